@@ -0,0 +1,157 @@
+"""
+WebRTC signaling fan-out over Redis pub/sub.
+Each call room has a Redis channel. A process subscribes to a room's channel
+only while it holds a WebSocket of that room, so both peers of a call see
+each other's SDP/ICE messages whichever API worker they are connected to.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+import redis.asyncio as redis
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Seconds get_message waits for a message before checking for shutdown
+POLL_TIMEOUT = 1.0
+
+
+class SignalingHub:
+    """
+    Relays signaling messages between the WebSockets of a room, across processes.
+
+    Messages are published as "<sender_user_id>:<raw JSON text>" and
+    delivered as the original text (no JSON re-encoding); receivers skip the
+    sender's own socket.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        """
+        Initialize signaling hub.
+
+        Args:
+            redis_client: Redis async client instance
+        """
+        self.redis = redis_client
+        self.key_prefix = "video_call:signal"
+        # room_id -> user_id -> WebSocket, for the sockets of this process
+        self.connections: Dict[str, Dict[int, WebSocket]] = {}
+        self._pubsub = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def _get_channel(self, room_id: str) -> str:
+        """Get Redis channel of a room."""
+        return f"{self.key_prefix}:{room_id}"
+
+    async def _ensure_reader(self) -> None:
+        """Open the pub/sub connection and start the reader task (lazy)."""
+        if self._pubsub is None:
+            self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            await self._pubsub.connect()
+        if self._reader_task is None or self._reader_task.done():
+            self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def join(self, room_id: str, user_id: int, websocket: WebSocket) -> None:
+        """
+        Register a WebSocket of this process, subscribing to its room if needed.
+
+        Args:
+            room_id: Call room ID
+            user_id: User ID of the socket's peer
+            websocket: Accepted WebSocket
+        """
+        async with self._lock:
+            room = self.connections.setdefault(room_id, {})
+            first = not room
+            room[user_id] = websocket
+            if first:
+                await self._ensure_reader()
+                await self._pubsub.subscribe(self._get_channel(room_id))
+
+    async def leave(self, room_id: str, user_id: int, websocket: Optional[WebSocket] = None) -> None:
+        """
+        Unregister a WebSocket, unsubscribing from its room if it was the last one.
+
+        Args:
+            room_id: Call room ID
+            user_id: User ID of the socket's peer
+            websocket: Socket to remove (None removes whatever socket the user has)
+        """
+        async with self._lock:
+            room = self.connections.get(room_id)
+            if room is None:
+                return
+            if websocket is None or room.get(user_id) is websocket:
+                room.pop(user_id, None)
+            if not room:
+                del self.connections[room_id]
+                if self._pubsub is not None:
+                    try:
+                        await self._pubsub.unsubscribe(self._get_channel(room_id))
+                    except Exception as e:
+                        logger.warning(f"Error unsubscribing from signaling room {room_id}: {e}")
+
+    async def publish(self, room_id: str, raw_message: str, sender_user_id: Optional[int] = None) -> None:
+        """
+        Send a message to every socket of a room except the sender's, on all processes.
+
+        Args:
+            room_id: Call room ID
+            raw_message: JSON text, delivered as is
+            sender_user_id: User ID of the sender (None delivers to everyone)
+        """
+        await self.redis.publish(self._get_channel(room_id), f"{sender_user_id or 0}:{raw_message}")
+
+    async def _deliver(self, room_id: str, raw_message: str, sender_user_id: int) -> None:
+        """Send a message to this process's sockets of a room."""
+        room = self.connections.get(room_id)
+        if not room:
+            return
+        for user_id, websocket in list(room.items()):
+            if user_id == sender_user_id:
+                continue
+            try:
+                await websocket.send_text(raw_message)
+            except Exception:
+                # Connection closed, remove it
+                await self.leave(room_id, user_id, websocket)
+
+    async def _read_loop(self) -> None:
+        """Deliver messages of the subscribed rooms to local sockets."""
+        channel_prefix = f"{self.key_prefix}:"
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=POLL_TIMEOUT)
+                if not message or message["type"] != "message":
+                    continue
+                channel = message["channel"]
+                data = message["data"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                if isinstance(data, bytes):
+                    data = data.decode()
+                sender, _, raw_message = data.partition(":")
+                await self._deliver(channel[len(channel_prefix):], raw_message, int(sender))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Reconnects re-subscribe to the rooms automatically
+                logger.error(f"Error in signaling reader: {e}")
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        """Stop the reader task and close the pub/sub connection."""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader_task = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
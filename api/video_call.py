@@ -5,6 +5,7 @@ Generates unique video call room IDs and links.
 import secrets
 import uuid
 import json
+import logging
 from datetime import datetime, timedelta
 from fastapi import FastAPI, HTTPException, Header, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,6 +15,9 @@ import redis.asyncio as redis
 import jwt
 
 from config.settings import settings
+from api.signaling import SignalingHub
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Video Call API", version="1.0.0")
 
@@ -29,8 +33,13 @@ app.add_middleware(
 # Global Redis client
 redis_client = None
 
-# WebSocket connections storage
-active_connections: Dict[str, Dict[int, WebSocket]] = {}
+# Signaling fan-out between the API processes (set with the Redis client)
+signaling_hub: Optional[SignalingHub] = None
+
+# Room state is a Redis hash, expiring this long after the last change
+ROOM_TTL_SECONDS = 3600
+# Room hash fields holding integers
+ROOM_INT_FIELDS = ("user1_id", "user2_id", "chat_room_id")
 
 
 class VideoCallRequest(BaseModel):
@@ -66,8 +75,50 @@ class VerifyTokenResponse(BaseModel):
 
 def set_redis_client(client: redis.Redis):
     """Set Redis client instance."""
-    global redis_client
+    global redis_client, signaling_hub
     redis_client = client
+    signaling_hub = SignalingHub(client) if client else None
+
+
+async def close_signaling():
+    """Close the signaling pub/sub connection."""
+    if signaling_hub:
+        await signaling_hub.close()
+
+
+def _get_room_key(room_id: str) -> str:
+    """Get Redis key for the state hash of a call room."""
+    # Not video_call:room: - that name held JSON strings, which HGETALL/HSET reject
+    return f"video_call:room_state:{room_id}"
+
+
+async def _get_room(room_id: str) -> Optional[dict]:
+    """
+    Get the state of a call room.
+    
+    Returns:
+        Room fields (IDs as integers) or None if the room doesn't exist
+    """
+    raw = await redis_client.hgetall(_get_room_key(room_id))
+    if not raw:
+        return None
+    room_data = {
+        (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+        for key, value in raw.items()
+    }
+    for field in ROOM_INT_FIELDS:
+        if field in room_data:
+            room_data[field] = int(room_data[field])
+    return room_data
+
+
+async def _update_room(room_id: str, fields: dict) -> None:
+    """Set fields of a call room's state and renew its expiry."""
+    room_key = _get_room_key(room_id)
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hset(room_key, mapping=fields)
+    pipe.expire(room_key, ROOM_TTL_SECONDS)
+    await pipe.execute()
 
 
 def verify_api_key_sync(x_api_key: str) -> bool:
@@ -122,16 +173,14 @@ async def create_video_call(
     
     # Store room information in Redis (expires in 1 hour)
     if redis_client:
-        room_key = f"video_call:room:{room_id}"
-        room_data = {
+        await _update_room(room_id, {
             "user1_id": request.user1_id,
             "user2_id": request.user2_id,
             "chat_room_id": request.chat_room_id,
             "call_type": request.call_type,
             "status": "pending",
             "created_at": datetime.utcnow().isoformat(),
-        }
-        await redis_client.setex(room_key, 3600, json.dumps(room_data))
+        })
     
     # Generate video call link
     video_call_link = f"{settings.VIDEO_CALL_DOMAIN}/call/{room_id}"
@@ -166,12 +215,10 @@ async def generate_call_tokens(
         raise HTTPException(status_code=503, detail="Redis not available")
     
     # Get room data
-    room_key = f"video_call:room:{room_id}"
-    room_data_str = await redis_client.get(room_key)
-    if not room_data_str:
+    room_data = await _get_room(room_id)
+    if not room_data:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    room_data = json.loads(room_data_str)
     user1_id = room_data["user1_id"]
     user2_id = room_data["user2_id"]
     chat_room_id = room_data["chat_room_id"]
@@ -182,8 +229,7 @@ async def generate_call_tokens(
     token2 = generate_call_token(user2_id, room_id, chat_room_id, call_type)
     
     # Update room status
-    room_data["status"] = "active"
-    await redis_client.setex(room_key, 3600, json.dumps(room_data))
+    await _update_room(room_id, {"status": "active"})
     
     return {
         "user1_token": token1,
@@ -218,12 +264,10 @@ async def verify_call_access(room_id: str, token: str):
         raise HTTPException(status_code=403, detail="Invalid token for this room")
     
     # Get room data
-    room_key = f"video_call:room:{room_id}"
-    room_data_str = await redis_client.get(room_key)
-    if not room_data_str:
+    room_data = await _get_room(room_id)
+    if not room_data:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    room_data = json.loads(room_data_str)
     user_id = payload["user_id"]
     
     # Check user is authorized
@@ -253,13 +297,11 @@ async def get_video_call_info(room_id: str):
     if not redis_client:
         raise HTTPException(status_code=503, detail="Redis not available")
     
-    room_key = f"video_call:room:{room_id}"
-    room_data_str = await redis_client.get(room_key)
+    room_data = await _get_room(room_id)
     
-    if not room_data_str:
+    if not room_data:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    room_data = json.loads(room_data_str)
     return {"room_id": room_id, "data": room_data}
 
 
@@ -282,8 +324,7 @@ async def delete_video_call(room_id: str, x_api_key: str = Header(...)):
     if not redis_client:
         raise HTTPException(status_code=503, detail="Redis not available")
     
-    room_key = f"video_call:room:{room_id}"
-    deleted = await redis_client.delete(room_key)
+    deleted = await redis_client.delete(_get_room_key(room_id))
     
     if deleted:
         return {"message": "Room deleted successfully"}
@@ -298,19 +339,8 @@ async def health_check():
 
 
 async def broadcast_to_room(room_id: str, message: dict, exclude_user_id: Optional[int] = None):
-    """Broadcast message to all users in a room except excluded user."""
-    if room_id not in active_connections:
-        return
-    
-    connections = active_connections[room_id]
-    for user_id, websocket in connections.items():
-        if user_id != exclude_user_id:
-            try:
-                await websocket.send_json(message)
-            except:
-                # Connection closed, remove it
-                if room_id in active_connections:
-                    active_connections[room_id].pop(user_id, None)
+    """Broadcast message to all users in a room except excluded user (on every API process)."""
+    await signaling_hub.publish(room_id, json.dumps(message), exclude_user_id)
 
 
 @app.websocket("/ws/video-call/{room_id}")
@@ -322,6 +352,9 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str):
     - SDP offer/answer exchange
     - ICE candidate exchange
     - User joined/left events
+    
+    Messages are relayed through the room's Redis channel, so the peers may
+    be connected to different API processes.
     """
     await websocket.accept()
     
@@ -342,18 +375,14 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str):
         await websocket.close(code=1011, reason="Server error")
         return
     
-    room_key = f"video_call:room:{room_id}"
-    room_data_str = await redis_client.get(room_key)
-    if not room_data_str:
+    if not await redis_client.exists(_get_room_key(room_id)):
         await websocket.close(code=1008, reason="Room not found")
         return
     
     user_id = payload["user_id"]
     
-    # Store connection
-    if room_id not in active_connections:
-        active_connections[room_id] = {}
-    active_connections[room_id][user_id] = websocket
+    # Store connection (subscribes this process to the room's channel)
+    await signaling_hub.join(room_id, user_id, websocket)
     
     # Notify other user that this user joined
     await broadcast_to_room(room_id, {
@@ -363,38 +392,38 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str):
     
     try:
         while True:
-            # Receive message
-            message = await websocket.receive_json()
+            # Receive message (forwarded as received, without re-encoding)
+            raw_message = await websocket.receive_text()
+            message = json.loads(raw_message)
             message_type = message.get("type")
             
             # Forward signaling messages to other user
             if message_type in ["offer", "answer", "ice-candidate"]:
-                await broadcast_to_room(room_id, message, exclude_user_id=user_id)
+                await signaling_hub.publish(room_id, raw_message, user_id)
             elif message_type == "call-ended":
                 # Notify other user
-                await broadcast_to_room(room_id, message, exclude_user_id=user_id)
+                await signaling_hub.publish(room_id, raw_message, user_id)
                 # Update room status in Redis
-                room_data = json.loads(room_data_str)
-                room_data["status"] = "ended"
-                room_data["ended_at"] = datetime.utcnow().isoformat()
-                await redis_client.setex(room_key, 3600, json.dumps(room_data))
+                await _update_room(room_id, {
+                    "status": "ended",
+                    "ended_at": datetime.utcnow().isoformat(),
+                })
                 break
                 
     except WebSocketDisconnect:
         pass
     except Exception as e:
         # Handle errors
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"WebSocket error: {e}")
     finally:
         # Remove connection
-        if room_id in active_connections:
-            active_connections[room_id].pop(user_id, None)
+        await signaling_hub.leave(room_id, user_id, websocket)
         
         # Notify other user that this user left
-        await broadcast_to_room(room_id, {
-            "type": "user-left",
-            "user_id": user_id
-        }, exclude_user_id=user_id)
-
+        try:
+            await broadcast_to_room(room_id, {
+                "type": "user-left",
+                "user_id": user_id
+            }, exclude_user_id=user_id)
+        except Exception as e:
+            logger.error(f"Error announcing user-left in room {room_id}: {e}")
@@ -0,0 +1,64 @@
+"""
+Shared Telegram Bot client.
+All outgoing Telegram API calls go through one aiohttp session, so they reuse
+keep-alive connections instead of opening a new TCP/TLS connection per call.
+"""
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.enums import ParseMode
+
+from config.settings import settings
+
+_session: Optional[AiohttpSession] = None
+_bot: Optional[Bot] = None
+_plain_bot: Optional[Bot] = None
+
+
+def get_session() -> AiohttpSession:
+    """Get the process-wide aiohttp session (connection pool) for Telegram."""
+    global _session
+    if _session is None:
+        _session = AiohttpSession(limit=settings.TELEGRAM_CONNECTION_POOL_SIZE)
+    return _session
+
+
+def create_bot() -> Bot:
+    """
+    Get the main bot instance (HTML parse mode) used by the dispatcher.
+
+    Handlers receive it as data["bot"].
+    """
+    global _bot
+    if _bot is None:
+        _bot = Bot(
+            token=settings.BOT_TOKEN,
+            session=get_session(),
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        )
+    return _bot
+
+
+def get_bot() -> Bot:
+    """
+    Get a shared bot without default parse mode.
+
+    Drop-in replacement for Bot(token=settings.BOT_TOKEN): same behaviour,
+    but it shares the process-wide session. Never close its session.
+    """
+    global _plain_bot
+    if _plain_bot is None:
+        _plain_bot = Bot(token=settings.BOT_TOKEN, session=get_session())
+    return _plain_bot
+
+
+async def close_session() -> None:
+    """Close the shared session (on shutdown only)."""
+    global _session, _bot, _plain_bot
+    if _session is not None:
+        await _session.close()
+    _session = None
+    _bot = None
+    _plain_bot = None
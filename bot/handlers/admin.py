@@ -97,9 +97,6 @@ from sqlalchemy import select, or_
 
 router = Router()
 
-# Track active broadcasts for pause/resume/cancel functionality
-_active_broadcasts: dict[int, dict] = {}  # broadcast_id -> {status, stop_event, pause_event}
-
 
 def get_gender_emoji(gender: str) -> str:
     """Get emoji for gender."""
@@ -588,41 +585,55 @@ async def process_broadcast_rate(message: Message, state: FSMContext):
             f"⏳ پیام به زودی توسط سیستم پردازش و ارسال خواهد شد.\n\n"
             f"💡 برای مشاهده وضعیت:\n"
             f"/admin_broadcast_stats {broadcast.id}",
-            parse_mode='HTML'
+            parse_mode='HTML',
+            reply_markup=get_broadcast_control_keyboard(broadcast.id)
         )
         
         await state.clear()
         break
 
 
+def get_broadcast_control_keyboard(broadcast_id: int, paused: bool = False):
+    """Get pause/resume and cancel buttons for a queued broadcast."""
+    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+    if paused:
+        toggle = InlineKeyboardButton(text="▶️ ادامه", callback_data=f"broadcast:resume:{broadcast_id}")
+    else:
+        toggle = InlineKeyboardButton(text="⏸ توقف موقت", callback_data=f"broadcast:pause:{broadcast_id}")
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            toggle,
+            InlineKeyboardButton(text="🛑 لغو", callback_data=f"broadcast:cancel:{broadcast_id}")
+        ]
+    ])
+
+
 @router.callback_query(F.data.startswith("broadcast:pause:"))
 async def handle_broadcast_pause(callback: CallbackQuery):
-    """Pause broadcast."""
+    """Pause broadcast (the processor stops at its next checkpoint)."""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ دسترسی محدود است.", show_alert=True)
         return
     
     broadcast_id = int(callback.data.split(":")[-1])
     
-    if broadcast_id not in _active_broadcasts:
+    from utils.broadcast_service import (
+        BroadcastService, BROADCAST_PAUSED, BROADCAST_ACTIVE_STATUSES
+    )
+    async for db_session in get_db():
+        paused = await BroadcastService().set_broadcast_status(
+            db_session, broadcast_id, BROADCAST_PAUSED, from_statuses=BROADCAST_ACTIVE_STATUSES
+        )
+        break
+    
+    if not paused:
         await callback.answer("❌ این broadcast دیگر فعال نیست.", show_alert=True)
         return
     
-    # Pause the broadcast
-    _active_broadcasts[broadcast_id]['status'] = 'paused'
-    _active_broadcasts[broadcast_id]['pause_event'].clear()
-    
-    # Update keyboard
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    pause_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="▶️ ادامه", callback_data=f"broadcast:resume:{broadcast_id}"),
-            InlineKeyboardButton(text="🛑 لغو", callback_data=f"broadcast:cancel:{broadcast_id}")
-        ]
-    ])
-    
     try:
-        await callback.message.edit_reply_markup(reply_markup=pause_keyboard)
+        await callback.message.edit_reply_markup(
+            reply_markup=get_broadcast_control_keyboard(broadcast_id, paused=True)
+        )
         await callback.answer("⏸ ارسال متوقف شد. برای ادامه روی دکمه 'ادامه' کلیک کنید.")
     except Exception:
         await callback.answer("❌ خطا در به‌روزرسانی.")
@@ -630,32 +641,31 @@ async def handle_broadcast_pause(callback: CallbackQuery):
 
 @router.callback_query(F.data.startswith("broadcast:resume:"))
 async def handle_broadcast_resume(callback: CallbackQuery):
-    """Resume broadcast."""
+    """Resume broadcast from its saved cursor."""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ دسترسی محدود است.", show_alert=True)
         return
     
     broadcast_id = int(callback.data.split(":")[-1])
     
-    if broadcast_id not in _active_broadcasts:
+    from utils.broadcast_service import (
+        BroadcastService, BROADCAST_PAUSED, BROADCAST_RUNNING
+    )
+    async for db_session in get_db():
+        # Running (not pending): the processor picks it up again and continues after last_user_id
+        resumed = await BroadcastService().set_broadcast_status(
+            db_session, broadcast_id, BROADCAST_RUNNING, from_statuses=(BROADCAST_PAUSED,)
+        )
+        break
+    
+    if not resumed:
         await callback.answer("❌ این broadcast دیگر فعال نیست.", show_alert=True)
         return
     
-    # Resume the broadcast
-    _active_broadcasts[broadcast_id]['status'] = 'running'
-    _active_broadcasts[broadcast_id]['pause_event'].set()
-    
-    # Update keyboard
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    resume_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="⏸ توقف موقت", callback_data=f"broadcast:pause:{broadcast_id}"),
-            InlineKeyboardButton(text="🛑 لغو", callback_data=f"broadcast:cancel:{broadcast_id}")
-        ]
-    ])
-    
     try:
-        await callback.message.edit_reply_markup(reply_markup=resume_keyboard)
+        await callback.message.edit_reply_markup(
+            reply_markup=get_broadcast_control_keyboard(broadcast_id)
+        )
         await callback.answer("▶️ ارسال ادامه یافت.")
     except Exception:
         await callback.answer("❌ خطا در به‌روزرسانی.")
@@ -670,14 +680,24 @@ async def handle_broadcast_cancel(callback: CallbackQuery):
     
     broadcast_id = int(callback.data.split(":")[-1])
     
-    if broadcast_id not in _active_broadcasts:
+    from utils.broadcast_service import (
+        BroadcastService, BROADCAST_CANCELLED, BROADCAST_PAUSED, BROADCAST_ACTIVE_STATUSES
+    )
+    async for db_session in get_db():
+        cancelled = await BroadcastService().set_broadcast_status(
+            db_session, broadcast_id, BROADCAST_CANCELLED,
+            from_statuses=BROADCAST_ACTIVE_STATUSES + (BROADCAST_PAUSED,)
+        )
+        break
+    
+    if not cancelled:
         await callback.answer("❌ این broadcast دیگر فعال نیست.", show_alert=True)
         return
     
-    # Cancel the broadcast
-    _active_broadcasts[broadcast_id]['status'] = 'cancelled'
-    _active_broadcasts[broadcast_id]['pause_event'].set()  # Unpause if paused
-    
+    try:
+        await callback.message.edit_reply_markup(reply_markup=None)
+    except Exception:
+        pass
     await callback.answer("🛑 ارسال لغو شد.", show_alert=True)
 
 
@@ -695,8 +715,18 @@ async def cmd_broadcast_stats(message: Message):
         await message.answer("❌ Usage: /admin_broadcast_stats <broadcast_id>")
         return
     
+    # Live counters of a running broadcast (the database is updated at checkpoints)
+    from utils.broadcast_service import get_broadcast_counters
+    live_counts = None
+    broadcast_counters = get_broadcast_counters()
+    if broadcast_counters:
+        try:
+            live_counts = await broadcast_counters.get(broadcast_id)
+        except Exception:
+            pass
+    
     async for db_session in get_db():
-        stats = await get_broadcast_statistics(db_session, broadcast_id)
+        stats = await get_broadcast_statistics(db_session, broadcast_id, live_counts)
         
         if not stats:
             await message.answer(f"❌ پیام همگانی با ID {broadcast_id} یافت نشد.")
@@ -757,7 +787,7 @@ async def cmd_admin_broadcast_queue(message: Message, state: FSMContext):
         "📢 <b>ارسال پیام همگانی (سیستم صف)</b>\n\n"
         "این سیستم برای ارسال به تعداد زیاد کاربر (100k+) بهینه شده است.\n\n"
         "✅ <b>ویژگی‌ها:</b>\n"
-        "• ارسال با سرعت 15 پیام/ثانیه\n"
+        f"• ارسال با سرعت {settings.BROADCAST_MAX_MESSAGES_PER_SECOND:g} پیام/ثانیه\n"
         "• مدیریت خودکار FloodWait\n"
         "• پردازش در پس‌زمینه\n"
         "• تلاش مجدد در صورت خطا\n\n"
@@ -857,7 +887,7 @@ async def process_queue_broadcast_message(message: Message, state: FSMContext):
         total_users = user_stats.get('active', 0)
 
         # Calculate estimated time
-        messages_per_second = 15
+        messages_per_second = settings.BROADCAST_MAX_MESSAGES_PER_SECOND
         estimated_minutes = total_users / messages_per_second / 60
 
         # Show preview and ask for confirmation
@@ -867,7 +897,7 @@ async def process_queue_broadcast_message(message: Message, state: FSMContext):
             preview_text += f"💬 متن: {message_text[:100]}...\n" if len(message_text) > 100 else f"💬 متن: {message_text}\n"
         preview_text += f"\n👥 <b>کاربران فعال:</b> {total_users:,}\n"
         preview_text += f"⏱ <b>زمان تقریبی:</b> {estimated_minutes:.1f} دقیقه\n"
-        preview_text += f"🚀 <b>سرعت:</b> 15 پیام/ثانیه\n\n"
+        preview_text += f"🚀 <b>سرعت:</b> {messages_per_second:g} پیام/ثانیه\n\n"
         preview_text += "⚠️ <b>توجه:</b> پیام به صف اضافه می‌شود و در پس‌زمینه ارسال خواهد شد.\n\n"
         preview_text += "آیا می‌خواهید ادامه دهید؟"
 
@@ -903,7 +933,7 @@ async def confirm_queue_broadcast(callback: CallbackQuery, state: FSMContext):
             from utils.broadcast_service import BroadcastService
             broadcast_service = BroadcastService()
 
-            # Create broadcast in database (default delay ~15 msg/sec = 0.067s)
+            # Create broadcast in database (at the global broadcast rate)
             broadcast = await broadcast_service.create_broadcast_message(
                 session=db_session,
                 admin_id=data['admin_id'],
@@ -913,7 +943,7 @@ async def confirm_queue_broadcast(callback: CallbackQuery, state: FSMContext):
                 message_caption=data.get('message_caption'),
                 forwarded_from_chat_id=data.get('forwarded_from_chat_id'),
                 forwarded_from_message_id=data.get('forwarded_from_message_id'),
-                delay_seconds=0.067,  # Default ~15 msg/sec for queue-based broadcasts
+                delay_seconds=1.0 / settings.BROADCAST_MAX_MESSAGES_PER_SECOND,
             )
 
             await callback.message.edit_text(
@@ -924,7 +954,8 @@ async def confirm_queue_broadcast(callback: CallbackQuery, state: FSMContext):
                 f"⏳ پیام به زودی توسط سیستم پردازش و ارسال خواهد شد.\n\n"
                 f"💡 برای مشاهده وضعیت:\n"
                 f"/admin_broadcast_stats {broadcast.id}",
-                parse_mode='HTML'
+                parse_mode='HTML',
+                reply_markup=get_broadcast_control_keyboard(broadcast.id)
             )
             
             await state.clear()
@@ -3,7 +3,7 @@ Admin user management handlers.
 Handles ban, unban, and edit profile actions for admins.
 """
 from datetime import datetime
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
@@ -18,7 +18,7 @@ from bot.keyboards.admin import (
     get_admin_user_management_keyboard,
     get_admin_edit_profile_keyboard,
 )
-from config.settings import settings
+from bot.client import get_bot
 from bot.handlers.admin import is_admin
 from bot.handlers.admin import EditUserProfileStates
 
@@ -347,13 +347,12 @@ async def process_admin_message_after_action(message: Message, state: FSMContext
         
         # Send admin message to user if provided
         if not skip_message and message_text:
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             try:
                 await bot.send_message(
                     target_user.telegram_id,
                     f"📢 پیام از ادمین:\n\n{message_text}"
                 )
-                await bot.session.close()
             except Exception as e:
                 # User might have blocked bot, continue anyway
                 pass
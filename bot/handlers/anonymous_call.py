@@ -2,7 +2,6 @@
 Anonymous call handler for video and voice chat.
 Handles anonymous video/voice call matching.
 """
-import random
 import json
 import time
 import asyncio
@@ -26,20 +25,22 @@ from bot.keyboards.anonymous_call import (
 from bot.keyboards.profile import get_profile_keyboard
 from bot.keyboards.common import get_main_menu_keyboard
 from config.settings import settings
+from core.anonymous_call_queue import AnonymousCallQueue
+from bot.client import get_bot
 from utils.validators import get_display_name
 
 router = Router()
 
 # Redis client will be set from main.py
 redis_client = None
-anonymous_call_queue_prefix = "anonymous_call:queue"
-anonymous_call_user_data_prefix = "anonymous_call:user"
+anonymous_call_queue: AnonymousCallQueue = None
 
 
 def set_redis_client(client):
     """Set Redis client for anonymous call handler."""
-    global redis_client
+    global redis_client, anonymous_call_queue
     redis_client = client
+    anonymous_call_queue = AnonymousCallQueue(client) if client else None
 
 
 async def add_to_anonymous_queue(
@@ -49,110 +50,41 @@ async def add_to_anonymous_queue(
     user_gender: str = None
 ) -> bool:
     """Add user to anonymous call queue."""
-    if not redis_client:
+    if not anonymous_call_queue:
         return False
     
-    user_data = {
-        "user_id": user_id,
-        "call_type": call_type,
-        "preferred_gender": preferred_gender,
-        "user_gender": user_gender,
-        "joined_at": time.time(),
-    }
-    
-    # Store user data
-    user_data_key = f"{anonymous_call_user_data_prefix}:{user_id}"
-    await redis_client.setex(
-        user_data_key,
-        300,  # 5 minutes timeout
-        json.dumps(user_data)
-    )
-    
-    # Add to queue based on call type and preferred gender
-    queue_key = f"{anonymous_call_queue_prefix}:{call_type}:{preferred_gender}"
-    await redis_client.sadd(queue_key, user_id)
-    await redis_client.expire(queue_key, 300)
-    
-    return True
+    return await anonymous_call_queue.add_user(user_id, call_type, preferred_gender, user_gender)
 
 
 async def remove_from_anonymous_queue(user_id: int, call_type: str = None, preferred_gender: str = None) -> bool:
-    """Remove user from anonymous call queue."""
-    if not redis_client:
+    """Remove user from anonymous call queue (the queue they joined is stored with their data)."""
+    if not anonymous_call_queue:
         return False
     
-    # Remove user data
-    user_data_key = f"{anonymous_call_user_data_prefix}:{user_id}"
-    await redis_client.delete(user_data_key)
-    
-    # Remove from all possible queues
-    if call_type and preferred_gender:
-        queue_key = f"{anonymous_call_queue_prefix}:{call_type}:{preferred_gender}"
-        await redis_client.srem(queue_key, user_id)
-    else:
-        # Remove from all queues
-        for call_t in ["video", "voice"]:
-            for gender in ["male", "female", "all"]:
-                queue_key = f"{anonymous_call_queue_prefix}:{call_t}:{gender}"
-                await redis_client.srem(queue_key, user_id)
+    return await anonymous_call_queue.remove_user(user_id)
+
+
+async def is_in_anonymous_queue(user_id: int) -> bool:
+    """Check if user is still searching (not matched by another user or cancelled)."""
+    if not anonymous_call_queue:
+        return False
     
-    return True
+    return await anonymous_call_queue.is_queued(user_id)
 
 
 async def find_match(user_id: int, call_type: str, preferred_gender: str, user_gender: str = None) -> tuple:
-    """Find a match for anonymous call."""
-    if not redis_client:
-        return None, None
-    
-    # Determine which queues to search based on what user is looking for
-    queues_to_search = []
-    
-    # If user wants "all", search all gender queues
-    if preferred_gender == "all":
-        for gender in ["male", "female", "all"]:
-            queue_key = f"{anonymous_call_queue_prefix}:{call_type}:{gender}"
-            queues_to_search.append((queue_key, gender))
-    else:
-        # Search for specific gender
-        queue_key = f"{anonymous_call_queue_prefix}:{call_type}:{preferred_gender}"
-        queues_to_search.append((queue_key, preferred_gender))
-        
-        # Also search "all" queue (users who don't care about gender)
-        queue_key_all = f"{anonymous_call_queue_prefix}:{call_type}:all"
-        queues_to_search.append((queue_key_all, "all"))
+    """
+    Find and claim a match for anonymous call.
     
-    # Search for matches
-    candidates = []
-    for queue_key, _ in queues_to_search:
-        members = await redis_client.smembers(queue_key)
-        for member_id in members:
-            try:
-                member_id_int = int(member_id)
-                if member_id_int != user_id:
-                    # Check if this member is looking for our user's gender or "all"
-                    member_data_key = f"{anonymous_call_user_data_prefix}:{member_id_int}"
-                    member_data_str = await redis_client.get(member_data_key)
-                    if member_data_str:
-                        member_data = json.loads(member_data_str)
-                        member_pref = member_data.get("preferred_gender", "all")
-                        member_gender = member_data.get("user_gender")
-                        
-                        # Check compatibility:
-                        # 1. Member wants "all" OR
-                        # 2. Member wants our user's gender OR
-                        # 3. Our user wants "all" and member's gender matches what we want
-                        if (member_pref == "all" or 
-                            member_pref == user_gender or 
-                            (preferred_gender == "all" and member_gender == preferred_gender) or
-                            (preferred_gender != "all" and member_gender == preferred_gender)):
-                            candidates.append(member_id_int)
-            except (ValueError, TypeError):
-                continue
+    The oldest compatible user is claimed atomically, so the returned
+    partner is no longer in the queue for other searchers.
+    """
+    if not anonymous_call_queue:
+        return None, None
     
-    if candidates:
-        # Randomly select a candidate
-        selected_id = random.choice(candidates)
-        return selected_id, call_type
+    partner_id = await anonymous_call_queue.claim_match(user_id)
+    if partner_id:
+        return partner_id, call_type
     
     return None, None
 
@@ -324,6 +256,11 @@ async def anonymous_video_call(callback: CallbackQuery):
                     if partner_id:
                         break
                     
+                    if not await is_in_anonymous_queue(user.id):
+                        # Matched by another user (who sent us the link) or cancelled
+                        await callback.answer()
+                        return
+                    
                     # Update message to show still searching
                     if attempt < max_attempts - 1:
                         await callback.message.edit_text(
@@ -358,9 +295,7 @@ async def anonymous_video_call(callback: CallbackQuery):
                         from db.crud import get_user_by_id
                         partner_user = await get_user_by_id(db_session, partner_id)
                         if partner_user:
-                            from aiogram import Bot
-                            from config.settings import settings
-                            bot = Bot(token=settings.BOT_TOKEN)
+                            bot = get_bot()
                             partner_call_data = await create_anonymous_call_room(partner_id, user.id, call_type)
                             await bot.send_message(
                                 partner_user.telegram_id,
@@ -374,7 +309,6 @@ async def anonymous_video_call(callback: CallbackQuery):
                                     partner_call_data["link"]
                                 )
                             )
-                            await bot.session.close()
                     except Exception as e:
                         print(f"Error notifying partner: {e}")
                 else:
@@ -505,6 +439,11 @@ async def handle_gender_selection(callback: CallbackQuery):
                 if partner_id:
                     break
                 
+                if not await is_in_anonymous_queue(user.id):
+                    # Matched by another user (who sent us the link) or cancelled
+                    await callback.answer()
+                    return
+                
                 # Update message to show still searching
                 if attempt < max_attempts - 1:
                     await callback.message.edit_text(
@@ -539,9 +478,7 @@ async def handle_gender_selection(callback: CallbackQuery):
                     from db.crud import get_user_by_id
                     partner_user = await get_user_by_id(db_session, partner_id)
                     if partner_user:
-                        from aiogram import Bot
-                        from config.settings import settings
-                        bot = Bot(token=settings.BOT_TOKEN)
+                        bot = get_bot()
                         partner_call_data = await create_anonymous_call_room(partner_id, user.id, call_type)
                         await bot.send_message(
                             partner_user.telegram_id,
@@ -555,7 +492,6 @@ async def handle_gender_selection(callback: CallbackQuery):
                                 partner_call_data["link"]
                             )
                         )
-                        await bot.session.close()
                 except Exception as e:
                     print(f"Error notifying partner: {e}")
             else:
@@ -651,14 +587,9 @@ async def find_next_match(callback: CallbackQuery):
             return
         
         # Get user's previous preference
-        user_data_key = f"{anonymous_call_user_data_prefix}:{user.id}"
-        if redis_client:
-            user_data_str = await redis_client.get(user_data_key)
-            if user_data_str:
-                user_data = json.loads(user_data_str)
-                preferred_gender = user_data.get("preferred_gender", "all")
-            else:
-                preferred_gender = "all"
+        user_data = await anonymous_call_queue.get_user_data(user.id) if anonymous_call_queue else None
+        if user_data:
+            preferred_gender = user_data.get("preferred_gender", "all")
         else:
             preferred_gender = "all"
         
@@ -687,6 +618,11 @@ async def find_next_match(callback: CallbackQuery):
             if partner_id:
                 break
             
+            if not await is_in_anonymous_queue(user.id):
+                # Matched by another user (who sent us the link) or cancelled
+                await callback.answer()
+                return
+            
             # Update message to show still searching
             if attempt < max_attempts - 1:
                 await callback.message.edit_text(
@@ -721,9 +657,7 @@ async def find_next_match(callback: CallbackQuery):
                 from db.crud import get_user_by_id
                 partner_user = await get_user_by_id(db_session, partner_id)
                 if partner_user:
-                    from aiogram import Bot
-                    from config.settings import settings
-                    bot = Bot(token=settings.BOT_TOKEN)
+                    bot = get_bot()
                     partner_call_data = await create_anonymous_call_room(partner_id, user.id, call_type)
                     await bot.send_message(
                         partner_user.telegram_id,
@@ -737,7 +671,6 @@ async def find_next_match(callback: CallbackQuery):
                             partner_call_data["link"]
                         )
                     )
-                    await bot.session.close()
             except Exception as e:
                 print(f"Error notifying partner: {e}")
         else:
@@ -12,6 +12,7 @@ from db.crud import get_user_by_telegram_id, get_user_by_id
 from bot.keyboards.reply import get_chat_reply_keyboard
 from core.chat_manager import ChatManager
 from config.settings import settings
+from bot.client import get_bot
 
 router = Router()
 
@@ -55,11 +56,10 @@ async def accept_call_request(callback: CallbackQuery):
             return
         
         # Create call room and generate tokens
-        from aiogram import Bot
         import aiohttp
         import json
         
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         call_type_text = "تصویری" if call_type == "video" else "صوتی"
         call_icon = "📹" if call_type == "video" else "📞"
         
@@ -163,7 +163,6 @@ async def accept_call_request(callback: CallbackQuery):
                     reply_markup=receiver_keyboard
                 )
             
-            await bot.session.close()
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
@@ -202,8 +201,7 @@ async def reject_call_request(callback: CallbackQuery):
             return
         
         # Notify caller that call was rejected
-        from aiogram import Bot
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         
         call_type_text = "تصویری" if call_type == "video" else "صوتی"
         call_icon = "📹" if call_type == "video" else "📞"
@@ -228,7 +226,6 @@ async def reject_call_request(callback: CallbackQuery):
                     reply_markup=get_chat_reply_keyboard()
                 )
             
-            await bot.session.close()
         except Exception:
             try:
                 await callback.message.answer(
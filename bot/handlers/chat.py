@@ -4,7 +4,7 @@ Handles starting chat, ending chat, and video call requests.
 """
 import asyncio
 from typing import Optional
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -22,7 +22,7 @@ from bot.keyboards.common import (
 )
 from bot.keyboards.reply import get_main_reply_keyboard, get_chat_reply_keyboard
 from config.settings import settings
-from utils.validators import get_display_name
+from bot.client import get_bot
 
 router = Router()
 
@@ -711,7 +711,7 @@ async def check_matchmaking_timeout_with_virtual(
                                 return f"💡 هزینه این چت {cost} سکه است؛ در صورت موفقیت چت ازت کسر می‌شود"
                     
                     # Send notification to user that they are connected (exactly like real match)
-                    bot = Bot(token=settings.BOT_TOKEN)
+                    bot = get_bot()
                     try:
                         user_cost_summary = get_match_cost_summary(
                             user_premium, preferred_gender, user_coins_deducted, filtered_chat_cost, user_points
@@ -728,7 +728,6 @@ async def check_matchmaking_timeout_with_virtual(
                             connection_msg,
                             reply_markup=get_chat_reply_keyboard()
                         )
-                        await bot.session.close()
                     except Exception as e:
                         logger.error(f"Failed to send connection message to user {user_id}: {e}")
                     
@@ -739,12 +738,11 @@ async def check_matchmaking_timeout_with_virtual(
                     
                     # Send "پروفایلت مشاهده شد" message (as if from virtual profile)
                     try:
-                        bot = Bot(token=settings.BOT_TOKEN)
+                        bot = get_bot()
                         await bot.send_message(
                             telegram_id,
                             "👁️ مخاطبت پروفایلت رو مشاهده کرد!"
                         )
-                        await bot.session.close()
                     except Exception as e:
                         logger.error(f"Failed to send profile viewed message: {e}")
                     
@@ -805,7 +803,7 @@ async def check_matchmaking_timeout_with_virtual(
                         ])
                         
                         # Send end chat message (exactly like real end_chat)
-                        bot = Bot(token=settings.BOT_TOKEN)
+                        bot = get_bot()
                         await bot.send_message(
                             telegram_id,
                             f"💬 چت شما با {virtual_profile_id_text} به پایان رسید\n\n"
@@ -818,21 +816,19 @@ async def check_matchmaking_timeout_with_virtual(
                             "📱 منوی اصلی",
                             reply_markup=get_main_reply_keyboard()
                         )
-                        await bot.session.close()
                     except Exception as e:
                         logger.error(f"Failed to end chat with virtual profile: {e}")
                 
             except Exception as e:
                 logger.error(f"Failed to create virtual profile for user {user_id}: {e}")
                 # Fallback to normal timeout message
-                bot = Bot(token=settings.BOT_TOKEN)
+                bot = get_bot()
                 try:
                     await bot.send_message(
                         telegram_id,
                         "❌ متأسفانه کسی رو برات پیدا نکردیم.\n\n"
                         "💡 می‌تونی دوباره امتحان کنی یا از طریق پروفایل‌ها با کاربران خاص چت کنی."
                     )
-                    await bot.session.close()
                 except Exception:
                     pass
             break
@@ -997,7 +993,7 @@ async def check_matchmaking_timeout_with_virtual(
                                 return f"💡 هزینه این چت {cost} سکه است؛ در صورت موفقیت چت ازت کسر می‌شود"
                     
                     # Send notification to user
-                    bot = Bot(token=settings.BOT_TOKEN)
+                    bot = get_bot()
                     try:
                         user_cost_summary = get_match_cost_summary(
                             user_premium, preferred_gender, user_coins_deducted, filtered_chat_cost, user_points
@@ -1014,7 +1010,6 @@ async def check_matchmaking_timeout_with_virtual(
                             connection_msg,
                             reply_markup=get_chat_reply_keyboard()
                         )
-                        await bot.session.close()
                     except Exception as e:
                         logger.error(f"Failed to send connection message to user {user_id}: {e}")
                     
@@ -1024,12 +1019,11 @@ async def check_matchmaking_timeout_with_virtual(
                     await asyncio.sleep(wait_time)
                     
                     try:
-                        bot = Bot(token=settings.BOT_TOKEN)
+                        bot = get_bot()
                         await bot.send_message(
                             telegram_id,
                             "👁️ مخاطبت پروفایلت رو مشاهده کرد!"
                         )
-                        await bot.session.close()
                     except Exception as e:
                         logger.error(f"Failed to send profile viewed message: {e}")
                     
@@ -1082,7 +1076,7 @@ async def check_matchmaking_timeout_with_virtual(
                             ],
                         ])
                         
-                        bot = Bot(token=settings.BOT_TOKEN)
+                        bot = get_bot()
                         await bot.send_message(
                             telegram_id,
                             f"💬 چت شما با {virtual_profile_id_text} به پایان رسید\n\n"
@@ -1094,20 +1088,18 @@ async def check_matchmaking_timeout_with_virtual(
                             "📱 منوی اصلی",
                             reply_markup=get_main_reply_keyboard()
                         )
-                        await bot.session.close()
                     except Exception as e:
                         logger.error(f"Failed to end chat with virtual profile: {e}")
                 
             except Exception as e:
                 logger.error(f"Failed to create virtual profile for user {user_id}: {e}")
-                bot = Bot(token=settings.BOT_TOKEN)
+                bot = get_bot()
                 try:
                     await bot.send_message(
                         telegram_id,
                         "❌ متأسفانه کسی رو برات پیدا نکردیم.\n\n"
                         "💡 می‌تونی دوباره امتحان کنی یا از طریق پروفایل‌ها با کاربران خاص چت کنی."
                     )
-                    await bot.session.close()
                 except Exception:
                     pass
             break
@@ -1158,7 +1150,7 @@ async def check_matchmaking_timeout(user_id: int, telegram_id: int):
             await matchmaking_queue.remove_user_from_queue(user_id)
             
             # Notify user with encouraging message
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             try:
                 # Create inline keyboard with retry button
                 retry_keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -1180,7 +1172,6 @@ async def check_matchmaking_timeout(user_id: int, telegram_id: int):
                     "🔹 یا از پروفایل‌های دیگران بازدید کنی\n\n",
                     reply_markup=retry_keyboard
                 )
-                await bot.session.close()
                 logger.info(f"Timeout message sent to user {user_id}")
             except Exception as e:
                 logger.error(f"Failed to send timeout message to user {user_id}: {e}")
@@ -1281,7 +1272,6 @@ async def try_find_match(telegram_id: int, db_session):
                     )
                     
                     # Notify both users and deduct coins if needed
-                    from aiogram import Bot
                     from db.crud import check_user_premium, spend_points, get_user_points
                     from core.points_manager import PointsManager
                     from db.crud import get_system_setting_value
@@ -1339,7 +1329,7 @@ async def try_find_match(telegram_id: int, db_session):
                         )
                     
                     
-                    bot = Bot(token=settings.BOT_TOKEN)
+                    bot = get_bot()
                     
                     await bot.send_message(
                         user.telegram_id,
@@ -1353,8 +1343,6 @@ async def try_find_match(telegram_id: int, db_session):
                         reply_markup=get_chat_reply_keyboard()
                     )
                     
-                    await bot.session.close()
-                    
                     # Remove users from queue after sending messages
                     await matchmaking_queue.remove_user_from_queue(telegram_id)
                     await matchmaking_queue.remove_user_from_queue(match_telegram_id)
@@ -1423,10 +1411,6 @@ async def end_chat_confirm(callback: CallbackQuery):
             if partner_id:
                 partner = await get_user_by_id(db_session, partner_id)
             
-            # Get message IDs before ending chat (for deletion)
-            user1_message_ids = await chat_manager.get_message_ids(chat_room.id, chat_room.user1_id)
-            user2_message_ids = await chat_manager.get_message_ids(chat_room.id, chat_room.user2_id)
-            
             # Get user Telegram IDs for message deletion
             user1_telegram_id = user.telegram_id
             user2_telegram_id = None
@@ -1478,71 +1462,6 @@ async def end_chat_confirm(callback: CallbackQuery):
             # Check if any messages were sent
             total_messages = current_user_count + partner_user_count
 
-            # Notify all users who requested notification for this user's chat end
-            if partner:
-                from db.crud import get_chat_end_notifications_for_user
-                from aiogram import Bot as NotifyBot
-                
-                notifications = await get_chat_end_notifications_for_user(db_session, partner.id)
-                
-                if notifications:
-                    notify_bot = NotifyBot(token=settings.BOT_TOKEN)
-                    try:
-                        for notification in notifications:
-                            watcher = await get_user_by_id(db_session, notification.watcher_id)
-                            if watcher:
-                                try:
-                                    gender_map = {"male": "پسر 🧑", "female": "دختر 👩", "other": "سایر"}
-                                    gender_text = gender_map.get(partner.gender, partner.gender or "تعیین نشده")
-                                    
-                                    # Generate profile_id if not exists
-                                    if not partner.profile_id:
-                                        import hashlib
-                                        profile_id = hashlib.md5(f"user_{partner.telegram_id}".encode()).hexdigest()[:12]
-                                        partner.profile_id = profile_id
-                                        await db_session.commit()
-                                        await db_session.refresh(partner)
-                                    
-                                    partner_profile_id = f"/user_{partner.profile_id}"
-                                    
-                                    notify_msg = f"🔔 چت {get_display_name(partner) or 'کاربر'} تمام شد!\n\n"
-                                    notify_msg += f"👤 نام: {get_display_name(partner) or 'نامشخص'}\n"
-                                    notify_msg += f"⚧️ جنسیت: {gender_text}\n"
-                                    
-                                    if partner.age:
-                                        notify_msg += f"🎂 سن: {partner.age}\n"
-                                    if partner.city:
-                                        notify_msg += f"🏙️ شهر: {partner.city}\n"
-                                    
-                                    notify_msg += f"🆔 ID: {partner_profile_id}\n\n"
-                                    notify_msg += "اکنون می‌توانید با این کاربر درخواست چت بفرستید."
-                                    
-                                    # Send notification with photo if available
-                                    if partner.profile_image_url:
-                                        try:
-                                            await notify_bot.send_photo(
-                                                watcher.telegram_id,
-                                                photo=partner.profile_image_url,
-                                                caption=notify_msg
-                                            )
-                                        except Exception:
-                                            await notify_bot.send_message(
-                                                watcher.telegram_id,
-                                                notify_msg
-                                            )
-                                    else:
-                                        await notify_bot.send_message(
-                                            watcher.telegram_id,
-                                            notify_msg
-                                        )
-                                except Exception:
-                                    # Continue with other notifications even if one fails
-                                    pass
-                        
-                        await notify_bot.session.close()
-                    except Exception:
-                        pass
-            
             # Get required message counts from system settings
             from db.crud import get_system_setting_value
             required_message_count_male_str = await get_system_setting_value(
@@ -1579,7 +1498,6 @@ async def end_chat_confirm(callback: CallbackQuery):
             # Get filtered chat cost to deduct only if chat is successful
             from db.crud import check_user_premium, get_user_points, add_points, get_system_setting_value, spend_points
             from core.points_manager import PointsManager
-            from aiogram import Bot
             
             user_premium = await check_user_premium(db_session, user.id)
             partner_premium = await check_user_premium(db_session, partner_id) if partner_id else False
@@ -1744,6 +1662,7 @@ async def end_chat_confirm(callback: CallbackQuery):
                     "📱 منوی اصلی",
                     reply_markup=get_main_reply_keyboard()
                 )
+            await callback.answer()
             
             # Send message to partner if exists
             if partner:
@@ -1767,7 +1686,7 @@ async def end_chat_confirm(callback: CallbackQuery):
                     await db_session.refresh(user)
                 user_profile_id_text = f"/user_{user.profile_id}"
                 
-                bot = Bot(token=settings.BOT_TOKEN)
+                bot = get_bot()
                 try:
                     # Create keyboard with only "جستجوی دوباره" and "حذف پیام‌ها"
                     partner_search_again_keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -1796,107 +1715,21 @@ async def end_chat_confirm(callback: CallbackQuery):
                     except:
                         pass
                     
-                    await bot.session.close()
                 except Exception:
                     pass
             
             # Don't delete messages automatically - user can request deletion via button
             # Message IDs are stored in Redis and will be available for deletion request
             
-            # Award coins for successful chat
-            if chat_successful_female:
-                from db.crud import get_coins_for_activity
-                from core.event_engine import EventEngine
-                from aiogram import Bot as RewardBot
-                from core.points_manager import PointsManager as RewardPointsManager
-
-                coins_base = await get_coins_for_activity(db_session, "chat_success")
-                if coins_base is None:
-                    coins_base = settings.POINTS_CHAT_SUCCESS
-
-                if coins_base and coins_base > 0:
-                    reward_users = []
-                    if user.gender == "female":
-                        reward_users.append(user)
-                    if partner and partner.gender == "female":
-                        reward_users.append(partner)
-
-                    if reward_users:
-                        reward_bot = RewardBot(token=settings.BOT_TOKEN)
-                        try:
-                            for target in reward_users:
-                                actual_coins = await EventEngine.apply_points_multiplier(
-                                    target.id,
-                                    coins_base,
-                                    "chat_success"
-                                )
-                                await RewardPointsManager.award_points(
-                                    target.id,
-                                    coins_base,
-                                    "chat_success",
-                                    "پاداش چت موفق برای دختران"
-                                )
-                                try:
-                                    await reward_bot.send_message(
-                                        target.telegram_id,
-                                        f"🎉 چت موفقیت‌آمیز بود!\n\n"
-                                        f"💰 {int(actual_coins)} سکه به حسابت اضافه شد!\n"
-                                        f"💡 میتونی سکه هات رو به پریمیوم تبدیل کنی ، با دوستات بازی کنی یا برای چت اختصاصی با دخترا و پسرای باحال استفاده کنی"
-                                    )
-                                except Exception:
-                                    pass
-                        finally:
-                            await reward_bot.session.close()
-            
-            # Check and award badges for chat achievements
-            if chat_successful_male:
-                from core.achievement_system import AchievementSystem
-                from core.badge_manager import BadgeManager
-                from db.crud import get_user_chat_count, get_badge_by_key
-                from aiogram import Bot as BadgeBot
-                
-                # Check chat count achievements for both users
-                user_chat_count = await get_user_chat_count(db_session, user.id)
-                partner_chat_count = await get_user_chat_count(db_session, partner.id) if partner else 0
-                
-                # Check achievements for user
-                completed_achievements = await AchievementSystem.check_chat_count_achievement(user.id, user_chat_count)
-                
-                # Award badges for completed achievements
-                badge_bot = BadgeBot(token=settings.BOT_TOKEN)
-                try:
-                    for achievement in completed_achievements:
-                        if achievement.achievement and achievement.achievement.badge_id:
-                            badge = await get_badge_by_key(db_session, achievement.achievement.achievement_key)
-                            if badge:
-                                await BadgeManager.award_badge_and_notify(
-                                    user.id,
-                                    badge.badge_key,
-                                    badge_bot,
-                                    user.telegram_id
-                                )
-                    
-                    # Check achievements for partner
-                    if partner:
-                        partner_completed = await AchievementSystem.check_chat_count_achievement(partner.id, partner_chat_count)
-                        for achievement in partner_completed:
-                            if achievement.achievement and achievement.achievement.badge_id:
-                                badge = await get_badge_by_key(db_session, achievement.achievement.achievement_key)
-                                if badge:
-                                    await BadgeManager.award_badge_and_notify(
-                                        partner.id,
-                                        badge.badge_key,
-                                        badge_bot,
-                                        partner.telegram_id
-                                    )
-                except Exception as e:
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Error awarding badges: {e}")
-                finally:
-                    await badge_bot.session.close()
-            
-            await callback.answer()
+            # Rewards, achievements and watcher notifications run in the chat events worker
+            from core.chat_events import publish_chat_ended
+            await publish_chat_ended(
+                chat_room.id,
+                user.id,
+                partner_id,
+                chat_successful_male,
+                chat_successful_female
+            )
         else:
             await callback.answer("❌ چت فعالی یافت نشد.", show_alert=True)
         break
@@ -1932,10 +1765,8 @@ async def delete_my_messages(callback: CallbackQuery):
             await callback.answer("❌ چت پایان یافته‌ای یافت نشد.", show_alert=True)
             return
         
-        # Get message IDs for this user from Redis
-        user_message_ids = await chat_manager.get_message_ids(ended_chat_room.id, user.id)
-        
-        if not user_message_ids:
+        # Check for stored message IDs of this user in Redis
+        if not await chat_manager.count_message_ids(ended_chat_room.id, user.id):
             await callback.answer("⚠️ پیامی برای حذف یافت نشد.", show_alert=True)
             return
         
@@ -1952,80 +1783,21 @@ async def delete_my_messages(callback: CallbackQuery):
         if partner_id:
             partner = await get_user_by_id(db_session, partner_id)
         
-        # Delete messages from user's chat
-        from aiogram import Bot as DeleteBot
-        delete_bot = DeleteBot(token=settings.BOT_TOKEN)
-        try:
-            deleted_count = 0
-            partner_deleted_count = 0
-            
-            # Delete messages from user's own chat
-            for msg_id in user_message_ids:
-                try:
-                    await delete_bot.delete_message(user.telegram_id, msg_id)
-                    deleted_count += 1
-                except Exception:
-                    pass  # Message might already be deleted or not found
-            
-            # Also delete messages from partner's chat
-            # The messages sent to partner have the same message_id (they were forwarded)
-            # But we need to find which messages in partner's chat correspond to user's messages
-            # Actually, when we send a message to partner, we store the sent message_id for partner
-            # So we need to get message IDs that were sent TO partner (stored under partner's ID)
-            # But wait, we stored message_id for partner when we sent the message
-            # So we need to get the message IDs that were sent to partner
-            
-            # Actually, the message IDs stored for user are:
-            # 1. Original messages sent by user (stored with user.id)
-            # 2. Messages sent to partner (stored with partner.id) - these are the forwarded messages
-            
-            # So we need to delete:
-            # 1. User's original messages (already done above)
-            # 2. Messages sent to partner (need to get from partner's message IDs)
-            
-            if partner:
-                # For each user message ID, find the corresponding partner message ID using the mapping
-                partner_msg_ids_to_delete = []
-                for user_msg_id in user_message_ids:
-                    # Get the corresponding partner message ID from the mapping
-                    pair_key = chat_manager._get_message_pair_key(ended_chat_room.id, user_msg_id)
-                    partner_msg_id_str = await chat_manager.redis.get(pair_key)
-                    if partner_msg_id_str:
-                        try:
-                            partner_msg_id = int(partner_msg_id_str)
-                            partner_msg_ids_to_delete.append(partner_msg_id)
-                        except (ValueError, TypeError):
-                            pass
-                
-                # Delete the corresponding messages from partner's chat
-                for partner_msg_id in partner_msg_ids_to_delete:
-                    try:
-                        await delete_bot.delete_message(partner.telegram_id, partner_msg_id)
-                        partner_deleted_count += 1
-                    except Exception:
-                        pass  # Message might already be deleted or not found
-                
-                # Clean up message pair mappings
-                for user_msg_id in user_message_ids:
-                    pair_key = chat_manager._get_message_pair_key(ended_chat_room.id, user_msg_id)
-                    await chat_manager.redis.delete(pair_key)
-            
-            await delete_bot.session.close()
-            
-            # Clear message IDs from Redis after deletion
-            await chat_manager.clear_message_ids(ended_chat_room.id, user.id)
-            
-            total_deleted = deleted_count + partner_deleted_count
-            if total_deleted > 0:
-                await callback.message.answer(
-                    f"✅ {deleted_count} پیام از شما و {partner_deleted_count} پیام از چت مخاطبت حذف شد.",
-                    reply_markup=get_main_reply_keyboard()
-                )
-                await callback.answer("✅ پیام‌های شما حذف شدند.", show_alert=True)
-            else:
-                await callback.answer("⚠️ پیامی برای حذف یافت نشد.", show_alert=True)
-        except Exception as e:
-            await callback.answer("❌ خطا در حذف پیام‌ها.", show_alert=True)
+        # Delete messages of both chats in a background job
+        from core.message_deletion import MessageDeletionJob, start_message_deletion
+        job = MessageDeletionJob(
+            get_bot(),
+            chat_manager,
+            ended_chat_room.id,
+            user.id,
+            user.telegram_id,
+            partner.telegram_id if partner else None,
+            reply_markup=get_main_reply_keyboard()
+        )
+        if await start_message_deletion(job):
+            await callback.answer("🗑️ حذف پیام‌ها شروع شد.")
+        else:
+            await callback.answer("⏳ پیام‌های این چت در حال حذف هستند.", show_alert=True)
         break
 
 
@@ -2161,7 +1933,6 @@ async def request_video_call(callback: CallbackQuery):
         
         # Request video call
         from db.crud import get_user_by_id
-        from aiogram import Bot
         from bot.keyboards.common import get_call_request_keyboard
         
         partner = await get_user_by_id(db_session, partner_id)
@@ -2184,7 +1955,7 @@ async def request_video_call(callback: CallbackQuery):
             )
         
         # Notify partner with accept/reject buttons
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             call_keyboard = get_call_request_keyboard("video", user.id)
             await bot.send_message(
@@ -2193,7 +1964,6 @@ async def request_video_call(callback: CallbackQuery):
                 "آیا می‌خواهید تماس تصویری را بپذیرید?",
                 reply_markup=call_keyboard
             )
-            await bot.session.close()
         except Exception:
             pass
         
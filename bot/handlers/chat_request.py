@@ -3,7 +3,7 @@ Chat request handlers.
 Handles sending, accepting, and rejecting chat requests.
 """
 import asyncio
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
@@ -19,6 +19,7 @@ from bot.keyboards.common import get_chat_request_keyboard, get_chat_request_can
 from bot.keyboards.reply import get_chat_reply_keyboard
 from core.chat_manager import ChatManager
 from config.settings import settings
+from bot.client import get_bot
 from utils.validators import get_display_name
 
 router = Router()
@@ -190,7 +191,7 @@ async def check_chat_request_timeout(requester_id: int, requester_telegram_id: i
             await remove_pending_chat_request(requester_id, receiver_id)
             
             # Notify requester
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             try:
                 from db.crud import get_user_by_id
                 receiver = await get_user_by_id(db_session, receiver_id)
@@ -202,7 +203,6 @@ async def check_chat_request_timeout(requester_id: int, requester_telegram_id: i
                     "💡 مثل اینکه کاربر آفلاین است یا درخواست را ندیده است.\n"
                     "می‌تونی دوباره امتحان کنی یا با کاربران دیگر چت کنی."
                 )
-                await bot.session.close()
             except Exception:
                 pass
         break
@@ -272,7 +272,7 @@ async def confirm_chat_request_send(callback: CallbackQuery, state: FSMContext):
             await db_session.refresh(user)
         
         # Send chat request notification to receiver
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             gender_map = {"male": "پسر 🧑", "female": "دختر 👩", "other": "سایر"}
             gender_text = gender_map.get(user.gender, user.gender or "تعیین نشده")
@@ -331,7 +331,6 @@ async def confirm_chat_request_send(callback: CallbackQuery, state: FSMContext):
                         reply_markup=chat_request_keyboard
                     )
                 
-                await bot.session.close()
         except Exception as e:
             # If bot can't send message, inform user
             await callback.answer("❌ امکان ارسال درخواست چت وجود ندارد.", show_alert=True)
@@ -409,7 +408,7 @@ async def accept_chat_request(callback: CallbackQuery):
                 chat_room = await chat_manager.create_chat(user.id, requester.id, db_session, None, None)
                 
                 # Chat created successfully, now deduct coins immediately upon connection
-                bot = Bot(token=settings.BOT_TOKEN)
+                bot = get_bot()
                 notification_errors = []
                 
                 # Check premium status and prepare messages
@@ -514,8 +513,6 @@ async def accept_chat_request(callback: CallbackQuery):
                 except Exception as e:
                     notification_errors.append(f"Failed to notify requester: {e}")
                 
-                await bot.session.close()
-                
                 # Log notification errors but don't fail
                 if notification_errors:
                     import logging
@@ -563,13 +560,12 @@ async def reject_chat_request(callback: CallbackQuery):
             return
         
         # Notify requester (optional)
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             await bot.send_message(
                 requester.telegram_id,
                 f"❌ درخواست چت شما توسط {get_display_name(user)} رد شد."
             )
-            await bot.session.close()
         except Exception:
             pass
         
@@ -618,13 +614,12 @@ async def cancel_chat_request(callback: CallbackQuery):
         await remove_pending_chat_request(user.id, receiver_id)
         
         # Notify receiver (optional - can be removed if not needed)
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             await bot.send_message(
                 receiver.telegram_id,
                 f"ℹ️ {get_display_name(user)} درخواست چت خود را لغو کرد."
             )
-            await bot.session.close()
         except Exception:
             pass
         
@@ -669,13 +664,12 @@ async def block_from_chat_request(callback: CallbackQuery):
         
         if success:
             # Notify requester (optional)
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             try:
                 await bot.send_message(
                     requester.telegram_id,
                     f"🚫 شما توسط {get_display_name(user)} بلاک شدید."
                 )
-                await bot.session.close()
             except Exception:
                 pass
             
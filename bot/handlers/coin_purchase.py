@@ -2,7 +2,7 @@
 Coin purchase handler for the bot.
 Handles coin package purchase flow.
 """
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, LabeledPrice, PreCheckoutQuery, SuccessfulPayment, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime
 import logging
@@ -17,7 +17,7 @@ from db.crud import (
     add_points,
 )
 from bot.keyboards.coin_package import get_user_coin_packages_keyboard, get_coin_package_payment_keyboard
-from config.settings import settings
+from bot.client import get_bot
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -137,7 +137,7 @@ async def process_stars_payment(
     now = datetime.utcnow()
     
     # Create invoice
-    bot = Bot(token=settings.BOT_TOKEN)
+    bot = get_bot()
     invoice_title = f"🪙 {package.package_name}"
     invoice_description = (
         f"خرید {package.coin_amount} سکه"
@@ -165,10 +165,8 @@ async def process_stars_payment(
             need_shipping_address=False,
             is_flexible=False,
         )
-        await bot.session.close()
     except Exception as e:
         await callback.answer(f"❌ خطا در ایجاد فاکتور: {str(e)}", show_alert=True)
-        await bot.session.close()
 
 
 async def process_shaparak_payment(
@@ -9,7 +9,7 @@ from db.crud import get_user_by_telegram_id
 from core.reward_system import RewardSystem
 from bot.keyboards.engagement import get_daily_reward_keyboard, get_engagement_menu_keyboard
 from bot.keyboards.common import get_main_menu_keyboard
-from config.settings import settings
+from bot.client import get_bot
 
 router = Router()
 
@@ -46,7 +46,6 @@ async def engagement_menu(callback: CallbackQuery):
     from db.crud import get_user_by_telegram_id, check_user_premium
     from core.points_manager import PointsManager
     from bot.keyboards.engagement import get_premium_rewards_menu_keyboard
-    from config.settings import settings
     
     user_id = callback.from_user.id
     
@@ -174,7 +173,6 @@ async def claim_daily_reward(callback: CallbackQuery):
         from core.achievement_system import AchievementSystem
         from core.badge_manager import BadgeManager
         from db.crud import get_badge_by_key
-        from aiogram import Bot as BadgeBot
         
         streak_count = reward_info.get('streak_count', 0)
         
@@ -185,7 +183,7 @@ async def claim_daily_reward(callback: CallbackQuery):
         )
         
         # Award badges
-        badge_bot = BadgeBot(token=settings.BOT_TOKEN)
+        badge_bot = get_bot()
         try:
             for achievement in completed_achievements:
                 if achievement.achievement and achievement.achievement.badge_id:
@@ -199,8 +197,6 @@ async def claim_daily_reward(callback: CallbackQuery):
                         )
         except Exception:
             pass
-        finally:
-            await badge_bot.session.close()
         
         # Calculate base points (without multiplier)
         base_points = await RewardSystem.calculate_reward_points(reward_info['streak_count'])
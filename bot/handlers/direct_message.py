@@ -2,7 +2,7 @@
 Direct message handlers for the bot.
 Handles sending, receiving, viewing, and managing direct messages.
 """
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
@@ -23,6 +23,7 @@ from db.crud import (
 from bot.keyboards.common import get_dm_confirm_keyboard, get_dm_receive_keyboard, get_dm_view_keyboard
 from bot.keyboards.reply import get_main_reply_keyboard
 from config.settings import settings
+from bot.client import get_bot
 from utils.validators import get_display_name
 
 router = Router()
@@ -177,7 +178,7 @@ async def confirm_dm_send(callback: CallbackQuery, state: FSMContext):
         )
         
         # Notify receiver immediately
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             # Generate profile_id if not exists
             if not user.profile_id:
@@ -211,7 +212,6 @@ async def confirm_dm_send(callback: CallbackQuery, state: FSMContext):
                     f"برای مشاهده پیام از دکمه زیر استفاده کن:",
                     reply_markup=get_dm_receive_keyboard(dm.id)
                 )
-            await bot.session.close()
         except Exception as e:
             # If bot can't send message (user blocked bot, etc.), still save the message
             pass
@@ -220,7 +220,6 @@ async def confirm_dm_send(callback: CallbackQuery, state: FSMContext):
         from core.achievement_system import AchievementSystem
         from core.badge_manager import BadgeManager
         from db.crud import get_user_dm_sent_count, get_badge_by_key
-        from aiogram import Bot as BadgeBot
         
         # Get DM sent count
         dm_sent_count = await get_user_dm_sent_count(db_session, user.id)
@@ -232,7 +231,7 @@ async def confirm_dm_send(callback: CallbackQuery, state: FSMContext):
         )
         
         # Award badges
-        badge_bot = BadgeBot(token=settings.BOT_TOKEN)
+        badge_bot = get_bot()
         try:
             for achievement in completed_achievements:
                 if achievement.achievement and achievement.achievement.badge_id:
@@ -246,8 +245,6 @@ async def confirm_dm_send(callback: CallbackQuery, state: FSMContext):
                         )
         except Exception:
             pass
-        finally:
-            await badge_bot.session.close()
         
         cost_text = "💎 این پیام رایگان بود (پریمیوم)" if user_premium else "💰 1 سکه از حساب شما کسر شد"
         
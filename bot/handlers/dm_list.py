@@ -2,7 +2,7 @@
 Direct message list handlers.
 Handles viewing direct messages from specific senders and replying.
 """
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter, BaseFilter
@@ -22,7 +22,7 @@ from db.crud import (
 )
 from bot.keyboards.my_profile import get_direct_messages_list_keyboard
 from bot.keyboards.common import get_dm_reply_keyboard, get_dm_confirm_keyboard, get_dm_receive_keyboard
-from config.settings import settings
+from bot.client import get_bot
 from utils.validators import get_display_name
 
 router = Router()
@@ -335,7 +335,7 @@ async def confirm_dm_reply_send(callback: CallbackQuery, state: FSMContext):
         )
         
         # Notify original sender immediately
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             # Generate profile_id if not exists
             if not user.profile_id:
@@ -363,7 +363,6 @@ async def confirm_dm_reply_send(callback: CallbackQuery, state: FSMContext):
                     f"برای مشاهده پیام از دکمه زیر استفاده کن:",
                     reply_markup=get_dm_receive_keyboard(dm.id)
                 )
-            await bot.session.close()
         except Exception as e:
             # If bot can't send message, still save the message
             pass
@@ -24,7 +24,7 @@ from db.crud import (
 )
 from core.chat_manager import ChatManager
 from bot.keyboards.reply import get_chat_reply_keyboard
-from config.settings import settings
+from bot.client import get_bot
 
 router = Router()
 
@@ -288,7 +288,7 @@ async def select_game_type(callback: CallbackQuery, state: FSMContext):
         from utils.validators import get_display_name
         user_display_name = get_display_name(user)
         
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             await bot.send_message(
                 partner.telegram_id,
@@ -299,8 +299,6 @@ async def select_game_type(callback: CallbackQuery, state: FSMContext):
             )
         except Exception:
             pass
-        finally:
-            await bot.session.close()
         
         await callback.message.edit_text(
             f"✅ درخواست بازی ارسال شد!\n\n"
@@ -390,7 +388,7 @@ async def accept_game_request(callback: CallbackQuery):
         game_name = game_names.get(game_request["game_type"], "بازی")
         game_emoji = game_emojis.get(game_request["game_type"], DICE_EMOJI)
         
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             # Handle rock paper scissors differently
             if game_request["game_type"] == GAME_TYPE_ROCK_PAPER_SCISSORS:
@@ -497,8 +495,6 @@ async def accept_game_request(callback: CallbackQuery):
                 )
         except Exception:
             pass
-        finally:
-            await bot.session.close()
         
         await callback.message.edit_text("✅ بازی شروع شد! 🚀")
         await callback.answer()
@@ -529,7 +525,7 @@ async def reject_game_request(callback: CallbackQuery):
             return
         
         # Notify initiator
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             await bot.send_message(
                 game_request["initiator_telegram_id"],
@@ -537,8 +533,6 @@ async def reject_game_request(callback: CallbackQuery):
             )
         except Exception:
             pass
-        finally:
-            await bot.session.close()
         
         # Delete request
         await delete_game_request(chat_room_id)
@@ -609,7 +603,7 @@ async def handle_game_start_button(message: Message):
                 return
         
         # Bot sends trigger message and dice for this user
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             # Send trigger message
             game_names = {
@@ -674,8 +668,6 @@ async def handle_game_start_button(message: Message):
             import logging
             logger = logging.getLogger(__name__)
             logger.error(f"Error sending game dice: {e}")
-        finally:
-            await bot.session.close()
         
         break
 
@@ -737,7 +729,7 @@ async def _process_dice_message_from_send(sent_message: Message, user_db_id: int
     partner_id = await chat_manager.get_partner_id(user_db_id, db_session)
     
     # Forward dice to partner
-    bot = Bot(token=settings.BOT_TOKEN)
+    bot = get_bot()
     try:
         if partner_id:
             partner = await get_user_by_id(db_session, partner_id)
@@ -813,8 +805,6 @@ async def _process_dice_message_from_send(sent_message: Message, user_db_id: int
         )
     except Exception as e:
         logger.error(f"Error forwarding dice: {e}", exc_info=True)
-    finally:
-        await bot.session.close()
     
     # Check if both users have sent their dice
     await _check_and_complete_game(active_game, db_session, chat_room_id)
@@ -923,7 +913,7 @@ async def _process_dice_message(message: Message, is_edited: bool = False):
         await set_user_game_emoji(chat_room.id, user.id, emoji)
         
         # Forward the same dice message to partner so they can see the result
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             partner_id = await chat_manager.get_partner_id(user.id, db_session)
             if partner_id:
@@ -1004,8 +994,6 @@ async def _process_dice_message(message: Message, is_edited: bool = False):
             )
         except Exception as e:
             logger.error(f"Error forwarding dice to partner: {e}", exc_info=True)
-        finally:
-            await bot.session.close()
         
         # Check if both users have sent their emojis
         await _check_and_complete_game(active_game, db_session, chat_room.id)
@@ -1055,7 +1043,7 @@ async def _check_and_complete_game(active_game: dict, db_session, chat_room_id:
             initiator_private_mode = await chat_manager.get_private_mode(chat_room.id, initiator.id)
             partner_private_mode = await chat_manager.get_private_mode(chat_room.id, partner.id)
         
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             if winner_id == active_game["initiator_id"]:
                 # Initiator wins
@@ -1095,8 +1083,6 @@ async def _check_and_complete_game(active_game: dict, db_session, chat_room_id:
                 )
         except Exception as e:
             logger.error(f"Error in game result: {e}", exc_info=True)
-        finally:
-            await bot.session.close()
         
         # Clean up
         if chat_room_id:
@@ -1378,7 +1364,7 @@ async def handle_tic_tac_toe_move(callback: CallbackQuery):
         partner = await get_user_by_id(db_session, active_game["partner_id"])
         from utils.validators import get_display_name
         
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             if winner:
                 # Game over
@@ -1460,8 +1446,6 @@ async def handle_tic_tac_toe_move(callback: CallbackQuery):
         except Exception as e:
             logger.error(f"Error handling tic-tac-toe move: {e}", exc_info=True)
             await callback.answer("❌ خطا در پردازش حرکت.", show_alert=True)
-        finally:
-            await bot.session.close()
         
         break
 
@@ -1628,7 +1612,7 @@ async def handle_rock_paper_scissors_choice(callback: CallbackQuery):
         choice_name = choice_names.get(choice, "نامشخص")
         
         # Update message to show selection
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             message_id = active_game.get("initiator_message_id") if user.id == active_game["initiator_id"] else active_game.get("partner_message_id")
             
@@ -1647,8 +1631,6 @@ async def handle_rock_paper_scissors_choice(callback: CallbackQuery):
         except Exception as e:
             logger.error(f"Error handling RPS choice: {e}", exc_info=True)
             await callback.answer("❌ خطا در پردازش انتخاب.", show_alert=True)
-        finally:
-            await bot.session.close()
         
         # Check if both users have chosen
         # Re-read active_game from Redis to get latest state
@@ -1717,7 +1699,7 @@ async def _process_rock_paper_scissors_result(active_game: dict, db_session, cha
     initiator_choice = choice_names.get(initiator_value, "نامشخص")
     partner_choice = choice_names.get(partner_value, "نامشخص")
     
-    bot = Bot(token=settings.BOT_TOKEN)
+    bot = get_bot()
     try:
         if winner_id is None:
             # Draw - no coins involved
@@ -1766,8 +1748,6 @@ async def _process_rock_paper_scissors_result(active_game: dict, db_session, cha
             )
     except Exception as e:
         logger.error(f"Error processing RPS result: {e}", exc_info=True)
-    finally:
-        await bot.session.close()
     
     # Clean up
     await delete_active_game(chat_room_id)
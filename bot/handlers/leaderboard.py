@@ -6,15 +6,17 @@ from aiogram.types import CallbackQuery
 from db.database import get_db
 from db.crud import (
     get_user_by_telegram_id,
-    get_top_users_by_points,
-    get_top_users_by_referrals,
-    get_top_users_by_likes,
-    get_user_rank_by_points,
-    get_user_rank_by_referrals,
-    get_user_rank_by_likes,
     get_user_points,
     get_referral_count
 )
+from utils.leaderboard import (
+    METRIC_POINTS,
+    METRIC_REFERRALS,
+    METRIC_LIKES,
+    get_leaderboard,
+    get_top_users,
+    get_user_rank
+)
 from bot.keyboards.leaderboard import (
     get_leaderboard_main_keyboard,
     get_leaderboard_period_keyboard
@@ -90,14 +92,14 @@ async def leaderboard_points(callback: CallbackQuery):
             return
         
         # Get users for current page
-        top_users = await get_top_users_by_points(db_session, limit=limit + 1, skip=skip, period=period_filter)
+        top_users = await get_top_users(db_session, METRIC_POINTS, limit=limit + 1, skip=skip, period=period_filter)
         has_next = len(top_users) > limit
         if has_next:
             top_users = top_users[:limit]
         
         # Get all users to find user's rank (first 10 for checking if user is in top)
-        all_top_users = await get_top_users_by_points(db_session, limit=10, skip=0, period=period_filter)
-        user_rank = await get_user_rank_by_points(db_session, user.id, period=period_filter)
+        all_top_users = await get_top_users(db_session, METRIC_POINTS, limit=10, skip=0, period=period_filter)
+        user_rank = await get_user_rank(db_session, METRIC_POINTS, user.id, period=period_filter)
         user_points = await get_user_points(db_session, user.id) or 0
         
         # Check if user is in top 10
@@ -209,14 +211,18 @@ async def leaderboard_referrals(callback: CallbackQuery):
             await callback.answer("❌ کاربر یافت نشد.", show_alert=True)
             return
         
-        top_users = await get_top_users_by_referrals(db_session, limit=limit + 1, skip=skip, period=period_filter)
+        top_users = await get_top_users(db_session, METRIC_REFERRALS, limit=limit + 1, skip=skip, period=period_filter)
         has_next = len(top_users) > limit
         if has_next:
             top_users = top_users[:limit]
         
-        all_top_users = await get_top_users_by_referrals(db_session, limit=10, skip=0, period=period_filter)
-        user_rank = await get_user_rank_by_referrals(db_session, user.id, period=period_filter)
-        user_referrals = await get_referral_count(db_session, user.id) or 0
+        all_top_users = await get_top_users(db_session, METRIC_REFERRALS, limit=10, skip=0, period=period_filter)
+        user_rank = await get_user_rank(db_session, METRIC_REFERRALS, user.id, period=period_filter)
+        leaderboard = get_leaderboard()
+        if leaderboard and await leaderboard.is_ready():
+            user_referrals = await leaderboard.get_score(METRIC_REFERRALS, user.id)
+        else:
+            user_referrals = await get_referral_count(db_session, user.id) or 0
         
         user_in_top = any(uid == user.id for uid, _, _, _, _, _ in all_top_users[:10])
         user_in_current_page = any(uid == user.id for uid, _, _, _, _, _ in top_users)
@@ -315,26 +321,30 @@ async def leaderboard_likes(callback: CallbackQuery):
             await callback.answer("❌ کاربر یافت نشد.", show_alert=True)
             return
         
-        top_users = await get_top_users_by_likes(db_session, limit=limit + 1, skip=skip, period=period_filter)
+        top_users = await get_top_users(db_session, METRIC_LIKES, limit=limit + 1, skip=skip, period=period_filter)
         has_next = len(top_users) > limit
         if has_next:
             top_users = top_users[:limit]
         
-        all_top_users = await get_top_users_by_likes(db_session, limit=10, skip=0, period=period_filter)
-        user_rank = await get_user_rank_by_likes(db_session, user.id, period=period_filter)
+        all_top_users = await get_top_users(db_session, METRIC_LIKES, limit=10, skip=0, period=period_filter)
+        user_rank = await get_user_rank(db_session, METRIC_LIKES, user.id, period=period_filter)
         
         user_in_top = any(uid == user.id for uid, _, _, _, _, _ in all_top_users[:10])
         user_in_current_page = any(uid == user.id for uid, _, _, _, _, _ in top_users)
         
         # Get user's like count
-        from datetime import datetime, timedelta
-        like_count_query = select(func.count(Like.id)).where(Like.liked_user_id == user.id)
-        if period_filter:
-            period_start = datetime.utcnow() - timedelta(days=7 if period_filter == 'week' else 30)
-            like_count_query = like_count_query.where(Like.created_at >= period_start)
-        
-        result = await db_session.execute(like_count_query)
-        user_likes = result.scalar() or 0
+        leaderboard = get_leaderboard()
+        if leaderboard and await leaderboard.is_ready():
+            user_likes = await leaderboard.get_score(METRIC_LIKES, user.id, period=period_filter)
+        else:
+            from datetime import datetime, timedelta
+            like_count_query = select(func.count(Like.id)).where(Like.liked_user_id == user.id)
+            if period_filter:
+                period_start = datetime.utcnow() - timedelta(days=7 if period_filter == 'week' else 30)
+                like_count_query = like_count_query.where(Like.created_at >= period_start)
+            
+            result = await db_session.execute(like_count_query)
+            user_likes = result.scalar() or 0
         
         period_text = {
             "week": "هفته",
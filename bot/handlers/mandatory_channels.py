@@ -23,6 +23,7 @@ from bot.keyboards.admin import (
     get_mandatory_channel_detail_keyboard,
 )
 from config.settings import settings
+from utils.channel_membership import invalidate_mandatory_channels
 
 router = Router()
 
@@ -151,6 +152,7 @@ async def process_channel_link(message: Message, state: FSMContext):
             order_index=max_order + 1,
             created_by_admin_id=admin_user_id
         )
+        invalidate_mandatory_channels()
         
         await message.answer(
             f"✅ چنل اجباری با موفقیت اضافه شد!\n\n"
@@ -252,6 +254,7 @@ async def callback_toggle_mandatory_channel(callback: CallbackQuery):
         
         new_status = not channel.is_active
         await update_mandatory_channel(db_session, channel_id, is_active=new_status)
+        invalidate_mandatory_channels()
         
         status_text = "فعال" if new_status else "غیرفعال"
         await callback.answer(f"✅ چنل {status_text} شد.", show_alert=True)
@@ -289,6 +292,7 @@ async def callback_delete_mandatory_channel(callback: CallbackQuery):
         
         channel_name = channel.channel_name or channel.channel_id
         success = await delete_mandatory_channel(db_session, channel_id)
+        invalidate_mandatory_channels()
         
         if success:
             await callback.answer(f"✅ چنل {channel_name} حذف شد.", show_alert=True)
@@ -4,7 +4,8 @@ Handles forwarding messages between chat partners.
 """
 import re
 import logging
-from aiogram import Router, F, Bot
+from typing import Optional
+from aiogram import Router, F
 from aiogram.types import Message, MessageReactionUpdated, Update
 from aiogram.enums import ContentType
 from aiogram.fsm.context import FSMContext
@@ -12,15 +13,16 @@ from aiogram.fsm.context import FSMContext
 from db.database import get_db
 from db.crud import get_user_by_telegram_id, check_user_premium, spend_points, get_user_points
 from core.chat_manager import ChatManager
-from utils.rate_limiter import MessageRateLimiter
+from core.user_context import UserContext, UserContextCache
 from config.settings import settings
+from bot.client import get_bot
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 # Global instances
 chat_manager = None
-rate_limiter = None
+user_context_cache = None
 
 # Default cost per message for non-premium users (in coins)
 DEFAULT_CHAT_MESSAGE_COST = 1
@@ -32,10 +34,29 @@ def set_chat_manager(manager: ChatManager):
     chat_manager = manager
 
 
-def set_rate_limiter(limiter: MessageRateLimiter):
-    """Set rate limiter instance."""
-    global rate_limiter
-    rate_limiter = limiter
+def set_user_context_cache(cache: UserContextCache):
+    """Set user context cache instance."""
+    global user_context_cache
+    user_context_cache = cache
+
+
+async def _resolve_user_context(telegram_id: int) -> Optional[UserContext]:
+    """
+    Resolve a user's context when the middleware couldn't provide it.
+
+    Tries the context cache again, then builds the context (without chat)
+    from the database.
+    """
+    if user_context_cache:
+        try:
+            return await user_context_cache.get(telegram_id)
+        except Exception as e:
+            logger.warning(f"Error resolving user context for {telegram_id}: {e}")
+
+    async for db_session in get_db():
+        db_user = await get_user_by_telegram_id(db_session, telegram_id)
+        return UserContext.from_user(db_user) if db_user else None
+    return None
 
 
 def contains_link(text: str) -> bool:
@@ -146,16 +167,7 @@ async def handle_reply_message(message: Message, state: FSMContext):
     
     user_id = message.from_user.id
     
-    # Check rate limit
-    if rate_limiter:
-        is_allowed, remaining = await rate_limiter.check_message_limit(user_id)
-        if not is_allowed:
-            await message.answer(
-                f"⏳ محدودیت ارسال پیام!\n"
-                f"لطفاً چند لحظه صبر کنید و دوباره تلاش کنید.\n"
-                f"پیام‌های باقی‌مانده: {remaining}"
-            )
-            return
+    # Rate limit is checked once per update by RateLimitMiddleware
     
     async for db_session in get_db():
         user = await get_user_by_telegram_id(db_session, user_id)
@@ -277,7 +289,7 @@ async def handle_reply_message(message: Message, state: FSMContext):
         
         # Forward message with reply
         try:
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             
             sent_message = None
             reply_to_id = None
@@ -369,7 +381,6 @@ async def handle_reply_message(message: Message, state: FSMContext):
             if message.message_id:
                 await chat_manager.add_message_id(chat_room.id, user.id, message.message_id)
             
-            await bot.session.close()
         except Exception as e:
             await chat_manager.redis.decr(chat_manager._get_message_count_key(chat_room.id, user.id))
             # Check if partner is virtual or error is "chat not found" or "bot was blocked" - silently ignore errors for virtual profiles
@@ -386,8 +397,13 @@ async def handle_reply_message(message: Message, state: FSMContext):
 
 
 @router.message(F.content_type.in_({ContentType.TEXT, ContentType.VOICE, ContentType.PHOTO, ContentType.VIDEO, ContentType.VIDEO_NOTE, ContentType.STICKER, ContentType.ANIMATION}))
-async def forward_message(message: Message, state: FSMContext):
-    """Forward message to chat partner."""
+async def forward_message(message: Message, state: FSMContext, user_context: Optional[UserContext] = None):
+    """
+    Forward message to chat partner.
+    
+    Uses the per-update user context (see UserContextMiddleware), so the
+    relay doesn't touch the database while the chat state is cached.
+    """
     # Skip dice messages - let game handler process them
     if message.dice:
         return
@@ -410,230 +426,184 @@ async def forward_message(message: Message, state: FSMContext):
     
     user_id = message.from_user.id
     
-    # Check rate limit
-    if rate_limiter:
-        is_allowed, remaining = await rate_limiter.check_message_limit(user_id)
-        if not is_allowed:
-            await message.answer(
-                f"⏳ محدودیت ارسال پیام!\n"
-                f"لطفاً چند لحظه صبر کنید و دوباره تلاش کنید.\n"
-                f"پیام‌های باقی‌مانده: {remaining}"
-            )
-            return
+    # Rate limit is checked once per update by RateLimitMiddleware
     
-    async for db_session in get_db():
-        user = await get_user_by_telegram_id(db_session, user_id)
-        
-        if not user:
-            return
-        
-        # Skip check for "🔍 جستجوی کاربران" button - it doesn't require active chat
-        if message.text == "🔍 جستجوی کاربران":
-            return  # Let reply handler process it
-        
-        # Check if user has active chat
-        # Skip check for admin users
-        is_admin = user_id in settings.ADMIN_IDS
-        if not is_admin and not await chat_manager.is_chat_active(user.id, db_session):
-            from bot.keyboards.reply import get_main_reply_keyboard
-            await message.answer(
-                "❌ شما در حال حاضر چت فعالی ندارید.\n\n"
-                "💬 برای شروع چت، دکمه «💬 شروع چت» را بزنید.\n\n"
-                "برای پیدا کردن یک هم‌چت، باید در صف جستجو قرار بگیرید.",
-                reply_markup=get_main_reply_keyboard()
-            )
-            return
-        
+    user = user_context
+    if user is None:
+        # The middleware left the context out (e.g. a Redis error)
+        user = await _resolve_user_context(user_id)
+    if not user or not user.is_active:
+        return
+    
+    # Skip check for "🔍 جستجوی کاربران" button - it doesn't require active chat
+    if message.text == "🔍 جستجوی کاربران":
+        return  # Let reply handler process it
+    
+    if not user.chat_room_id:
+        # Chat state not cached in Redis (e.g. after a restart): check the
+        # database, which re-caches it, and load the chat into the context
+        async for db_session in get_db():
+            if user_context_cache and await chat_manager.is_chat_active(user.id, db_session):
+                await user_context_cache.load_chat(user, db_session)
+            break
+    
+    # Check if user has active chat
+    # Skip check for admin users
+    is_admin = user_id in settings.ADMIN_IDS
+    if not user.chat_room_id:
         # For admin users without active chat, just return silently
-        if is_admin and not await chat_manager.is_chat_active(user.id, db_session):
-            return
-        
-        # Check for links and @ mentions in text messages and captions
-        text_to_check = message.text or message.caption
-        if text_to_check:
-            if contains_link(text_to_check):
-                await message.answer("❌ ارسال لینک در چت مجاز نیست.")
-                return
-            
-            if contains_mention(text_to_check):
-                await message.answer("❌ ارسال @ و ID در چت مجاز نیست.")
-                return
-        
-        # Get chat room to track message counts
-        from db.crud import get_active_chat_room_by_user
-        chat_room = await get_active_chat_room_by_user(db_session, user.id)
-        if not chat_room:
-            await message.answer("❌ چت فعالی یافت نشد.")
+        if is_admin:
             return
         
-        # Get partner ID
-        partner_id = await chat_manager.get_partner_id(user.id, db_session)
-        if not partner_id:
-            await message.answer("❌ هم‌چت شما یافت نشد.")
+        from bot.keyboards.reply import get_main_reply_keyboard
+        await message.answer(
+            "❌ شما در حال حاضر چت فعالی ندارید.\n\n"
+            "💬 برای شروع چت، دکمه «💬 شروع چت» را بزنید.\n\n"
+            "برای پیدا کردن یک هم‌چت، باید در صف جستجو قرار بگیرید.",
+            reply_markup=get_main_reply_keyboard()
+        )
+        return
+    
+    # Check for links and @ mentions in text messages and captions
+    text_to_check = message.text or message.caption
+    if text_to_check:
+        if contains_link(text_to_check):
+            await message.answer("❌ ارسال لینک در چت مجاز نیست.")
             return
         
-        # Check if partner is a virtual profile - don't send messages to virtual profiles
-        from db.crud import get_user_by_id
-        partner = await get_user_by_id(db_session, partner_id)
-        
-        # Check if partner is a virtual profile (using chat_manager method)
-        # This is important because we use real user profiles as virtual profiles
-        is_virtual = False
-        if partner and chat_manager:
-            is_virtual = await chat_manager.is_partner_virtual_profile(user.id, partner_id, db_session)
-        
-        if is_virtual or (partner and partner.is_virtual):
-            # Silently ignore messages to virtual profiles - simulate that they're not responding
+        if contains_mention(text_to_check):
+            await message.answer("❌ ارسال @ و ID در چت مجاز نیست.")
             return
+    
+    chat_room_id = user.chat_room_id
+    partner_id = user.partner_id
+    
+    # Check if partner is a virtual profile - don't send messages to virtual profiles
+    # (we use real user profiles as virtual profiles, so this is per chat)
+    if user.partner_is_virtual:
+        # Silently ignore messages to virtual profiles - simulate that they're not responding
+        return
+    
+    # Private mode status (protect_content) for this user
+    private_mode = user.private_mode
+    
+    # Increment message count for this user
+    # No coin deduction in message handler - coins are deducted at chat start
+    # We only track message counts for success determination
+    await chat_manager.increment_message_count(chat_room_id, user.id)
+    
+    # Get partner's Telegram ID
+    partner_telegram_id = user.partner_telegram_id
+    
+    if not partner_telegram_id:
+        # Decrement message count since we can't send
+        await chat_manager.redis.decr(chat_manager._get_message_count_key(chat_room_id, user.id))
         
-        # Get private mode status for this user
-        private_mode = await chat_manager.get_private_mode(chat_room.id, user.id)
-        
-        # Increment message count for this user
-        user_message_count = await chat_manager.increment_message_count(chat_room.id, user.id)
-        
-        # Get message counts for both users
-        user1_count, user2_count = await chat_manager.get_chat_message_counts(
-            chat_room.id,
-            chat_room.user1_id,
-            chat_room.user2_id
-        )
+        await message.answer("❌ هم‌چت شما یافت نشد. لطفاً دوباره چت را شروع کنید.")
+        return
+    
+    # Forward message based on type
+    try:
+        bot = get_bot()
+        
+        sent_message = None
+        
+        if message.text:
+            # Forward text message with protect_content based on user's private mode
+            sent_message = await bot.send_message(
+                partner_telegram_id,
+                message.text,
+                protect_content=private_mode
+            )
+        elif message.voice:
+            # Forward voice message (using file_id) with protect_content based on user's private mode
+            sent_message = await bot.send_voice(
+                partner_telegram_id,
+                voice=message.voice.file_id,
+                protect_content=private_mode
+            )
+        elif message.photo:
+            # Forward photo (using file_id) with protect_content based on user's private mode
+            # Support for self-destructing media (has_media_spoiler)
+            sent_message = await bot.send_photo(
+                partner_telegram_id,
+                photo=message.photo[-1].file_id,
+                caption=message.caption,
+                protect_content=private_mode,
+                has_spoiler=getattr(message, 'has_media_spoiler', False) or False
+            )
+        elif message.video:
+            # Forward video (using file_id) with protect_content based on user's private mode
+            # Support for self-destructing media (has_media_spoiler)
+            # Note: Timed media effects are preserved automatically by Telegram when using file_id
+            sent_message = await bot.send_video(
+                partner_telegram_id,
+                video=message.video.file_id,
+                caption=message.caption,
+                protect_content=private_mode,
+                has_spoiler=getattr(message, 'has_media_spoiler', False) or False
+            )
+        elif message.sticker:
+            # Forward sticker (using file_id) with protect_content based on user's private mode
+            sent_message = await bot.send_sticker(
+                partner_telegram_id,
+                sticker=message.sticker.file_id,
+                protect_content=private_mode
+            )
+        elif message.animation:
+            # Forward GIF/animation (using file_id) with protect_content based on user's private mode
+            sent_message = await bot.send_animation(
+                partner_telegram_id,
+                animation=message.animation.file_id,
+                caption=message.caption,
+                protect_content=private_mode
+            )
+        elif message.video_note:
+            # Forward video note (round video message)
+            sent_message = await bot.send_video_note(
+                partner_telegram_id,
+                video_note=message.video_note.file_id,
+                protect_content=private_mode
+            )
         
-        # Determine which user is which
-        if chat_room.user1_id == user.id:
-            current_user_count = user1_count
-            partner_user_count = user2_count
-        else:
-            current_user_count = user2_count
-            partner_user_count = user1_count
+        # Store message ID for deletion after chat ends
+        # Store for both users: the sent message for partner, and the original message for user
+        if sent_message and sent_message.message_id:
+            # Store sent message ID for partner (the message they received)
+            await chat_manager.add_message_id(chat_room_id, partner_id, sent_message.message_id)
+            
+            # Store message pair mapping (bidirectional) for deletion, edit, reaction, reply
+            if message.message_id:
+                pipe = chat_manager.redis.pipeline(transaction=False)
+                # Store mapping: user_msg_id -> partner_msg_id
+                pipe.setex(
+                    chat_manager._get_message_pair_key(chat_room_id, message.message_id),
+                    604800,  # 7 days TTL
+                    str(sent_message.message_id)
+                )
+                # Store reverse mapping: partner_msg_id -> user_msg_id
+                pipe.setex(
+                    chat_manager._get_message_pair_key(chat_room_id, sent_message.message_id),
+                    604800,  # 7 days TTL
+                    str(message.message_id)
+                )
+                await pipe.execute()
         
-        # No coin deduction in message handler - coins are deducted at chat start
-        # We only track message counts for success determination
+        # Also store the original message ID for the sender (user)
+        if message.message_id:
+            await chat_manager.add_message_id(chat_room_id, user.id, message.message_id)
         
-        # Get partner's Telegram ID
-        partner_telegram_id = await chat_manager.get_partner_telegram_id(user.id, db_session)
+    except Exception as e:
+        # If message sending fails, decrement message count
+        await chat_manager.redis.decr(chat_manager._get_message_count_key(chat_room_id, user.id))
         
-        if not partner_telegram_id:
-            # Decrement message count since we can't send
-            await chat_manager.redis.decr(chat_manager._get_message_count_key(chat_room.id, user.id))
-            
-            await message.answer("❌ هم‌چت شما یافت نشد. لطفاً دوباره چت را شروع کنید.")
+        # Check if error is "chat not found" or "bot was blocked" - silently ignore
+        error_str = str(e).lower()
+        if "chat not found" in error_str or "bot was blocked" in error_str or "forbidden" in error_str:
+            # Silently ignore "chat not found" or "bot was blocked" errors (can happen with virtual profiles or blocked users)
             return
         
-        # Forward message based on type
-        # Store partner_id and partner in variables accessible in exception handler
-        partner_id_for_error = partner_id
-        partner_for_error = partner
-        try:
-            from aiogram import Bot
-            bot = Bot(token=settings.BOT_TOKEN)
-            
-            sent_message = None
-            
-            if message.text:
-                # Forward text message with protect_content based on user's private mode
-                sent_message = await bot.send_message(
-                    partner_telegram_id,
-                    message.text,
-                    protect_content=private_mode
-                )
-            elif message.voice:
-                # Forward voice message (using file_id) with protect_content based on user's private mode
-                sent_message = await bot.send_voice(
-                    partner_telegram_id,
-                    voice=message.voice.file_id,
-                    protect_content=private_mode
-                )
-            elif message.photo:
-                # Forward photo (using file_id) with protect_content based on user's private mode
-                # Support for self-destructing media (has_media_spoiler)
-                sent_message = await bot.send_photo(
-                    partner_telegram_id,
-                    photo=message.photo[-1].file_id,
-                    caption=message.caption,
-                    protect_content=private_mode,
-                    has_spoiler=getattr(message, 'has_media_spoiler', False) or False
-                )
-            elif message.video:
-                # Forward video (using file_id) with protect_content based on user's private mode
-                # Support for self-destructing media (has_media_spoiler)
-                # Note: Timed media effects are preserved automatically by Telegram when using file_id
-                sent_message = await bot.send_video(
-                    partner_telegram_id,
-                    video=message.video.file_id,
-                    caption=message.caption,
-                    protect_content=private_mode,
-                    has_spoiler=getattr(message, 'has_media_spoiler', False) or False
-                )
-            elif message.sticker:
-                # Forward sticker (using file_id) with protect_content based on user's private mode
-                sent_message = await bot.send_sticker(
-                    partner_telegram_id,
-                    sticker=message.sticker.file_id,
-                    protect_content=private_mode
-                )
-            elif message.animation:
-                # Forward GIF/animation (using file_id) with protect_content based on user's private mode
-                sent_message = await bot.send_animation(
-                    partner_telegram_id,
-                    animation=message.animation.file_id,
-                    caption=message.caption,
-                    protect_content=private_mode
-                )
-            elif message.video_note:
-                # Forward video note (round video message)
-                sent_message = await bot.send_video_note(
-                    partner_telegram_id,
-                    video_note=message.video_note.file_id,
-                    protect_content=private_mode
-                )
-            
-            # Store message ID for deletion after chat ends
-            # Store for both users: the sent message for partner, and the original message for user
-            if sent_message and sent_message.message_id:
-                # Get partner's database ID (get_user_by_telegram_id is already imported at the top)
-                partner_db_user = await get_user_by_telegram_id(db_session, partner_telegram_id)
-                if partner_db_user:
-                    # Store sent message ID for partner (the message they received)
-                    await chat_manager.add_message_id(chat_room.id, partner_db_user.id, sent_message.message_id)
-                    
-                    # Store message pair mapping (bidirectional) for deletion, edit, reaction, reply
-                    if message.message_id:
-                        # Store mapping: user_msg_id -> partner_msg_id
-                        await chat_manager.redis.setex(
-                            chat_manager._get_message_pair_key(chat_room.id, message.message_id),
-                            604800,  # 7 days TTL
-                            str(sent_message.message_id)
-                        )
-                        # Store reverse mapping: partner_msg_id -> user_msg_id
-                        await chat_manager.redis.setex(
-                            chat_manager._get_message_pair_key(chat_room.id, sent_message.message_id),
-                            604800,  # 7 days TTL
-                            str(message.message_id)
-                        )
-            
-            # Also store the original message ID for the sender (user)
-            if message.message_id:
-                await chat_manager.add_message_id(chat_room.id, user.id, message.message_id)
-            
-            await bot.session.close()
-            
-        except Exception as e:
-            # If message sending fails, decrement message count
-            await chat_manager.redis.decr(chat_manager._get_message_count_key(chat_room.id, user.id))
-            
-            # Check if partner is virtual or error is "chat not found" or "bot was blocked" - silently ignore errors for virtual profiles
-            error_str = str(e).lower()
-            if partner_is_virtual_for_error or (partner_for_error and partner_for_error.is_virtual):
-                # Silently ignore errors for virtual profiles
-                return
-            if "chat not found" in error_str or "bot was blocked" in error_str or "forbidden" in error_str:
-                # Silently ignore "chat not found" or "bot was blocked" errors (can happen with virtual profiles or blocked users)
-                return
-            
-            await message.answer(f"❌ خطا در ارسال پیام: {str(e)}\n\nلطفاً دوباره تلاش کنید.")
-        
-        break
+        await message.answer(f"❌ خطا در ارسال پیام: {str(e)}\n\nلطفاً دوباره تلاش کنید.")
 
 
 @router.edited_message()
@@ -710,7 +680,7 @@ async def handle_edited_message(message: Message):
         
         # Edit the partner's message
         try:
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             
             if message.text:
                 logger.info(f"Editing text message: partner_msg_id={partner_msg_id}, text={message.text[:50]}")
@@ -741,7 +711,6 @@ async def handle_edited_message(message: Message):
                         caption=message.caption
                     )
             
-            await bot.session.close()
             logger.info(f"Successfully edited message: partner_msg_id={partner_msg_id}")
         except Exception as e:
             logger.error(f"Failed to edit message: {e}", exc_info=True)
@@ -827,7 +796,7 @@ async def handle_message_reaction(update: MessageReactionUpdated):
         
         # Forward reaction to partner's message
         try:
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             
             # Set reactions on partner's message
             from aiogram.types import ReactionTypeEmoji
@@ -859,7 +828,6 @@ async def handle_message_reaction(update: MessageReactionUpdated):
                     reaction=None
                 )
             
-            await bot.session.close()
             logger.info(f"Successfully set reaction: partner_msg_id={partner_msg_id}")
         except Exception as e:
             logger.error(f"Failed to set reaction: {e}", exc_info=True)
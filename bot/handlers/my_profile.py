@@ -3,9 +3,9 @@ My profile handler for editing own profile and managing follows/blocks.
 """
 from datetime import datetime
 from aiogram import Router, F
-from aiogram import Bot
 from aiogram.types import Message, CallbackQuery, InlineQuery, InlineQueryResult, InlineQueryResultArticle, InputTextMessageContent, InputMessageContent
 from config.settings import settings
+from bot.client import get_bot
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
@@ -42,7 +42,6 @@ async def check_and_notify_profile_completion(db_session, user_id: int):
     """Check if profile is complete and notify referrer if needed."""
     from db.crud import get_user_by_telegram_id, get_points_history, get_coins_for_activity
     from core.points_manager import PointsManager
-    from config.settings import settings
     
     # Get user
     user = await get_user_by_telegram_id(db_session, user_id)
@@ -156,35 +155,31 @@ async def check_and_notify_profile_completion(db_session, user_id: int):
     from db.crud import get_user_by_id
     referrer = await get_user_by_id(db_session, referral.referrer_id)
     
-    from aiogram import Bot
-    bot = Bot(token=settings.BOT_TOKEN)
-    try:
-        # Notify referrer
-        if referrer:
-            try:
-                await bot.send_message(
-                    referrer.telegram_id,
-                    f"🎉 خبر خوب!\n\n"
-                    f"✅ یکی از کاربرانی که از لینک دعوت شما استفاده کرده، پروفایلش را تکمیل کرد!\n\n"
-                    f"💰 {coins_profile_complete_actual} سکه به حساب شما اضافه شد!{referrer_event_info}\n\n"
-                    f"💡 با دعوت کاربران بیشتر، سکه بیشتری دریافت می‌کنی!"
-                )
-            except Exception:
-                pass
-        
-        # Notify referred user
+    bot = get_bot()
+    # Notify referrer
+    if referrer:
         try:
             await bot.send_message(
-                user.telegram_id,
-                f"🎉 تبریک!\n\n"
-                f"✅ پروفایل شما تکمیل شد!\n\n"
-                f"💰 {coins_referred_actual} سکه به حساب شما اضافه شد!{referred_event_info}\n\n"
-                f"💡 با تکمیل پروفایل، سکه دریافت کردی!"
+                referrer.telegram_id,
+                f"🎉 خبر خوب!\n\n"
+                f"✅ یکی از کاربرانی که از لینک دعوت شما استفاده کرده، پروفایلش را تکمیل کرد!\n\n"
+                f"💰 {coins_profile_complete_actual} سکه به حساب شما اضافه شد!{referrer_event_info}\n\n"
+                f"💡 با دعوت کاربران بیشتر، سکه بیشتری دریافت می‌کنی!"
             )
         except Exception:
             pass
-    finally:
-        await bot.session.close()
+        
+    # Notify referred user
+    try:
+        await bot.send_message(
+            user.telegram_id,
+            f"🎉 تبریک!\n\n"
+            f"✅ پروفایل شما تکمیل شد!\n\n"
+            f"💰 {coins_referred_actual} سکه به حساب شما اضافه شد!{referred_event_info}\n\n"
+            f"💡 با تکمیل پروفایل، سکه دریافت کردی!"
+        )
+    except Exception:
+        pass
 
 
 class MyProfileEditStates(StatesGroup):
@@ -239,13 +234,11 @@ async def view_my_profile(callback: CallbackQuery):
         # Send profile with photo if available
         profile_image_url = getattr(user, 'profile_image_url', None)
         if profile_image_url:
-            from aiogram import Bot
-            from config.settings import settings
             from utils.minio_storage import is_url_accessible_from_internet
             import logging
             logger = logging.getLogger(__name__)
             
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             try:
                 # Check if it's a URL or file_id
                 if profile_image_url.startswith(('http://', 'https://')):
@@ -287,7 +280,6 @@ async def view_my_profile(callback: CallbackQuery):
                         caption=profile_text,
                         reply_markup=profile_keyboard
                     )
-                await bot.session.close()
                 await callback.answer()
             except Exception as e:
                 logger.error(f"Error sending photo: {e}", exc_info=True)
@@ -331,13 +323,11 @@ async def process_new_photo(message: Message, state: FSMContext):
         # Upload photo to MinIO
         from utils.minio_storage import upload_telegram_photo_to_minio
         from utils.nsfw_detector import download_and_check_photo
-        from aiogram import Bot
-        from config.settings import settings
         
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             # Check for NSFW content before uploading
-            is_safe, error_message = await download_and_check_photo(bot, file_id)
+            is_safe, error_message = await download_and_check_photo(bot, file_id, photo.file_unique_id)
             if not is_safe:
                 await message.answer(error_message)
                 await state.clear()
@@ -367,8 +357,6 @@ async def process_new_photo(message: Message, state: FSMContext):
             logger = logging.getLogger(__name__)
             logger.error(f"Error uploading photo to MinIO: {e}", exc_info=True)
             await message.answer("❌ خطا در آپلود عکس. لطفاً دوباره تلاش کنید.")
-        finally:
-            await bot.session.close()
         
         await state.clear()
         break
@@ -650,10 +638,9 @@ async def inline_following_list(inline_query: InlineQuery):
             # If it's a file_id and thumbnail_url is None, try to get Telegram file URL
             if not thumbnail_url and profile_image_url and not profile_image_url.startswith(('http://', 'https://')):
                 try:
-                    bot = Bot(token=settings.BOT_TOKEN)
+                    bot = get_bot()
                     file = await bot.get_file(profile_image_url)
                     thumbnail_url = f"https://api.telegram.org/file/bot{settings.BOT_TOKEN}/{file.file_path}"
-                    await bot.session.close()
                 except Exception:
                     thumbnail_url = None
             
@@ -805,10 +792,9 @@ async def inline_liked_list(inline_query: InlineQuery):
             # If it's a file_id and thumbnail_url is None, try to get Telegram file URL
             if not thumbnail_url and profile_image_url and not profile_image_url.startswith(('http://', 'https://')):
                 try:
-                    bot = Bot(token=settings.BOT_TOKEN)
+                    bot = get_bot()
                     file = await bot.get_file(profile_image_url)
                     thumbnail_url = f"https://api.telegram.org/file/bot{settings.BOT_TOKEN}/{file.file_path}"
-                    await bot.session.close()
                 except Exception:
                     thumbnail_url = None
             
@@ -885,10 +871,9 @@ async def inline_blocked_list(inline_query: InlineQuery):
             # If it's a file_id and thumbnail_url is None, try to get Telegram file URL
             if not thumbnail_url and profile_image_url and not profile_image_url.startswith(('http://', 'https://')):
                 try:
-                    bot = Bot(token=settings.BOT_TOKEN)
+                    bot = get_bot()
                     file = await bot.get_file(profile_image_url)
                     thumbnail_url = f"https://api.telegram.org/file/bot{settings.BOT_TOKEN}/{file.file_path}"
-                    await bot.session.close()
                 except Exception:
                     thumbnail_url = None
             
@@ -1229,14 +1214,12 @@ async def delete_account_execute(callback: CallbackQuery):
             
             # Notify partner if exists
             if partner:
-                from aiogram import Bot
-                bot = Bot(token=settings.BOT_TOKEN)
+                bot = get_bot()
                 try:
                     await bot.send_message(
                         partner.telegram_id,
                         "ℹ️ هم‌چت شما اکانت خود را حذف کرد و چت به پایان رسید."
                     )
-                    await bot.session.close()
                 except Exception:
                     pass
         
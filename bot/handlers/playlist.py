@@ -6,6 +6,7 @@ from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
+from bot.client import get_bot
 
 logger = logging.getLogger(__name__)
 
@@ -120,9 +121,7 @@ async def handle_partner_playlist_button(message: Message, state: FSMContext):
             
             # Notify partner that someone tried to view their playlist but they don't have one
             try:
-                from aiogram import Bot
-                from config.settings import settings
-                bot = Bot(token=settings.BOT_TOKEN)
+                bot = get_bot()
                 
                 viewer_name = user.display_name or user.username or "کسی"
                 notification_text = (
@@ -135,7 +134,6 @@ async def handle_partner_playlist_button(message: Message, state: FSMContext):
                     chat_id=partner.telegram_id,
                     text=notification_text
                 )
-                await bot.session.close()
             except Exception as e:
                 logger.error(f"Error sending playlist view notification: {e}")
             
@@ -154,9 +152,7 @@ async def handle_partner_playlist_button(message: Message, state: FSMContext):
             
             # Notify partner that someone viewed their empty playlist
             try:
-                from aiogram import Bot
-                from config.settings import settings
-                bot = Bot(token=settings.BOT_TOKEN)
+                bot = get_bot()
                 
                 viewer_name = user.display_name or user.username or "کسی"
                 notification_text = (
@@ -169,7 +165,6 @@ async def handle_partner_playlist_button(message: Message, state: FSMContext):
                     chat_id=partner.telegram_id,
                     text=notification_text
                 )
-                await bot.session.close()
             except Exception as e:
                 logger.error(f"Error sending playlist view notification: {e}")
             
@@ -193,9 +188,7 @@ async def handle_partner_playlist_button(message: Message, state: FSMContext):
         
         # Notify partner that someone viewed their playlist
         try:
-            from aiogram import Bot
-            from config.settings import settings
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             
             viewer_name = user.display_name or user.username or "کسی"
             notification_text = (
@@ -207,7 +200,6 @@ async def handle_partner_playlist_button(message: Message, state: FSMContext):
                 chat_id=partner.telegram_id,
                 text=notification_text
             )
-            await bot.session.close()
         except Exception as e:
             # Silently fail if notification can't be sent
             logger.error(f"Error sending playlist view notification: {e}")
@@ -26,6 +26,7 @@ from bot.keyboards.engagement import (
     get_coins_menu_keyboard,
 )
 from config.settings import settings
+from bot.client import get_bot
 
 router = Router()
 
@@ -400,12 +401,11 @@ async def points_convert(callback: CallbackQuery):
             if subscription:
                 from core.achievement_system import AchievementSystem
                 from core.badge_manager import BadgeManager
-                from aiogram import Bot as BadgeBot
 
                 premium_days = await get_user_premium_days(db_session, user.id)
                 completed = await AchievementSystem.check_premium_achievement(user.id, premium_days)
 
-                badge_bot = BadgeBot(token=settings.BOT_TOKEN)
+                badge_bot = get_bot()
                 try:
                     for achievement in completed:
                         if achievement.achievement and achievement.achievement.badge_id:
@@ -419,8 +419,6 @@ async def points_convert(callback: CallbackQuery):
                                 )
                 except Exception:
                     pass
-                finally:
-                    await badge_bot.session.close()
 
                 await callback.answer(
                     f"✅ {days} روز پریمیوم دریافت کردی!",
@@ -661,7 +659,6 @@ async def points_convert(callback: CallbackQuery):
                 from core.achievement_system import AchievementSystem
                 from core.badge_manager import BadgeManager
                 from db.crud import get_user_premium_days, get_badge_by_key
-                from aiogram import Bot as BadgeBot
                 
                 # Get premium days
                 premium_days = await get_user_premium_days(db_session, user.id)
@@ -673,7 +670,7 @@ async def points_convert(callback: CallbackQuery):
                 )
                 
                 # Award badges
-                badge_bot = BadgeBot(token=settings.BOT_TOKEN)
+                badge_bot = get_bot()
                 try:
                     for achievement in completed_achievements:
                         if achievement.achievement and achievement.achievement.badge_id:
@@ -687,8 +684,6 @@ async def points_convert(callback: CallbackQuery):
                                 )
                 except Exception:
                     pass
-                finally:
-                    await badge_bot.session.close()
                 
                 await callback.answer(
                     f"✅ {days} روز پریمیوم دریافت کردی!",
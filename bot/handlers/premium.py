@@ -2,7 +2,7 @@
 Premium handler for the bot.
 Handles premium subscription information and purchase flow.
 """
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, LabeledPrice, PreCheckoutQuery, SuccessfulPayment, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime
 import requests
@@ -15,6 +15,7 @@ from bot.keyboards.engagement import get_premium_rewards_menu_keyboard
 from bot.keyboards.premium_plan import get_premium_plan_payment_keyboard
 from core.points_manager import PointsManager
 from config.settings import settings
+from bot.client import get_bot
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -375,7 +376,6 @@ async def process_premium_purchase(
             from core.achievement_system import AchievementSystem
             from core.badge_manager import BadgeManager
             from db.crud import get_user_premium_days, get_badge_by_key
-            from aiogram import Bot as BadgeBot
             
             # Get premium days
             premium_days = await get_user_premium_days(db_session, user.id)
@@ -387,7 +387,7 @@ async def process_premium_purchase(
             )
             
             # Award badges
-            badge_bot = BadgeBot(token=settings.BOT_TOKEN)
+            badge_bot = get_bot()
             try:
                 for achievement in completed_achievements:
                     if achievement.achievement and achievement.achievement.badge_id:
@@ -401,8 +401,6 @@ async def process_premium_purchase(
                             )
             except Exception:
                 pass
-            finally:
-                await badge_bot.session.close()
         
         return subscription is not None
 
@@ -555,7 +553,7 @@ async def process_stars_payment(
         expiration_date = now + duration_to_add
     
     # Create invoice
-    bot = Bot(token=settings.BOT_TOKEN)
+    bot = get_bot()
     invoice_title = f"💎 پریمیوم {plan.plan_name}"
     invoice_description = (
         f"اشتراک پریمیوم {plan.duration_days} روزه\n"
@@ -584,10 +582,8 @@ async def process_stars_payment(
             need_shipping_address=False,
             is_flexible=False,
         )
-        await bot.session.close()
     except Exception as e:
         await callback.answer(f"❌ خطا در ایجاد فاکتور: {str(e)}", show_alert=True)
-        await bot.session.close()
 
 
 async def process_shaparak_payment(
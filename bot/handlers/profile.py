@@ -2,7 +2,7 @@
 Profile handlers for user profile interactions.
 Handles like, follow, block, report, gift, and other profile actions.
 """
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
@@ -27,7 +27,7 @@ from db.crud import (
 from bot.keyboards.profile import get_profile_keyboard
 from bot.keyboards.reply import get_chat_reply_keyboard, get_main_reply_keyboard
 from core.chat_manager import ChatManager
-from config.settings import settings
+from bot.client import get_bot
 
 router = Router()
 
@@ -93,7 +93,6 @@ async def handle_like(callback: CallbackQuery):
                     get_user_follow_received_count,
                     get_badge_by_key
                 )
-                from aiogram import Bot as BadgeBot
                 
                 # Get like counts
                 from sqlalchemy import func, select
@@ -112,7 +111,7 @@ async def handle_like(callback: CallbackQuery):
                 )
                 
                 # Award badges
-                badge_bot = BadgeBot(token=settings.BOT_TOKEN)
+                badge_bot = get_bot()
                 try:
                     for achievement in completed_achievements:
                         if achievement.achievement and achievement.achievement.badge_id:
@@ -126,8 +125,6 @@ async def handle_like(callback: CallbackQuery):
                                 )
                 except Exception:
                     pass
-                finally:
-                    await badge_bot.session.close()
                 
                 # Check like received achievements for partner
                 partner_like_count = partner.like_count or 0
@@ -136,7 +133,7 @@ async def handle_like(callback: CallbackQuery):
                     partner_like_count
                 )
                 
-                badge_bot2 = BadgeBot(token=settings.BOT_TOKEN)
+                badge_bot2 = get_bot()
                 try:
                     for achievement in partner_completed:
                         if achievement.achievement and achievement.achievement.badge_id:
@@ -150,8 +147,6 @@ async def handle_like(callback: CallbackQuery):
                                 )
                 except Exception:
                     pass
-                finally:
-                    await badge_bot2.session.close()
             
             # Refresh partner data
             await db_session.refresh(partner)
@@ -235,7 +230,6 @@ async def handle_follow(callback: CallbackQuery):
                     get_user_follow_received_count,
                     get_badge_by_key
                 )
-                from aiogram import Bot as BadgeBot
                 
                 # Get follow counts
                 follow_given_count = await get_user_follow_given_count(db_session, user.id)
@@ -249,7 +243,7 @@ async def handle_follow(callback: CallbackQuery):
                 )
                 
                 # Award badges for user
-                badge_bot = BadgeBot(token=settings.BOT_TOKEN)
+                badge_bot = get_bot()
                 try:
                     for achievement in completed_achievements:
                         if achievement.achievement and achievement.achievement.badge_id:
@@ -263,8 +257,6 @@ async def handle_follow(callback: CallbackQuery):
                                 )
                 except Exception:
                     pass
-                finally:
-                    await badge_bot.session.close()
                 
                 # Check follow received achievements for partner
                 partner_follow_given_count = await get_user_follow_given_count(db_session, partner.id)
@@ -274,7 +266,7 @@ async def handle_follow(callback: CallbackQuery):
                     follow_received_count
                 )
                 
-                badge_bot2 = BadgeBot(token=settings.BOT_TOKEN)
+                badge_bot2 = get_bot()
                 try:
                     for achievement in partner_completed:
                         if achievement.achievement and achievement.achievement.badge_id:
@@ -288,8 +280,6 @@ async def handle_follow(callback: CallbackQuery):
                                 )
                 except Exception:
                     pass
-                finally:
-                    await badge_bot2.session.close()
             
             # Refresh keyboard
             is_liked_status = await is_liked(db_session, user.id, partner.id)
@@ -19,6 +19,7 @@ from db.crud import (
 from bot.keyboards.profile import get_profile_keyboard
 from bot.keyboards.reply import get_main_reply_keyboard
 from utils.validators import get_display_name
+from bot.client import get_bot
 
 router = Router()
 
@@ -125,13 +126,12 @@ async def view_user_profile(message: Message):
         # Send profile with photo if available
         profile_image_url = getattr(profile_user, 'profile_image_url', None)
         if profile_image_url:
-            from aiogram import Bot
             from config.settings import settings
             from utils.minio_storage import is_url_accessible_from_internet, download_telegram_file
             import logging
             logger = logging.getLogger(__name__)
             
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             try:
                 # Check if it's a URL or file_id
                 if profile_image_url.startswith(('http://', 'https://')):
@@ -173,7 +173,6 @@ async def view_user_profile(message: Message):
                         caption=profile_text,
                         reply_markup=profile_keyboard
                     )
-                await bot.session.close()
             except Exception as e:
                 logger.error(f"Error sending photo: {e}", exc_info=True)
                 await message.answer(profile_text, reply_markup=profile_keyboard)
@@ -284,13 +283,12 @@ async def view_user_profile_regex(message: Message):
         # Send profile with photo if available
         profile_image_url = getattr(profile_user, 'profile_image_url', None)
         if profile_image_url:
-            from aiogram import Bot
             from config.settings import settings
             from utils.minio_storage import is_url_accessible_from_internet
             import logging
             logger = logging.getLogger(__name__)
             
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             try:
                 # Check if it's a URL or file_id
                 if profile_image_url.startswith(('http://', 'https://')):
@@ -332,7 +330,6 @@ async def view_user_profile_regex(message: Message):
                         caption=profile_text,
                         reply_markup=profile_keyboard
                     )
-                await bot.session.close()
             except Exception as e:
                 logger.error(f"Error sending photo: {e}", exc_info=True)
                 await message.answer(profile_text, reply_markup=profile_keyboard)
@@ -18,7 +18,7 @@ from bot.keyboards.common import (
     get_main_menu_keyboard
 )
 from utils.validators import validate_age, parse_age, validate_gender, validate_city, validate_username
-from config.settings import settings
+from bot.client import get_bot
 
 router = Router()
 
@@ -225,15 +225,13 @@ async def process_photo(message: Message, state: FSMContext):
     # Upload photo to MinIO
     from utils.minio_storage import upload_telegram_photo_to_minio
     from utils.nsfw_detector import download_and_check_photo
-    from aiogram import Bot
-    from config.settings import settings
     import logging
     logger = logging.getLogger(__name__)
     
-    bot = Bot(token=settings.BOT_TOKEN)
+    bot = get_bot()
     try:
         # Check for NSFW content before uploading
-        is_safe, error_message = await download_and_check_photo(bot, file_id)
+        is_safe, error_message = await download_and_check_photo(bot, file_id, photo.file_unique_id)
         if not is_safe:
             await message.answer(error_message)
             return
@@ -259,8 +257,6 @@ async def process_photo(message: Message, state: FSMContext):
             registration_data[user_id] = {}
         registration_data[user_id]["profile_image_url"] = file_id
         await complete_registration(message, state, user_id)
-    finally:
-        await bot.session.close()
 
 
 @router.callback_query(F.data == "registration:skip_photo")
@@ -481,8 +477,7 @@ async def complete_registration(message: Message, state: FSMContext, user_id: in
                     if referrer:
                         # Check if referrer wants to receive referral notifications
                         if getattr(referrer, 'receive_referral_notifications', True):
-                            from aiogram import Bot
-                            bot = Bot(token=settings.BOT_TOKEN)
+                            bot = get_bot()
                             try:
                                 await bot.send_message(
                                     referrer.telegram_id,
@@ -493,8 +488,6 @@ async def complete_registration(message: Message, state: FSMContext, user_id: in
                                 )
                             except Exception:
                                 pass
-                            finally:
-                                await bot.session.close()
                     
                     # Store info for final message
                     coins_received = coins_referred_actual
@@ -19,6 +19,7 @@ from bot.keyboards.engagement import (
 )
 from core.chat_manager import ChatManager
 from config.settings import settings
+from bot.client import get_bot
 from utils.validators import get_display_name
 from bot.handlers.points import build_points_info_text
 
@@ -365,11 +366,9 @@ async def partner_profile_button(message: Message):
         # Send profile with photo if available
         profile_image_url = getattr(partner, 'profile_image_url', None)
         if profile_image_url:
-            from aiogram import Bot
-            from config.settings import settings
             from utils.minio_storage import is_url_accessible_from_internet
             
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = get_bot()
             try:
                 # Check if it's a URL or file_id
                 if profile_image_url.startswith(('http://', 'https://')):
@@ -411,7 +410,6 @@ async def partner_profile_button(message: Message):
                         caption=profile_text,
                         reply_markup=profile_keyboard
                     )
-                await bot.session.close()
             except Exception as e:
                 logger.error(f"Error sending photo: {e}", exc_info=True)
                 await message.answer(profile_text, reply_markup=profile_keyboard)
@@ -420,21 +418,18 @@ async def partner_profile_button(message: Message):
         
         # Notify partner that their profile was viewed
         try:
-            from aiogram import Bot as NotifyBot
-            from config.settings import settings
             from db.crud import get_active_chat_room_by_user
             
             # Check if chat is still active
             chat_room = await get_active_chat_room_by_user(db_session, user.id)
             if chat_room and chat_room.is_active:
-                notify_bot = NotifyBot(token=settings.BOT_TOKEN)
+                notify_bot = get_bot()
                 try:
                     await notify_bot.send_message(
                         partner.telegram_id,
                         "👁️ مخاطبت پروفایلت رو مشاهده کرد!",
                         reply_markup=get_chat_reply_keyboard()
                     )
-                    await notify_bot.session.close()
                 except Exception:
                     pass  # Partner might have blocked the bot or left chat
         except Exception:
@@ -520,7 +515,6 @@ async def start_voice_call_button(message: Message):
         
         # Request voice call
         from db.crud import get_user_by_id
-        from aiogram import Bot
         from config.settings import settings
         from bot.keyboards.common import get_call_request_keyboard
         
@@ -540,7 +534,7 @@ async def start_voice_call_button(message: Message):
         )
         
         # Notify partner with accept/reject buttons
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         try:
             call_keyboard = get_call_request_keyboard("voice", user.id)
             await bot.send_message(
@@ -549,7 +543,6 @@ async def start_voice_call_button(message: Message):
                 "آیا می‌خواهید تماس صوتی را بپذیرید?",
                 reply_markup=call_keyboard
             )
-            await bot.session.close()
         except Exception as e:
             pass
         
@@ -617,8 +610,7 @@ async def toggle_private_mode_button(message: Message):
             # Notify partner
             if partner:
                 try:
-                    from aiogram import Bot
-                    bot = Bot(token=settings.BOT_TOKEN)
+                    bot = get_bot()
                     user_name = user.display_name or user.username or "مخاطب"
                     await bot.send_message(
                         chat_id=partner.telegram_id,
@@ -627,7 +619,6 @@ async def toggle_private_mode_button(message: Message):
                             f"از این به بعد پیام‌های {user_name} غیرقابل فوروارد و ذخیره هستند."
                         )
                     )
-                    await bot.session.close()
                 except Exception as e:
                     logger.error(f"Error sending private mode notification: {e}")
         else:
@@ -640,8 +631,7 @@ async def toggle_private_mode_button(message: Message):
             # Notify partner
             if partner:
                 try:
-                    from aiogram import Bot
-                    bot = Bot(token=settings.BOT_TOKEN)
+                    bot = get_bot()
                     user_name = user.display_name or user.username or "مخاطب"
                     await bot.send_message(
                         chat_id=partner.telegram_id,
@@ -650,7 +640,6 @@ async def toggle_private_mode_button(message: Message):
                             f"از این به بعد پیام‌های {user_name} قابل فوروارد و ذخیره هستند."
                         )
                     )
-                    await bot.session.close()
                 except Exception as e:
                     logger.error(f"Error sending private mode notification: {e}")
         break
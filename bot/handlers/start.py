@@ -5,18 +5,27 @@ Handles /start command and initial user setup.
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart
-from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 
 from db.database import get_db
-from db.crud import get_user_by_telegram_id, get_payment_transaction_by_transaction_id, check_user_premium, get_premium_plan_by_id, get_coin_package_by_id, get_active_mandatory_channels
+from db.crud import get_user_by_telegram_id, get_payment_transaction_by_transaction_id, check_user_premium, get_premium_plan_by_id, get_coin_package_by_id
 from bot.keyboards.common import get_gender_keyboard, get_channel_check_keyboard
 from bot.keyboards.reply import remove_keyboard, get_main_reply_keyboard
 from bot.keyboards.admin import get_admin_reply_keyboard
 from config.settings import settings
+from utils.channel_membership import ChannelMembershipChecker
 
 router = Router()
 
+# Global instance (set in main.py); without Redis results are just not cached
+membership_checker = ChannelMembershipChecker(None)
+
+
+def set_membership_checker(checker: ChannelMembershipChecker):
+    """Set channel membership checker instance."""
+    global membership_checker
+    membership_checker = checker
+
 
 async def check_payment_status(message: Message, transaction_id: str):
     """Check payment transaction status and notify user."""
@@ -277,54 +286,17 @@ async def callback_check_channel_membership(callback: CallbackQuery):
     bot = callback.bot
     
     try:
-        # Get active mandatory channels
-        async for db_session in get_db():
-            mandatory_channels = await get_active_mandatory_channels(db_session)
-            break
-        else:
-            # Fallback to old MANDATORY_CHANNEL_ID if no channels in database
-            if settings.MANDATORY_CHANNEL_ID:
-                mandatory_channels = [type('obj', (object,), {
-                    'channel_id': settings.MANDATORY_CHANNEL_ID,
-                    'channel_link': f"https://t.me/{settings.MANDATORY_CHANNEL_ID.lstrip('@')}",
-                    'channel_name': None
-                })()]
-            else:
-                mandatory_channels = []
-        
-        if not mandatory_channels:
-            # No mandatory channels, allow access
-            await callback.answer("✅ عضویت تایید شد!", show_alert=True)
-            await callback.message.delete()
-            return
-        
-        # Check if user is member of all mandatory channels
+        # Always re-check with Telegram here: this is the button users press
+        # after joining, so cached results (negative ones especially) are stale
         missing_channels = []
-        all_joined = True
-        
-        for channel in mandatory_channels:
-            try:
-                member = await bot.get_chat_member(
-                    channel.channel_id,
-                    user_id
-                )
-                
-                # Check membership status
-                if member.status not in ["member", "administrator", "creator"]:
-                    # User hasn't joined this channel
-                    channel_link = channel.channel_link or f"https://t.me/{channel.channel_id.lstrip('@')}"
-                    channel_name = channel.channel_name or channel.channel_id
-                    missing_channels.append({
-                        'name': channel_name,
-                        'link': channel_link
-                    })
-                    all_joined = False
-            except TelegramBadRequest:
-                # Channel doesn't exist or bot can't access it, skip it
-                pass
-            except Exception:
-                # Error checking membership, skip this channel
-                pass
+        for channel in await membership_checker.get_missing_channels(bot, user_id, force_refresh=True):
+            channel_link = channel.channel_link or f"https://t.me/{channel.channel_id.lstrip('@')}"
+            channel_name = channel.channel_name or channel.channel_id
+            missing_channels.append({
+                'name': channel_name,
+                'link': channel_link
+            })
+        all_joined = not missing_channels
         
         if all_joined:
             # User has joined all channels
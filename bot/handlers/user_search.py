@@ -2,9 +2,10 @@
 User search handlers for the bot.
 Handles user search by city, province, and gender using inline queries.
 """
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
 from config.settings import settings
+from bot.client import get_bot
 
 from db.database import get_db
 from db.crud import get_user_by_telegram_id, search_users, is_blocked
@@ -96,7 +97,7 @@ async def handle_user_search(inline_query: InlineQuery):
         
         # Build results
         results = []
-        bot = Bot(token=settings.BOT_TOKEN)
+        bot = get_bot()
         
         for found_user in users:
             # Skip if user has blocked this user or vice versa
@@ -163,8 +164,6 @@ async def handle_user_search(inline_query: InlineQuery):
                 )
             )
         
-        await bot.session.close()
-        
         # Note: Telegram inline queries support pagination automatically
         # If we return exactly 50 results, Telegram will show a "Next" button
         # The next_offset will be passed in the next query automatically
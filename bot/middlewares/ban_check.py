@@ -42,45 +42,51 @@ class BanCheckMiddleware(BaseMiddleware):
         if not user_id:
             return await handler(event, data)
         
-        # Check if user is banned
-        async for db_session in get_db():
-            user = await get_user_by_telegram_id(db_session, user_id, include_inactive=True)
-            
-            # If user doesn't exist, allow handler to process (for registration)
-            if not user:
-                return await handler(event, data)
+        # Check if user is banned, using the per-update user context when
+        # it was resolved by UserContextMiddleware
+        if "user_context" in data:
+            user = data["user_context"]
+        else:
+            user = None
+            async for db_session in get_db():
+                user = await get_user_by_telegram_id(db_session, user_id, include_inactive=True)
+                break
+        
+        # If user doesn't exist, allow handler to process (for registration)
+        if not user:
+            return await handler(event, data)
+        
+        # If user is banned, block access
+        if user.is_banned:
+            # Allow /start command so user can see ban message
+            if isinstance(event, Message) and event.text and event.text.startswith("/start"):
+                # Still allow /start but show ban message
+                await event.answer(
+                    "🚫 شما از استفاده از این ربات مسدود شده‌اید.\n\n"
+                    "در صورت نیاز به اطلاعات بیشتر، با پشتیبانی تماس بگیرید."
+                )
+                return None
             
-            # If user is banned, block access
-            if user.is_banned:
-                # Allow /start command so user can see ban message
-                if isinstance(event, Message) and event.text and event.text.startswith("/start"):
-                    # Still allow /start but show ban message
+            # Send ban message to user
+            if isinstance(event, Message):
+                # Only send message if it's not already a ban message to avoid spam
+                ban_keywords = ["مسدود", "بن", "ban", "blocked"]
+                is_ban_message = event.text and any(keyword in event.text.lower() for keyword in ban_keywords)
+                
+                if not is_ban_message:
                     await event.answer(
                         "🚫 شما از استفاده از این ربات مسدود شده‌اید.\n\n"
                         "در صورت نیاز به اطلاعات بیشتر، با پشتیبانی تماس بگیرید."
                     )
-                    return None
-                
-                # Send ban message to user
-                if isinstance(event, Message):
-                    # Only send message if it's not already a ban message to avoid spam
-                    ban_keywords = ["مسدود", "بن", "ban", "blocked"]
-                    is_ban_message = event.text and any(keyword in event.text.lower() for keyword in ban_keywords)
-                    
-                    if not is_ban_message:
-                        await event.answer(
-                            "🚫 شما از استفاده از این ربات مسدود شده‌اید.\n\n"
-                            "در صورت نیاز به اطلاعات بیشتر، با پشتیبانی تماس بگیرید."
-                        )
-                elif isinstance(event, CallbackQuery):
-                    await event.answer(
-                        "🚫 شما از استفاده از این ربات مسدود شده‌اید.",
-                        show_alert=True
-                    )
-                
-                # Don't process the handler
-                return None
+            elif isinstance(event, CallbackQuery):
+                await event.answer(
+                    "🚫 شما از استفاده از این ربات مسدود شده‌اید.",
+                    show_alert=True
+                )
             
-            # User is not banned, allow handler to process
-            return await handler(event, data)
+            # Don't process the handler
+            return None
+        
+        # User is not banned, allow handler to process
+        return await handler(event, data)
 
@@ -5,17 +5,23 @@ Ensures users have joined all mandatory channels before using chat features.
 from typing import Any, Awaitable, Callable, Dict, List
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
-from aiogram.exceptions import TelegramBadRequest
 
-from config.settings import settings
-from db.database import get_db
-from db.crud import get_active_mandatory_channels
 from bot.keyboards.common import get_channel_check_keyboard
+from utils.channel_membership import ChannelMembershipChecker
 
 
 class ChannelCheckMiddleware(BaseMiddleware):
     """Middleware to check if user has joined mandatory channel."""
     
+    def __init__(self, membership_checker: ChannelMembershipChecker):
+        """
+        Initialize channel check middleware.
+        
+        Args:
+            membership_checker: ChannelMembershipChecker instance
+        """
+        self.membership_checker = membership_checker
+    
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
@@ -53,51 +59,17 @@ class ChannelCheckMiddleware(BaseMiddleware):
             try:
                 bot = data.get("bot")
                 if bot:
-                    # Get active mandatory channels from database
-                    async for db_session in get_db():
-                        mandatory_channels = await get_active_mandatory_channels(db_session)
-                        break
-                    else:
-                        # Fallback to old MANDATORY_CHANNEL_ID if no channels in database
-                        if settings.MANDATORY_CHANNEL_ID:
-                            mandatory_channels = [type('obj', (object,), {
-                                'channel_id': settings.MANDATORY_CHANNEL_ID,
-                                'channel_link': f"https://t.me/{settings.MANDATORY_CHANNEL_ID.lstrip('@')}",
-                                'channel_name': None
-                            })()]
-                        else:
-                            mandatory_channels = []
-                    
-                    if not mandatory_channels:
-                        # No mandatory channels, allow to continue
-                        return await handler(event, data)
-                    
-                    # Check if user is member of all mandatory channels
-                    missing_channels: List[str] = []
-                    
-                    for channel in mandatory_channels:
-                        try:
-                            member = await bot.get_chat_member(
-                                channel.channel_id,
-                                user_id
-                            )
-                            
-                            # Check membership status
-                            if member.status not in ["member", "administrator", "creator"]:
-                                # User hasn't joined this channel
-                                channel_link = channel.channel_link or f"https://t.me/{channel.channel_id.lstrip('@')}"
-                                channel_name = channel.channel_name or channel.channel_id
-                                missing_channels.append({
-                                    'name': channel_name,
-                                    'link': channel_link,
-                                    'formatted': f"• {channel_name}\n  {channel_link}"
-                                })
-                        except TelegramBadRequest:
-                            # Channel doesn't exist or bot can't access it, skip it
-                            pass
-                        except Exception:
-                            # Error checking membership, skip this channel
-                            pass
+                    # Channels the user hasn't joined (cached membership,
+                    # uncached channels are checked concurrently)
+                    missing_channels: List[dict] = []
+                    for channel in await self.membership_checker.get_missing_channels(bot, user_id):
+                        channel_link = channel.channel_link or f"https://t.me/{channel.channel_id.lstrip('@')}"
+                        channel_name = channel.channel_name or channel.channel_id
+                        missing_channels.append({
+                            'name': channel_name,
+                            'link': channel_link,
+                            'formatted': f"• {channel_name}\n  {channel_link}"
+                        })
                     
                     # If user hasn't joined all channels, show message
                     if missing_channels:
@@ -2,15 +2,42 @@
 Rate limiting middleware for aiogram.
 Prevents users from sending too many messages too quickly.
 """
-from typing import Any, Awaitable, Callable, Dict
+from typing import Any, Awaitable, Callable, Dict, List
 from aiogram import BaseMiddleware
-from aiogram.types import TelegramObject, Message
+from aiogram.types import TelegramObject, Message, CallbackQuery
 
 from utils.rate_limiter import MessageRateLimiter
 
+# Callback data prefixes that also count against a dedicated limit
+CALLBACK_LIMITS = {
+    "dm:confirm:": "direct_messages",
+    "chat_request:send:confirm": "chat_requests",
+}
+
+
+def get_limit_names(event: TelegramObject) -> List[str]:
+    """
+    Get the named rate limits an update counts against.
+    
+    Args:
+        event: Telegram event
+        
+    Returns:
+        Limit names (see utils.rate_limiter.get_default_rules)
+    """
+    if isinstance(event, Message):
+        return ["messages"]
+    if isinstance(event, CallbackQuery):
+        names = ["callbacks"]
+        for prefix, name in CALLBACK_LIMITS.items():
+            if event.data and event.data.startswith(prefix):
+                names.append(name)
+        return names
+    return []
+
 
 class RateLimitMiddleware(BaseMiddleware):
-    """Middleware for rate limiting message sending."""
+    """Middleware for rate limiting messages and button presses."""
     
     def __init__(self, rate_limiter: MessageRateLimiter):
         """
@@ -38,23 +65,28 @@ class RateLimitMiddleware(BaseMiddleware):
         Returns:
             Handler result or None if rate limited
         """
-        # Only apply to messages
-        if isinstance(event, Message):
-            user_id = event.from_user.id
-            
-            # Check rate limit
-            is_allowed, remaining = await self.rate_limiter.check_message_limit(user_id)
+        user_id = event.from_user.id if getattr(event, "from_user", None) else None
+        limit_names = get_limit_names(event)
+        
+        if user_id and limit_names:
+            # All limits of this update are checked in one Redis call
+            is_allowed, _ = await self.rate_limiter.check_user_limits(user_id, limit_names)
             
             if not is_allowed:
                 # Rate limit exceeded
-                await event.answer(
-                    "⏱️ پیام‌هات خیلی سریع ارسال می‌شن! 🚦\n"
-                    "🌟 برای بهتر شدن تجربه‌ات، چند لحظه صبر کن و دوباره تلاش کن.\n\n"
-                    "🤖 ارسال سریع پیام شبیه رفتار رباتیه و ممکنه باعث محدودیت بشه.\n"
-                    "🙏 ممنون از همکاریت! ⏳"
-                )
-                return  # Don't process the message
+                if isinstance(event, CallbackQuery):
+                    await event.answer(
+                        "⏱️ خیلی سریع درخواست می‌دی! چند لحظه صبر کن و دوباره تلاش کن.",
+                        show_alert=True
+                    )
+                else:
+                    await event.answer(
+                        "⏱️ پیام‌هات خیلی سریع ارسال می‌شن! 🚦\n"
+                        "🌟 برای بهتر شدن تجربه‌ات، چند لحظه صبر کن و دوباره تلاش کن.\n\n"
+                        "🤖 ارسال سریع پیام شبیه رفتار رباتیه و ممکنه باعث محدودیت بشه.\n"
+                        "🙏 ممنون از همکاریت! ⏳"
+                    )
+                return  # Don't process the update
         
         # Continue to handler
         return await handler(event, data)
-
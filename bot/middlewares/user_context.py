@@ -0,0 +1,56 @@
+"""
+User context middleware.
+Resolves the user snapshot once per update and shares it as data["user_context"].
+"""
+import logging
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Message, CallbackQuery
+
+from core.user_context import UserContextCache
+
+logger = logging.getLogger(__name__)
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Outer middleware that puts the cached UserContext into handler data."""
+
+    def __init__(self, user_context_cache: UserContextCache):
+        """
+        Initialize user context middleware.
+
+        Args:
+            user_context_cache: UserContextCache instance
+        """
+        self.user_context_cache = user_context_cache
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """
+        Process middleware call.
+
+        Args:
+            handler: Handler function
+            event: Telegram event
+            data: Handler data
+
+        Returns:
+            Handler result
+        """
+        user_id = None
+        if isinstance(event, (Message, CallbackQuery)) and event.from_user:
+            user_id = event.from_user.id
+
+        if user_id:
+            try:
+                # None means the user is not registered
+                data["user_context"] = await self.user_context_cache.get(user_id)
+            except Exception as e:
+                # Leave data without the key so consumers fall back to the database
+                logger.warning(f"Error resolving user context for {user_id}: {e}")
+
+        return await handler(event, data)
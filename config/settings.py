@@ -13,6 +13,7 @@ class Settings(BaseSettings):
     
     # Bot configuration
     BOT_TOKEN: str = Field(..., description="Telegram bot token from @BotFather")
+    TELEGRAM_CONNECTION_POOL_SIZE: int = Field(default=100, description="Maximum open connections to the Telegram Bot API (shared by all handlers)")
     
     # Database configuration
     MYSQL_HOST: str = Field(default="localhost", description="MySQL host")
@@ -31,6 +32,7 @@ class Settings(BaseSettings):
     REDIS_DB: int = Field(default=0, description="Redis database number")
     REDIS_PASSWORD: str = Field(default="", description="Redis password (empty if not set)")
     REDIS_MAX_CONNECTIONS: int = Field(default=50, description="Maximum Redis connection pool size")
+    USER_CONTEXT_CACHE_TTL_SECONDS: int = Field(default=300, description="TTL of the cached per-user context snapshot (ban/premium/profile changes invalidate it)")
     
     # MinIO configuration
     MINIO_ENDPOINT: str = Field(default="localhost:9000", description="MinIO endpoint (internal, for Docker)")
@@ -42,6 +44,9 @@ class Settings(BaseSettings):
     
     # Channel configuration
     MANDATORY_CHANNEL_ID: str = Field(..., description="Channel ID that users must join before using chat")
+    MANDATORY_CHANNELS_CACHE_TTL_SECONDS: int = Field(default=60, description="How long the mandatory channel list is cached in-process")
+    CHANNEL_MEMBERSHIP_CACHE_TTL_SECONDS: int = Field(default=3600, description="How long a confirmed channel membership is cached in Redis")
+    CHANNEL_NON_MEMBERSHIP_CACHE_TTL_SECONDS: int = Field(default=60, description="How long a failed membership check is cached (the check button always re-checks)")
     
     # Support configuration
     SUPPORT_ADMIN: str = Field(default="", description="Telegram link for support/admin contact")
@@ -85,14 +90,67 @@ class Settings(BaseSettings):
     
     # Matchmaking worker configuration
     MATCHMAKING_WORKER_INTERVAL: float = Field(default=1.0, description="Matchmaking worker check interval in seconds (can be decimal like 0.1 for faster matching)")
+    MATCHMAKING_WORKER_MAX_INTERVAL: float = Field(default=5.0, description="Maximum wait between matchmaking passes when the queue is idle (passes also run immediately when a user joins)")
     MATCHMAKING_WORKER_BATCH_SIZE: int = Field(default=5, description="Number of matches to process per worker cycle")
+    MATCHMAKING_BATCH_PAIRING: bool = Field(
+        default=True,
+        description="Pair users from one queue snapshot per cycle instead of calling find_match per user (redis backend only)"
+    )
+    MATCHMAKING_ATOMIC_CLAIM: bool = Field(
+        default=True,
+        description="Claim matches atomically with a Redis Lua script (safe with multiple bot replicas)"
+    )
     MATCHMAKING_BACKEND: str = Field(
         default="redis",
         description="Backend for matchmaking queue: 'redis' or 'memory'"
     )
     
+    # User activity (last_seen) configuration
+    LAST_SEEN_WRITE_BEHIND: bool = Field(
+        default=True,
+        description="Keep activity in Redis only and flush users.last_seen in batches instead of one UPDATE per update"
+    )
+    LAST_SEEN_FLUSH_INTERVAL_SECONDS: int = Field(default=30, description="How often buffered last_seen values are written to the database")
+    
+    # Profile photo moderation
+    NSFW_WORKER_PROCESSES: int = Field(default=2, description="Processes running NSFW inference (one model per process)")
+    NSFW_MAX_PENDING_CHECKS: int = Field(default=32, description="Max NSFW checks queued or running; further checks wait")
+    NSFW_CHECK_TIMEOUT_SECONDS: int = Field(default=60, description="Give up on an NSFW check (photo is rejected) after this many seconds")
+    NSFW_VERDICT_CACHE_SIZE: int = Field(default=10000, description="NSFW verdicts cached in-process by file_unique_id")
+    NSFW_VERDICT_TTL_DAYS: int = Field(default=30, description="Days moderation verdicts stay cached in Redis (MySQL keeps them)")
+    NSFW_PHASH_MAX_DISTANCE: int = Field(default=5, description="Max differing hash bits (0-7) for an image to match a rejected one")
+    
+    # Chat-end events (Redis Stream)
+    CHAT_EVENTS_STREAM_MAXLEN: int = Field(default=100000, description="Approximate number of chat_ended events kept in the stream")
+    CHAT_EVENTS_RETRY_AFTER_SECONDS: int = Field(default=60, description="Retry a chat_ended event this long after a failed or abandoned attempt")
+    
+    # Leaderboards
+    LEADERBOARD_CACHE_TTL_SECONDS: int = Field(default=60, description="How long a materialized week/month leaderboard is reused")
+    LEADERBOARD_RECONCILE_INTERVAL_SECONDS: int = Field(default=3600, description="How often the leaderboard sorted sets are rebuilt from the database")
+    
+    # Broadcast delivery
+    BROADCAST_MAX_MESSAGES_PER_SECOND: float = Field(
+        default=25.0,
+        description="Global send rate of broadcasts (Telegram allows ~30 messages per second)"
+    )
+    BROADCAST_CONCURRENCY: int = Field(default=20, description="Concurrent broadcast senders sharing the global rate")
+    
+    # Bulk message deletion (chat:delete_my_messages)
+    MESSAGE_DELETION_MAX_CALLS_PER_SECOND: float = Field(
+        default=10.0,
+        description="deleteMessages calls per second, shared by all deletion jobs (up to 100 messages per call)"
+    )
+    MESSAGE_DELETION_CONCURRENCY: int = Field(default=4, description="deleteMessages calls in flight across all deletion jobs")
+    
     # Rate limiting
     RATE_LIMIT_MESSAGES_PER_MINUTE: int = Field(default=20, description="Max messages per minute per user")
+    RATE_LIMIT_CALLBACKS_PER_MINUTE: int = Field(default=60, description="Max button presses (callback queries) per minute per user")
+    RATE_LIMIT_DIRECT_MESSAGES_PER_MINUTE: int = Field(default=10, description="Max direct messages sent per minute per user")
+    RATE_LIMIT_CHAT_REQUESTS_PER_MINUTE: int = Field(default=5, description="Max chat requests sent per minute per user")
+    RATE_LIMIT_MODE: str = Field(
+        default="sliding",
+        description="Rate limiting algorithm: 'sliding' (exact sliding-window log) or 'gcra' (token bucket, smoother and lighter on Redis)"
+    )
 
     # Virtual profile / bot simulation (currently optional, used in some deployments)
     VIRTUAL_PROFILE_BOT_ENABLED: bool = Field(
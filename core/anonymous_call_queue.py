@@ -0,0 +1,250 @@
+"""
+Redis-based queue for anonymous video/voice call matching.
+Searchers wait in sorted sets (scored by joined_at) per call type, gender
+and preferred gender, so a match is the oldest compatible searcher and is
+found with a few index reads whatever the queue size.
+
+Two searchers are compatible only if each one accepts the other's gender
+(preferred gender "all" or equal to it), as in chat matchmaking. The
+previous set-based queue accepted a candidate if either side's preference
+allowed the pair.
+"""
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+# Genders of the queue buckets; anything else lands in "other"
+QUEUE_GENDERS = ("male", "female", "other")
+# Searchers are dropped from the queue after this many seconds
+QUEUE_TIMEOUT = 300
+# Oldest entries read per bucket (spare ones skip the searcher and stale entries)
+PEEK_COUNT = 5
+# Claim attempts when other searchers take the chosen candidates first
+MAX_CLAIM_ATTEMPTS = 3
+
+
+# Claim a pair: succeeds only if both users are still queued (not claimed by
+# another searcher, not cancelled) and removes both from their buckets.
+#
+# KEYS[1], KEYS[2] = queue bucket keys of the users
+# ARGV[1], ARGV[2] = user ids
+CLAIM_PAIR_SCRIPT = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) or not redis.call('ZSCORE', KEYS[2], ARGV[2]) then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+def _queue_gender(gender: Optional[str]) -> str:
+    """Normalize a gender value to one of the queue buckets."""
+    return gender if gender in QUEUE_GENDERS else "other"
+
+
+def _queue_preference(preferred_gender: Optional[str]) -> str:
+    """Normalize a preferred gender to male, female or all."""
+    return preferred_gender if preferred_gender in ("male", "female") else "all"
+
+
+class AnonymousCallQueue:
+    """Redis-based anonymous call queue with FIFO matching and atomic claims."""
+
+    def __init__(self, redis_client: redis.Redis):
+        """
+        Initialize anonymous call queue with Redis client.
+
+        Args:
+            redis_client: Redis async client instance
+        """
+        self.redis = redis_client
+        self.queue_prefix = "anonymous_call:queue"
+        self.user_data_prefix = "anonymous_call:user"
+        self._claim_pair_script = self.redis.register_script(CLAIM_PAIR_SCRIPT)
+
+    def _get_queue_key(self, call_type: str, gender: str, preference: str) -> str:
+        """Get Redis key for the bucket of (call type, gender, preferred gender)."""
+        return f"{self.queue_prefix}:{call_type}:{gender}:{preference}"
+
+    def _get_user_data_key(self, user_id: int) -> str:
+        """Get Redis key for a searcher's data."""
+        return f"{self.user_data_prefix}:{user_id}"
+
+    def _get_candidate_keys(self, call_type: str, gender: str, preference: str) -> List[str]:
+        """
+        Get the buckets of searchers compatible with a searcher.
+
+        Candidates must have the wanted gender and want the searcher's gender
+        (or anyone).
+        """
+        genders = QUEUE_GENDERS if preference == "all" else (preference,)
+        preferences = ("all",) if gender == "other" else (gender, "all")
+        return [
+            self._get_queue_key(call_type, candidate_gender, candidate_preference)
+            for candidate_gender in genders
+            for candidate_preference in preferences
+        ]
+
+    async def add_user(
+        self,
+        user_id: int,
+        call_type: str,
+        preferred_gender: str,
+        user_gender: Optional[str] = None
+    ) -> bool:
+        """
+        Add a searcher to the queue (again, if already queued).
+
+        Args:
+            user_id: User's database ID
+            call_type: "video" or "voice"
+            preferred_gender: Wanted gender ("male", "female" or "all")
+            user_gender: Searcher's gender
+
+        Returns:
+            True if added
+        """
+        joined_at = time.time()
+        queue_key = self._get_queue_key(call_type, _queue_gender(user_gender), _queue_preference(preferred_gender))
+        user_data = {
+            "user_id": user_id,
+            "call_type": call_type,
+            "preferred_gender": preferred_gender,
+            "user_gender": user_gender,
+            "joined_at": joined_at,
+            "queue_key": queue_key,
+        }
+
+        previous_queue_key = await self._get_queue_key_of(user_id)
+        pipe = self.redis.pipeline(transaction=True)
+        if previous_queue_key and previous_queue_key != queue_key:
+            pipe.zrem(previous_queue_key, user_id)
+        pipe.setex(self._get_user_data_key(user_id), QUEUE_TIMEOUT, json.dumps(user_data))
+        pipe.zadd(queue_key, {str(user_id): joined_at})
+        # Drop entries of searchers that timed out
+        pipe.zremrangebyscore(queue_key, "-inf", joined_at - QUEUE_TIMEOUT)
+        pipe.expire(queue_key, QUEUE_TIMEOUT)
+        await pipe.execute()
+        return True
+
+    async def get_user_data(self, user_id: int) -> Optional[Dict]:
+        """Get a searcher's data, or None if not queued (or timed out)."""
+        data_str = await self.redis.get(self._get_user_data_key(user_id))
+        if not data_str:
+            return None
+        return json.loads(data_str)
+
+    async def _get_queue_key_of(self, user_id: int) -> Optional[str]:
+        """Get the bucket a searcher was added to."""
+        user_data = await self.get_user_data(user_id)
+        return user_data.get("queue_key") if user_data else None
+
+    async def remove_user(self, user_id: int) -> bool:
+        """
+        Remove a searcher's data and queue entry.
+
+        Args:
+            user_id: User's database ID
+
+        Returns:
+            True if removed
+        """
+        queue_key = await self._get_queue_key_of(user_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(self._get_user_data_key(user_id))
+        if queue_key:
+            pipe.zrem(queue_key, user_id)
+        await pipe.execute()
+        return True
+
+    async def is_queued(self, user_id: int) -> bool:
+        """Check if a searcher is still waiting (not matched, cancelled or timed out)."""
+        queue_key = await self._get_queue_key_of(user_id)
+        if not queue_key:
+            return False
+        return await self.redis.zscore(queue_key, user_id) is not None
+
+    async def _get_candidates(self, user_id: int, candidate_keys: List[str]) -> List[Tuple[int, str]]:
+        """
+        Get the oldest queued searchers of the candidate buckets.
+
+        Returns:
+            (user_id, queue_key) tuples, oldest first
+        """
+        min_joined_at = time.time() - QUEUE_TIMEOUT
+        pipe = self.redis.pipeline(transaction=False)
+        for key in candidate_keys:
+            pipe.zrangebyscore(key, min_joined_at, "+inf", start=0, num=PEEK_COUNT, withscores=True)
+        results = await pipe.execute()
+
+        entries = []
+        for key, members in zip(candidate_keys, results):
+            for member, joined_at in members:
+                member_id = int(member)
+                if member_id != user_id:
+                    entries.append((joined_at, member_id, key))
+        entries.sort()
+        if not entries:
+            return []
+
+        # One MGET drops entries whose data expired or was removed
+        data = await self.redis.mget([self._get_user_data_key(member_id) for _, member_id, _ in entries])
+        candidates = []
+        stale = self.redis.pipeline(transaction=False)
+        has_stale = False
+        for (_, member_id, key), member_data in zip(entries, data):
+            if member_data:
+                candidates.append((member_id, key))
+            else:
+                stale.zrem(key, member_id)
+                has_stale = True
+        if has_stale:
+            await stale.execute()
+        return candidates
+
+    async def claim_match(self, user_id: int) -> Optional[int]:
+        """
+        Find the oldest compatible searcher and claim the pair.
+
+        Compatible means both accept each other's gender (see the module
+        docstring).
+
+        The claim runs atomically in a Lua script, so two searchers can never
+        take the same partner; both users leave the queue (their data is kept
+        until remove_user).
+
+        Args:
+            user_id: User's database ID
+
+        Returns:
+            Partner's user ID, or None if no match (or the searcher is no longer queued)
+        """
+        user_data = await self.get_user_data(user_id)
+        if not user_data or not user_data.get("queue_key"):
+            return None
+
+        queue_key = user_data["queue_key"]
+        candidate_keys = self._get_candidate_keys(
+            user_data["call_type"],
+            _queue_gender(user_data.get("user_gender")),
+            _queue_preference(user_data.get("preferred_gender"))
+        )
+
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            candidates = await self._get_candidates(user_id, candidate_keys)
+            if not candidates:
+                return None
+            for partner_id, partner_queue_key in candidates:
+                claimed = await self._claim_pair_script(
+                    keys=[queue_key, partner_queue_key],
+                    args=[user_id, partner_id]
+                )
+                if claimed:
+                    return partner_id
+                if await self.redis.zscore(queue_key, user_id) is None:
+                    # Claimed by another searcher (or cancelled) meanwhile
+                    return None
+        return None
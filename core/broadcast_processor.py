@@ -7,50 +7,81 @@ Processes pending broadcast messages from the queue
 import logging
 import asyncio
 import re
-from typing import Dict, Any, List, Set
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Set, Tuple
 from datetime import datetime
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 
+from config.settings import settings
 from db.database import get_db
+from db.crud import mark_users_bot_blocked, bulk_create_broadcast_receipts
 from db.models import BroadcastMessage, User
-from utils.broadcast_service import BroadcastService
-from sqlalchemy import select
+from utils.broadcast_service import (
+    BroadcastService,
+    BroadcastCounters,
+    BROADCAST_RUNNING,
+    BROADCAST_CANCELLED,
+    BROADCAST_ACTIVE_STATUSES,
+)
+from utils.token_bucket import TokenBucket
 
 logger = logging.getLogger(__name__)
 
+# Delivery results of _send_with_retry
+SEND_OK = "sent"
+SEND_FAILED = "failed"
+SEND_BLOCKED = "blocked"
+
+
+@dataclass
+class BroadcastRun:
+    """State of a broadcast being sent, shared by its senders."""
+    broadcast_id: int
+    sent: int = 0
+    failed: int = 0
+    # Buffered until the next checkpoint
+    blocked_user_ids: List[int] = field(default_factory=list)
+    receipts: List[Dict[str, Any]] = field(default_factory=list)
+
 
 class BroadcastProcessor:
     """پردازشگر پیام‌های همگانی"""
 
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, counters: Optional[BroadcastCounters] = None):
         self.bot = bot
+        self.counters = counters  # Live progress counters in Redis (optional)
         self.broadcast_service = BroadcastService()
         self.processing_locks: Set[int] = set()  # Track which broadcasts are being processed
-        self.batch_size = 1000  # Process in batches for better memory management
+        self.batch_size = 1000  # Recipients fetched per keyset page
+        self.checkpoint_interval = 500  # Users between progress/cursor checkpoints
+        # One bucket for all broadcasts, so concurrent senders stay under Telegram's limit
+        self.rate_limiter = TokenBucket(settings.BROADCAST_MAX_MESSAGES_PER_SECOND)
+        self.concurrency = settings.BROADCAST_CONCURRENCY
 
     async def process_pending_broadcasts(self):
         """پردازش پیام‌های همگانی در انتظار"""
         try:
+            pending_broadcasts = []
             async for session in get_db():
                 try:
                     pending_broadcasts = await self.broadcast_service.get_pending_broadcasts(session)
-
-                    if not pending_broadcasts:
-                        return
-
-                    logger.info(f"Found {len(pending_broadcasts)} pending broadcasts")
-
-                    for broadcast in pending_broadcasts:
-                        await self._process_single_broadcast(broadcast)
-                        
                     break
                 except Exception as e:
                     logger.error(f"Error in broadcast session: {e}")
                     await session.rollback()
                     break
 
+            if not pending_broadcasts:
+                return
+
+            logger.info(f"Found {len(pending_broadcasts)} pending broadcasts")
+
+            # Each broadcast opens its own short sessions
+            for broadcast in pending_broadcasts:
+                await self._process_single_broadcast(broadcast)
+
         except Exception as e:
             logger.error(f"Error processing pending broadcasts: {e}")
 
@@ -65,89 +96,98 @@ class BroadcastProcessor:
         self.processing_locks.add(broadcast.id)
         
         try:
-            # Use delay_seconds from broadcast, or default to 0.067 (~15 msg/sec)
+            # Admin-chosen rate (delay_seconds), capped by the global rate
             delay_seconds = getattr(broadcast, 'delay_seconds', 0.067)
-            messages_per_second = 1.0 / delay_seconds if delay_seconds > 0 else 15
+            requested_rate = 1.0 / delay_seconds if delay_seconds > 0 else self.rate_limiter.rate
+            messages_per_second = min(requested_rate, self.rate_limiter.rate)
+            buckets = [self.rate_limiter]
+            if messages_per_second < self.rate_limiter.rate:
+                buckets.insert(0, TokenBucket(messages_per_second))
             
-            logger.info(f"Processing broadcast {broadcast.id}: {broadcast.message_type} (delay: {delay_seconds}s, rate: {messages_per_second:.1f} msg/sec)")
+            logger.info(f"Processing broadcast {broadcast.id}: {broadcast.message_type} (rate: {messages_per_second:.1f} msg/sec, senders: {self.concurrency})")
 
+            # Claim the broadcast (double-check after acquiring lock) and count what's left
+            started = False
+            total_users = 0
             async for session in get_db():
-                try:
-                    # Check if broadcast was already completed (double-check after acquiring lock)
-                    result = await session.execute(
-                        select(BroadcastMessage).where(BroadcastMessage.id == broadcast.id)
-                    )
-                    current_broadcast = result.scalar_one_or_none()
-                    if not current_broadcast or current_broadcast.sent_count > 0:
-                        logger.info(f"Broadcast {broadcast.id} already processed, skipping")
-                        break
-                    
-                    # Get active users
-                    users = await self.broadcast_service.get_active_users(session)
-
-                    total_users = len(users)
+                started = await self.broadcast_service.set_broadcast_status(
+                    session, broadcast.id, BROADCAST_RUNNING, from_statuses=BROADCAST_ACTIVE_STATUSES
+                )
+                if started:
+                    total_users = await self.broadcast_service.count_active_users(session, broadcast.last_user_id)
+                break
+            if not started:
+                logger.info(f"Broadcast {broadcast.id} already processed, skipping")
+                return
+
+            if broadcast.last_user_id:
+                logger.info(f"Resuming broadcast {broadcast.id} after user {broadcast.last_user_id}")
+            logger.info(
+                f"Starting broadcast to {total_users} users (rate: {messages_per_second:.1f} msg/sec)"
+            )
+            estimated_time = total_users / messages_per_second / 60  # minutes
+            logger.info(f"Estimated completion time: {estimated_time:.1f} minutes")
+
+            # Senders take users from the queue; database sessions are only
+            # opened briefly here, per batch and per checkpoint
+            run = BroadcastRun(broadcast.id, sent=broadcast.sent_count, failed=broadcast.failed_count)
+            await self._reset_counters(run)
+            last_user_id = broadcast.last_user_id
+            status = BROADCAST_RUNNING
+            processed = 0
+            queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+            senders = [
+                asyncio.create_task(self._run_sender(queue, broadcast, buckets, run))
+                for _ in range(self.concurrency)
+            ]
 
-                    if total_users == 0:
-                        logger.warning("No active users found for broadcast")
-                        await self.broadcast_service.mark_broadcast_completed(
-                            session, broadcast.id, sent_count=0, failed_count=0
+            try:
+                while status == BROADCAST_RUNNING:
+                    users = []
+                    async for session in get_db():
+                        users = await self.broadcast_service.get_active_user_batch(
+                            session, last_user_id, self.batch_size
                         )
                         break
+                    if not users:
+                        break
 
-                    # Send messages with rate limiting
-                    sent_count = 0
-                    failed_count = 0
-
-                    logger.info(
-                        f"Starting broadcast to {total_users} users (delay: {delay_seconds:.3f}s, rate: {messages_per_second:.1f} msg/sec)"
-                    )
-                    estimated_time = total_users * delay_seconds / 60  # minutes
-                    logger.info(f"Estimated completion time: {estimated_time:.1f} minutes")
-
-                    for idx, user in enumerate(users, 1):
-                        try:
-                            # Send with automatic retry on FloodWait
-                            success = await self._send_with_retry(user, broadcast, max_retries=3)
-
-                            if success:
-                                sent_count += 1
-                            else:
-                                failed_count += 1
-
-                            # Log progress every 100 messages
-                            if idx % 100 == 0:
-                                logger.info(
-                                    f"Broadcast progress: {idx}/{total_users} "
-                                    f"({(idx/total_users)*100:.1f}%) - "
-                                    f"Sent: {sent_count}, Failed: {failed_count}"
-                                )
-
-                            # Rate limiting delay - use delay_seconds from broadcast
-                            if idx < total_users:  # Don't wait after last message
-                                await asyncio.sleep(delay_seconds)
-
-                        except Exception as e:
-                            failed_count += 1
-                            logger.error(f"Failed to send broadcast to user {user.telegram_id}: {e}")
-
-                        # Update progress in database every 500 messages
-                        if idx % 500 == 0:
-                            await self.broadcast_service.update_broadcast_progress(
-                                session, broadcast.id, sent_count=sent_count, failed_count=failed_count
+                    for user in users:
+                        await queue.put(user)
+                        processed += 1
+
+                        # Checkpoint every checkpoint_interval users and at the end of each batch
+                        if processed % self.checkpoint_interval == 0 or user is users[-1]:
+                            last_user_id = user.id
+                            status = await self._checkpoint(queue, run, last_user_id)
+                            logger.info(
+                                f"Broadcast progress: {processed}/{total_users} "
+                                f"({(processed/max(total_users, 1))*100:.1f}%) - "
+                                f"Sent: {run.sent}, Failed: {run.failed}"
                             )
+                            if status != BROADCAST_RUNNING:
+                                break
 
-                    # Mark as completed
-                    await self.broadcast_service.mark_broadcast_completed(
-                        session, broadcast.id, sent_count=sent_count, failed_count=failed_count
-                    )
+                for _ in senders:
+                    await queue.put(None)
+                await asyncio.gather(*senders)
+            finally:
+                for sender in senders:
+                    sender.cancel()
 
-                    logger.info(f"Broadcast {broadcast.id} completed: {sent_count} sent, {failed_count} failed")
-                    
-                    break
-                except Exception as e:
-                    logger.error(f"Error in broadcast processing session: {e}")
-                    await session.rollback()
-                    break
+            if status != BROADCAST_RUNNING:
+                logger.info(f"Broadcast {broadcast.id} {status} after user {last_user_id}")
+                return
+
+            # Mark as completed
+            async for session in get_db():
+                await self._flush_run(session, run)
+                await self.broadcast_service.mark_broadcast_completed(
+                    session, broadcast.id, sent_count=run.sent, failed_count=run.failed
+                )
+                break
+
+            logger.info(f"Broadcast {broadcast.id} completed: {run.sent} sent, {run.failed} failed")
 
         except Exception as e:
             logger.error(f"Error processing broadcast {broadcast.id}: {e}")
@@ -155,75 +195,184 @@ class BroadcastProcessor:
             # Release lock
             self.processing_locks.discard(broadcast.id)
 
+    async def _checkpoint(self, queue: asyncio.Queue, run: BroadcastRun, last_user_id: int) -> str:
+        """
+        ذخیره پیشرفت و مکان cursor
+
+        Waits until every queued user has been handled, so the stored cursor
+        is exact, then reads the status back (the admin may have paused or
+        cancelled the broadcast).
+
+        Returns:
+            Current broadcast status
+        """
+        await queue.join()
+        status = BROADCAST_RUNNING
+        async for session in get_db():
+            await self._flush_run(session, run)
+            await self.broadcast_service.update_broadcast_progress(
+                session, run.broadcast_id,
+                sent_count=run.sent, failed_count=run.failed,
+                last_user_id=last_user_id
+            )
+            # A deleted broadcast is treated as cancelled
+            status = await self.broadcast_service.get_broadcast_status(session, run.broadcast_id) or BROADCAST_CANCELLED
+            break
+        return status
+
+    async def _run_sender(
+        self,
+        queue: asyncio.Queue,
+        broadcast: BroadcastMessage,
+        buckets: List[TokenBucket],
+        run: BroadcastRun
+    ):
+        """ارسال‌کننده: کاربران را از صف برمی‌دارد تا به None برسد"""
+        while True:
+            user = await queue.get()
+            try:
+                if user is None:
+                    return
+
+                message_id = None
+                try:
+                    status, message_id = await self._send_with_retry(user, broadcast, buckets, max_retries=3)
+                except Exception as e:
+                    status = SEND_FAILED
+                    logger.error(f"Failed to send broadcast to user {user.telegram_id}: {e}")
+
+                # Blocked users are counted (and receipted) as failed
+                counter = 'sent' if status == SEND_OK else 'failed'
+                if status == SEND_OK:
+                    run.sent += 1
+                else:
+                    run.failed += 1
+                    if status == SEND_BLOCKED:
+                        run.blocked_user_ids.append(user.id)
+                run.receipts.append({
+                    'broadcast_id': run.broadcast_id,
+                    'user_id': user.id,
+                    'telegram_message_id': message_id,
+                    'status': counter,
+                    'sent_at': datetime.utcnow(),
+                })
+                await self._increment_counter(run.broadcast_id, counter)
+            finally:
+                queue.task_done()
+
+    async def _reset_counters(self, run: BroadcastRun):
+        """شروع شمارنده‌های زنده از مقادیر ذخیره‌شده"""
+        if not self.counters:
+            return
+        try:
+            await self.counters.reset(run.broadcast_id, sent=run.sent, failed=run.failed)
+        except Exception as e:
+            logger.warning(f"Error resetting counters of broadcast {run.broadcast_id}: {e}")
+
+    async def _increment_counter(self, broadcast_id: int, field: str):
+        """افزایش شمارنده زنده (HINCRBY)"""
+        if not self.counters:
+            return
+        try:
+            await self.counters.increment(broadcast_id, field)
+        except Exception as e:
+            logger.debug(f"Error incrementing {field} counter of broadcast {broadcast_id}: {e}")
+
+    async def _flush_run(self, session, run: BroadcastRun):
+        """
+        ذخیره رسیدهای بافر‌شده و کاربرانی که ربات را مسدود کرده‌اند
+
+        Receipts go in one multi-row INSERT; blocked users are marked so
+        later broadcasts skip them.
+        """
+        receipts = run.receipts[:]
+        run.receipts.clear()
+        if receipts:
+            try:
+                await bulk_create_broadcast_receipts(session, receipts)
+            except Exception as e:
+                await session.rollback()
+                logger.warning(f"Error saving {len(receipts)} receipts of broadcast {run.broadcast_id}: {e}")
+
+        user_ids = run.blocked_user_ids[:]
+        run.blocked_user_ids.clear()
+        if user_ids:
+            try:
+                await mark_users_bot_blocked(session, user_ids)
+            except Exception as e:
+                await session.rollback()
+                logger.warning(f"Error marking {len(user_ids)} users as blocked: {e}")
+
     async def _send_message_to_user(self, user: User, broadcast: BroadcastMessage):
-        """ارسال پیام به یک کاربر"""
+        """ارسال پیام به یک کاربر (پیام ارسال‌شده را برمی‌گرداند)"""
         try:
             if broadcast.message_type == 'text':
-                await self.bot.send_message(
+                sent_message = await self.bot.send_message(
                     chat_id=user.telegram_id,
                     text=broadcast.message_text,
                     parse_mode='HTML'
                 )
             elif broadcast.message_type == 'photo' and broadcast.message_file_id:
-                await self.bot.send_photo(
+                sent_message = await self.bot.send_photo(
                     chat_id=user.telegram_id,
                     photo=broadcast.message_file_id,
                     caption=broadcast.message_caption,
                     parse_mode='HTML'
                 )
             elif broadcast.message_type == 'video' and broadcast.message_file_id:
-                await self.bot.send_video(
+                sent_message = await self.bot.send_video(
                     chat_id=user.telegram_id,
                     video=broadcast.message_file_id,
                     caption=broadcast.message_caption,
                     parse_mode='HTML'
                 )
             elif broadcast.message_type == 'document' and broadcast.message_file_id:
-                await self.bot.send_document(
+                sent_message = await self.bot.send_document(
                     chat_id=user.telegram_id,
                     document=broadcast.message_file_id,
                     caption=broadcast.message_caption,
                     parse_mode='HTML'
                 )
             elif broadcast.message_type == 'audio' and broadcast.message_file_id:
-                await self.bot.send_audio(
+                sent_message = await self.bot.send_audio(
                     chat_id=user.telegram_id,
                     audio=broadcast.message_file_id,
                     caption=broadcast.message_caption,
                     parse_mode='HTML'
                 )
             elif broadcast.message_type == 'voice' and broadcast.message_file_id:
-                await self.bot.send_voice(
+                sent_message = await self.bot.send_voice(
                     chat_id=user.telegram_id,
                     voice=broadcast.message_file_id,
                     caption=broadcast.message_caption,
                     parse_mode='HTML'
                 )
             elif broadcast.message_type == 'video_note' and broadcast.message_file_id:
-                await self.bot.send_video_note(
+                sent_message = await self.bot.send_video_note(
                     chat_id=user.telegram_id,
                     video_note=broadcast.message_file_id
                 )
             elif broadcast.message_type == 'animation' and broadcast.message_file_id:
-                await self.bot.send_animation(
+                sent_message = await self.bot.send_animation(
                     chat_id=user.telegram_id,
                     animation=broadcast.message_file_id,
                     caption=broadcast.message_caption,
                     parse_mode='HTML'
                 )
             elif broadcast.message_type == 'sticker' and broadcast.message_file_id:
-                await self.bot.send_sticker(
+                sent_message = await self.bot.send_sticker(
                     chat_id=user.telegram_id,
                     sticker=broadcast.message_file_id
                 )
             elif broadcast.message_type == 'forward' and broadcast.forwarded_from_chat_id and broadcast.forwarded_from_message_id:
-                await self.bot.forward_message(
+                sent_message = await self.bot.forward_message(
                     chat_id=user.telegram_id,
                     from_chat_id=broadcast.forwarded_from_chat_id,
                     message_id=broadcast.forwarded_from_message_id
                 )
             else:
                 raise ValueError(f"Invalid message type or missing data: {broadcast.message_type}")
+            return sent_message
 
         except Exception as e:
             logger.error(f"Error sending message to user {user.telegram_id}: {e}")
@@ -248,44 +397,64 @@ class BroadcastProcessor:
         # Default wait time if pattern not found
         return 60
 
-    async def _send_with_retry(self, user: User, broadcast: BroadcastMessage, max_retries: int = 3):
-        """ارسال پیام با retry در صورت خطا"""
+    def _get_flood_wait_time(self, error: Exception) -> Optional[int]:
+        """زمان انتظار FloodWait، یا None اگر خطا FloodWait نباشد"""
+        if isinstance(error, TelegramRetryAfter):
+            return error.retry_after or self._extract_flood_wait_time(str(error))
+        # 429s that were not mapped to TelegramRetryAfter
+        error_str = str(error)
+        if "too many requests" in error_str.lower() or "retry after" in error_str.lower():
+            return self._extract_flood_wait_time(error_str)
+        return None
+
+    async def _send_with_retry(
+        self,
+        user: User,
+        broadcast: BroadcastMessage,
+        buckets: List[TokenBucket],
+        max_retries: int = 3
+    ) -> Tuple[str, Optional[int]]:
+        """
+        ارسال پیام با retry در صورت خطا
+
+        Every attempt takes a token from each bucket. A FloodWait pauses the
+        shared bucket, so all senders back off together.
+
+        Returns:
+            Tuple of (SEND_OK, SEND_FAILED or SEND_BLOCKED, Telegram message ID if sent)
+        """
         for attempt in range(max_retries):
+            for bucket in buckets:
+                await bucket.acquire()
             try:
-                await self._send_message_to_user(user, broadcast)
-                return True
-            except TelegramRetryAfter as e:
-                # FloodWait - wait and retry
-                wait_time = e.retry_after
-                logger.warning(
-                    f"FloodWait on attempt {attempt + 1}/{max_retries}: waiting {wait_time}s"
-                )
-                await asyncio.sleep(wait_time)
-                continue
+                sent_message = await self._send_message_to_user(user, broadcast)
+                return SEND_OK, sent_message.message_id
             except TelegramForbiddenError as e:
                 # User blocked bot or deactivated
                 logger.debug(f"User {user.telegram_id} blocked the bot or is deactivated")
-                return False
-            except TelegramBadRequest as e:
-                # Bad request (invalid file_id, chat not found, etc.)
+                return SEND_BLOCKED, None
+            except Exception as e:
+                wait_time = self._get_flood_wait_time(e)
+                if wait_time is not None:
+                    # FloodWait - pause every sender and retry
+                    logger.warning(
+                        f"FloodWait on attempt {attempt + 1}/{max_retries}: pausing broadcast for {wait_time}s"
+                    )
+                    self.rate_limiter.pause(wait_time)
+                    continue
+
                 error_str = str(e)
-                if "chat not found" in error_str.lower() or "user not found" in error_str.lower():
+                if isinstance(e, TelegramBadRequest) and (
+                    "chat not found" in error_str.lower() or "user not found" in error_str.lower()
+                ):
+                    # Bad request (invalid file_id, chat not found, etc.)
                     logger.debug(f"User {user.telegram_id} not found")
-                    return False
+                    return SEND_BLOCKED, None
                 elif attempt < max_retries - 1:
-                    logger.warning(f"Bad request on attempt {attempt + 1}/{max_retries}: {e}")
-                    await asyncio.sleep(2)  # Wait 2 seconds before retry
-                    continue
-                else:
-                    raise
-            except Exception as e:
-                # Other errors
-                if attempt < max_retries - 1:
                     logger.warning(f"Error on attempt {attempt + 1}/{max_retries}: {e}")
                     await asyncio.sleep(2)  # Wait 2 seconds before retry
                     continue
                 else:
                     raise
 
-        return False
-
+        return SEND_FAILED, None
@@ -0,0 +1,332 @@
+"""
+Chat-end side effects, processed from a Redis Stream.
+end_chat_confirm publishes a chat_ended event and answers the user right
+away; workers in a consumer group (one per bot process) notify watchers and
+award chat rewards, achievements and badges.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+from typing import Dict, Optional, Set
+import redis.asyncio as redis
+from aiogram import Bot
+
+from config.settings import settings
+from db.database import get_db
+from db.crud import (
+    get_user_by_id,
+    get_chat_end_notifications_for_user,
+    get_coins_for_activity,
+    get_user_chat_count,
+    get_badge_by_key,
+)
+from utils.validators import get_display_name
+
+logger = logging.getLogger(__name__)
+
+CHAT_ENDED_STREAM = "events:chat_ended"
+CHAT_ENDED_GROUP = "chat_ended_workers"
+
+# Events read (and processed concurrently) per worker iteration
+BATCH_SIZE = 20
+# Block on XREADGROUP at most this long, so pending retries are picked up
+READ_BLOCK_MS = 5000
+# Events failing this many times are dropped
+MAX_DELIVERIES = 5
+# Claims of completed side effects are kept this long (retries come much sooner)
+STEP_CLAIM_TTL_SECONDS = 7 * 86400
+
+redis_client: Optional[redis.Redis] = None
+bot_instance: Optional[Bot] = None
+# Events processed in-process without Redis (kept referenced until they finish)
+_local_tasks: Set[asyncio.Task] = set()
+
+
+def set_redis_client(client: redis.Redis):
+    """Set Redis client instance."""
+    global redis_client
+    redis_client = client
+
+
+def set_bot(bot: Bot):
+    """Set bot instance."""
+    global bot_instance
+    bot_instance = bot
+
+
+async def publish_chat_ended(
+    chat_room_id: int,
+    user_id: int,
+    partner_id: Optional[int],
+    chat_successful_male: bool,
+    chat_successful_female: bool
+) -> None:
+    """
+    Publish a chat_ended event.
+
+    Without Redis the event is processed in a background task of this
+    process instead.
+
+    Args:
+        chat_room_id: Ended chat room ID
+        user_id: User ID of the user who ended the chat
+        partner_id: User ID of the partner (None if there was none)
+        chat_successful_male: Both users sent enough messages (male threshold)
+        chat_successful_female: Both users sent enough messages (female threshold)
+    """
+    event = {
+        "chat_room_id": str(chat_room_id),
+        "user_id": str(user_id),
+        "partner_id": str(partner_id or 0),
+        "successful_male": "1" if chat_successful_male else "0",
+        "successful_female": "1" if chat_successful_female else "0",
+    }
+    if redis_client:
+        try:
+            await redis_client.xadd(
+                CHAT_ENDED_STREAM,
+                event,
+                maxlen=settings.CHAT_EVENTS_STREAM_MAXLEN,
+                approximate=True
+            )
+            return
+        except Exception as e:
+            logger.error(f"Error publishing chat_ended event for chat {chat_room_id}: {e}")
+
+    async def process_locally():
+        try:
+            await process_chat_ended(event)
+        except Exception as e:
+            logger.error(f"Error processing chat_ended event for chat {chat_room_id}: {e}", exc_info=True)
+
+    task = asyncio.create_task(process_locally())
+    _local_tasks.add(task)
+    task.add_done_callback(_local_tasks.discard)
+
+
+# ============= Side effects =============
+
+async def _run_once(chat_room_id: int, step: str, func, *args) -> None:
+    """
+    Run a side effect of a chat at most once.
+
+    The step is claimed before it runs: a failed step gives up its claim
+    (and the event is retried), but a worker dying mid-step never makes
+    another worker repeat it.
+    """
+    claim_key = f"chat_ended:{chat_room_id}:{step}"
+    if redis_client:
+        if not await redis_client.set(claim_key, "1", nx=True, ex=STEP_CLAIM_TTL_SECONDS):
+            return
+    try:
+        await func(*args)
+    except Exception:
+        if redis_client:
+            await redis_client.delete(claim_key)
+        raise
+
+
+async def _notify_watchers(db_session, partner) -> None:
+    """Notify users who asked to know when partner's chat ends."""
+    notifications = await get_chat_end_notifications_for_user(db_session, partner.id)
+    if not notifications:
+        return
+
+    gender_map = {"male": "پسر 🧑", "female": "دختر 👩", "other": "سایر"}
+    gender_text = gender_map.get(partner.gender, partner.gender or "تعیین نشده")
+
+    # Generate profile_id if not exists
+    if not partner.profile_id:
+        partner.profile_id = hashlib.md5(f"user_{partner.telegram_id}".encode()).hexdigest()[:12]
+        await db_session.commit()
+        await db_session.refresh(partner)
+
+    notify_msg = f"🔔 چت {get_display_name(partner) or 'کاربر'} تمام شد!\n\n"
+    notify_msg += f"👤 نام: {get_display_name(partner) or 'نامشخص'}\n"
+    notify_msg += f"⚧️ جنسیت: {gender_text}\n"
+    if partner.age:
+        notify_msg += f"🎂 سن: {partner.age}\n"
+    if partner.city:
+        notify_msg += f"🏙️ شهر: {partner.city}\n"
+    notify_msg += f"🆔 ID: /user_{partner.profile_id}\n\n"
+    notify_msg += "اکنون می‌توانید با این کاربر درخواست چت بفرستید."
+
+    for notification in notifications:
+        watcher = await get_user_by_id(db_session, notification.watcher_id)
+        if not watcher:
+            continue
+        try:
+            # Send notification with photo if available
+            if partner.profile_image_url:
+                try:
+                    await bot_instance.send_photo(
+                        watcher.telegram_id,
+                        photo=partner.profile_image_url,
+                        caption=notify_msg
+                    )
+                except Exception:
+                    await bot_instance.send_message(watcher.telegram_id, notify_msg)
+            else:
+                await bot_instance.send_message(watcher.telegram_id, notify_msg)
+        except Exception:
+            # Continue with other notifications even if one fails
+            pass
+
+
+async def _award_chat_success(db_session, target) -> None:
+    """Award chat_success coins to a female user."""
+    from core.event_engine import EventEngine
+    from core.points_manager import PointsManager
+
+    coins_base = await get_coins_for_activity(db_session, "chat_success")
+    if coins_base is None:
+        coins_base = settings.POINTS_CHAT_SUCCESS
+    if not coins_base or coins_base <= 0:
+        return
+
+    actual_coins = await EventEngine.apply_points_multiplier(target.id, coins_base, "chat_success")
+    await PointsManager.award_points(
+        target.id,
+        coins_base,
+        "chat_success",
+        "پاداش چت موفق برای دختران"
+    )
+    try:
+        await bot_instance.send_message(
+            target.telegram_id,
+            f"🎉 چت موفقیت‌آمیز بود!\n\n"
+            f"💰 {int(actual_coins)} سکه به حسابت اضافه شد!\n"
+            f"💡 میتونی سکه هات رو به پریمیوم تبدیل کنی ، با دوستات بازی کنی یا برای چت اختصاصی با دخترا و پسرای باحال استفاده کنی"
+        )
+    except Exception:
+        pass
+
+
+async def _award_chat_achievements(db_session, target) -> None:
+    """Check chat count achievements of a user and award their badges."""
+    from core.achievement_system import AchievementSystem
+    from core.badge_manager import BadgeManager
+
+    chat_count = await get_user_chat_count(db_session, target.id)
+    completed_achievements = await AchievementSystem.check_chat_count_achievement(target.id, chat_count)
+    for achievement in completed_achievements:
+        if achievement.achievement and achievement.achievement.badge_id:
+            badge = await get_badge_by_key(db_session, achievement.achievement.achievement_key)
+            if badge:
+                await BadgeManager.award_badge_and_notify(
+                    target.id,
+                    badge.badge_key,
+                    bot_instance,
+                    target.telegram_id
+                )
+
+
+async def process_chat_ended(event: Dict[str, str]) -> None:
+    """
+    Run the side effects of a chat_ended event (each at most once).
+
+    Args:
+        event: Event fields (as published by publish_chat_ended)
+    """
+    chat_room_id = int(event["chat_room_id"])
+    user_id = int(event["user_id"])
+    partner_id = int(event["partner_id"]) or None
+    chat_successful_male = event["successful_male"] == "1"
+    chat_successful_female = event["successful_female"] == "1"
+
+    async for db_session in get_db():
+        user = await get_user_by_id(db_session, user_id)
+        partner = await get_user_by_id(db_session, partner_id) if partner_id else None
+        participants = [target for target in (user, partner) if target]
+
+        # Notify all users who requested notification for the partner's chat end
+        if partner:
+            await _run_once(chat_room_id, "notify_watchers", _notify_watchers, db_session, partner)
+
+        # Award coins for successful chat
+        if chat_successful_female:
+            for target in participants:
+                if target.gender == "female":
+                    await _run_once(
+                        chat_room_id, f"chat_success:{target.id}", _award_chat_success, db_session, target
+                    )
+
+        # Check and award badges for chat achievements
+        if chat_successful_male:
+            for target in participants:
+                await _run_once(
+                    chat_room_id, f"achievements:{target.id}", _award_chat_achievements, db_session, target
+                )
+        break
+
+
+# ============= Worker =============
+
+async def _handle_message(message_id, fields: dict) -> None:
+    """Process one stream entry and acknowledge it (or drop it after MAX_DELIVERIES)."""
+    event = {
+        (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+        for key, value in fields.items()
+    }
+    try:
+        await process_chat_ended(event)
+    except Exception as e:
+        pending = await redis_client.xpending_range(
+            CHAT_ENDED_STREAM, CHAT_ENDED_GROUP, min=message_id, max=message_id, count=1
+        )
+        deliveries = pending[0]["times_delivered"] if pending else MAX_DELIVERIES
+        if deliveries < MAX_DELIVERIES:
+            # Left pending: claimed again after CHAT_EVENTS_RETRY_AFTER_SECONDS
+            logger.warning(f"Error processing chat_ended event {message_id} (attempt {deliveries}): {e}")
+            return
+        logger.error(f"Dropping chat_ended event {message_id} after {deliveries} attempts: {e}", exc_info=True)
+
+    await redis_client.xack(CHAT_ENDED_STREAM, CHAT_ENDED_GROUP, message_id)
+
+
+async def run_chat_events_worker():
+    """Background worker consuming chat_ended events as a member of the consumer group."""
+    if not redis_client:
+        logger.warning("Chat events worker not started: Redis is not set up")
+        return
+
+    consumer = f"{socket.gethostname()}:{os.getpid()}"
+    retry_after_ms = settings.CHAT_EVENTS_RETRY_AFTER_SECONDS * 1000
+    try:
+        await redis_client.xgroup_create(CHAT_ENDED_STREAM, CHAT_ENDED_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+    logger.info(f"📨 Chat events worker started (consumer {consumer})")
+    last_claim = 0.0
+
+    while True:
+        try:
+            messages = []
+            # Retry events left pending by failed attempts or dead consumers
+            if time.monotonic() - last_claim >= settings.CHAT_EVENTS_RETRY_AFTER_SECONDS:
+                last_claim = time.monotonic()
+                claimed = await redis_client.xautoclaim(
+                    CHAT_ENDED_STREAM, CHAT_ENDED_GROUP, consumer,
+                    min_idle_time=retry_after_ms, start_id="0-0", count=BATCH_SIZE
+                )
+                messages = [(message_id, fields) for message_id, fields in claimed[1] if fields]
+
+            if not messages:
+                response = await redis_client.xreadgroup(
+                    CHAT_ENDED_GROUP, consumer, {CHAT_ENDED_STREAM: ">"},
+                    count=BATCH_SIZE, block=READ_BLOCK_MS
+                )
+                messages = response[0][1] if response else []
+
+            await asyncio.gather(
+                *(_handle_message(message_id, fields) for message_id, fields in messages)
+            )
+
+        except Exception as e:
+            logger.error(f"Error in chat events worker: {e}", exc_info=True)
+            await asyncio.sleep(5)
@@ -2,7 +2,7 @@
 Chat manager for handling chat rooms, message routing, and media forwarding.
 Manages active chat sessions and routes messages between users.
 """
-from typing import Optional, Dict
+from typing import Optional, Dict, AsyncIterator, List
 import redis.asyncio as redis
 
 from db.models import ChatRoom, User
@@ -14,6 +14,54 @@ from db.crud import (
     get_user_by_id,
 )
 from db.database import get_db
+from core.recent_partners import RecentPartners
+
+# TTL of the per-chat state hash (identity + per-user flags)
+CHAT_STATE_TTL = 86400  # 24 hours
+# Per-user flags that chats started before the state hash kept in their own
+# string keys (chat:<flag>:<chat_room_id>:<user_id>); these expire within
+# CHAT_STATE_TTL of the upgrade
+LEGACY_CHAT_FLAGS = ("pref_gender", "cost_deducted", "private_mode", "is_virtual")
+# Message ID logs are kept for deletion requests after the chat ends
+MESSAGE_IDS_TTL = 604800  # 7 days
+# Number of message IDs read from Redis per LRANGE call
+MESSAGE_IDS_BATCH_SIZE = 500
+
+# Reads the user -> chat room mapping and the chat state hash in one call.
+# Returns {chat_room_id, flat HGETALL reply} or nil if the user has no
+# cached chat.
+#
+# KEYS[1] = user -> chat room key
+# ARGV[1] = chat state key prefix ("chat:state")
+CHAT_STATE_SCRIPT = """
+local chat_room_id = redis.call('GET', KEYS[1])
+if not chat_room_id then
+    return nil
+end
+return {chat_room_id, redis.call('HGETALL', ARGV[1] .. ':' .. chat_room_id)}
+"""
+
+# Moves a message ID log written before the list format (a JSON array under
+# chat:message_ids:*) in front of the list, so its older IDs come first.
+# Returns the number of IDs moved.
+#
+# KEYS[1] = legacy JSON key, KEYS[2] = message ID list
+# ARGV[1] = list TTL
+MIGRATE_MESSAGE_IDS_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then
+    return 0
+end
+local message_ids = cjson.decode(raw)
+for i = #message_ids, 1, -1 do
+    redis.call('LPUSH', KEYS[2], message_ids[i])
+end
+redis.call('DEL', KEYS[1])
+if #message_ids > 0 then
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+return #message_ids
+"""
 
 
 class ChatManager:
@@ -27,20 +75,66 @@ class ChatManager:
             redis_client: Redis async client instance
         """
         self.redis = redis_client
-        self.active_chat_prefix = "active:chat"
+        # Chat state hashes (a new name: active:chat:<id> held a string before)
+        self.active_chat_prefix = "chat:state"
+        self._chat_state_script = self.redis.register_script(CHAT_STATE_SCRIPT)
+        self._migrate_message_ids_script = self.redis.register_script(MIGRATE_MESSAGE_IDS_SCRIPT)
+        # Partners of ended chats, read by matchmaking for the no-rematch rule
+        self.recent_partners = RecentPartners(redis_client)
     
     def _get_chat_key(self, chat_room_id: int) -> str:
-        """Get Redis key for chat room."""
+        """Get Redis key for chat room state hash."""
         return f"{self.active_chat_prefix}:{chat_room_id}"
     
+    def _get_user_chat_key(self, user_id: int) -> str:
+        """Get Redis key for user -> chat room mapping."""
+        return f"user:chat:{user_id}"
+    
+    def _get_legacy_flag_key(self, chat_room_id: int, field: str) -> str:
+        """Get the pre-hash string key of a per-user flag field ("<flag>:<user_id>")."""
+        flag, user_id = field.split(":", 1)
+        return f"chat:{flag}:{chat_room_id}:{user_id}"
+    
+    async def _get_chat_field(self, chat_room_id: int, field: str) -> Optional[str]:
+        """Read a single field of the chat state hash (or its legacy key)."""
+        value = await self.redis.hget(self._get_chat_key(chat_room_id), field)
+        if value is None and field.split(":", 1)[0] in LEGACY_CHAT_FLAGS:
+            # Chat started before the state hash
+            value = await self.redis.get(self._get_legacy_flag_key(chat_room_id, field))
+        if value is None:
+            return None
+        return value.decode() if isinstance(value, bytes) else value
+    
+    async def _set_chat_field(self, chat_room_id: int, field: str, value: str) -> None:
+        """Write a single field of the chat state hash (refreshing its TTL)."""
+        chat_key = self._get_chat_key(chat_room_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(chat_key, field, value)
+        pipe.expire(chat_key, CHAT_STATE_TTL)
+        await pipe.execute()
+    
     def _get_message_count_key(self, chat_room_id: int, user_id: int) -> str:
         """Get Redis key for user message count in a chat."""
         return f"chat:message_count:{chat_room_id}:{user_id}"
     
     def _get_message_ids_key(self, chat_room_id: int, user_id: int) -> str:
-        """Get Redis key for storing message IDs for a user in a chat."""
+        """Get Redis key for the message ID log (list) of a user in a chat."""
+        return f"chat:message_log:{chat_room_id}:{user_id}"
+    
+    def _get_legacy_message_ids_key(self, chat_room_id: int, user_id: int) -> str:
+        """Get the pre-list key of the message ID log (a JSON array)."""
         return f"chat:message_ids:{chat_room_id}:{user_id}"
     
+    async def _migrate_message_ids(self, chat_room_id: int, user_id: int) -> None:
+        """Move a legacy JSON message ID log into the list (no-op once moved)."""
+        await self._migrate_message_ids_script(
+            keys=[
+                self._get_legacy_message_ids_key(chat_room_id, user_id),
+                self._get_message_ids_key(chat_room_id, user_id),
+            ],
+            args=[MESSAGE_IDS_TTL]
+        )
+    
     def _get_message_pair_key(self, chat_room_id: int, user_msg_id: int) -> str:
         """Get Redis key for storing message pair mapping (user_msg_id -> partner_msg_id)."""
         return f"chat:msg_pair:{chat_room_id}:{user_msg_id}"
@@ -71,40 +165,38 @@ class ChatManager:
         # Create chat room in database
         chat_room = await create_chat_room(db_session, user1_id, user2_id)
         
-        # Store chat mapping in Redis for fast lookup
-        chat_key = self._get_chat_key(chat_room.id)
-        chat_data = {
+        # Store chat state in one Redis hash for fast lookup:
+        # - preferred genders for coin deduction logic. Always store
+        #   preferred_gender (even if None/"all") so we can check it later,
+        #   "all" is stored explicitly to distinguish from None
+        # - chat cost status (whether coins were deducted at start)
+        # - private mode status (protect_content) for each user (default: False)
+        # - virtual profile flag for user2 (we use real user profiles as
+        #   virtual profiles, so this can't be derived from the user)
+        user1_pref_to_store = user1_preferred_gender if user1_preferred_gender is not None else "all"
+        user2_pref_to_store = user2_preferred_gender if user2_preferred_gender is not None else "all"
+        chat_state = {
             "user1_id": user1_id,
             "user2_id": user2_id,
             "chat_room_id": chat_room.id,
+            f"pref_gender:{user1_id}": user1_pref_to_store,
+            f"pref_gender:{user2_id}": user2_pref_to_store,
+            f"cost_deducted:{user1_id}": "0",
+            f"cost_deducted:{user2_id}": "0",
+            f"private_mode:{user1_id}": "0",
+            f"private_mode:{user2_id}": "0",
         }
-        await self.redis.setex(chat_key, 86400, str(chat_data))  # 24 hours TTL
-        
-        # Store user -> chat room mapping for both users
-        await self.redis.setex(f"user:chat:{user1_id}", 86400, str(chat_room.id))
-        await self.redis.setex(f"user:chat:{user2_id}", 86400, str(chat_room.id))
-        
-        # Store preferred genders for coin deduction logic
-        # Always store preferred_gender (even if None/"all") so we can check it later
-        # Store "all" as explicit string to distinguish from None
-        user1_pref_to_store = user1_preferred_gender if user1_preferred_gender is not None else "all"
-        user2_pref_to_store = user2_preferred_gender if user2_preferred_gender is not None else "all"
-        await self.redis.setex(f"chat:pref_gender:{chat_room.id}:{user1_id}", 86400, user1_pref_to_store)
-        await self.redis.setex(f"chat:pref_gender:{chat_room.id}:{user2_id}", 86400, user2_pref_to_store)
-        
-        # Store chat cost status (whether coins were deducted at start)
-        # This will be set when chat starts
-        await self.redis.setex(f"chat:cost_deducted:{chat_room.id}:{user1_id}", 86400, "0")
-        await self.redis.setex(f"chat:cost_deducted:{chat_room.id}:{user2_id}", 86400, "0")
-        
-        # Store private mode status (protect_content) for each user (default: False)
-        await self.redis.setex(f"chat:private_mode:{chat_room.id}:{user1_id}", 86400, "0")
-        await self.redis.setex(f"chat:private_mode:{chat_room.id}:{user2_id}", 86400, "0")
-        
-        # Store virtual profile flag for user2 (indicates this is a virtual profile chat)
-        # This is important because we use real user profiles as virtual profiles
         if is_virtual_profile:
-            await self.redis.setex(f"chat:is_virtual:{chat_room.id}:{user2_id}", 86400, "1")
+            chat_state[f"is_virtual:{user2_id}"] = "1"
+        
+        # Write state and user -> chat room mappings in one round-trip
+        chat_key = self._get_chat_key(chat_room.id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(chat_key, mapping=chat_state)
+        pipe.expire(chat_key, CHAT_STATE_TTL)
+        pipe.setex(self._get_user_chat_key(user1_id), CHAT_STATE_TTL, str(chat_room.id))
+        pipe.setex(self._get_user_chat_key(user2_id), CHAT_STATE_TTL, str(chat_room.id))
+        await pipe.execute()
         
         return chat_room
     
@@ -115,8 +207,7 @@ class ChatManager:
         deducted: bool = True
     ) -> None:
         """Mark that chat cost was deducted for a user."""
-        cost_key = f"chat:cost_deducted:{chat_room_id}:{user_id}"
-        await self.redis.setex(cost_key, 86400, "1" if deducted else "0")
+        await self._set_chat_field(chat_room_id, f"cost_deducted:{user_id}", "1" if deducted else "0")
     
     async def was_chat_cost_deducted(
         self,
@@ -124,9 +215,8 @@ class ChatManager:
         user_id: int
     ) -> bool:
         """Check if chat cost was deducted for a user."""
-        cost_key = f"chat:cost_deducted:{chat_room_id}:{user_id}"
-        deducted = await self.redis.get(cost_key)
-        return deducted.decode() == "1" if deducted else False
+        deducted = await self._get_chat_field(chat_room_id, f"cost_deducted:{user_id}")
+        return deducted == "1"
     
     async def get_user_preferred_gender(
         self,
@@ -144,13 +234,10 @@ class ChatManager:
         Returns:
             Preferred gender ("male", "female") or None if "all"
         """
-        pref_key = f"chat:pref_gender:{chat_room_id}:{user_id}"
-        pref_gender = await self.redis.get(pref_key)
-        if not pref_gender:
+        pref_gender_str = await self._get_chat_field(chat_room_id, f"pref_gender:{user_id}")
+        if not pref_gender_str:
             return None
         
-        pref_gender_str = pref_gender.decode() if isinstance(pref_gender, bytes) else pref_gender
-        
         # Convert "all" to None, keep "male" and "female" as is
         if pref_gender_str == "all":
             return None
@@ -164,8 +251,7 @@ class ChatManager:
         enabled: bool = True
     ) -> None:
         """Set private mode (protect_content) for a user in a chat room."""
-        private_key = f"chat:private_mode:{chat_room_id}:{user_id}"
-        await self.redis.setex(private_key, 86400, "1" if enabled else "0")
+        await self._set_chat_field(chat_room_id, f"private_mode:{user_id}", "1" if enabled else "0")
     
     async def get_private_mode(
         self,
@@ -173,9 +259,8 @@ class ChatManager:
         user_id: int
     ) -> bool:
         """Get private mode (protect_content) status for a user in a chat room."""
-        private_key = f"chat:private_mode:{chat_room_id}:{user_id}"
-        private_mode = await self.redis.get(private_key)
-        return private_mode.decode() == "1" if private_mode else False
+        private_mode = await self._get_chat_field(chat_room_id, f"private_mode:{user_id}")
+        return private_mode == "1"
     
     async def get_partner_id(
         self,
@@ -193,14 +278,14 @@ class ChatManager:
             Partner's database ID or None
         """
         # First try Redis lookup
-        chat_room_id = await self.redis.get(f"user:chat:{user_id}")
+        chat_room_id = await self.redis.get(self._get_user_chat_key(user_id))
         
         if chat_room_id:
             chat_room_id = int(chat_room_id)
             chat_key = self._get_chat_key(chat_room_id)
-            chat_data = await self.redis.get(chat_key)
+            chat_exists = await self.redis.exists(chat_key)
             
-            if chat_data:
+            if chat_exists:
                 # Parse chat data (simplified, should use JSON)
                 chat_room = await get_active_chat_room_by_user(db_session, user_id)
                 if chat_room:
@@ -265,8 +350,8 @@ class ChatManager:
         # First check Redis flag (fastest)
         chat_room = await get_active_chat_room_by_user(db_session, user_id)
         if chat_room:
-            virtual_flag = await self.redis.get(f"chat:is_virtual:{chat_room.id}:{partner_id}")
-            if virtual_flag and virtual_flag.decode() == "1":
+            virtual_flag = await self._get_chat_field(chat_room.id, f"is_virtual:{partner_id}")
+            if virtual_flag == "1":
                 return True
         
         # Fallback: Check if partner has a VirtualProfile entry
@@ -287,6 +372,66 @@ class ChatManager:
         
         return False
     
+    async def get_chat_state(
+        self,
+        user_id: int
+    ) -> Optional[Dict[str, str]]:
+        """
+        Get the state hash of a user's active chat from Redis only.
+        
+        Unlike is_chat_active, this never falls back to the database, so a
+        None result only means the chat is not cached.
+        
+        Args:
+            user_id: User's database ID
+            
+        Returns:
+            Chat state fields (decoded) or None
+        """
+        result = await self._chat_state_script(
+            keys=[self._get_user_chat_key(user_id)],
+            args=[self.active_chat_prefix]
+        )
+        if not result:
+            return None
+        
+        chat_room_id, flat_state = result
+        state = {}
+        for i in range(0, len(flat_state), 2):
+            field, value = flat_state[i], flat_state[i + 1]
+            field = field.decode() if isinstance(field, bytes) else field
+            state[field] = value.decode() if isinstance(value, bytes) else value
+        
+        if not state or state.get("ended") == "1" or "user1_id" not in state:
+            return None
+        state["chat_room_id"] = chat_room_id.decode() if isinstance(chat_room_id, bytes) else str(chat_room_id)
+        return state
+    
+    async def set_partner_info(
+        self,
+        chat_room_id: int,
+        partner_id: int,
+        partner_telegram_id: int,
+        is_virtual: bool
+    ) -> None:
+        """
+        Cache a chat partner's Telegram ID and virtual flag in the chat state.
+        
+        Args:
+            chat_room_id: Chat room database ID
+            partner_id: Partner's database ID
+            partner_telegram_id: Partner's Telegram ID
+            is_virtual: Whether the partner is a virtual profile in this chat
+        """
+        chat_key = self._get_chat_key(chat_room_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(chat_key, mapping={
+            f"telegram_id:{partner_id}": str(partner_telegram_id),
+            f"is_virtual:{partner_id}": "1" if is_virtual else "0",
+        })
+        pipe.expire(chat_key, CHAT_STATE_TTL)
+        await pipe.execute()
+    
     async def increment_message_count(
         self,
         chat_room_id: int,
@@ -374,27 +519,58 @@ class ChatManager:
         message_id: int
     ) -> None:
         """
-        Add a message ID to the list for a user in a chat room.
+        Append a message ID to the log of a user in a chat room.
+        
+        The log is an append-only Redis list, so each call is O(1).
         
         Args:
             chat_room_id: Chat room database ID
             user_id: User's database ID
             message_id: Telegram message ID
         """
-        import json
         message_ids_key = self._get_message_ids_key(chat_room_id, user_id)
-        # Get existing message IDs
-        existing = await self.redis.get(message_ids_key)
-        if existing:
-            message_ids = json.loads(existing)
-        else:
-            message_ids = []
-        
-        # Add new message ID
-        message_ids.append(message_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(message_ids_key, message_id)
+        pipe.expire(message_ids_key, MESSAGE_IDS_TTL)
+        await pipe.execute()
+    
+    async def iter_message_id_batches(
+        self,
+        chat_room_id: int,
+        user_id: int,
+        batch_size: int = MESSAGE_IDS_BATCH_SIZE
+    ) -> AsyncIterator[List[int]]:
+        """
+        Iterate over the message IDs of a user in a chat room in batches.
         
-        # Save back to Redis
-        await self.redis.setex(message_ids_key, 604800, json.dumps(message_ids))  # 7 days TTL
+        Args:
+            chat_room_id: Chat room database ID
+            user_id: User's database ID
+            batch_size: Number of message IDs per batch
+            
+        Yields:
+            Lists of message IDs, oldest first
+        """
+        await self._migrate_message_ids(chat_room_id, user_id)
+        message_ids_key = self._get_message_ids_key(chat_room_id, user_id)
+        start = 0
+        while True:
+            batch = await self.redis.lrange(message_ids_key, start, start + batch_size - 1)
+            if not batch:
+                return
+            yield [int(message_id) for message_id in batch]
+            if len(batch) < batch_size:
+                return
+            start += batch_size
+    
+    async def count_message_ids(
+        self,
+        chat_room_id: int,
+        user_id: int
+    ) -> int:
+        """Get number of stored message IDs for a user in a chat room."""
+        await self._migrate_message_ids(chat_room_id, user_id)
+        return await self.redis.llen(self._get_message_ids_key(chat_room_id, user_id))
     
     async def get_message_ids(
         self,
@@ -411,12 +587,51 @@ class ChatManager:
         Returns:
             List of message IDs
         """
-        import json
-        message_ids_key = self._get_message_ids_key(chat_room_id, user_id)
-        existing = await self.redis.get(message_ids_key)
-        if existing:
-            return json.loads(existing)
-        return []
+        message_ids = []
+        async for batch in self.iter_message_id_batches(chat_room_id, user_id):
+            message_ids.extend(batch)
+        return message_ids
+    
+    async def get_partner_message_ids(
+        self,
+        chat_room_id: int,
+        user_message_ids: List[int]
+    ) -> List[int]:
+        """
+        Resolve the partner's copies of a user's messages (one MGET).
+        
+        Args:
+            chat_room_id: Chat room database ID
+            user_message_ids: Telegram message IDs in the user's chat
+            
+        Returns:
+            Telegram message IDs in the partner's chat (unknown ones skipped)
+        """
+        if not user_message_ids:
+            return []
+        values = await self.redis.mget([
+            self._get_message_pair_key(chat_room_id, user_msg_id)
+            for user_msg_id in user_message_ids
+        ])
+        partner_message_ids = []
+        for value in values:
+            try:
+                partner_message_ids.append(int(value))
+            except (ValueError, TypeError):
+                pass
+        return partner_message_ids
+    
+    async def clear_message_pairs(
+        self,
+        chat_room_id: int,
+        user_message_ids: List[int]
+    ) -> None:
+        """Delete the message pair mappings of a user's messages."""
+        if user_message_ids:
+            await self.redis.delete(*[
+                self._get_message_pair_key(chat_room_id, user_msg_id)
+                for user_msg_id in user_message_ids
+            ])
     
     async def clear_message_ids(
         self,
@@ -432,12 +647,12 @@ class ChatManager:
             user_id: First user's database ID
             user2_id: Second user's database ID (optional, if None, only clear user_id)
         """
-        message_ids_key1 = self._get_message_ids_key(chat_room_id, user_id)
-        await self.redis.delete(message_ids_key1)
-        
-        if user2_id is not None:
-            message_ids_key2 = self._get_message_ids_key(chat_room_id, user2_id)
-            await self.redis.delete(message_ids_key2)
+        message_ids_keys = []
+        for member_id in (user_id, user2_id):
+            if member_id is not None:
+                message_ids_keys.append(self._get_message_ids_key(chat_room_id, member_id))
+                message_ids_keys.append(self._get_legacy_message_ids_key(chat_room_id, member_id))
+        await self.redis.delete(*message_ids_keys)
     
     async def end_chat(
         self,
@@ -464,31 +679,32 @@ class ChatManager:
         user1_id = chat_room.user1_id
         user2_id = chat_room.user2_id
         
-        # Get message counts before clearing
-        message_counts = await self.get_chat_message_counts(chat_room_id, user1_id, user2_id)
-        
-        # Remove from Redis first (to prevent race conditions)
-        chat_key = self._get_chat_key(chat_room_id)
-        await self.redis.delete(chat_key)
-        await self.redis.delete(f"user:chat:{user1_id}")
-        await self.redis.delete(f"user:chat:{user2_id}")
-        
-        # Clear message counts
-        await self.clear_message_counts(chat_room_id, user1_id, user2_id)
-        
-        # Don't clear message IDs immediately - keep them for user deletion request
-        # They will be cleared after 7 days (TTL) or when user requests deletion
-        
-        # End in database
+        # End in database first, so is_chat_active can't re-cache the
+        # mappings from the database after the Redis cleanup below
+        # (end_chat_room also records the pair for the no-rematch rule)
         success = await end_chat_room(db_session, chat_room_id)
         
-        # Double-check Redis cleanup in case of any issues
-        if success:
-            await self.redis.delete(chat_key)
-            await self.redis.delete(f"user:chat:{user1_id}")
-            await self.redis.delete(f"user:chat:{user2_id}")
-            await self.clear_message_counts(chat_room_id, user1_id, user2_id)
-            # Don't clear message IDs - keep them for user deletion request
+        # Read message counts and clean up Redis in one round-trip.
+        # The state hash is kept (marked as ended) because the per-user flags
+        # are still needed by the end-of-chat logic; it expires with its TTL.
+        # Don't clear message IDs - keep them for user deletion request.
+        # They will be cleared after 7 days (TTL) or when user requests deletion
+        count_key1 = self._get_message_count_key(chat_room_id, user1_id)
+        count_key2 = self._get_message_count_key(chat_room_id, user2_id)
+        pipe = self.redis.pipeline(transaction=True)
+        chat_key = self._get_chat_key(chat_room_id)
+        pipe.mget(count_key1, count_key2)
+        pipe.hset(chat_key, "ended", "1")
+        # The hash may have expired already: don't recreate it without a TTL
+        pipe.expire(chat_key, CHAT_STATE_TTL)
+        pipe.delete(
+            self._get_user_chat_key(user1_id),
+            self._get_user_chat_key(user2_id),
+            count_key1,
+            count_key2,
+        )
+        counts = (await pipe.execute())[0]
+        message_counts = tuple(int(count) if count else 0 for count in counts)
         
         # Return success and message counts for notification
         return success, message_counts
@@ -509,7 +725,7 @@ class ChatManager:
             True if user has active chat
         """
         # First check Redis (fast)
-        chat_room_id = await self.redis.get(f"user:chat:{user_id}")
+        chat_room_id = await self.redis.get(self._get_user_chat_key(user_id))
         if chat_room_id:
             # Verify in database that chat is still active
             try:
@@ -519,18 +735,37 @@ class ChatManager:
                     return True
                 else:
                     # Chat room not active, clean up Redis
-                    await self.redis.delete(f"user:chat:{user_id}")
+                    await self.redis.delete(self._get_user_chat_key(user_id))
             except (ValueError, TypeError):
                 # Invalid chat_room_id, clean up Redis
-                await self.redis.delete(f"user:chat:{user_id}")
+                await self.redis.delete(self._get_user_chat_key(user_id))
         
         # Database check
         chat_room = await get_active_chat_room_by_user(db_session, user_id)
         if chat_room:
-            # Chat exists in DB, update Redis cache
+            # Chat exists in DB, update Redis cache (keeping any stored flags)
             chat_key = self._get_chat_key(chat_room.id)
-            await self.redis.setex(chat_key, 3600, "1")  # Cache for 1 hour
-            await self.redis.setex(f"user:chat:{user_id}", 3600, str(chat_room.id))
+            # Carry over the flags of a chat started before the state hash
+            legacy_fields = [
+                f"{flag}:{member_id}"
+                for flag in LEGACY_CHAT_FLAGS
+                for member_id in (chat_room.user1_id, chat_room.user2_id)
+            ]
+            legacy_values = await self.redis.mget([
+                self._get_legacy_flag_key(chat_room.id, field) for field in legacy_fields
+            ])
+            pipe = self.redis.pipeline(transaction=True)
+            for field, value in zip(legacy_fields, legacy_values):
+                if value is not None:
+                    pipe.hsetnx(chat_key, field, value)
+            pipe.hset(chat_key, mapping={
+                "user1_id": chat_room.user1_id,
+                "user2_id": chat_room.user2_id,
+                "chat_room_id": chat_room.id,
+            })
+            pipe.expire(chat_key, CHAT_STATE_TTL)
+            pipe.setex(self._get_user_chat_key(user_id), 3600, str(chat_room.id))  # Cache for 1 hour
+            await pipe.execute()
             return True
         
         return False
@@ -564,12 +799,16 @@ class ChatManager:
         )
         
         if success:
-            # Update Redis cache
+            # Update Redis cache with video call info
             chat_key = self._get_chat_key(chat_room_id)
-            chat_data = await self.redis.get(chat_key)
-            if chat_data:
-                # Update with video call info (should use JSON properly)
-                await self.redis.setex(chat_key, 86400, str(chat_data))
+            if await self.redis.exists(chat_key):
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.hset(chat_key, mapping={
+                    "video_call_room_id": video_call_room_id,
+                    "video_call_link": video_call_link,
+                })
+                pipe.expire(chat_key, CHAT_STATE_TTL)
+                await pipe.execute()
         
         return success
 
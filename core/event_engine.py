@@ -150,6 +150,9 @@ class EventEngine:
             await db_session.commit()
             await db_session.refresh(user)
             
+            from core.user_context import invalidate_user_context
+            await invalidate_user_context(user.telegram_id)
+            
             # Create premium subscription record
             await create_premium_subscription(
                 db_session,
@@ -288,6 +291,9 @@ class EventEngine:
                         user.premium_expires_at = new_expires_at
                         await db_session.commit()
                         
+                        from core.user_context import invalidate_user_context
+                        await invalidate_user_context(user.telegram_id)
+                        
                         # Create subscription record
                         from db.crud import create_premium_subscription
                         await create_premium_subscription(
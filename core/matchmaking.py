@@ -5,15 +5,337 @@ Handles user queues, matching, and queue count tracking.
 Also provides an in-memory implementation for low-traffic setups where
 we want extremely fast matching without depending on Redis for the queue.
 """
+import asyncio
 import json
 import random
 import time
 from dataclasses import dataclass
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterable, Tuple, Set
 
 import redis.asyncio as redis
 
 from config.settings import settings
+from core.recent_partners import RecentPartners
+
+# Genders used for compatibility index buckets; anything else lands in "other"
+INDEX_GENDERS = ("male", "female", "other")
+# Width (in years) of the age-band buckets of the compatibility index
+AGE_BAND_WIDTH = 5
+# Maximum age difference allowed by the "same age" filter
+SAME_AGE_RANGE = 3
+
+
+# Server-side matching: reads the candidate buckets, skips blocked/claimed
+# users and recent partners (no-rematch rule), applies the same checks as is_compatible_pair and atomically removes
+# both users from every queue/index set they joined. Returns {user, partner}
+# or nil. Candidate keys are passed in ARGV, so this expects a single
+# (non-cluster) Redis instance, like the rest of the matchmaking keys.
+#
+# KEYS[1] = requester data key, KEYS[2] = requester blocked set,
+# KEYS[3] = joined_at index, KEYS[4] = requester recent partners set
+# ARGV[1] = requester id, ARGV[2] = user data key prefix ("matchmaking:user:"),
+# ARGV[3] = JSON list of key lists to SINTER, ARGV[4] = SAME_AGE_RANGE,
+# ARGV[5] = no-rematch cutoff timestamp ('' when the rule is disabled)
+CLAIM_MATCH_SCRIPT = """
+local function field(data, name)
+    local value = data[name]
+    if value == cjson.null then
+        return nil
+    end
+    return value
+end
+
+local function truthy(value)
+    return value ~= nil and value ~= false and value ~= 0 and value ~= ''
+end
+
+local function matches_filters(requester, candidate)
+    if truthy(field(requester, 'filter_same_age')) then
+        local req_age, cand_age = field(requester, 'age'), field(candidate, 'age')
+        if req_age == nil or cand_age == nil then
+            return false
+        end
+        if math.abs(req_age - cand_age) > tonumber(ARGV[4]) then
+            return false
+        end
+    end
+    for _, name in ipairs({'city', 'province'}) do
+        if truthy(field(requester, 'filter_same_' .. name)) then
+            local req_value, cand_value = field(requester, name), field(candidate, name)
+            if not truthy(req_value) or not truthy(cand_value) or req_value ~= cand_value then
+                return false
+            end
+        end
+    end
+    return true
+end
+
+local function wants(requester, candidate)
+    local preferred_gender = field(requester, 'preferred_gender')
+    if truthy(preferred_gender) and preferred_gender ~= 'all'
+        and field(candidate, 'gender') ~= preferred_gender then
+        return false
+    end
+    local preferred_city = field(requester, 'preferred_city')
+    if truthy(preferred_city) and field(candidate, 'city') ~= preferred_city then
+        return false
+    end
+    local candidate_age = field(candidate, 'age')
+    if truthy(candidate_age) then
+        local min_age, max_age = field(requester, 'min_age'), field(requester, 'max_age')
+        if truthy(min_age) and candidate_age < min_age then
+            return false
+        end
+        if truthy(max_age) and candidate_age > max_age then
+            return false
+        end
+    end
+    return matches_filters(requester, candidate)
+end
+
+local function remove_from_indexes(member, data)
+    local index_keys = field(data, 'index_keys') or {}
+    for _, key in ipairs(index_keys) do
+        redis.call('SREM', key, member)
+    end
+    redis.call('ZREM', KEYS[3], member)
+end
+
+local function is_recent_partner(member)
+    if ARGV[5] == '' then
+        return false
+    end
+    local ended_at = redis.call('ZSCORE', KEYS[4], member)
+    return ended_at and tonumber(ended_at) >= tonumber(ARGV[5])
+end
+
+local raw = redis.call('GET', KEYS[1])
+if not raw or not redis.call('ZSCORE', KEYS[3], ARGV[1]) then
+    -- Requester left the queue or was already claimed by another worker
+    return nil
+end
+local user = cjson.decode(raw)
+
+local seen = {}
+local candidates = {}
+for _, keys in ipairs(cjson.decode(ARGV[3])) do
+    local members
+    if #keys == 1 then
+        members = redis.call('SMEMBERS', keys[1])
+    else
+        members = redis.call('SINTER', unpack(keys))
+    end
+    for _, member in ipairs(members) do
+        if member ~= ARGV[1] and not seen[member] then
+            seen[member] = true
+            if redis.call('SISMEMBER', KEYS[2], member) == 0 and not is_recent_partner(member) then
+                local candidate_raw = redis.call('GET', ARGV[2] .. member)
+                local joined_at = redis.call('ZSCORE', KEYS[3], member)
+                if candidate_raw and joined_at then
+                    table.insert(candidates, {member, cjson.decode(candidate_raw), tonumber(joined_at)})
+                elseif not candidate_raw then
+                    -- Stale entry whose data expired
+                    for _, key in ipairs(keys) do
+                        redis.call('SREM', key, member)
+                    end
+                    redis.call('ZREM', KEYS[3], member)
+                end
+            end
+        end
+    end
+end
+
+table.sort(candidates, function(a, b) return a[3] < b[3] end)
+for _, entry in ipairs(candidates) do
+    local candidate = entry[2]
+    if wants(user, candidate) and wants(candidate, user) then
+        remove_from_indexes(ARGV[1], user)
+        remove_from_indexes(entry[1], candidate)
+        return {ARGV[1], entry[1]}
+    end
+end
+return nil
+"""
+
+# Claim an already chosen pair: succeeds only if both users are still queued
+# (not claimed by another worker) and removes both from their sets.
+#
+# KEYS[1], KEYS[2] = user data keys, KEYS[3] = joined_at index
+# ARGV[1], ARGV[2] = user ids
+CLAIM_PAIR_SCRIPT = """
+local profiles = {}
+for i = 1, 2 do
+    local raw = redis.call('GET', KEYS[i])
+    if not raw or not redis.call('ZSCORE', KEYS[3], ARGV[i]) then
+        return 0
+    end
+    profiles[i] = cjson.decode(raw)
+end
+for i = 1, 2 do
+    local index_keys = profiles[i]['index_keys']
+    if index_keys and index_keys ~= cjson.null then
+        for _, key in ipairs(index_keys) do
+            redis.call('SREM', key, ARGV[i])
+        end
+    end
+    redis.call('ZREM', KEYS[3], ARGV[i])
+end
+return 1
+"""
+
+
+def _index_gender(gender: Optional[str]) -> str:
+    """Normalize a gender value to one of the index buckets."""
+    return gender if gender in INDEX_GENDERS else "other"
+
+
+def _index_preference(preferred_gender: Optional[str]) -> str:
+    """Normalize a gender preference to an index bucket ("any" when unset)."""
+    if not preferred_gender or preferred_gender == "all":
+        return "any"
+    return _index_gender(preferred_gender)
+
+
+def matches_filters(requester: Dict, candidate: Dict) -> bool:
+    """Check advanced filters such as same age/city/province."""
+    # Same age filter (±3 years)
+    if requester.get("filter_same_age"):
+        req_age = requester.get("age")
+        cand_age = candidate.get("age")
+        if req_age is None or cand_age is None:
+            return False
+        if abs(req_age - cand_age) > SAME_AGE_RANGE:
+            return False
+    
+    # Same city filter
+    if requester.get("filter_same_city"):
+        req_city = requester.get("city")
+        cand_city = candidate.get("city")
+        if not req_city or not cand_city or req_city != cand_city:
+            return False
+    
+    # Same province filter
+    if requester.get("filter_same_province"):
+        req_province = requester.get("province")
+        cand_province = candidate.get("province")
+        if not req_province or not cand_province or req_province != cand_province:
+            return False
+    
+    return True
+
+
+def wants_candidate(requester: Dict, candidate: Dict) -> bool:
+    """
+    Check whether requester accepts candidate as a partner.
+    
+    Covers the requester's gender preference, explicit preferred city,
+    age range and advanced filters. Use both directions for a full check.
+    """
+    preferred_gender = requester.get("preferred_gender")
+    if preferred_gender and preferred_gender != "all":
+        if candidate.get("gender") != preferred_gender:
+            return False
+    
+    # City filter (optional explicit preferred city)
+    preferred_city = requester.get("preferred_city")
+    if preferred_city and candidate.get("city") != preferred_city:
+        return False
+    
+    # Age filter (optional)
+    candidate_age = candidate.get("age")
+    if candidate_age:
+        min_age = requester.get("min_age")
+        max_age = requester.get("max_age")
+        if min_age and candidate_age < min_age:
+            return False
+        if max_age and candidate_age > max_age:
+            return False
+    
+    return matches_filters(requester, candidate)
+
+
+def is_compatible_pair(user_data: Dict, candidate_data: Dict) -> bool:
+    """Check bidirectional compatibility of two queued users."""
+    return wants_candidate(user_data, candidate_data) and wants_candidate(candidate_data, user_data)
+
+
+def _candidate_buckets(user_data: Dict) -> List[Tuple[str, str]]:
+    """Get the (gender, preference) index buckets that can hold partners for a user."""
+    preferred_gender = user_data.get("preferred_gender")
+    if preferred_gender and preferred_gender != "all":
+        candidate_genders = [_index_gender(preferred_gender)]
+    else:
+        candidate_genders = list(INDEX_GENDERS)
+    # Candidate must want the user's gender or accept anyone
+    candidate_preferences = [_index_gender(user_data.get("gender")), "any"]
+    return [(gender, preference) for gender in candidate_genders for preference in candidate_preferences]
+
+
+def build_pairs(
+    profiles: List[Dict],
+    blocked_ids: Dict[int, Set[int]],
+    max_pairs: Optional[int] = None,
+) -> List[Tuple[int, int]]:
+    """
+    Compute a maximal pairing of queued users in memory.
+    
+    Users are processed oldest first and each one takes the longest-waiting
+    compatible partner still free, so nobody compatible is left unpaired and
+    long waits are served first.
+    
+    Args:
+        profiles: Queue profiles ordered by joined_at (oldest first)
+        blocked_ids: user_id -> ids the user must not be matched with
+        max_pairs: Stop after this many pairs (None for no limit)
+        
+    Returns:
+        List of (user_id, partner_id) tuples
+    """
+    # Same bucketing as the Redis index, keeping joined_at order per bucket
+    buckets: Dict[Tuple[str, str], List[Dict]] = {}
+    for profile in profiles:
+        bucket = (_index_gender(profile.get("gender")), _index_preference(profile.get("preferred_gender")))
+        buckets.setdefault(bucket, []).append(profile)
+    
+    heads: Dict[Tuple[str, str], int] = {}
+    paired: Set[int] = set()
+    pairs: List[Tuple[int, int]] = []
+    for user_data in profiles:
+        if max_pairs is not None and len(pairs) >= max_pairs:
+            break
+        user_id = user_data["user_id"]
+        if user_id in paired:
+            continue
+        user_blocked = blocked_ids.get(user_id, set())
+        
+        best = None
+        for bucket in _candidate_buckets(user_data):
+            queue = buckets.get(bucket, [])
+            # Skip users paired earlier so the oldest free one is at the head
+            head = heads.get(bucket, 0)
+            while head < len(queue) and queue[head]["user_id"] in paired:
+                head += 1
+            heads[bucket] = head
+            for index in range(head, len(queue)):
+                candidate_data = queue[index]
+                if best and candidate_data.get("joined_at", 0) >= best.get("joined_at", 0):
+                    # Buckets are ordered, nothing older left in this one
+                    break
+                candidate_id = candidate_data["user_id"]
+                if candidate_id == user_id or candidate_id in paired or candidate_id in user_blocked:
+                    continue
+                if user_id in blocked_ids.get(candidate_id, ()):
+                    continue
+                if is_compatible_pair(user_data, candidate_data):
+                    best = candidate_data
+                    break
+        
+        if best:
+            paired.add(user_id)
+            paired.add(best["user_id"])
+            pairs.append((user_id, best["user_id"]))
+    
+    return pairs
 
 
 class MatchmakingQueue:
@@ -31,6 +353,16 @@ class MatchmakingQueue:
         self.user_data_prefix = "matchmaking:user"
         self.active_chats_prefix = "active:chats"
         self.blocked_users_prefix = "matchmaking:blocked"
+        self.index_prefix = "matchmaking:index"
+        # Sorted set of queued users scored by joined_at (FIFO order)
+        self.joined_index_key = f"{self.index_prefix}:joined"
+        self._claim_match_script = self.redis.register_script(CLAIM_MATCH_SCRIPT)
+        self._claim_pair_script = self.redis.register_script(CLAIM_PAIR_SCRIPT)
+        # Partners of recently ended chats (no-rematch rule), written by db.crud.end_chat_room
+        self.recent_partners = RecentPartners(redis_client)
+        # Pub/sub channel notified whenever a user joins the queue
+        self.wakeup_channel = "matchmaking:wakeup"
+        self._wakeup_pubsub = None
     
     def _get_queue_key(self, gender: Optional[str] = None, city: Optional[str] = None) -> str:
         """
@@ -56,6 +388,103 @@ class MatchmakingQueue:
         """Get Redis key for user matchmaking data."""
         return f"{self.user_data_prefix}:{user_id}"
     
+    def _get_bucket_key(self, gender: str, preference: str) -> str:
+        """Get index key for users of a gender with a given gender preference."""
+        return f"{self.index_prefix}:gender:{gender}:pref:{preference}"
+    
+    def _get_city_index_key(self, city: str) -> str:
+        """Get index key for users from a city."""
+        return f"{self.index_prefix}:city:{city}"
+    
+    def _get_province_index_key(self, province: str) -> str:
+        """Get index key for users from a province."""
+        return f"{self.index_prefix}:province:{province}"
+    
+    def _get_age_band_key(self, band: int) -> str:
+        """Get index key for users in an age band (see AGE_BAND_WIDTH)."""
+        return f"{self.index_prefix}:age:{band}"
+    
+    def _get_queue_keys(self, user_data: Dict) -> List[str]:
+        """Get the filter queue keys a user joins (see add_user_to_queue)."""
+        queue_keys = []
+        if user_data.get("preferred_gender"):
+            queue_keys.append(self._get_queue_key(
+                gender=user_data.get("preferred_gender"),
+                city=user_data.get("preferred_city"),
+            ))
+        queue_keys.append(self._get_queue_key())
+        return queue_keys
+    
+    def _get_index_keys(self, user_data: Dict) -> List[str]:
+        """Get all compatibility index sets a queued user belongs to."""
+        index_keys = [
+            self._get_bucket_key(
+                _index_gender(user_data.get("gender")),
+                _index_preference(user_data.get("preferred_gender")),
+            )
+        ]
+        if user_data.get("city"):
+            index_keys.append(self._get_city_index_key(user_data["city"]))
+        if user_data.get("province"):
+            index_keys.append(self._get_province_index_key(user_data["province"]))
+        if user_data.get("age") is not None:
+            index_keys.append(self._get_age_band_key(int(user_data["age"]) // AGE_BAND_WIDTH))
+        return index_keys
+    
+    def _get_candidate_queries(self, user_data: Dict) -> Optional[List[List[str]]]:
+        """
+        Build the index intersections that can hold compatible candidates.
+        
+        Each entry is a list of keys to SINTER; the union of all results is a
+        superset of compatible candidates (exact checks run on the profiles).
+        
+        Returns:
+            List of key lists, or None if the user's own filters can't be met
+        """
+        location_keys = []
+        if user_data.get("filter_same_city"):
+            if not user_data.get("city"):
+                return None
+            location_keys.append(self._get_city_index_key(user_data["city"]))
+        if user_data.get("preferred_city"):
+            location_keys.append(self._get_city_index_key(user_data["preferred_city"]))
+        if user_data.get("filter_same_province"):
+            if not user_data.get("province"):
+                return None
+            location_keys.append(self._get_province_index_key(user_data["province"]))
+        
+        age_band_keys: List[Optional[str]] = [None]
+        if user_data.get("filter_same_age"):
+            age = user_data.get("age")
+            if age is None:
+                return None
+            first_band = (int(age) - SAME_AGE_RANGE) // AGE_BAND_WIDTH
+            last_band = (int(age) + SAME_AGE_RANGE) // AGE_BAND_WIDTH
+            age_band_keys = [self._get_age_band_key(band) for band in range(first_band, last_band + 1)]
+        
+        queries = []
+        for gender, preference in _candidate_buckets(user_data):
+            bucket_key = self._get_bucket_key(gender, preference)
+            for age_band_key in age_band_keys:
+                keys = [bucket_key] + location_keys
+                if age_band_key:
+                    keys.append(age_band_key)
+                queries.append(keys)
+        return queries
+    
+    async def _remove_from_indexes(self, users: Iterable[Dict]) -> None:
+        """Remove users from queues and compatibility indexes (keeps user data)."""
+        pipe = self.redis.pipeline(transaction=False)
+        for user_data in users:
+            user_id = user_data["user_id"]
+            index_keys = user_data.get("index_keys") or (
+                self._get_queue_keys(user_data) + self._get_index_keys(user_data)
+            )
+            for key in index_keys:
+                pipe.srem(key, user_id)
+            pipe.zrem(self.joined_index_key, user_id)
+        await pipe.execute()
+    
     async def add_user_to_queue(
         self,
         user_id: int,
@@ -106,6 +535,8 @@ class MatchmakingQueue:
             "filter_same_province": filter_same_province,
             "province": province,
         }
+        # Remember the sets the user joins so removal (also server-side) is exact
+        user_data["index_keys"] = self._get_queue_keys(user_data) + self._get_index_keys(user_data)
         
         user_data_key = self._get_user_data_key(user_id)
         
@@ -132,22 +563,16 @@ class MatchmakingQueue:
             stored_user_data = json.loads(stored_data)
             logger.info(f"DEBUG: Verified stored data for user {user_id}: preferred_gender = {stored_user_data.get('preferred_gender')}, type = {type(stored_user_data.get('preferred_gender'))}")
         
-        # Add to appropriate queues based on what the user is looking for
-        queues_to_join = []
-        
-        # If user has gender preference, add to that gender's queue
-        if preferred_gender:
-            queue_key = self._get_queue_key(gender=preferred_gender, city=preferred_city)
-            queues_to_join.append(queue_key)
-        
-        # Also add to general queue
-        general_queue = self._get_queue_key()
-        queues_to_join.append(general_queue)
-        
-        # Add user to all relevant queues
-        for queue_key in queues_to_join:
-            await self.redis.sadd(queue_key, user_id)
-            await self.redis.expire(queue_key, settings.MATCHMAKING_TIMEOUT_SECONDS)
+        # Add to the filter queues (preferred gender queue + general queue)
+        # and to the compatibility index used by find_match
+        pipe = self.redis.pipeline(transaction=False)
+        for key in user_data["index_keys"]:
+            pipe.sadd(key, user_id)
+            pipe.expire(key, settings.MATCHMAKING_TIMEOUT_SECONDS)
+        pipe.zadd(self.joined_index_key, {user_id: user_data["joined_at"]})
+        # Wake up matchmaking workers so the new user is matched right away
+        pipe.publish(self.wakeup_channel, user_id)
+        await pipe.execute()
         
         return True
     
@@ -161,10 +586,14 @@ class MatchmakingQueue:
         Returns:
             True if removed successfully
         """
-        # Get all queue keys
-        pattern = f"{self.queue_prefix}:*"
-        async for queue_key in self.redis.scan_iter(match=pattern):
-            await self.redis.srem(queue_key, user_id)
+        user_data = await self.get_user_data(user_id)
+        if user_data:
+            await self._remove_from_indexes([user_data])
+        else:
+            # Data already expired: drop what we can, stale index entries
+            # are cleaned up lazily by find_match
+            await self.redis.srem(self._get_queue_key(), user_id)
+            await self.redis.zrem(self.joined_index_key, user_id)
         
         # Remove user data
         user_data_key = self._get_user_data_key(user_id)
@@ -205,152 +634,230 @@ class MatchmakingQueue:
         """
         Find a match for a user.
         
+        Only the compatibility index buckets that can satisfy the user's
+        filters are read, and candidate profiles are fetched with one MGET,
+        so the cost grows with compatible candidates, not queue size.
+        Longest-waiting candidates are preferred.
+        
         Args:
             user_id: Telegram user ID
             
         Returns:
             Matched user ID or None
         """
+        if settings.MATCHMAKING_ATOMIC_CLAIM:
+            pair = await self.claim_match(user_id)
+            return pair[1] if pair else None
+        
         user_data = await self.get_user_data(user_id)
         if not user_data:
             return None
         
-        preferred_gender = user_data.get("preferred_gender")
-        preferred_city = user_data.get("preferred_city")
-        min_age = user_data.get("min_age")
-        max_age = user_data.get("max_age")
-        user_gender = user_data.get("gender")
-        
-        # Get all unique users in all queues
-        pattern = f"{self.user_data_prefix}:*"
-        all_candidates = set()
+        queries = self._get_candidate_queries(user_data)
+        if not queries:
+            return None
         
-        async for key in self.redis.scan_iter(match=pattern):
-            # Handle both bytes and string keys
-            if isinstance(key, bytes):
-                key_str = key.decode()
+        # Read all candidate buckets and the block list in one round-trip
+        pipe = self.redis.pipeline(transaction=False)
+        for keys in queries:
+            if len(keys) == 1:
+                pipe.smembers(keys[0])
             else:
-                key_str = str(key)
-            
-            candidate_id_str = key_str.split(":")[-1]
-            try:
-                candidate_id = int(candidate_id_str)
-                if candidate_id != user_id:
-                    all_candidates.add(candidate_id)
-            except ValueError:
-                continue
+                pipe.sinter(keys)
+        pipe.smembers(self._get_blocked_users_key(user_id))
+        results = await pipe.execute()
         
-        if not all_candidates:
+        blocked_ids = {int(member) for member in results[-1]}
+        candidate_ids = set()
+        for members in results[:-1]:
+            candidate_ids.update(int(member) for member in members)
+        candidate_ids.discard(user_id)
+        candidate_ids -= blocked_ids
+        # No-rematch rule: skip partners of recently ended chats
+        candidate_ids -= (await self.recent_partners.get_recent_partner_ids([user_id]))[user_id]
+        
+        if not candidate_ids:
             return None
         
-        # Helper to check advanced filters
-        def matches_filters(requester: Dict, candidate: Dict) -> bool:
-            """Check advanced filters such as same age/city/province."""
-            # Same age filter (±3 years)
-            if requester.get("filter_same_age"):
-                req_age = requester.get("age")
-                cand_age = candidate.get("age")
-                if req_age is None or cand_age is None:
-                    return False
-                if abs(req_age - cand_age) > 3:
-                    return False
-            
-            # Same city filter
-            if requester.get("filter_same_city"):
-                req_city = requester.get("city")
-                cand_city = candidate.get("city")
-                if not req_city or not cand_city or req_city != cand_city:
-                    return False
-            
-            # Same province filter
-            if requester.get("filter_same_province"):
-                req_province = requester.get("province")
-                cand_province = candidate.get("province")
-                if not req_province or not cand_province or req_province != cand_province:
-                    return False
-            
-            return True
+        candidate_ids = list(candidate_ids)
+        raw_profiles = await self.redis.mget(
+            [self._get_user_data_key(candidate_id) for candidate_id in candidate_ids]
+        )
         
-        # Try to find a matching candidate
-        for candidate_id in all_candidates:
-            candidate_data = await self.get_user_data(candidate_id)
-            if not candidate_data:
-                continue
-            
-            # Check if candidate is blocked (rejected/ended chat before)
-            if await self.is_user_blocked(user_id, candidate_id):
-                continue
-            
-            # Check bidirectional matching:
-            # 1. User wants candidate's gender (or all)
-            # 2. Candidate wants user's gender (or all)
-            
-            candidate_gender = candidate_data.get("gender")
-            candidate_preferred_gender = candidate_data.get("preferred_gender")
-            
-            # Check if user wants candidate's gender
-            user_wants_candidate = True
-            if preferred_gender:
-                # User has a gender preference
-                if preferred_gender == "all":
-                    user_wants_candidate = True  # User accepts all
-                else:
-                    user_wants_candidate = (candidate_gender == preferred_gender)
-            else:
-                # No preference, accept all
-                user_wants_candidate = True
-            
-            # Check if candidate wants user's gender
-            candidate_wants_user = True
-            if candidate_preferred_gender:
-                # Candidate has a gender preference
-                if candidate_preferred_gender == "all":
-                    candidate_wants_user = True  # Candidate accepts all
-                else:
-                    candidate_wants_user = (user_gender == candidate_preferred_gender)
-            else:
-                # No preference, accept all
-                candidate_wants_user = True
-            
-            # Both must want each other (or accept all)
-            if not (user_wants_candidate and candidate_wants_user):
-                continue
-            
-            # City filter (optional explicit preferred city)
-            if preferred_city and candidate_data.get("city") != preferred_city:
-                continue
-            
-            # Age filter (optional)
-            candidate_age = candidate_data.get("age")
-            if candidate_age:
-                if min_age and candidate_age < min_age:
-                    continue
-                if max_age and candidate_age > max_age:
-                    continue
-            
-            # Apply advanced filters (both directions)
-            if not matches_filters(user_data, candidate_data):
+        candidates = []
+        stale_ids = []
+        for candidate_id, raw in zip(candidate_ids, raw_profiles):
+            if not raw:
+                stale_ids.append(candidate_id)
                 continue
-            if not matches_filters(candidate_data, user_data):
+            if isinstance(raw, bytes):
+                raw = raw.decode('utf-8')
+            candidates.append(json.loads(raw))
+        
+        if stale_ids:
+            # Profiles expired without remove_user_from_queue: clean the buckets we read
+            pipe = self.redis.pipeline(transaction=False)
+            for key in {key for keys in queries for key in keys}:
+                pipe.srem(key, *stale_ids)
+            pipe.zrem(self.joined_index_key, *stale_ids)
+            await pipe.execute()
+        
+        candidates.sort(key=lambda data: data.get("joined_at") or 0)
+        for candidate_data in candidates:
+            if not is_compatible_pair(user_data, candidate_data):
                 continue
             
             # Match found!
             # IMPORTANT: Don't remove user data yet - we need it in connect_users
-            # Just remove from queues, but keep user data for now
-            # We'll remove user data after connect_users is done
+            # Just remove from queues and indexes, we'll remove user data after
+            # connect_users is done
+            await self._remove_from_indexes([user_data, candidate_data])
             
-            # Remove from queues (but keep user data)
-            pattern = f"{self.queue_prefix}:*"
-            async for queue_key in self.redis.scan_iter(match=pattern):
-                await self.redis.srem(queue_key, user_id)
-                await self.redis.srem(queue_key, candidate_id)
+            return candidate_data["user_id"]
+        
+        return None
+    
+    async def claim_match(self, user_id: int) -> Optional[Tuple[int, int]]:
+        """
+        Find and claim a match for a user in a single server-side call.
+        
+        Candidate filtering, the block list check and removal of both users
+        from their queues run atomically in a Lua script (EVALSHA), so two
+        workers can never claim the same candidate. Like find_match, user
+        data is kept until connect_users is done.
+        
+        Args:
+            user_id: Telegram user ID
             
-            # Note: We don't delete user_data_key here - it will be deleted after connect_users
-            # This way, connect_users can still access the user data
+        Returns:
+            (user_id, partner_id) tuple or None
+        """
+        user_data = await self.get_user_data(user_id)
+        if not user_data:
+            return None
+        
+        queries = self._get_candidate_queries(user_data)
+        if not queries:
+            return None
+        
+        result = await self._claim_match_script(
+            keys=[
+                self._get_user_data_key(user_id),
+                self._get_blocked_users_key(user_id),
+                self.joined_index_key,
+                self.recent_partners._get_key(user_id),
+            ],
+            args=[
+                user_id,
+                f"{self.user_data_prefix}:",
+                json.dumps(queries),
+                SAME_AGE_RANGE,
+                time.time() - self.recent_partners.window_seconds if settings.ENABLE_NO_REMATCH_RULE else "",
+            ],
+        )
+        if not result:
+            return None
+        
+        return int(result[0]), int(result[1])
+    
+    async def claim_pair(self, user_id: int, partner_id: int) -> bool:
+        """
+        Atomically remove an already chosen pair from the queues.
+        
+        Fails if either user left the queue or was claimed by another worker
+        in the meantime. User data is kept for connect_users.
+        
+        Returns:
+            True if the pair was claimed
+        """
+        claimed = await self._claim_pair_script(
+            keys=[
+                self._get_user_data_key(user_id),
+                self._get_user_data_key(partner_id),
+                self.joined_index_key,
+            ],
+            args=[user_id, partner_id],
+        )
+        return bool(claimed)
+    
+    async def get_queue_snapshot(self) -> List[Dict]:
+        """
+        Load all queued user profiles with pipelined reads.
+        
+        Returns:
+            User data dictionaries ordered by joined_at (oldest first)
+        """
+        user_ids = await self.get_all_user_ids()
+        if not user_ids:
+            return []
+        
+        raw_profiles = await self.redis.mget(
+            [self._get_user_data_key(user_id) for user_id in user_ids]
+        )
+        profiles = []
+        for raw in raw_profiles:
+            if not raw:
+                continue
+            if isinstance(raw, bytes):
+                raw = raw.decode('utf-8')
+            profiles.append(json.loads(raw))
+        return profiles
+    
+    async def get_blocked_user_ids(self, user_ids: List[int]) -> Dict[int, Set[int]]:
+        """
+        Get the block lists of several users, including their recent
+        partners (no-rematch rule), in two pipelined round-trips.
+        
+        Returns:
+            Dictionary of user_id -> set of user IDs they must not be matched with
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.smembers(self._get_blocked_users_key(user_id))
+        results = await pipe.execute()
+        recent_partner_ids = await self.recent_partners.get_recent_partner_ids(user_ids)
+        return {
+            user_id: {int(member) for member in members} | recent_partner_ids[user_id]
+            for user_id, members in zip(user_ids, results)
+        }
+    
+    async def wait_for_change(self, timeout: float) -> bool:
+        """
+        Wait until a user joins the queue (on any replica).
+        
+        Args:
+            timeout: Maximum time to wait in seconds
             
-            return candidate_id
+        Returns:
+            True if the queue changed, False on timeout
+        """
+        if self._wakeup_pubsub is None:
+            self._wakeup_pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            await self._wakeup_pubsub.subscribe(self.wakeup_channel)
         
-        return None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                # Subscribe confirmations come back as None before the timeout
+                message = await self._wakeup_pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=remaining
+                )
+                if message:
+                    break
+            
+            # Coalesce a burst of joins into a single wakeup
+            while await self._wakeup_pubsub.get_message(ignore_subscribe_messages=True, timeout=0):
+                pass
+            return True
+        except Exception:
+            # Drop the broken subscription, it will be recreated on the next call
+            pubsub, self._wakeup_pubsub = self._wakeup_pubsub, None
+            await pubsub.close()
+            raise
     
     async def get_queue_count(
         self,
@@ -371,6 +878,11 @@ class MatchmakingQueue:
         count = await self.redis.scard(queue_key)
         return count
     
+    async def _prune_joined_index(self) -> None:
+        """Drop users whose queue data has expired from the joined_at index."""
+        expired_before = time.time() - settings.MATCHMAKING_TIMEOUT_SECONDS
+        await self.redis.zremrangebyscore(self.joined_index_key, "-inf", expired_before)
+    
     async def get_total_queue_count(self) -> int:
         """
         Get total count of all users in all queues (with deduplication).
@@ -378,32 +890,19 @@ class MatchmakingQueue:
         Returns:
             Total unique users in queues
         """
-        pattern = f"{self.user_data_prefix}:*"
-        count = 0
-        async for _ in self.redis.scan_iter(match=pattern):
-            count += 1
-        return count
+        await self._prune_joined_index()
+        return await self.redis.zcard(self.joined_index_key)
 
     async def get_all_user_ids(self) -> List[int]:
         """
-        Get all user IDs currently present in the matchmaking queue.
+        Get all user IDs currently present in the matchmaking queue,
+        longest-waiting first.
         This is a helper for the matchmaking worker so it doesn't have to
         know about Redis internals.
         """
-        pattern = f"{self.user_data_prefix}:*"
-        user_ids: List[int] = []
-        async for key in self.redis.scan_iter(match=pattern):
-            if isinstance(key, bytes):
-                key_str = key.decode()
-            else:
-                key_str = str(key)
-            candidate_id_str = key_str.split(":")[-1]
-            try:
-                candidate_id = int(candidate_id_str)
-            except ValueError:
-                continue
-            user_ids.append(candidate_id)
-        return user_ids
+        await self._prune_joined_index()
+        members = await self.redis.zrange(self.joined_index_key, 0, -1)
+        return [int(member) for member in members]
     
     async def is_user_in_queue(self, user_id: int) -> bool:
         """
@@ -426,17 +925,15 @@ class MatchmakingQueue:
         Returns:
             Dictionary with gender counts: {'male': 5, 'female': 3}
         """
-        counts = {'male': 0, 'female': 0, 'other': 0}
-        
-        # Get all users in queue
-        pattern = f"{self.user_data_prefix}:*"
-        async for key in self.redis.scan_iter(match=pattern):
-            user_data = await self.get_user_data(int(key.decode().split(":")[-1]) if isinstance(key, bytes) else int(str(key).split(":")[-1]))
-            if user_data:
-                gender = user_data.get("gender")
-                if gender in counts:
-                    counts[gender] += 1
+        pipe = self.redis.pipeline(transaction=False)
+        for gender in INDEX_GENDERS:
+            for preference in INDEX_GENDERS + ("any",):
+                pipe.scard(self._get_bucket_key(gender, preference))
+        sizes = iter(await pipe.execute())
         
+        counts = {}
+        for gender in INDEX_GENDERS:
+            counts[gender] = sum(next(sizes) for _ in range(len(INDEX_GENDERS) + 1))
         return counts
     
     def _get_blocked_users_key(self, user_id: int) -> str:
@@ -526,15 +1023,19 @@ class InMemoryMatchmakingQueue:
     In-memory matchmaking queue system.
 
     Designed for low-traffic setups: keeps two simple lists (boys/girls) in memory
-    and uses the database to enforce the 7-hour no-rematch rule.
+    and uses the Redis recent partners index to enforce the no-rematch rule.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, recent_partners: Optional[RecentPartners] = None) -> None:
+        # Partners of recently ended chats (no-rematch rule), None to disable
+        self.recent_partners = recent_partners
         # telegram_id -> UserQueueEntry
         self._user_data: Dict[int, UserQueueEntry] = {}
         # Queues by gender (telegram IDs, order preserved)
         self._boys_queue: List[int] = []
         self._girls_queue: List[int] = []
+        # Set whenever a user joins, awaited by the matchmaking worker
+        self._changed = asyncio.Event()
 
     async def add_user_to_queue(
         self,
@@ -583,6 +1084,7 @@ class InMemoryMatchmakingQueue:
             if user_id not in self._girls_queue:
                 self._girls_queue.append(user_id)
 
+        self._changed.set()
         return True
 
     async def remove_user_from_queue(self, user_id: int) -> bool:
@@ -619,7 +1121,7 @@ class InMemoryMatchmakingQueue:
 
     async def find_match(self, user_id: int) -> Optional[int]:
         """
-        Find a match for a user using in-memory queues and DB-based 7-hour rule.
+        Find a match for a user using in-memory queues and the no-rematch rule.
 
         Rules:
         - Boys: try boy-boy first; if none, boy-girl.
@@ -637,6 +1139,11 @@ class InMemoryMatchmakingQueue:
 
         gender = entry.gender or "other"
         preferred_gender = entry.preferred_gender
+        
+        # No-rematch rule: partners of recently ended chats, read once per search
+        recent_partner_ids: Set[int] = set()
+        if self.recent_partners:
+            recent_partner_ids = (await self.recent_partners.get_recent_partner_ids([user_id]))[user_id]
 
         # Helper to check if candidate matches filters
         def matches_filters(user_entry: UserQueueEntry, candidate_entry: UserQueueEntry) -> bool:
@@ -673,7 +1180,7 @@ class InMemoryMatchmakingQueue:
                 required_gender: If specified, only match with this gender
             """
             for candidate_id in list(queue):
-                if candidate_id == user_id:
+                if candidate_id == user_id or candidate_id in recent_partner_ids:
                     continue
                 if candidate_id not in self._user_data:
                     # stale id, clean up
@@ -859,7 +1366,7 @@ class InMemoryMatchmakingQueue:
         # Build a combined list preserving order (boys first, then girls)
         combined = self._boys_queue + [uid for uid in self._girls_queue if uid not in self._boys_queue]
         for candidate_id in combined:
-            if candidate_id == user_id:
+            if candidate_id == user_id or candidate_id in recent_partner_ids:
                 continue
             if candidate_id not in self._user_data:
                 continue
@@ -875,6 +1382,15 @@ class InMemoryMatchmakingQueue:
 
         return None
 
+    async def wait_for_change(self, timeout: float) -> bool:
+        """Wait until a user joins the queue; False on timeout."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
     async def get_queue_count(
         self,
         gender: Optional[str] = None,
@@ -911,7 +1427,8 @@ class InMemoryMatchmakingQueue:
         return counts
 
     # Block-list APIs are kept for compatibility but implemented as no-ops
-    # for the in-memory backend, because the 7-hour rule is enforced via DB.
+    # for the in-memory backend, because the no-rematch rule is enforced via
+    # the recent partners index.
 
     async def add_blocked_user(self, user_id: int, blocked_user_id: int, ttl: int = 3600 * 7) -> bool:  # noqa: ARG002
         return True
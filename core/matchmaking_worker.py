@@ -4,10 +4,10 @@ Periodically checks queue and connects matching users.
 """
 import asyncio
 import logging
-from typing import Optional
+from typing import Optional, List, Tuple
 from db.database import get_db
-from db.crud import get_user_by_telegram_id, get_user_by_id, had_recent_chat
-from core.matchmaking import MatchmakingQueue
+from db.crud import get_user_by_telegram_id, get_user_by_id
+from core.matchmaking import MatchmakingQueue, build_pairs
 from core.chat_manager import ChatManager
 from config.settings import settings
 from aiogram import Bot
@@ -39,15 +39,42 @@ def set_bot(bot: Bot):
     bot_instance = bot
 
 
-async def check_and_match_users():
-    """Check queue and match users periodically. Process multiple matches per cycle."""
-    if not matchmaking_queue or not chat_manager or not bot_instance:
-        return
+async def collect_batch_matches() -> List[Tuple[int, int]]:
+    """
+    Pair users from one queue snapshot instead of calling find_match per user.
+    
+    Loads the whole queue and the block lists with pipelined reads, computes
+    the pairing in memory and only claims the final pairs in Redis.
+    """
+    profiles = await matchmaking_queue.get_queue_snapshot()
+    if len(profiles) < 2:
+        return []
     
+    blocked_ids = await matchmaking_queue.get_blocked_user_ids(
+        [profile["user_id"] for profile in profiles]
+    )
+    pairs = build_pairs(profiles, blocked_ids, max_pairs=settings.MATCHMAKING_WORKER_BATCH_SIZE)
+    if not pairs:
+        return []
+    
+    # Another replica may have claimed some of these users meanwhile
+    claimed = await asyncio.gather(
+        *(matchmaking_queue.claim_pair(user_id, partner_id) for user_id, partner_id in pairs)
+    )
+    matches_found = []
+    for (user_id, partner_id), is_claimed in zip(pairs, claimed):
+        if is_claimed:
+            logger.info(f"Match found: {user_id} <-> {partner_id}")
+            matches_found.append((user_id, partner_id))
+    return matches_found
+
+
+async def collect_matches() -> List[Tuple[int, int]]:
+    """Collect matches by running find_match for every queued user."""
     # Get all users in queue
     all_users = await matchmaking_queue.get_total_queue_count()
     if all_users < 2:
-        return  # Need at least 2 users to match
+        return []  # Need at least 2 users to match
     
     processed_users = set()
     matches_found = []
@@ -81,11 +108,31 @@ async def check_and_match_users():
         else:
             logger.debug(f"No match found for user {user_id} in this cycle")
     
+    return matches_found
+
+
+async def check_and_match_users() -> int:
+    """
+    Check queue and match users. Process multiple matches per cycle.
+    
+    Returns:
+        Number of matches found in this cycle
+    """
+    if not matchmaking_queue or not chat_manager or not bot_instance:
+        return 0
+    
+    if settings.MATCHMAKING_BATCH_PAIRING and isinstance(matchmaking_queue, MatchmakingQueue):
+        matches_found = await collect_batch_matches()
+    else:
+        matches_found = await collect_matches()
+    
     # Process all matches found in this cycle concurrently
     if matches_found:
         tasks = [connect_users(user1_id, user2_id) for user1_id, user2_id in matches_found]
         await asyncio.gather(*tasks, return_exceptions=True)
         logger.info(f"Processed {len(matches_found)} matches in this cycle")
+    
+    return len(matches_found)
 
 
 async def connect_users(user1_telegram_id: int, user2_telegram_id: int):
@@ -111,54 +158,6 @@ async def connect_users(user1_telegram_id: int, user2_telegram_id: int):
             
             logger.info(f"Users found: user1_id={user1.id}, user2_id={user2.id}")
 
-            # Enforce no-rematch rule using database history (if enabled).
-            # If this rule is enabled and these two users had a chat that ended
-            # within the configured hours, we skip creating a new chat for them.
-            logger.info(f"Checking no-rematch rule for {user1_telegram_id} and {user2_telegram_id}")
-            if settings.ENABLE_NO_REMATCH_RULE:
-                had_recent = await had_recent_chat(db_session, user1.id, user2.id, hours=settings.NO_REMATCH_HOURS)
-                logger.info(f"had_recent_chat result: {had_recent} for users {user1_telegram_id} and {user2_telegram_id}")
-                if had_recent:
-                    logger.info(
-                        "Skipping match for users %s and %s due to recent chat within %s hours",
-                        user1_telegram_id,
-                        user2_telegram_id,
-                        settings.NO_REMATCH_HOURS,
-                    )
-                    # Users were removed from queue in find_match, but match failed
-                    # We need to re-add them to queue so they can try matching with others
-                    # Get user data from DB to re-add them
-                    user1_data = await matchmaking_queue.get_user_data(user1_telegram_id)
-                    if not user1_data:
-                        # Try to get from DB and re-add (get_user_by_telegram_id is already imported at top)
-                        user1_obj = await get_user_by_telegram_id(db_session, user1_telegram_id)
-                        if user1_obj:
-                            from db.crud import check_user_premium
-                            user1_premium = await check_user_premium(db_session, user1_obj.id)
-                            await matchmaking_queue.add_user_to_queue(
-                                user_id=user1_telegram_id,
-                                gender=user1_obj.gender,
-                                city=user1_obj.city,
-                                age=user1_obj.age,
-                                preferred_gender=None,  # Will be lost, but better than nothing
-                                is_premium=user1_premium,
-                            )
-                    user2_data = await matchmaking_queue.get_user_data(user2_telegram_id)
-                    if not user2_data:
-                        user2_obj = await get_user_by_telegram_id(db_session, user2_telegram_id)
-                        if user2_obj:
-                            from db.crud import check_user_premium
-                            user2_premium = await check_user_premium(db_session, user2_obj.id)
-                            await matchmaking_queue.add_user_to_queue(
-                                user_id=user2_telegram_id,
-                                gender=user2_obj.gender,
-                                city=user2_obj.city,
-                                age=user2_obj.age,
-                                preferred_gender=None,
-                                is_premium=user2_premium,
-                            )
-                    return
-            
             # Check if either user already has active chat
             logger.info(f"Checking active chat for {user1_telegram_id} and {user2_telegram_id}")
             user1_has_active = await chat_manager.is_chat_active(user1.id, db_session)
@@ -390,17 +389,45 @@ async def connect_users(user1_telegram_id: int, user2_telegram_id: int):
         break
 
 
+async def wait_for_queue_change(timeout: float) -> bool:
+    """Wait for a queue wakeup, falling back to a plain sleep on errors."""
+    try:
+        return await matchmaking_queue.wait_for_change(timeout)
+    except Exception as e:
+        logger.warning(f"Matchmaking wakeup wait failed, sleeping instead: {e}")
+        await asyncio.sleep(timeout)
+        return False
+
+
 async def run_matchmaking_worker():
-    """Run matchmaking worker in background."""
+    """
+    Run matchmaking worker in background.
+    
+    A pass runs right away when a user joins the queue. While nothing
+    happens the wait between passes doubles up to
+    MATCHMAKING_WORKER_MAX_INTERVAL.
+    """
     interval = settings.MATCHMAKING_WORKER_INTERVAL
-    logger.info(f"Matchmaking worker started with interval: {interval} seconds, batch size: {settings.MATCHMAKING_WORKER_BATCH_SIZE}")
+    max_interval = max(settings.MATCHMAKING_WORKER_MAX_INTERVAL, interval)
+    logger.info(f"Matchmaking worker started with interval: {interval}-{max_interval} seconds, batch size: {settings.MATCHMAKING_WORKER_BATCH_SIZE}")
     
+    delay = interval
     while True:
+        matches = 0
         try:
-            await check_and_match_users()
+            matches = await check_and_match_users()
         except Exception as e:
             logger.error(f"Matchmaking worker error: {e}", exc_info=True)
         
-        # Check at configured interval (default: 1 second)
-        await asyncio.sleep(interval)
-
+        if matches:
+            delay = interval
+        
+        if not matchmaking_queue:
+            await asyncio.sleep(delay)
+            continue
+        
+        if await wait_for_queue_change(delay):
+            delay = interval
+        elif not matches:
+            # Nothing happened: back off exponentially
+            delay = min(delay * 2, max_interval)
@@ -0,0 +1,226 @@
+"""
+Bulk deletion of chat messages in the background.
+Deletes a user's messages from an ended chat, in both users' chats, with
+Telegram's deleteMessages (up to 100 IDs per call) under a rate budget
+shared by all deletion jobs of the process.
+"""
+import asyncio
+import logging
+from typing import List, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from config.settings import settings
+from core.chat_manager import ChatManager
+from utils.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram's deleteMessages accepts up to 100 message IDs per call
+DELETE_MESSAGES_BATCH_SIZE = 100
+# A job that died without releasing its lock frees the chat after this long
+DELETION_LOCK_TTL = 600
+# Minimum seconds between progress message edits
+PROGRESS_UPDATE_INTERVAL = 2.0
+# FloodWait retries of one deleteMessages call
+MAX_FLOOD_WAIT_RETRIES = 3
+
+# deleteMessages calls per second, shared by all deletion jobs
+_rate_limiter: Optional[TokenBucket] = None
+# Bounds deleteMessages calls in flight, across all deletion jobs
+_concurrency: Optional[asyncio.Semaphore] = None
+# Running jobs (kept referenced until they finish)
+_jobs: Set[asyncio.Task] = set()
+
+
+def get_rate_limiter() -> TokenBucket:
+    """Get the deleteMessages rate budget shared by all jobs (lazy loading)."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = TokenBucket(settings.MESSAGE_DELETION_MAX_CALLS_PER_SECOND)
+    return _rate_limiter
+
+
+def _get_concurrency() -> asyncio.Semaphore:
+    """Get the semaphore bounding deleteMessages calls in flight (lazy loading)."""
+    global _concurrency
+    if _concurrency is None:
+        _concurrency = asyncio.Semaphore(settings.MESSAGE_DELETION_CONCURRENCY)
+    return _concurrency
+
+
+def _get_lock_key(chat_room_id: int, user_id: int) -> str:
+    """Get Redis key held while a user's messages of a chat are being deleted."""
+    return f"chat:delete_job:{chat_room_id}:{user_id}"
+
+
+async def _delete_batch(bot: Bot, chat_id: int, message_ids: List[int]) -> int:
+    """
+    Delete up to DELETE_MESSAGES_BATCH_SIZE messages of a chat in one call.
+
+    Returns:
+        Number of messages requested for deletion (Telegram skips the ones
+        already gone), or 0 if the call failed
+    """
+    rate_limiter = get_rate_limiter()
+    for _ in range(MAX_FLOOD_WAIT_RETRIES + 1):
+        await rate_limiter.acquire()
+        try:
+            async with _get_concurrency():
+                await bot.delete_messages(chat_id, message_ids)
+            return len(message_ids)
+        except TelegramRetryAfter as e:
+            # FloodWait - pause every deletion job and retry
+            logger.warning(f"FloodWait while deleting messages: waiting {e.retry_after} seconds")
+            rate_limiter.pause(e.retry_after)
+        except (TelegramBadRequest, TelegramForbiddenError) as e:
+            # Messages too old to delete or the user blocked the bot
+            logger.debug(f"Could not delete messages in chat {chat_id}: {e}")
+            return 0
+        except Exception as e:
+            logger.error(f"Error deleting messages in chat {chat_id}: {e}")
+            return 0
+    return 0
+
+
+async def _delete_messages(bot: Bot, chat_id: int, message_ids: List[int]) -> int:
+    """Delete messages of a chat in concurrent deleteMessages calls."""
+    batches = [
+        message_ids[i:i + DELETE_MESSAGES_BATCH_SIZE]
+        for i in range(0, len(message_ids), DELETE_MESSAGES_BATCH_SIZE)
+    ]
+    results = await asyncio.gather(*(_delete_batch(bot, chat_id, batch) for batch in batches))
+    return sum(results)
+
+
+class MessageDeletionJob:
+    """Deletes a user's messages of an ended chat from both chats and reports progress."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        chat_manager: ChatManager,
+        chat_room_id: int,
+        user_id: int,
+        user_telegram_id: int,
+        partner_telegram_id: Optional[int] = None,
+        reply_markup=None
+    ):
+        """
+        Initialize deletion job.
+
+        Args:
+            bot: Bot instance
+            chat_manager: Chat manager holding the message ID logs
+            chat_room_id: Ended chat room ID
+            user_id: User's database ID
+            user_telegram_id: User's Telegram ID
+            partner_telegram_id: Partner's Telegram ID (None skips the partner's copies)
+            reply_markup: Keyboard sent with the final report
+        """
+        self.bot = bot
+        self.chat_manager = chat_manager
+        self.chat_room_id = chat_room_id
+        self.user_id = user_id
+        self.user_telegram_id = user_telegram_id
+        self.partner_telegram_id = partner_telegram_id
+        self.reply_markup = reply_markup
+        self.deleted_count = 0
+        self.partner_deleted_count = 0
+
+    async def _update_progress(self, progress_message, processed: int, total: int) -> None:
+        """Edit the progress message (failures are ignored)."""
+        if not progress_message:
+            return
+        try:
+            await progress_message.edit_text(f"🗑️ در حال حذف پیام‌ها... {processed}/{total}")
+        except Exception:
+            pass
+
+    async def run(self) -> None:
+        """Delete the messages batch by batch, then clear the logs and report."""
+        total = await self.chat_manager.count_message_ids(self.chat_room_id, self.user_id)
+        progress_message = None
+        try:
+            progress_message = await self.bot.send_message(
+                self.user_telegram_id,
+                f"🗑️ در حال حذف پیام‌ها... 0/{total}"
+            )
+        except Exception:
+            pass
+
+        processed = 0
+        loop = asyncio.get_running_loop()
+        last_update = loop.time()
+        # Walk the user's message ID log in chunks
+        async for user_message_ids in self.chat_manager.iter_message_id_batches(self.chat_room_id, self.user_id):
+            deletions = [_delete_messages(self.bot, self.user_telegram_id, user_message_ids)]
+            if self.partner_telegram_id:
+                # The copies sent to the partner are mapped user_msg_id -> partner_msg_id
+                partner_message_ids = await self.chat_manager.get_partner_message_ids(
+                    self.chat_room_id, user_message_ids
+                )
+                deletions.append(_delete_messages(self.bot, self.partner_telegram_id, partner_message_ids))
+
+            results = await asyncio.gather(*deletions)
+            self.deleted_count += results[0]
+            if len(results) > 1:
+                self.partner_deleted_count += results[1]
+                await self.chat_manager.clear_message_pairs(self.chat_room_id, user_message_ids)
+
+            processed += len(user_message_ids)
+            if loop.time() - last_update >= PROGRESS_UPDATE_INTERVAL:
+                last_update = loop.time()
+                await self._update_progress(progress_message, processed, total)
+
+        # Clear message IDs from Redis after deletion
+        await self.chat_manager.clear_message_ids(self.chat_room_id, self.user_id)
+
+        if progress_message:
+            try:
+                await progress_message.delete()
+            except Exception:
+                pass
+
+        if self.deleted_count + self.partner_deleted_count > 0:
+            text = f"✅ {self.deleted_count} پیام از شما و {self.partner_deleted_count} پیام از چت مخاطبت حذف شد."
+        else:
+            text = "⚠️ پیامی برای حذف یافت نشد."
+        try:
+            await self.bot.send_message(self.user_telegram_id, text, reply_markup=self.reply_markup)
+        except Exception:
+            pass
+
+
+async def start_message_deletion(job: MessageDeletionJob) -> bool:
+    """
+    Start a deletion job in the background.
+
+    Args:
+        job: Deletion job
+
+    Returns:
+        True if started, False if the same deletion is already running
+    """
+    redis_client = job.chat_manager.redis
+    lock_key = _get_lock_key(job.chat_room_id, job.user_id)
+    if not await redis_client.set(lock_key, "1", nx=True, ex=DELETION_LOCK_TTL):
+        return False
+
+    async def run_job():
+        try:
+            await job.run()
+        except Exception as e:
+            logger.error(f"Error deleting messages of chat {job.chat_room_id}: {e}", exc_info=True)
+            try:
+                await job.bot.send_message(job.user_telegram_id, "❌ خطا در حذف پیام‌ها.")
+            except Exception:
+                pass
+        finally:
+            await redis_client.delete(lock_key)
+
+    task = asyncio.create_task(run_job())
+    _jobs.add(task)
+    task.add_done_callback(_jobs.discard)
+    return True
@@ -15,6 +15,7 @@ from db.crud import (
 )
 from db.database import get_db
 from config.settings import settings
+from bot.client import get_bot
 from core.event_engine import EventEngine
 
 
@@ -147,7 +148,6 @@ class PointsManager:
         # Get event info and send notifications if multiplier was applied
         async for db_session in get_db():
             from db.crud import get_user_by_id, get_active_events
-            from aiogram import Bot
             
             # Get event info for user1
             user1_event_info = ""
@@ -177,31 +177,28 @@ class PointsManager:
             user1 = await get_user_by_id(db_session, user1_id)
             user2 = await get_user_by_id(db_session, user2_id)
             
-            bot = Bot(token=settings.BOT_TOKEN)
-            try:
-                if user1:
-                    try:
-                        await bot.send_message(
-                            user1.telegram_id,
-                            f"🎉 چت موفقیت‌آمیز بود!\n\n"
-                            f"💰 {coins_user1_actual} سکه به حساب شما اضافه شد!{user1_event_info}\n\n"
-                            f"💡 با چت‌های بیشتر، سکه بیشتری دریافت می‌کنی!"
-                        )
-                    except Exception:
-                        pass
+            bot = get_bot()
+            if user1:
+                try:
+                    await bot.send_message(
+                        user1.telegram_id,
+                        f"🎉 چت موفقیت‌آمیز بود!\n\n"
+                        f"💰 {coins_user1_actual} سکه به حساب شما اضافه شد!{user1_event_info}\n\n"
+                        f"💡 با چت‌های بیشتر، سکه بیشتری دریافت می‌کنی!"
+                    )
+                except Exception:
+                    pass
                 
-                if user2:
-                    try:
-                        await bot.send_message(
-                            user2.telegram_id,
-                            f"🎉 چت موفقیت‌آمیز بود!\n\n"
-                            f"💰 {coins_user2_actual} سکه به حساب شما اضافه شد!{user2_event_info}\n\n"
-                            f"💡 با چت‌های بیشتر، سکه بیشتری دریافت می‌کنی!"
-                        )
-                    except Exception:
-                        pass
-            finally:
-                await bot.session.close()
+            if user2:
+                try:
+                    await bot.send_message(
+                        user2.telegram_id,
+                        f"🎉 چت موفقیت‌آمیز بود!\n\n"
+                        f"💰 {coins_user2_actual} سکه به حساب شما اضافه شد!{user2_event_info}\n\n"
+                        f"💡 با چت‌های بیشتر، سکه بیشتری دریافت می‌کنی!"
+                    )
+                except Exception:
+                    pass
             break
         
         # Track challenge progress for both users
@@ -253,7 +250,6 @@ class PointsManager:
         # Get event info and send notifications if multiplier was applied
         async for db_session in get_db():
             from db.crud import get_user_by_id, get_active_events
-            from aiogram import Bot
             
             # Get event info for user1
             user1_event_info = ""
@@ -283,33 +279,30 @@ class PointsManager:
             user1 = await get_user_by_id(db_session, user1_id)
             user2 = await get_user_by_id(db_session, user2_id)
             
-            bot = Bot(token=settings.BOT_TOKEN)
-            try:
-                if user1:
-                    try:
-                        await bot.send_message(
-                            user1.telegram_id,
-                            f"💕 لایک متقابل!\n\n"
-                            f"✅ شما و طرف مقابل همدیگر را لایک کردید!\n\n"
-                            f"💰 {coins_user1_actual} سکه به حساب شما اضافه شد!{user1_event_info}\n\n"
-                            f"💡 با لایک‌های بیشتر، سکه بیشتری دریافت می‌کنی!"
-                        )
-                    except Exception:
-                        pass
+            bot = get_bot()
+            if user1:
+                try:
+                    await bot.send_message(
+                        user1.telegram_id,
+                        f"💕 لایک متقابل!\n\n"
+                        f"✅ شما و طرف مقابل همدیگر را لایک کردید!\n\n"
+                        f"💰 {coins_user1_actual} سکه به حساب شما اضافه شد!{user1_event_info}\n\n"
+                        f"💡 با لایک‌های بیشتر، سکه بیشتری دریافت می‌کنی!"
+                    )
+                except Exception:
+                    pass
                 
-                if user2:
-                    try:
-                        await bot.send_message(
-                            user2.telegram_id,
-                            f"💕 لایک متقابل!\n\n"
-                            f"✅ شما و طرف مقابل همدیگر را لایک کردید!\n\n"
-                            f"💰 {coins_user2_actual} سکه به حساب شما اضافه شد!{user2_event_info}\n\n"
-                            f"💡 با لایک‌های بیشتر، سکه بیشتری دریافت می‌کنی!"
-                        )
-                    except Exception:
-                        pass
-            finally:
-                await bot.session.close()
+            if user2:
+                try:
+                    await bot.send_message(
+                        user2.telegram_id,
+                        f"💕 لایک متقابل!\n\n"
+                        f"✅ شما و طرف مقابل همدیگر را لایک کردید!\n\n"
+                        f"💰 {coins_user2_actual} سکه به حساب شما اضافه شد!{user2_event_info}\n\n"
+                        f"💡 با لایک‌های بیشتر، سکه بیشتری دریافت می‌کنی!"
+                    )
+                except Exception:
+                    pass
             break
         
         return True
@@ -377,7 +370,6 @@ class PointsManager:
         # Get event info and send notifications
         async for db_session in get_db():
             from db.crud import get_user_by_id, get_active_events
-            from aiogram import Bot
             
             # Get event info for referrer if multiplier was applied
             referrer_event_info = ""
@@ -407,37 +399,34 @@ class PointsManager:
             referrer = await get_user_by_id(db_session, referrer_id)
             referred = await get_user_by_id(db_session, referred_id)
             
-            bot = Bot(token=settings.BOT_TOKEN)
-            try:
-                # Notify referrer (only if didn't get premium from event)
-                if referrer and not event_reward_given:
-                    # Check if referrer wants to receive referral notifications
-                    if getattr(referrer, 'receive_referral_notifications', True):
-                        try:
-                            await bot.send_message(
-                                referrer.telegram_id,
-                                f"🎉 خبر خوب!\n\n"
-                                f"✅ یکی از کاربرانی که از لینک دعوت شما استفاده کرده، عضو ربات شد!\n\n"
-                                f"💰 {coins_referrer_actual} سکه به حساب شما اضافه شد!{referrer_event_info}\n\n"
-                                f"💡 با دعوت کاربران بیشتر، سکه بیشتری دریافت می‌کنی!"
-                            )
-                        except Exception:
-                            pass
-                
-                # Notify referred user
-                if referred:
+            bot = get_bot()
+            # Notify referrer (only if didn't get premium from event)
+            if referrer and not event_reward_given:
+                # Check if referrer wants to receive referral notifications
+                if getattr(referrer, 'receive_referral_notifications', True):
                     try:
                         await bot.send_message(
-                            referred.telegram_id,
-                            f"🎉 خوش آمدی!\n\n"
-                            f"✅ با لینک دعوت عضو شدی!\n\n"
-                            f"💰 {coins_referred_actual} سکه به حساب شما اضافه شد!{referred_event_info}\n\n"
-                            f"💡 با تکمیل پروفایلت، سکه بیشتری دریافت می‌کنی!"
+                            referrer.telegram_id,
+                            f"🎉 خبر خوب!\n\n"
+                            f"✅ یکی از کاربرانی که از لینک دعوت شما استفاده کرده، عضو ربات شد!\n\n"
+                            f"💰 {coins_referrer_actual} سکه به حساب شما اضافه شد!{referrer_event_info}\n\n"
+                            f"💡 با دعوت کاربران بیشتر، سکه بیشتری دریافت می‌کنی!"
                         )
                     except Exception:
                         pass
-            finally:
-                await bot.session.close()
+                
+            # Notify referred user
+            if referred:
+                try:
+                    await bot.send_message(
+                        referred.telegram_id,
+                        f"🎉 خوش آمدی!\n\n"
+                        f"✅ با لینک دعوت عضو شدی!\n\n"
+                        f"💰 {coins_referred_actual} سکه به حساب شما اضافه شد!{referred_event_info}\n\n"
+                        f"💡 با تکمیل پروفایلت، سکه بیشتری دریافت می‌کنی!"
+                    )
+                except Exception:
+                    pass
             break
         
         # Track challenge progress
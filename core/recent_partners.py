@@ -0,0 +1,144 @@
+"""
+Recent chat partners index for the no-rematch rule.
+Each user has a Redis sorted set of the users they chatted with, scored by
+chat end time, so matching can exclude recent partners without querying
+chat_rooms in MySQL.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+import redis.asyncio as redis
+
+from config.settings import settings
+from db.crud import get_recent_chat_partners
+
+logger = logging.getLogger(__name__)
+
+# Chats recorded per pipeline when rebuilding the index
+REBUILD_BATCH_SIZE = 500
+
+
+class RecentPartners:
+    """Per-user sorted sets of recent chat partners (Telegram IDs, as in the matchmaking queue)."""
+
+    def __init__(self, redis_client: redis.Redis):
+        """
+        Initialize recent partners index.
+
+        Args:
+            redis_client: Redis async client instance
+        """
+        self.redis = redis_client
+        self.key_prefix = "matchmaking:recent"
+
+    def _get_key(self, user_id: int) -> str:
+        """Get Redis key for a user's recent partners."""
+        return f"{self.key_prefix}:{user_id}"
+
+    @property
+    def window_seconds(self) -> int:
+        """How long a partner can't be matched again."""
+        return settings.NO_REMATCH_HOURS * 3600
+
+    def _add_record(self, pipe, user1_id: int, user2_id: int, ended_at: float, cutoff: float) -> None:
+        """Queue the commands recording a chat (for both users) on a pipeline."""
+        for user_id, partner_id in ((user1_id, user2_id), (user2_id, user1_id)):
+            key = self._get_key(user_id)
+            pipe.zadd(key, {str(partner_id): ended_at}, gt=True)
+            pipe.zremrangebyscore(key, "-inf", cutoff)
+            pipe.expire(key, self.window_seconds)
+
+    async def record(self, user1_id: int, user2_id: int, ended_at: Optional[float] = None) -> None:
+        """
+        Record that two users chatted (for both of them).
+
+        Entries older than the no-rematch window are pruned.
+
+        Args:
+            user1_id: First user's Telegram ID
+            user2_id: Second user's Telegram ID
+            ended_at: Chat end time as a UNIX timestamp (defaults to now)
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        self._add_record(
+            pipe,
+            user1_id,
+            user2_id,
+            ended_at if ended_at is not None else time.time(),
+            time.time() - self.window_seconds
+        )
+        await pipe.execute()
+
+    async def get_recent_partner_ids(self, user_ids: List[int]) -> Dict[int, Set[int]]:
+        """
+        Get the partners of several users within the no-rematch window, in one round-trip.
+
+        Args:
+            user_ids: Telegram IDs
+
+        Returns:
+            Dictionary of user_id -> set of partner Telegram IDs (empty if the
+            rule is disabled)
+        """
+        if not settings.ENABLE_NO_REMATCH_RULE or not user_ids:
+            return {user_id: set() for user_id in user_ids}
+
+        cutoff = time.time() - self.window_seconds
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zrangebyscore(self._get_key(user_id), cutoff, "+inf")
+        results = await pipe.execute()
+        return {
+            user_id: {int(member) for member in members}
+            for user_id, members in zip(user_ids, results)
+        }
+
+    async def rebuild(self, db_session) -> int:
+        """
+        Fill the index from chats ended within the window (e.g. at startup).
+
+        Args:
+            db_session: Database session
+
+        Returns:
+            Number of chats recorded
+        """
+        since = datetime.utcnow() - timedelta(seconds=self.window_seconds)
+        chats = await get_recent_chat_partners(db_session, since)
+        cutoff = time.time() - self.window_seconds
+        for start in range(0, len(chats), REBUILD_BATCH_SIZE):
+            pipe = self.redis.pipeline(transaction=False)
+            for user1_id, user2_id, ended_at in chats[start:start + REBUILD_BATCH_SIZE]:
+                # ended_at is stored in UTC
+                self._add_record(pipe, user1_id, user2_id, (ended_at - datetime(1970, 1, 1)).total_seconds(), cutoff)
+            await pipe.execute()
+        return len(chats)
+
+
+# Global instance (set in main.py), used to record chats ended in db/crud.py
+_recent_partners: Optional[RecentPartners] = None
+
+
+def set_recent_partners(index: RecentPartners):
+    """Set recent partners index instance."""
+    global _recent_partners
+    _recent_partners = index
+
+
+async def record_chat_partners(user1_telegram_id: Optional[int], user2_telegram_id: Optional[int]) -> None:
+    """
+    Record that two users chatted, for the no-rematch rule. No-op if the
+    index is not configured.
+
+    Args:
+        user1_telegram_id: First user's Telegram ID
+        user2_telegram_id: Second user's Telegram ID
+    """
+    if not _recent_partners or not user1_telegram_id or not user2_telegram_id:
+        return
+    try:
+        await _recent_partners.record(user1_telegram_id, user2_telegram_id)
+    except Exception as e:
+        logger.warning(f"Failed to record recent partners {user1_telegram_id}, {user2_telegram_id}: {e}")
@@ -0,0 +1,238 @@
+"""
+Per-update user context.
+Resolves a compact snapshot of the user (and their active chat) once per
+update, backed by Redis, so middlewares and handlers don't each query MySQL.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timezone
+from typing import Optional, Dict
+
+import redis.asyncio as redis
+
+from config.settings import settings
+from db.database import get_db
+from db.crud import get_user_by_telegram_id, get_user_by_id
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UserContext:
+    """Snapshot of a user and their active chat, shared through handler data."""
+    id: int
+    telegram_id: int
+    is_active: bool
+    is_banned: bool
+    is_premium: bool
+    premium_expires_at: Optional[float]  # UTC timestamp
+    gender: Optional[str]
+    is_virtual: bool
+    # Active chat (chat_room_id is None when the user has no cached chat)
+    chat_room_id: Optional[int] = None
+    chat_user1_id: Optional[int] = None
+    chat_user2_id: Optional[int] = None
+    partner_id: Optional[int] = None
+    partner_telegram_id: Optional[int] = None
+    partner_is_virtual: bool = False
+    private_mode: bool = False
+
+    @property
+    def has_premium(self) -> bool:
+        """Same rule as check_user_premium: premium flag with a future expiry."""
+        if self.is_premium and self.premium_expires_at:
+            return self.premium_expires_at > time.time()
+        return False
+
+    @classmethod
+    def from_user(cls, user) -> "UserContext":
+        """Build a context (without chat) from a User model."""
+        premium_expires_at = None
+        if user.premium_expires_at:
+            # premium_expires_at is stored as naive UTC
+            premium_expires_at = user.premium_expires_at.replace(tzinfo=timezone.utc).timestamp()
+        return cls(
+            id=user.id,
+            telegram_id=user.telegram_id,
+            is_active=bool(user.is_active),
+            is_banned=bool(user.is_banned),
+            is_premium=bool(user.is_premium),
+            premium_expires_at=premium_expires_at,
+            gender=user.gender,
+            is_virtual=bool(user.is_virtual),
+        )
+
+    def to_redis(self) -> Dict[str, str]:
+        """Serialize the user fields for the Redis hash (chat fields are not cached)."""
+        return {
+            "id": str(self.id),
+            "telegram_id": str(self.telegram_id),
+            "is_active": "1" if self.is_active else "0",
+            "is_banned": "1" if self.is_banned else "0",
+            "is_premium": "1" if self.is_premium else "0",
+            "premium_expires_at": str(self.premium_expires_at) if self.premium_expires_at else "",
+            "gender": self.gender or "",
+            "is_virtual": "1" if self.is_virtual else "0",
+        }
+
+    @classmethod
+    def from_redis(cls, data: Dict[str, str]) -> "UserContext":
+        """Build a context (without chat) from a decoded Redis hash."""
+        return cls(
+            id=int(data["id"]),
+            telegram_id=int(data["telegram_id"]),
+            is_active=data.get("is_active") == "1",
+            is_banned=data.get("is_banned") == "1",
+            is_premium=data.get("is_premium") == "1",
+            premium_expires_at=float(data["premium_expires_at"]) if data.get("premium_expires_at") else None,
+            gender=data.get("gender") or None,
+            is_virtual=data.get("is_virtual") == "1",
+        )
+
+
+class UserContextCache:
+    """
+    Redis-backed cache of UserContext snapshots.
+
+    The user part is cached per Telegram ID and invalidated when the profile,
+    ban or premium status changes (see invalidate_user_context). The chat part
+    is read from the chat manager's Redis state on every resolve, so it
+    follows chat start/end without extra invalidation.
+    """
+
+    def __init__(self, redis_client: redis.Redis, chat_manager, ttl: Optional[int] = None):
+        """
+        Initialize user context cache.
+
+        Args:
+            redis_client: Redis async client instance
+            chat_manager: ChatManager instance (source of the chat state)
+            ttl: Snapshot TTL in seconds (defaults to USER_CONTEXT_CACHE_TTL_SECONDS)
+        """
+        self.redis = redis_client
+        self.chat_manager = chat_manager
+        self.ttl = ttl if ttl is not None else settings.USER_CONTEXT_CACHE_TTL_SECONDS
+        self.key_prefix = "user:context"
+
+    def _get_user_key(self, telegram_id: int) -> str:
+        """Get Redis key for a user's cached snapshot."""
+        return f"{self.key_prefix}:{telegram_id}"
+
+    async def get(self, telegram_id: int) -> Optional[UserContext]:
+        """
+        Resolve the context of a user.
+
+        Args:
+            telegram_id: Telegram user ID
+
+        Returns:
+            UserContext (including inactive/banned users) or None if not registered
+        """
+        user_key = self._get_user_key(telegram_id)
+        cached = await self.redis.hgetall(user_key)
+
+        if cached:
+            context = UserContext.from_redis({
+                (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                for k, v in cached.items()
+            })
+        else:
+            user = None
+            async for db_session in get_db():
+                user = await get_user_by_telegram_id(db_session, telegram_id, include_inactive=True)
+                break
+            # Unregistered users are not cached, so registration is picked up immediately
+            if not user:
+                return None
+
+            context = UserContext.from_user(user)
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hset(user_key, mapping=context.to_redis())
+            pipe.expire(user_key, self.ttl)
+            await pipe.execute()
+
+        if self.chat_manager:
+            await self.load_chat(context)
+        return context
+
+    async def load_chat(self, context: UserContext, db_session=None) -> None:
+        """
+        Fill the chat fields of a context from the cached chat state.
+
+        The partner's Telegram ID and virtual flag are resolved from the
+        database once per chat and then kept in the chat state.
+
+        Args:
+            context: UserContext to fill
+            db_session: Optional database session for the one-time partner lookup
+        """
+        state = await self.chat_manager.get_chat_state(context.id)
+        if not state:
+            return
+
+        context.chat_room_id = int(state["chat_room_id"])
+        context.chat_user1_id = int(state["user1_id"])
+        context.chat_user2_id = int(state["user2_id"])
+        context.partner_id = context.chat_user2_id if context.chat_user1_id == context.id else context.chat_user1_id
+        context.private_mode = state.get(f"private_mode:{context.id}") == "1"
+
+        partner_telegram_id = state.get(f"telegram_id:{context.partner_id}")
+        if partner_telegram_id:
+            context.partner_telegram_id = int(partner_telegram_id)
+            context.partner_is_virtual = state.get(f"is_virtual:{context.partner_id}") == "1"
+            return
+
+        if db_session is not None:
+            await self._load_partner(context, db_session)
+        else:
+            async for session in get_db():
+                await self._load_partner(context, session)
+                break
+
+    async def _load_partner(self, context: UserContext, db_session) -> None:
+        """Look up the partner in the database and cache it in the chat state."""
+        partner = await get_user_by_id(db_session, context.partner_id)
+        if not partner:
+            return
+
+        context.partner_telegram_id = partner.telegram_id
+        context.partner_is_virtual = await self.chat_manager.is_partner_virtual_profile(
+            context.id, context.partner_id, db_session
+        )
+        await self.chat_manager.set_partner_info(
+            context.chat_room_id,
+            context.partner_id,
+            context.partner_telegram_id,
+            context.partner_is_virtual
+        )
+
+    async def invalidate(self, telegram_id: int) -> None:
+        """Drop the cached snapshot of a user."""
+        await self.redis.delete(self._get_user_key(telegram_id))
+
+
+# Global instance (set in main.py), used for invalidation from db/crud.py
+_user_context_cache: Optional[UserContextCache] = None
+
+
+def set_user_context_cache(cache: UserContextCache):
+    """Set user context cache instance."""
+    global _user_context_cache
+    _user_context_cache = cache
+
+
+async def invalidate_user_context(telegram_id: Optional[int]) -> None:
+    """
+    Drop the cached snapshot of a user after their profile, ban or premium
+    status changed. No-op if the cache is not configured.
+
+    Args:
+        telegram_id: Telegram user ID
+    """
+    if not _user_context_cache or not telegram_id:
+        return
+    try:
+        await _user_context_cache.invalidate(telegram_id)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate user context for {telegram_id}: {e}")
@@ -3,10 +3,10 @@ CRUD operations for database models.
 Provides functions to interact with User, ChatRoom, PremiumSubscription, and Report models.
 """
 from datetime import datetime, timedelta, date
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_, or_, func
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, update, delete, insert, and_, or_, func, bindparam
+from sqlalchemy.orm import joinedload, aliased
 
 from db.models import (
     User, ChatRoom, PremiumSubscription, Report, Like, Follow, Block, DirectMessage, ChatEndNotification,                                                       
@@ -15,7 +15,7 @@ from db.models import (
     AdminReferralLink, AdminReferralLinkClick, AdminReferralLinkSignup, CoinSetting,                                                                            
     BroadcastMessage, BroadcastMessageReceipt, CoinPackage, PaymentTransaction,
     Event, EventParticipant, EventReward, PremiumPlan, CoinRewardSetting, MandatoryChannel,
-    UserPlaylist, PlaylistItem                                                                      
+    UserPlaylist, PlaylistItem, ImageModerationVerdict
 )
 from config.settings import settings
 
@@ -94,42 +94,29 @@ async def search_users(
         User.city.isnot(None)
     )
     
-    # If online_only, we need to filter after getting results from DB
-    # because online status is in Redis, not DB
+    # Online status is in Redis, not DB
     if online_only:
         if not activity_tracker:
             # If activity_tracker is not available, return empty list
             return []
         
-        # For online search, fetch ALL matching users for consistent pagination
-        # We need to fetch ALL users, filter online ones, sort, then apply offset/limit
-        # This ensures consistent results across multiple pagination requests
-        result = await session.execute(query)
-        all_users = list(result.scalars().all())
-            
-        # Filter online users and prepare for sorting
-        online_candidates = []
-        for user in all_users:
-            if await activity_tracker.is_online(user.telegram_id):
-                last_seen = user.last_seen
-                created_at = user.created_at
-                online_candidates.append((user, last_seen, created_at))
+        # Online users come from the presence sorted set in one call, so
+        # filtering, sorting and pagination all run in the database
+        online_ids = await activity_tracker.get_online_user_ids()
+        if not online_ids:
+            return []
         
         # Sort online users:
         # 1. last_seen DESC (newest visit first)
         # 2. created_at DESC (newest user first)
         # 3. user.id ASC (tie-breaker for stable sorting)
-        online_candidates.sort(
-            key=lambda x: (
-                -(x[1].timestamp() if x[1] else 0),   # last_seen DESC
-                -(x[2].timestamp() if x[2] else 0),   # created_at DESC
-                x[0].id  # user.id ASC (tie-breaker for stable sorting)
-            )
-        )
-        
-        # Apply offset and limit after sorting
-        sorted_online = [u[0] for u in online_candidates]
-        return sorted_online[offset:offset + limit]
+        query = query.where(User.telegram_id.in_(online_ids)).order_by(
+            User.last_seen.desc(),
+            User.created_at.desc(),
+            User.id.asc()
+        ).offset(offset).limit(limit)
+        result = await session.execute(query)
+        return list(result.scalars().all())
     else:
         # Normal search - fetch ALL matching users for consistent pagination
         # We need to fetch ALL users, sort them once, then apply offset/limit
@@ -638,6 +625,9 @@ async def update_user_profile(
     
     user.updated_at = datetime.utcnow()
     await session.commit()
+    
+    from core.user_context import invalidate_user_context
+    await invalidate_user_context(telegram_id)
     await session.refresh(user)
     return user
 
@@ -648,9 +638,17 @@ async def ban_user(session: AsyncSession, user_id: int) -> bool:
         update(User).where(User.id == user_id).values(is_banned=True)
     )
     await session.commit()
+    await _invalidate_user_context_by_id(session, user_id)
     return result.rowcount > 0
 
 
+async def _invalidate_user_context_by_id(session: AsyncSession, user_id: int) -> None:
+    """Drop the cached user context of a user after changing their row."""
+    from core.user_context import invalidate_user_context
+    result = await session.execute(select(User.telegram_id).where(User.id == user_id))
+    await invalidate_user_context(result.scalar_one_or_none())
+
+
 async def delete_user_account(session: AsyncSession, user_id: int) -> bool:
     """
     Delete user account (soft delete by setting is_active=False).
@@ -692,7 +690,7 @@ async def delete_user_account(session: AsyncSession, user_id: int) -> bool:
                     # Last part is the filename
                     filename = path_parts[-1]
                     # Try to delete from MinIO
-                    if delete_image_from_minio(filename):
+                    if await delete_image_from_minio(filename):
                         logger.info(f"Successfully deleted profile image from MinIO for user {user_id}: {filename}")
                     else:
                         logger.warning(f"Failed to delete profile image from MinIO for user {user_id}: {filename}")
@@ -722,6 +720,9 @@ async def delete_user_account(session: AsyncSession, user_id: int) -> bool:
     await session.commit()
     logger.info(f"Committed changes for user {user_id}")
     
+    from core.user_context import invalidate_user_context
+    await invalidate_user_context(user.telegram_id)
+    
     # Verify the update was successful by querying database directly
     # This ensures we get the actual state from database, not from session cache
     result = await session.execute(
@@ -747,9 +748,65 @@ async def unban_user(session: AsyncSession, user_id: int) -> bool:
         update(User).where(User.id == user_id).values(is_banned=False)
     )
     await session.commit()
+    await _invalidate_user_context_by_id(session, user_id)
     return result.rowcount > 0
 
 
+async def bulk_update_last_seen(
+    session: AsyncSession,
+    last_seen_by_telegram_id: Dict[int, datetime],
+    batch_size: int = 1000
+) -> int:
+    """
+    Set last_seen of many users with one executemany UPDATE per batch.
+    
+    Activity also means the user can be reached again, so is_bot_blocked is
+    cleared for them.
+    
+    Args:
+        session: Database session
+        last_seen_by_telegram_id: Telegram user ID -> last activity (UTC)
+        batch_size: Rows per statement
+        
+    Returns:
+        Number of users sent to the database
+    """
+    users_table = User.__table__
+    stmt = (
+        update(users_table)
+        .where(users_table.c.telegram_id == bindparam("b_telegram_id"))
+        .values(last_seen=bindparam("b_last_seen"), is_bot_blocked=False)
+    )
+    rows = [
+        {"b_telegram_id": telegram_id, "b_last_seen": last_seen}
+        for telegram_id, last_seen in last_seen_by_telegram_id.items()
+    ]
+    for i in range(0, len(rows), batch_size):
+        await session.execute(stmt, rows[i:i + batch_size])
+    await session.commit()
+    return len(rows)
+
+
+async def mark_users_bot_blocked(session: AsyncSession, user_ids: List[int]) -> int:
+    """
+    Mark users who blocked the bot (or deleted their account) so broadcasts skip them.
+    
+    Args:
+        session: Database session
+        user_ids: User IDs (database IDs)
+        
+    Returns:
+        Number of users marked
+    """
+    if not user_ids:
+        return 0
+    await session.execute(
+        update(User).where(User.id.in_(user_ids)).values(is_bot_blocked=True)
+    )
+    await session.commit()
+    return len(user_ids)
+
+
 async def get_all_users(session: AsyncSession, skip: int = 0, limit: int = None) -> List[User]:
     """Get all users with pagination. If limit is None, returns all users."""
     query = select(User).offset(skip)
@@ -884,15 +941,42 @@ async def get_chat_room_by_id(session: AsyncSession, chat_room_id: int) -> Optio
     return result.scalar_one_or_none()
 
 
+async def get_chat_room_telegram_ids(session: AsyncSession, chat_room_id: int) -> Optional[tuple]:
+    """
+    Get the Telegram IDs of the users of a chat room in one query.
+
+    Returns:
+        (user1 telegram_id, user2 telegram_id) or None if not found
+    """
+    user1 = aliased(User)
+    user2 = aliased(User)
+    result = await session.execute(
+        select(user1.telegram_id, user2.telegram_id)
+        .select_from(ChatRoom)
+        .join(user1, user1.id == ChatRoom.user1_id)
+        .join(user2, user2.id == ChatRoom.user2_id)
+        .where(ChatRoom.id == chat_room_id)
+    )
+    row = result.first()
+    return tuple(row) if row else None
+
+
 async def end_chat_room(session: AsyncSession, chat_room_id: int) -> bool:
-    """End a chat room."""
+    """End a chat room and record its users for the no-rematch rule."""
     result = await session.execute(
         update(ChatRoom)
         .where(ChatRoom.id == chat_room_id)
         .values(is_active=False, ended_at=datetime.utcnow())
     )
     await session.commit()
-    return result.rowcount > 0
+    if result.rowcount == 0:
+        return False
+    
+    telegram_ids = await get_chat_room_telegram_ids(session, chat_room_id)
+    if telegram_ids:
+        from core.recent_partners import record_chat_partners
+        await record_chat_partners(*telegram_ids)
+    return True
 
 
 async def update_chat_room_video_call(
@@ -952,6 +1036,33 @@ async def had_recent_chat(
     return last_chat is not None
 
 
+async def get_recent_chat_partners(
+    session: AsyncSession,
+    since: datetime,
+) -> List[tuple]:
+    """
+    Get the users of chats that ended since a given time.
+
+    Used to rebuild the recent partners index of the no-rematch rule.
+
+    Returns:
+        List of (user1 telegram_id, user2 telegram_id, ended_at) tuples
+    """
+    user1 = aliased(User)
+    user2 = aliased(User)
+    result = await session.execute(
+        select(user1.telegram_id, user2.telegram_id, ChatRoom.ended_at)
+        .join(user1, user1.id == ChatRoom.user1_id)
+        .join(user2, user2.id == ChatRoom.user2_id)
+        .where(
+            ChatRoom.is_active == False,
+            ChatRoom.ended_at.isnot(None),
+            ChatRoom.ended_at >= since,
+        )
+    )
+    return [tuple(row) for row in result.all()]
+
+
 # ============= PremiumSubscription CRUD =============
 
 async def create_premium_subscription(
@@ -998,6 +1109,7 @@ async def create_premium_subscription(
     
     await session.commit()
     await session.refresh(subscription)
+    await _invalidate_user_context_by_id(session, user_id)
     return subscription
 
 
@@ -1100,6 +1212,11 @@ async def like_user(session: AsyncSession, user_id: int, liked_user_id: int) ->
         await session.commit()
         await session.refresh(like)
         logger.info(f"Successfully liked: User {user_id} -> {liked_user_id}, like_id: {like.id}")
+        
+        from utils.leaderboard import get_leaderboard
+        leaderboard = get_leaderboard()
+        if leaderboard:
+            await leaderboard.record_like(liked_user_id, like.created_at)
         return like
     except Exception as e:
         logger.error(f"Error in like_user: {e}", exc_info=True)
@@ -1128,6 +1245,11 @@ async def unlike_user(session: AsyncSession, user_id: int, liked_user_id: int) -
     )
     
     await session.commit()
+    
+    from utils.leaderboard import get_leaderboard
+    leaderboard = get_leaderboard()
+    if leaderboard:
+        await leaderboard.record_like(liked_user_id, like.created_at, removed=True)
     return True
 
 
@@ -1580,6 +1702,7 @@ async def add_points(
     session.add(history)
     
     await session.commit()
+    await _record_leaderboard_points(user_id, user_points.points)
     return True
 
 
@@ -1611,9 +1734,18 @@ async def spend_points(
     session.add(history)
     
     await session.commit()
+    await _record_leaderboard_points(user_id, user_points.points)
     return True
 
 
+async def _record_leaderboard_points(user_id: int, balance: int) -> None:
+    """Update the points leaderboard after a transaction (if Redis is set up)."""
+    from utils.leaderboard import get_leaderboard
+    leaderboard = get_leaderboard()
+    if leaderboard:
+        await leaderboard.record_points(user_id, balance)
+
+
 async def get_user_points(session: AsyncSession, user_id: int) -> int:
     """Get user's current points balance."""
     user_points = await get_or_create_user_points(session, user_id)
@@ -1861,6 +1993,11 @@ async def create_referral(
     
     await session.commit()
     await session.refresh(referral)
+    
+    from utils.leaderboard import get_leaderboard
+    leaderboard = get_leaderboard()
+    if leaderboard:
+        await leaderboard.record_referral(referrer_id, referral.created_at)
     return referral
 
 
@@ -2604,6 +2741,36 @@ async def create_broadcast_receipt(
     return receipt
 
 
+async def bulk_create_broadcast_receipts(
+    session: AsyncSession,
+    receipts: List[Dict[str, Any]]
+) -> int:
+    """
+    Insert many broadcast receipts with one multi-row INSERT.
+    
+    Receipts that already exist (a resumed broadcast re-sending to users
+    after its last checkpoint) are skipped.
+    
+    Args:
+        session: Database session
+        receipts: Rows with broadcast_id, user_id, telegram_message_id, status and sent_at
+        
+    Returns:
+        Number of receipts sent to the database
+    """
+    if not receipts:
+        return 0
+    stmt = (
+        insert(BroadcastMessageReceipt)
+        .values(receipts)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+    await session.execute(stmt)
+    await session.commit()
+    return len(receipts)
+
+
 async def update_broadcast_receipt_status(
     session: AsyncSession,
     broadcast_id: int,
@@ -2660,63 +2827,52 @@ async def increment_broadcast_stats(
 
 async def get_broadcast_statistics(
     session: AsyncSession,
-    broadcast_id: int
+    broadcast_id: int,
+    live_counts: Optional[Dict[str, int]] = None
 ) -> dict:
-    """Get detailed statistics for a broadcast message."""
+    """
+    Get detailed statistics for a broadcast message.
+    
+    Args:
+        session: Database session
+        broadcast_id: Broadcast ID
+        live_counts: Live sent/failed/opened counters (BroadcastCounters) of a
+            running broadcast; the stored counts are used when not given
+    """
     broadcast = await get_broadcast_message_by_id(session, broadcast_id)
     if not broadcast:
         return {}
     
-    # Get receipt details
+    # Get receipt status counts in one query
     receipts_result = await session.execute(
-        select(func.count(BroadcastMessageReceipt.id))
+        select(BroadcastMessageReceipt.status, func.count(BroadcastMessageReceipt.id))
         .where(BroadcastMessageReceipt.broadcast_id == broadcast_id)
+        .group_by(BroadcastMessageReceipt.status)
     )
-    total_receipts = receipts_result.scalar() or 0
+    receipt_counts = {status: count for status, count in receipts_result.all()}
+    total_receipts = sum(receipt_counts.values())
+    sent_count = receipt_counts.get("sent", 0)
+    failed_count = receipt_counts.get("failed", 0)
+    opened_count = receipt_counts.get("opened", 0)
     
-    # Get status counts
-    sent_result = await session.execute(
-        select(func.count(BroadcastMessageReceipt.id))
-        .where(
-            and_(
-                BroadcastMessageReceipt.broadcast_id == broadcast_id,
-                BroadcastMessageReceipt.status == "sent"
-            )
-        )
-    )
-    sent_count = sent_result.scalar() or 0
-    
-    failed_result = await session.execute(
-        select(func.count(BroadcastMessageReceipt.id))
-        .where(
-            and_(
-                BroadcastMessageReceipt.broadcast_id == broadcast_id,
-                BroadcastMessageReceipt.status == "failed"
-            )
-        )
-    )
-    failed_count = failed_result.scalar() or 0
-    
-    opened_result = await session.execute(
-        select(func.count(BroadcastMessageReceipt.id))
-        .where(
-            and_(
-                BroadcastMessageReceipt.broadcast_id == broadcast_id,
-                BroadcastMessageReceipt.status == "opened"
-            )
-        )
-    )
-    opened_count = opened_result.scalar() or 0
+    counts = {
+        "sent_count": broadcast.sent_count,
+        "failed_count": broadcast.failed_count,
+        "opened_count": broadcast.opened_count,
+    }
+    if live_counts:
+        counts["sent_count"] = live_counts.get("sent", counts["sent_count"])
+        counts["failed_count"] = live_counts.get("failed", counts["failed_count"])
+        counts["opened_count"] = live_counts.get("opened", counts["opened_count"])
     
     # Calculate open rate
-    open_rate = (opened_count / sent_count * 100) if sent_count > 0 else 0
+    open_rate = (counts["opened_count"] / counts["sent_count"] * 100) if counts["sent_count"] > 0 else 0
     
     return {
         "broadcast_id": broadcast.id,
         "message_type": broadcast.message_type,
-        "sent_count": broadcast.sent_count,
-        "failed_count": broadcast.failed_count,
-        "opened_count": broadcast.opened_count,
+        "status": broadcast.status,
+        **counts,
         "total_receipts": total_receipts,
         "sent_count_detail": sent_count,
         "failed_count_detail": failed_count,
@@ -3381,6 +3537,101 @@ async def get_user_rank_by_likes(
     return rank + 1
 
 
+def _leaderboard_source(metric: str) -> tuple:
+    """Get (user id column, created_at column) of the rows counted by a leaderboard metric."""
+    if metric == "points":
+        return PointsHistory.user_id, PointsHistory.created_at
+    if metric == "referrals":
+        return Referral.referrer_id, Referral.created_at
+    if metric == "likes":
+        return Like.liked_user_id, Like.created_at
+    raise ValueError(f"Unknown leaderboard metric: {metric}")
+
+
+async def get_leaderboard_totals(session: AsyncSession, metric: str) -> List[tuple]:
+    """
+    Get all-time leaderboard scores of active, non-banned users.
+    
+    Args:
+        session: Database session
+        metric: 'points' (current balance), 'referrals' or 'likes' (received)
+        
+    Returns:
+        List of (user_id, score) tuples
+    """
+    if metric == "points":
+        query = select(UserPoints.user_id, UserPoints.points).join(User, UserPoints.user_id == User.id)
+    else:
+        user_id_column, _ = _leaderboard_source(metric)
+        query = select(user_id_column, func.count()).join(
+            User, user_id_column == User.id
+        ).group_by(user_id_column)
+    
+    result = await session.execute(
+        query.where(User.is_banned == False, User.is_active == True)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def get_leaderboard_daily_totals(
+    session: AsyncSession,
+    metric: str,
+    since: datetime
+) -> List[tuple]:
+    """
+    Get per-day leaderboard counts of active, non-banned users.
+    
+    For 'points' the count is the number of points transactions (a user
+    with any transaction that day was active).
+    
+    Args:
+        session: Database session
+        metric: 'points', 'referrals' or 'likes'
+        since: Start of the first day
+        
+    Returns:
+        List of (user_id, day, count) tuples
+    """
+    user_id_column, created_at_column = _leaderboard_source(metric)
+    day = func.date(created_at_column)
+    result = await session.execute(
+        select(user_id_column, day, func.count())
+        .join(User, user_id_column == User.id)
+        .where(
+            created_at_column >= since,
+            User.is_banned == False,
+            User.is_active == True
+        )
+        .group_by(user_id_column, day)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def get_leaderboard_users(session: AsyncSession, user_ids: List[int]) -> Dict[int, tuple]:
+    """
+    Get display details of the active, non-banned users among user_ids.
+    
+    Returns:
+        Dict of user_id -> (display_name, profile_id, gender)
+    """
+    if not user_ids:
+        return {}
+    
+    result = await session.execute(
+        select(User.id, User.display_name, User.username, User.telegram_id, User.profile_id, User.gender)
+        .where(
+            User.id.in_(user_ids),
+            User.is_banned == False,
+            User.is_active == True
+        )
+    )
+    return {
+        # Use display_name if available, otherwise fall back to username, then telegram_id
+        user_id: (display_name or username or f"User {telegram_id}", profile_id, gender)
+        for user_id, display_name, username, telegram_id, profile_id, gender in result.all()
+    }
+
+
 # ============= Premium Plan CRUD =============
 
 async def create_premium_plan(
@@ -3901,6 +4152,67 @@ async def get_active_mandatory_channels(session: AsyncSession) -> List[Mandatory
     return list(result.scalars().all())
 
 
+# ============= Image Moderation CRUD =============
+
+async def get_image_verdict(
+    session: AsyncSession,
+    file_unique_id: str
+) -> Optional[ImageModerationVerdict]:
+    """Get the stored moderation verdict of an image by file_unique_id."""
+    result = await session.execute(
+        select(ImageModerationVerdict).where(ImageModerationVerdict.file_unique_id == file_unique_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def find_nsfw_verdict_by_phash(
+    session: AsyncSession,
+    phash: int,
+    max_distance: int
+) -> Optional[ImageModerationVerdict]:
+    """
+    Find an NSFW verdict of a near-duplicate image.
+    
+    Args:
+        session: Database session
+        phash: Perceptual hash (signed 64-bit, as stored)
+        max_distance: Maximum number of differing hash bits
+        
+    Returns:
+        Closest NSFW verdict within max_distance, or None
+    """
+    distance = func.bit_count(ImageModerationVerdict.phash.op('^')(phash))
+    result = await session.execute(
+        select(ImageModerationVerdict)
+        .where(
+            ImageModerationVerdict.is_nsfw == True,
+            ImageModerationVerdict.phash.isnot(None),
+            distance <= max_distance
+        )
+        .order_by(distance)
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def save_image_verdict(
+    session: AsyncSession,
+    file_unique_id: str,
+    phash: Optional[int],
+    is_nsfw: bool,
+    confidence: float
+) -> None:
+    """Store (or replace) the moderation verdict of an image."""
+    verdict = await get_image_verdict(session, file_unique_id)
+    if verdict is None:
+        verdict = ImageModerationVerdict(file_unique_id=file_unique_id)
+        session.add(verdict)
+    verdict.phash = phash
+    verdict.is_nsfw = is_nsfw
+    verdict.confidence = confidence
+    await session.commit()
+
+
 # ============= Coin Package CRUD =============
 
 async def create_coin_package(
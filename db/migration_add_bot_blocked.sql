@@ -0,0 +1,23 @@
+-- Migration: Add is_bot_blocked field to users table
+-- Date: 2026-10-XX
+-- Description: Marks users who blocked the bot so broadcasts skip them
+-- (cleared again as soon as the user is active)
+
+-- Check if column exists before adding
+SET @dbname = DATABASE();
+SET @tablename = "users";
+SET @columnname = "is_bot_blocked";
+SET @preparedStatement = (SELECT IF(
+  (
+    SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE
+      (TABLE_SCHEMA = @dbname)
+      AND (TABLE_NAME = @tablename)
+      AND (COLUMN_NAME = @columnname)
+  ) > 0,
+  "SELECT 1",
+  CONCAT("ALTER TABLE ", @tablename, " ADD COLUMN ", @columnname, " BOOLEAN DEFAULT FALSE NOT NULL AFTER is_virtual")
+));
+PREPARE alterIfNotExists FROM @preparedStatement;
+EXECUTE alterIfNotExists;
+DEALLOCATE PREPARE alterIfNotExists;
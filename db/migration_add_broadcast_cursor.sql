@@ -0,0 +1,61 @@
+-- Migration: Add status and recipient cursor to broadcast_messages table
+-- Date: 2026-10-XX
+-- Description: Lets broadcasts be paused and resumed (also after a restart)
+-- from the last delivered user
+
+-- Check if column exists before adding
+SET @dbname = DATABASE();
+SET @tablename = "broadcast_messages";
+SET @columnname = "status";
+SET @preparedStatement = (SELECT IF(
+  (
+    SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE
+      (TABLE_SCHEMA = @dbname)
+      AND (TABLE_NAME = @tablename)
+      AND (COLUMN_NAME = @columnname)
+  ) > 0,
+  "SELECT 1",
+  CONCAT("ALTER TABLE ", @tablename, " ADD COLUMN ", @columnname, " VARCHAR(20) DEFAULT 'pending' NOT NULL AFTER delay_seconds")
+));
+PREPARE alterIfNotExists FROM @preparedStatement;
+EXECUTE alterIfNotExists;
+DEALLOCATE PREPARE alterIfNotExists;
+
+SET @columnname = "last_user_id";
+SET @preparedStatement = (SELECT IF(
+  (
+    SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE
+      (TABLE_SCHEMA = @dbname)
+      AND (TABLE_NAME = @tablename)
+      AND (COLUMN_NAME = @columnname)
+  ) > 0,
+  "SELECT 1",
+  CONCAT("ALTER TABLE ", @tablename, " ADD COLUMN ", @columnname, " INT DEFAULT 0 NOT NULL AFTER status")
+));
+PREPARE alterIfNotExists FROM @preparedStatement;
+EXECUTE alterIfNotExists;
+DEALLOCATE PREPARE alterIfNotExists;
+
+-- Add index if it doesn't exist
+SET @indexname = "idx_broadcast_status";
+SET @preparedStatement = (SELECT IF(
+  (
+    SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+    WHERE
+      (TABLE_SCHEMA = @dbname)
+      AND (TABLE_NAME = @tablename)
+      AND (INDEX_NAME = @indexname)
+  ) > 0,
+  "SELECT 1",
+  CONCAT("CREATE INDEX ", @indexname, " ON ", @tablename, "(status)")
+));
+PREPARE createIndexIfNotExists FROM @preparedStatement;
+EXECUTE createIndexIfNotExists;
+DEALLOCATE PREPARE createIndexIfNotExists;
+
+-- Broadcasts that already started were processed by the old sender
+-- (which could not resume), so they are not picked up again
+UPDATE broadcast_messages SET status = 'completed'
+WHERE status = 'pending' AND (sent_count > 0 OR failed_count >= 100);
@@ -0,0 +1,15 @@
+-- Migration: Add image moderation verdicts table
+-- Cached NSFW verdicts of profile photos by Telegram file_unique_id and
+-- perceptual hash (MySQL fallback of the Redis cache)
+
+CREATE TABLE IF NOT EXISTS `image_moderation_verdicts` (
+    `id` INT AUTO_INCREMENT PRIMARY KEY,
+    `file_unique_id` VARCHAR(255) NOT NULL UNIQUE,
+    `phash` BIGINT DEFAULT NULL,
+    `is_nsfw` BOOLEAN NOT NULL,
+    `confidence` FLOAT NOT NULL DEFAULT 0,
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX `idx_moderation_file_unique_id` (`file_unique_id`),
+    INDEX `idx_moderation_phash` (`phash`),
+    INDEX `idx_moderation_is_nsfw` (`is_nsfw`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -64,6 +64,7 @@ class User(Base):
     is_banned = Column(Boolean, default=False, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
     is_virtual = Column(Boolean, default=False, nullable=False)  # Virtual/bot profile for engagement
+    is_bot_blocked = Column(Boolean, default=False, nullable=False)  # User blocked the bot (skipped by broadcasts)
     
     # Chat filter preferences (default settings)
     default_chat_filter_same_age = Column(Boolean, default=True, nullable=False)  # Default: filter by same age (±3 years)
@@ -764,6 +765,8 @@ class BroadcastMessage(Base):
     failed_count = Column(Integer, default=0, nullable=False)
     opened_count = Column(Integer, default=0, nullable=False)
     delay_seconds = Column(Float, default=0.067, nullable=False)  # Delay between messages in seconds (default ~15 msg/sec)
+    status = Column(String(20), default="pending", nullable=False, index=True)  # pending, running, paused, completed, cancelled
+    last_user_id = Column(Integer, default=0, nullable=False)  # Recipient cursor: users with id <= last_user_id are done
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     
     # Relationships
@@ -1106,6 +1109,27 @@ class MandatoryChannel(Base):
         return f"<MandatoryChannel(id={self.id}, channel_id={self.channel_id}, is_active={self.is_active})>"
 
 
+class ImageModerationVerdict(Base):
+    """Cached NSFW verdict of an image, by Telegram file_unique_id and perceptual hash."""
+    __tablename__ = "image_moderation_verdicts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_unique_id = Column(String(255), unique=True, nullable=False)  # Telegram file_unique_id
+    phash = Column(BigInteger, nullable=True)  # 64-bit difference hash (stored signed)
+    is_nsfw = Column(Boolean, nullable=False)
+    confidence = Column(Float, default=0.0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_moderation_file_unique_id', 'file_unique_id'),
+        Index('idx_moderation_phash', 'phash'),
+        Index('idx_moderation_is_nsfw', 'is_nsfw'),
+    )
+    
+    def __repr__(self):
+        return f"<ImageModerationVerdict(id={self.id}, file_unique_id={self.file_unique_id}, is_nsfw={self.is_nsfw})>"
+
+
 # ============= Playlist Models =============
 
 class UserPlaylist(Base):
@@ -5,20 +5,20 @@ Initializes bot, database, Redis, handlers, and FastAPI server.
 import asyncio
 import logging
 from contextlib import asynccontextmanager
-from datetime import datetime
 
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
 import redis.asyncio as redis
 from fastapi import FastAPI
 import uvicorn
 
 from config.settings import settings
+from bot.client import create_bot, get_bot, close_session
 from db.database import init_db, close_db, get_db
 from core.matchmaking import MatchmakingQueue, InMemoryMatchmakingQueue
 from core.chat_manager import ChatManager
+from core.recent_partners import RecentPartners, set_recent_partners
+from core.user_context import UserContextCache, set_user_context_cache
 from utils.rate_limiter import MessageRateLimiter
 from utils.user_activity import UserActivityTracker
 from bot.middlewares.activity_tracker import ActivityTrackerMiddleware
@@ -41,13 +41,16 @@ import bot.handlers.coin_package_admin as coin_package_admin
 import bot.handlers.coin_purchase as coin_purchase
 from bot.middlewares.rate_limit import RateLimitMiddleware
 from bot.middlewares.channel_check import ChannelCheckMiddleware
+from utils.channel_membership import ChannelMembershipChecker
 from bot.middlewares.ban_check import BanCheckMiddleware
+from bot.middlewares.user_context import UserContextMiddleware
 
 # Import API
-from api.video_call import app as fastapi_app, set_redis_client as set_api_redis
+from api.video_call import app as fastapi_app, set_redis_client as set_api_redis, close_signaling
 
 # Import matchmaking worker
 from core.matchmaking_worker import set_matchmaking_queue as set_worker_queue, set_chat_manager as set_worker_chat_manager, set_bot as set_worker_bot, run_matchmaking_worker
+from core.chat_events import set_redis_client as set_chat_events_redis, set_bot as set_chat_events_bot, run_chat_events_worker
 
 # Configure logging
 logging.basicConfig(
@@ -62,6 +65,7 @@ matchmaking_queue = None
 chat_manager = None
 rate_limiter = None
 activity_tracker = None
+user_context_cache = None
 
 
 async def setup_redis():
@@ -102,7 +106,7 @@ async def setup_matchmaking():
         redis_client = await setup_redis()
     
     if getattr(settings, "MATCHMAKING_BACKEND", "redis") == "memory":
-        matchmaking_queue = InMemoryMatchmakingQueue()
+        matchmaking_queue = InMemoryMatchmakingQueue(RecentPartners(redis_client))
         logger.info("✅ Matchmaking queue initialized (in-memory backend)")
     else:
         matchmaking_queue = MatchmakingQueue(redis_client)
@@ -119,11 +123,27 @@ async def setup_chat_manager():
         redis_client = await setup_redis()
     
     chat_manager = ChatManager(redis_client)
+    # Chats ended anywhere (db/crud.end_chat_room) are recorded for the no-rematch rule
+    set_recent_partners(chat_manager.recent_partners)
     logger.info("✅ Chat manager initialized")
     
     return chat_manager
 
 
+async def setup_user_context_cache():
+    """Setup per-update user context cache."""
+    global user_context_cache, redis_client
+    
+    if not redis_client:
+        redis_client = await setup_redis()
+    
+    user_context_cache = UserContextCache(redis_client, chat_manager)
+    set_user_context_cache(user_context_cache)
+    logger.info("✅ User context cache initialized")
+    
+    return user_context_cache
+
+
 async def setup_rate_limiter():
     """Setup rate limiter."""
     global rate_limiter, redis_client
@@ -153,10 +173,7 @@ async def setup_activity_tracker():
 async def setup_bot():
     """Setup and configure the Telegram bot."""
     # Initialize bot
-    bot = Bot(
-        token=settings.BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    bot = create_bot()
     
     # Setup Redis first (needed for RedisStorage)
     await setup_redis()
@@ -166,16 +183,29 @@ async def setup_bot():
     storage = RedisStorage(redis=redis_client)
     dp = Dispatcher(storage=storage)
     
-    # Setup broadcast processor
+    # Setup broadcast processor (live progress counters in Redis)
     from core.broadcast_processor import BroadcastProcessor
-    broadcast_processor = BroadcastProcessor(bot)
+    from utils.broadcast_service import BroadcastCounters, set_broadcast_counters
+    broadcast_counters = BroadcastCounters(redis_client)
+    set_broadcast_counters(broadcast_counters)
+    broadcast_processor = BroadcastProcessor(bot, broadcast_counters)
     
     # Store broadcast processor for scheduler
     dp['broadcast_processor'] = broadcast_processor
     
+    # Setup leaderboards (Redis sorted sets)
+    from utils.leaderboard import Leaderboard, set_leaderboard
+    set_leaderboard(Leaderboard(redis_client))
+    
+    # Setup persistent image moderation verdicts (Redis + MySQL)
+    from utils.moderation_cache import ModerationCache
+    from utils.nsfw_detector import set_moderation_cache
+    set_moderation_cache(ModerationCache(redis_client))
+    
     # Setup matchmaking, chat manager, rate limiter, and activity tracker
     await setup_matchmaking()
     await setup_chat_manager()
+    await setup_user_context_cache()
     await setup_rate_limiter()
     await setup_activity_tracker()
     
@@ -183,7 +213,7 @@ async def setup_bot():
     chat.set_matchmaking_queue(matchmaking_queue)
     chat.set_chat_manager(chat_manager)
     message.set_chat_manager(chat_manager)
-    message.set_rate_limiter(rate_limiter)
+    message.set_user_context_cache(user_context_cache)
     reply.set_chat_manager(chat_manager)
     profile.set_chat_manager(chat_manager)
     anonymous_call.set_redis_client(redis_client)
@@ -200,23 +230,51 @@ async def setup_bot():
     set_worker_chat_manager(chat_manager)
     set_worker_bot(bot)
     
+    # Fill the no-rematch index with chats that ended before this start
+    if settings.ENABLE_NO_REMATCH_RULE:
+        try:
+            async for db_session in get_db():
+                recorded = await chat_manager.recent_partners.rebuild(db_session)
+                logger.info(f"✅ Recent partners index rebuilt ({recorded} chats)")
+                break
+        except Exception as e:
+            logger.error(f"❌ Failed to rebuild recent partners index: {e}")
+    
     # Start matchmaking worker in background
     asyncio.create_task(run_matchmaking_worker())
     
-    # Start activity checker worker in background
-    asyncio.create_task(run_activity_checker())
+    # Start last_seen writer in background: the write-behind flusher covers
+    # every active user, otherwise only users going offline need an update
+    if settings.LAST_SEEN_WRITE_BEHIND:
+        asyncio.create_task(run_last_seen_flusher())
+    else:
+        asyncio.create_task(run_activity_checker())
     
     # Start broadcast processor worker in background
     asyncio.create_task(run_broadcast_processor(dp['broadcast_processor']))
     
+    # Start chat-end event worker in background
+    set_chat_events_redis(redis_client)
+    set_chat_events_bot(get_bot())
+    asyncio.create_task(run_chat_events_worker())
+    
+    # Start leaderboard reconciliation in background
+    asyncio.create_task(run_leaderboard_reconciler())
+    
     # Register middlewares
+    # User context is resolved once per update (outer) and shared with the
+    # middlewares and handlers below as data["user_context"]
+    dp.message.outer_middleware(UserContextMiddleware(user_context_cache))
+    dp.callback_query.outer_middleware(UserContextMiddleware(user_context_cache))
     # Ban check should be first to block banned users immediately
     dp.message.middleware(BanCheckMiddleware())
     dp.callback_query.middleware(BanCheckMiddleware())
     dp.message.middleware(RateLimitMiddleware(rate_limiter))
     dp.callback_query.middleware(RateLimitMiddleware(rate_limiter))
-    dp.message.middleware(ChannelCheckMiddleware())
-    dp.callback_query.middleware(ChannelCheckMiddleware())
+    membership_checker = ChannelMembershipChecker(redis_client)
+    start.set_membership_checker(membership_checker)
+    dp.message.middleware(ChannelCheckMiddleware(membership_checker))
+    dp.callback_query.middleware(ChannelCheckMiddleware(membership_checker))
     # Activity tracker middleware (should be early to track all activity)
     dp.message.middleware(ActivityTrackerMiddleware(activity_tracker))
     dp.callback_query.middleware(ActivityTrackerMiddleware(activity_tracker))
@@ -304,8 +362,34 @@ async def run_broadcast_processor(broadcast_processor):
             await asyncio.sleep(60)  # Wait longer on error
 
 
+async def run_last_seen_flusher():
+    """Background task to write buffered last_seen values to the database in batches."""
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    interval = settings.LAST_SEEN_FLUSH_INTERVAL_SECONDS
+    logger.info(f"🕒 last_seen flusher started (flushing every {interval} seconds)")
+    
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            
+            if not activity_tracker:
+                continue
+            
+            flushed = 0
+            async for db_session in get_db():
+                flushed = await activity_tracker.flush_last_seen(db_session)
+                break
+            if flushed:
+                logger.debug(f"Flushed last_seen for {flushed} users")
+            
+        except Exception as e:
+            logger.error(f"Error in last_seen flusher: {e}", exc_info=True)
+
+
 async def run_activity_checker():
-    """Background task to check and mark users as offline after 1 minute of inactivity."""
+    """Background task to write last_seen of users who went offline to the database."""
     import logging
     logger = logging.getLogger(__name__)
     
@@ -313,64 +397,49 @@ async def run_activity_checker():
         try:
             await asyncio.sleep(30)  # Check every 30 seconds
             
-            if not activity_tracker or not redis_client:
+            if not activity_tracker:
                 continue
             
-            # Get all activity keys from Redis
-            pattern = f"{activity_tracker.activity_prefix}:*"
-            keys = []
-            async for key in redis_client.scan_iter(match=pattern):
-                if isinstance(key, bytes):
-                    key = key.decode('utf-8')
-                keys.append(key)
-            
-            # Check each key
-            now = datetime.utcnow()
-            for key in keys:
-                try:
-                    # Get timestamp from Redis
-                    timestamp_str = await redis_client.get(key)
-                    if not timestamp_str:
-                        continue
-                    
-                    if isinstance(timestamp_str, bytes):
-                        timestamp_str = timestamp_str.decode('utf-8')
-                    
-                    timestamp = float(timestamp_str)
-                    last_activity = datetime.utcfromtimestamp(timestamp)
-                    time_diff = (now - last_activity).total_seconds()
-                    
-                    # If more than 1 minute, user is offline (key will expire automatically)
-                    # But we should update last_seen in database
-                    if time_diff > 60:
-                        # Extract telegram_id from key
-                        telegram_id_str = key.split(":")[-1]
-                        telegram_id = int(telegram_id_str)
-                        
-                        # Update last_seen in database
-                        try:
-                            async for db_session in get_db():
-                                try:
-                                    from db.crud import get_user_by_telegram_id
-                                    user = await get_user_by_telegram_id(db_session, telegram_id)
-                                    if user:
-                                        user.last_seen = last_activity
-                                        await db_session.commit()
-                                except Exception as db_error:
-                                    logger.warning(f"Error updating last_seen for user {telegram_id}: {db_error}")
-                                    await db_session.rollback()
-                                break
-                        except Exception as db_error:
-                            logger.warning(f"Error getting DB session for user {telegram_id}: {db_error}")
-                except Exception as e:
-                    logger.warning(f"Error processing activity key {key}: {e}")
-                    continue
+            # One range query over the presence sorted set instead of a key scan
+            flushed = 0
+            async for db_session in get_db():
+                flushed = await activity_tracker.flush_offline_users(db_session)
+                break
+            if flushed:
+                logger.debug(f"Updated last_seen for {flushed} offline users")
                     
         except Exception as e:
             logger.error(f"Error in activity checker: {e}", exc_info=True)
             await asyncio.sleep(60)  # Wait longer on error
 
 
+async def run_leaderboard_reconciler():
+    """Background task to rebuild the leaderboard sorted sets from the database."""
+    import logging
+    from utils.leaderboard import get_leaderboard
+    logger = logging.getLogger(__name__)
+    
+    interval = settings.LEADERBOARD_RECONCILE_INTERVAL_SECONDS
+    logger.info(f"🏆 Leaderboard reconciler started (rebuilding every {interval} seconds)")
+    
+    while True:
+        try:
+            leaderboard = get_leaderboard()
+            if leaderboard:
+                rebuilt = False
+                async for db_session in get_db():
+                    rebuilt = await leaderboard.reconcile(db_session)
+                    break
+                if rebuilt:
+                    logger.debug("Leaderboards rebuilt")
+            
+            await asyncio.sleep(interval)
+            
+        except Exception as e:
+            logger.error(f"Error in leaderboard reconciler: {e}", exc_info=True)
+            await asyncio.sleep(60)  # Wait longer on error
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for FastAPI app."""
@@ -406,6 +475,10 @@ async def lifespan(app: FastAPI):
         await run_migration(migration_file)
         migration_file = os.path.join(os.path.dirname(__file__), "db", "migration_add_broadcast_delay.sql")
         await run_migration(migration_file)
+        migration_file = os.path.join(os.path.dirname(__file__), "db", "migration_add_bot_blocked.sql")
+        await run_migration(migration_file)
+        migration_file = os.path.join(os.path.dirname(__file__), "db", "migration_add_broadcast_cursor.sql")
+        await run_migration(migration_file)
         migration_file = os.path.join(os.path.dirname(__file__), "db", "migration_add_coin_packages.sql")
         await run_migration(migration_file)
         logger.info("✅ Migrations completed")
@@ -430,6 +503,12 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Error closing database: {e}")
     
+    # Close signaling pub/sub connection
+    try:
+        await close_signaling()
+    except Exception as e:
+        logger.error(f"❌ Error closing signaling: {e}")
+    
     # Close Redis
     if redis_client:
         await redis_client.close()
@@ -450,7 +529,9 @@ async def run_bot():
     except Exception as e:
         logger.error(f"❌ Bot error: {e}")
     finally:
-        await bot.session.close()
+        await close_session()
+        from utils.nsfw_detector import shutdown_executor
+        shutdown_executor()
 
 
 async def run_fastapi():
@@ -0,0 +1,115 @@
+"""
+Tests for anonymous call matching on a fake Redis.
+Tests that the oldest compatible searcher is matched first, that concurrent
+searchers never share a partner and that both users must accept each
+other's gender.
+"""
+import asyncio
+import itertools
+
+import pytest
+from fakeredis import aioredis
+
+from core import anonymous_call_queue as queue_module
+from core.anonymous_call_queue import AnonymousCallQueue
+
+GENDERS = ["male", "female", "other"]
+PREFERENCES = ["male", "female", "all"]
+
+
+class FakeClock:
+    """Stands in for the time module of the queue, one second per call."""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+async def queue(monkeypatch):
+    """Anonymous call queue on an empty fake Redis, with distinct join times."""
+    monkeypatch.setattr(queue_module, "time", FakeClock())
+    client = aioredis.FakeRedis()
+    yield AnonymousCallQueue(client)
+    await client.aclose()
+
+
+def accepts(preferred_gender: str, gender: str) -> bool:
+    """Whether a searcher with this preference accepts a partner of this gender."""
+    return preferred_gender == "all" or preferred_gender == gender
+
+
+class TestClaimMatch:
+    """Test FIFO order and atomic claims."""
+
+    async def test_oldest_compatible_first(self, queue):
+        """The longest-waiting compatible searcher is matched."""
+        await queue.add_user(1, "video", "all", "female")
+        await queue.add_user(2, "video", "all", "female")
+        await queue.add_user(3, "video", "all", "male")
+
+        assert await queue.claim_match(3) == 1
+        assert await queue.is_queued(1) is False
+        assert await queue.is_queued(3) is False
+        assert await queue.is_queued(2) is True
+
+    async def test_skips_incompatible_older_searcher(self, queue):
+        """An older searcher who doesn't accept the user is skipped."""
+        await queue.add_user(1, "video", "female", "female")
+        await queue.add_user(2, "video", "all", "female")
+        await queue.add_user(3, "video", "all", "male")
+
+        assert await queue.claim_match(3) == 2
+
+    async def test_call_types_are_separate(self, queue):
+        """Video and voice searchers are not matched together."""
+        await queue.add_user(1, "voice", "all", "female")
+        await queue.add_user(2, "video", "all", "male")
+
+        assert await queue.claim_match(2) is None
+
+    async def test_removed_user_is_not_matched(self, queue):
+        """Searchers who cancelled are not matched."""
+        await queue.add_user(1, "video", "all", "female")
+        await queue.add_user(2, "video", "all", "male")
+        await queue.remove_user(1)
+
+        assert await queue.claim_match(2) is None
+
+    async def test_matched_user_cannot_claim(self, queue):
+        """A searcher claimed by someone else gets no second match."""
+        await queue.add_user(1, "video", "all", "female")
+        await queue.add_user(2, "video", "all", "male")
+        await queue.add_user(3, "video", "all", "male")
+
+        assert await queue.claim_match(2) == 1
+        assert await queue.claim_match(1) is None
+
+    async def test_concurrent_claims(self, queue):
+        """Concurrent searchers never share a partner."""
+        for user_id in range(1, 21):
+            await queue.add_user(user_id, "video", "all", "female" if user_id % 2 else "male")
+
+        results = await asyncio.gather(*(queue.claim_match(user_id) for user_id in range(1, 21)))
+
+        pairs = [(user_id, partner_id) for user_id, partner_id in zip(range(1, 21), results) if partner_id]
+        matched = [user_id for pair in pairs for user_id in pair]
+        assert len(matched) == len(set(matched))
+        assert len(pairs) == 10
+
+
+@pytest.mark.parametrize(
+    "first_gender,first_preference,second_gender,second_preference",
+    list(itertools.product(GENDERS, PREFERENCES, GENDERS, PREFERENCES))
+)
+async def test_gender_matrix(queue, first_gender, first_preference, second_gender, second_preference):
+    """Two searchers are matched only if each accepts the other's gender."""
+    await queue.add_user(1, "video", first_preference, first_gender)
+    await queue.add_user(2, "video", second_preference, second_gender)
+
+    expected = accepts(first_preference, second_gender) and accepts(second_preference, first_gender)
+
+    assert (await queue.claim_match(2) == 1) is expected
@@ -0,0 +1,123 @@
+"""
+Tests for profanity and pattern detection.
+Tests that the precompiled matchers report the same word/pattern as the
+original per-word checks: direct matches before variations, then list order.
+"""
+import random
+import re
+
+import pytest
+
+from utils import content_filter
+from utils.content_filter import (
+    INAPPROPRIATE_PATTERNS,
+    PROFANITY_WORDS,
+    ProfanityMatcher,
+    check_profanity,
+    detect_pattern,
+    generate_variations,
+    normalize_text,
+)
+
+
+def reference_check_profanity(words, text):
+    """The original check: every word directly, then every word's variations."""
+    normalized = normalize_text(text)
+    for word in words:
+        normalized_word = normalize_text(word)
+        if normalized_word and normalized_word in normalized:
+            return word
+    for word in words:
+        for variation in generate_variations(normalize_text(word))[1:]:
+            if variation in normalized:
+                return word
+    return None
+
+
+def reference_detect_pattern(text):
+    """The original check: the first listed pattern found in the text."""
+    normalized = normalize_text(text)
+    for pattern in INAPPROPRIATE_PATTERNS:
+        if re.search(pattern, normalized, re.IGNORECASE):
+            return pattern
+    return None
+
+
+@pytest.fixture
+def replacements(monkeypatch):
+    """Character substitutions for the variation tests."""
+    monkeypatch.setattr(content_filter, "CHAR_REPLACEMENTS", {"o": ["0"], "a": ["4"]})
+
+
+class TestProfanityMatcher:
+    """Test the priority of matches found by ProfanityMatcher."""
+
+    def test_no_match(self):
+        """Clean text matches nothing."""
+        assert ProfanityMatcher(["cat", "dog"]).find("hello world") is None
+
+    def test_list_order_wins_over_position(self):
+        """The first listed word is reported, not the leftmost one."""
+        assert ProfanityMatcher(["cat", "dog"]).find("dog and cat") == "cat"
+
+    def test_overlapping_words_use_list_order(self):
+        """A word contained in a longer one is reported if listed first."""
+        assert ProfanityMatcher(["cat", "catfish"]).find("catfish") == "cat"
+        assert ProfanityMatcher(["catfish", "cat"]).find("catfish") == "catfish"
+
+    def test_direct_match_wins_over_variation(self, replacements):
+        """A direct match of a later word wins over a variation of an earlier one."""
+        matcher = ProfanityMatcher(["dog", "cat"])
+
+        assert matcher.find("d0g cat") == "cat"
+
+    def test_variations_use_list_order(self, replacements):
+        """Among variation matches, the first listed word is reported."""
+        matcher = ProfanityMatcher(["cat", "dog"])
+
+        assert matcher.find("d0g c4t") == "cat"
+        assert matcher.find("d0g") == "dog"
+
+    def test_matches_original_check(self, replacements):
+        """Random texts over a small alphabet give the original results."""
+        words = ["cat", "dog", "at", "god", "toga", "a c"]
+        matcher = ProfanityMatcher(words)
+        rng = random.Random(0)
+        for _ in range(2000):
+            text = "".join(rng.choice("catdog04 ") for _ in range(rng.randint(0, 12)))
+            assert matcher.find(normalize_text(text)) == reference_check_profanity(words, text), text
+
+
+class TestCheckProfanity:
+    """Test check_profanity with the loaded word list."""
+
+    def test_matches_original_check(self):
+        """Texts built from listed words give the original results."""
+        rng = random.Random(0)
+        for _ in range(300):
+            text = " ".join(rng.sample(PROFANITY_WORDS, 3) + ["سلام"])
+            expected = reference_check_profanity(PROFANITY_WORDS, text)
+            assert check_profanity(text) == (True, expected)
+
+    def test_clean_text(self):
+        """Clean text passes."""
+        assert check_profanity("سلام خوبی") == (False, "")
+
+
+class TestDetectPattern:
+    """Test detect_pattern."""
+
+    def test_reports_first_listed_pattern(self):
+        """The first listed pattern is reported, not the leftmost match."""
+        text = "کیر م و کس میخوام"
+
+        assert detect_pattern(text) == (True, INAPPROPRIATE_PATTERNS[0])
+
+    def test_matches_original_check(self):
+        """Random texts give the original results."""
+        fragments = ["کس", "کص", "کیر", "میخوام", "م", "بخو", "کش", "سلام", " "]
+        rng = random.Random(0)
+        for _ in range(1000):
+            text = "".join(rng.choice(fragments) for _ in range(rng.randint(0, 6)))
+            expected = reference_detect_pattern(text)
+            assert detect_pattern(text) == ((True, expected) if expected else (False, "")), text
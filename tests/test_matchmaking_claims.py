@@ -0,0 +1,101 @@
+"""
+Tests for the atomic matchmaking claims (Lua scripts) on a fake Redis.
+Tests that a user can be claimed only once, that users who left the queue
+can't be claimed and that recent partners are not matched again.
+"""
+import pytest
+from fakeredis import aioredis
+
+from config.settings import settings
+from core.matchmaking import MatchmakingQueue
+
+
+@pytest.fixture
+async def queue():
+    """Matchmaking queue on an empty fake Redis."""
+    client = aioredis.FakeRedis()
+    yield MatchmakingQueue(client)
+    await client.aclose()
+
+
+class TestClaimMatch:
+    """Test server-side matching with claim_match."""
+
+    async def test_claims_oldest_compatible_candidate(self, queue):
+        """The longest-waiting compatible user is claimed and both leave the queue."""
+        await queue.add_user_to_queue(1, gender="male", preferred_gender="female")
+        await queue.add_user_to_queue(2, gender="female")
+        await queue.add_user_to_queue(3, gender="female")
+
+        assert await queue.claim_match(1) == (1, 2)
+        assert await queue.get_all_user_ids() == [3]
+
+    async def test_double_claim(self, queue):
+        """A claimed candidate can't be claimed by another user."""
+        await queue.add_user_to_queue(1, gender="male")
+        await queue.add_user_to_queue(2, gender="female")
+        await queue.add_user_to_queue(3, gender="male")
+
+        assert await queue.claim_match(1) == (1, 2)
+        assert await queue.claim_match(3) is None
+        # The requester was claimed too, so it can't claim again
+        assert await queue.claim_match(1) is None
+
+    async def test_removed_user_is_not_claimed(self, queue):
+        """Users who left the queue are skipped."""
+        await queue.add_user_to_queue(1, gender="male")
+        await queue.add_user_to_queue(2, gender="female")
+        await queue.remove_user_from_queue(2)
+
+        assert await queue.claim_match(1) is None
+
+    async def test_blocked_user_is_not_claimed(self, queue):
+        """Blocked users are skipped."""
+        await queue.add_user_to_queue(1, gender="male")
+        await queue.add_user_to_queue(2, gender="female")
+        await queue.add_blocked_user(1, 2)
+
+        assert await queue.claim_match(1) is None
+
+    async def test_no_rematch_rejection(self, queue, monkeypatch):
+        """Partners of a recently ended chat are not matched again."""
+        monkeypatch.setattr(settings, "ENABLE_NO_REMATCH_RULE", True)
+        await queue.recent_partners.record(1, 2)
+        await queue.add_user_to_queue(1, gender="male")
+        await queue.add_user_to_queue(2, gender="female")
+        await queue.add_user_to_queue(3, gender="female")
+
+        assert await queue.claim_match(1) == (1, 3)
+
+    async def test_no_rematch_rule_disabled(self, queue, monkeypatch):
+        """Recent partners can be matched when the rule is disabled."""
+        monkeypatch.setattr(settings, "ENABLE_NO_REMATCH_RULE", False)
+        await queue.recent_partners.record(1, 2)
+        await queue.add_user_to_queue(1, gender="male")
+        await queue.add_user_to_queue(2, gender="female")
+
+        assert await queue.claim_match(1) == (1, 2)
+
+
+class TestClaimPair:
+    """Test claiming a pair chosen by the batch worker with claim_pair."""
+
+    async def test_claims_pair_once(self, queue):
+        """A pair is claimed once; a second claim of either user fails."""
+        await queue.add_user_to_queue(1, gender="male")
+        await queue.add_user_to_queue(2, gender="female")
+        await queue.add_user_to_queue(3, gender="female")
+
+        assert await queue.claim_pair(1, 2) is True
+        assert await queue.claim_pair(1, 3) is False
+        assert await queue.claim_pair(3, 2) is False
+        assert await queue.get_all_user_ids() == [3]
+
+    async def test_removed_user_is_not_claimed(self, queue):
+        """A pair with a user who left the queue is not claimed."""
+        await queue.add_user_to_queue(1, gender="male")
+        await queue.add_user_to_queue(2, gender="female")
+        await queue.remove_user_from_queue(2)
+
+        assert await queue.claim_pair(1, 2) is False
+        assert await queue.get_all_user_ids() == [1]
@@ -0,0 +1,90 @@
+"""
+Tests for the in-memory pairing used by the batch matchmaking worker.
+Tests that build_pairs respects gender rules, filters and block lists,
+and serves the longest-waiting users first.
+"""
+from core.matchmaking import build_pairs
+
+
+def make_profile(user_id, gender, preferred_gender=None, joined_at=None, **extra):
+    """Build a queue profile like the one stored by add_user_to_queue."""
+    profile = {
+        "user_id": user_id,
+        "gender": gender,
+        "city": None,
+        "age": None,
+        "preferred_gender": preferred_gender,
+        "min_age": None,
+        "max_age": None,
+        "preferred_city": None,
+        "joined_at": joined_at if joined_at is not None else float(user_id),
+        "is_premium": False,
+        "filter_same_age": False,
+        "filter_same_city": False,
+        "filter_same_province": False,
+        "province": None,
+    }
+    profile.update(extra)
+    return profile
+
+
+class TestBuildPairs:
+    """Test batch pairing of queue snapshots."""
+
+    def test_pairs_longest_waiting_first(self):
+        """Oldest user is paired with the oldest compatible partner."""
+        profiles = [
+            make_profile(1, "male"),
+            make_profile(2, "female"),
+            make_profile(3, "male"),
+            make_profile(4, "female"),
+        ]
+
+        pairs = build_pairs(profiles, {})
+
+        assert pairs == [(1, 2), (3, 4)]
+
+    def test_respects_bidirectional_gender_preference(self):
+        """Both users must accept each other's gender."""
+        profiles = [
+            make_profile(1, "male", preferred_gender="female"),
+            make_profile(2, "male"),
+            make_profile(3, "female", preferred_gender="female"),
+            make_profile(4, "female", preferred_gender="male"),
+        ]
+
+        pairs = build_pairs(profiles, {})
+
+        assert pairs == [(1, 4)]
+
+    def test_respects_block_lists(self):
+        """Blocked users are never paired, in either direction."""
+        profiles = [
+            make_profile(1, "male"),
+            make_profile(2, "female"),
+            make_profile(3, "female"),
+        ]
+
+        pairs = build_pairs(profiles, {2: {1}})
+
+        assert pairs == [(1, 3)]
+
+    def test_respects_advanced_filters(self):
+        """Same-city filter of either user is applied."""
+        profiles = [
+            make_profile(1, "male", city="Tehran", filter_same_city=True),
+            make_profile(2, "female", city="Shiraz"),
+            make_profile(3, "female", city="Tehran"),
+        ]
+
+        pairs = build_pairs(profiles, {})
+
+        assert pairs == [(1, 3)]
+
+    def test_max_pairs_limits_result(self):
+        """No more than max_pairs pairs are returned."""
+        profiles = [make_profile(user_id, "male") for user_id in range(1, 7)]
+
+        pairs = build_pairs(profiles, {}, max_pairs=2)
+
+        assert pairs == [(1, 2), (3, 4)]
@@ -0,0 +1,60 @@
+"""
+Tests for the Redis layer of the moderation verdict cache on a fake Redis.
+Tests that safe verdicts are only reused for the same file, while NSFW
+verdicts are also reused for identical and near-duplicate images.
+"""
+from unittest.mock import AsyncMock
+
+import pytest
+from fakeredis import aioredis
+
+from utils import moderation_cache
+from utils.moderation_cache import ModerationCache
+
+PHASH = 0x0123456789ABCDEF
+
+
+@pytest.fixture
+async def cache(monkeypatch):
+    """Moderation cache on an empty fake Redis, without MySQL."""
+    monkeypatch.setattr(moderation_cache, "save_image_verdict", AsyncMock())
+    monkeypatch.setattr(moderation_cache, "find_nsfw_verdict_by_phash", AsyncMock(return_value=None))
+    monkeypatch.setattr(moderation_cache, "get_db", lambda: _no_session())
+    client = aioredis.FakeRedis()
+    yield ModerationCache(client, ttl=60, max_distance=4)
+    await client.aclose()
+
+
+async def _no_session():
+    yield None
+
+
+class TestModerationCache:
+    """Test which verdicts are reused."""
+
+    async def test_safe_verdict_reused_by_file_only(self, cache):
+        """A safe verdict is reused for the same file, not for an identical hash."""
+        await cache.store("approved", PHASH, (False, 0.1))
+
+        assert await cache.get_by_file_unique_id("approved") == (False, 0.1)
+        assert await cache.get_by_hash(PHASH) is None
+        assert await cache.redis.exists(cache._get_hash_key(PHASH)) == 0
+
+    async def test_nsfw_verdict_reused_by_hash(self, cache):
+        """An NSFW verdict is reused for identical and near-duplicate hashes."""
+        await cache.store("rejected", PHASH, (True, 0.9))
+
+        assert await cache.get_by_hash(PHASH) == (True, 0.9)
+        assert await cache.get_by_hash(PHASH ^ 0b101) == (True, 0.9)
+        assert await cache.get_by_hash(PHASH ^ 0xFFFF) is None
+
+    async def test_legacy_safe_hash_entry_ignored(self, cache):
+        """Safe verdicts stored by hash before are not reused."""
+        await cache.redis.set(cache._get_hash_key(PHASH), cache._encode((False, 0.1)))
+
+        assert await cache.get_by_hash(PHASH) is None
+
+    async def test_redis_miss_skips_mysql(self, cache):
+        """The MySQL near-duplicate scan only runs without Redis."""
+        assert await cache.get_by_hash(PHASH) is None
+        moderation_cache.find_nsfw_verdict_by_phash.assert_not_awaited()
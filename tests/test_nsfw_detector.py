@@ -0,0 +1,61 @@
+"""
+Tests for off-loop NSFW checks.
+Tests that check_image_nsfw_async runs the check in the inference process
+pool and only caches verdicts given by the detector.
+"""
+import io
+
+import pytest
+from PIL import Image
+
+from utils import nsfw_detector
+
+
+def make_image(width: int, height: int) -> bytes:
+    """Build a plain JPEG image."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Fresh inference pool and verdict caches, shut down after the test."""
+    monkeypatch.setattr(nsfw_detector.settings, "NSFW_WORKER_PROCESSES", 1)
+    monkeypatch.setattr(nsfw_detector, "_pending_checks", None)
+    monkeypatch.setattr(nsfw_detector, "_moderation_cache", None)
+    monkeypatch.setattr(nsfw_detector, "_verdict_cache", type(nsfw_detector._verdict_cache)())
+    yield
+    nsfw_detector.shutdown_executor()
+
+
+class TestCheckImageNsfwAsync:
+    """Test checks through the process pool."""
+
+    async def test_returns_through_pool(self, pool):
+        """A readable image gets the verdict computed in a pool worker."""
+        image_data = make_image(100, 100)
+        expected = nsfw_detector.check_image_nsfw(image_data)
+
+        verdict = await nsfw_detector.check_image_nsfw_async(image_data)
+
+        assert verdict == expected
+        assert nsfw_detector._executor is not None
+
+    async def test_fallback_verdict_is_not_cached(self, pool):
+        """Rejections of unusable images are returned but not cached."""
+        verdict = await nsfw_detector.check_image_nsfw_async(make_image(5, 5), "tiny")
+
+        assert verdict == (True, 1.0)
+        assert "tiny" not in nsfw_detector._verdict_cache
+
+    async def test_detector_verdict_is_cached(self, pool):
+        """Verdicts given by the detector are cached by file_unique_id."""
+        image_data = make_image(100, 100)
+        _, _, from_detector = nsfw_detector.check_image_nsfw_detailed(image_data)
+
+        verdict = await nsfw_detector.check_image_nsfw_async(image_data, "plain")
+
+        assert ("plain" in nsfw_detector._verdict_cache) == from_detector
+        if from_detector:
+            assert nsfw_detector._verdict_cache["plain"] == verdict
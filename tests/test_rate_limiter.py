@@ -0,0 +1,165 @@
+"""
+Tests for the Redis rate limiter on a fake Redis.
+Tests that both algorithms (sliding window and GCRA) allow requests up to the
+limit, deny the next ones and allow again once the window has passed, and
+that callbacks count against their dedicated limits.
+"""
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.types import CallbackQuery, Chat, Message, User
+from fakeredis import aioredis
+
+from bot.middlewares.rate_limit import RateLimitMiddleware, get_limit_names
+from utils import rate_limiter as rate_limiter_module
+from utils.rate_limiter import MODE_GCRA, MODE_SLIDING_WINDOW, MessageRateLimiter, RateLimiter, RateLimitRule
+
+MODES = [MODE_SLIDING_WINDOW, MODE_GCRA]
+
+
+class FakeClock:
+    """Stands in for the time module of the rate limiter."""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen clock for the rate limiter."""
+    fake_clock = FakeClock()
+    monkeypatch.setattr(rate_limiter_module, "time", fake_clock)
+    return fake_clock
+
+
+@pytest.fixture
+async def redis_client():
+    """Empty fake Redis."""
+    client = aioredis.FakeRedis()
+    yield client
+    await client.aclose()
+
+
+def make_user(user_id: int = 1) -> User:
+    """Build a Telegram user."""
+    return User(id=user_id, is_bot=False, first_name="test")
+
+
+def make_callback(data: str, user_id: int = 1) -> CallbackQuery:
+    """Build a button press with the given callback data."""
+    return CallbackQuery(id="1", from_user=make_user(user_id), chat_instance="1", data=data)
+
+
+@pytest.mark.parametrize("mode", MODES)
+class TestRateLimiter:
+    """Test check_rate_limit in both modes."""
+
+    async def test_allows_up_to_limit(self, redis_client, clock, mode):
+        """Requests within the limit are allowed, with decreasing remaining counts."""
+        limiter = RateLimiter(redis_client, mode)
+
+        results = [await limiter.check_rate_limit("rate_limit:test", 3, 60) for _ in range(3)]
+
+        assert [allowed for allowed, _ in results] == [True, True, True]
+        assert [remaining for _, remaining in results] == [2, 1, 0]
+
+    async def test_denies_over_limit(self, redis_client, clock, mode):
+        """The request over the limit is denied and not counted."""
+        limiter = RateLimiter(redis_client, mode)
+        for _ in range(3):
+            await limiter.check_rate_limit("rate_limit:test", 3, 60)
+
+        assert await limiter.check_rate_limit("rate_limit:test", 3, 60) == (False, 0)
+        clock.advance(1)
+        assert await limiter.check_rate_limit("rate_limit:test", 3, 60) == (False, 0)
+
+    async def test_allows_after_window(self, redis_client, clock, mode):
+        """Requests are allowed again once the window has passed."""
+        limiter = RateLimiter(redis_client, mode)
+        for _ in range(3):
+            await limiter.check_rate_limit("rate_limit:test", 3, 60)
+
+        clock.advance(61)
+
+        assert await limiter.check_rate_limit("rate_limit:test", 3, 60) == (True, 2)
+
+    async def test_reset(self, redis_client, clock, mode):
+        """reset_rate_limit clears the count."""
+        limiter = RateLimiter(redis_client, mode)
+        for _ in range(3):
+            await limiter.check_rate_limit("rate_limit:test", 3, 60)
+
+        await limiter.reset_rate_limit("rate_limit:test")
+
+        assert (await limiter.check_rate_limit("rate_limit:test", 3, 60))[0] is True
+
+    async def test_denied_request_counts_against_no_limit(self, redis_client, clock, mode):
+        """A request denied by one limit is not counted against the others."""
+        limiter = MessageRateLimiter(redis_client, mode)
+        limiter.rules = {
+            "callbacks": RateLimitRule("callbacks", 10),
+            "chat_requests": RateLimitRule("chat_requests", 1),
+        }
+
+        assert (await limiter.check_user_limits(1, ["callbacks", "chat_requests"]))[0] is True
+        assert (await limiter.check_user_limits(1, ["callbacks", "chat_requests"]))[0] is False
+
+        is_allowed, remaining = await limiter.check_user_limits(1, ["callbacks"])
+        assert is_allowed is True
+        assert remaining == {"callbacks": 8}
+
+
+class TestGetLimitNames:
+    """Test which limits an update counts against."""
+
+    def test_message(self):
+        """Messages count against the message limit."""
+        message = Message(
+            message_id=1,
+            date=0,
+            chat=Chat(id=1, type="private"),
+            from_user=make_user(),
+            text="hi"
+        )
+        assert get_limit_names(message) == ["messages"]
+
+    def test_plain_callback(self):
+        """Button presses count against the callback limit."""
+        assert get_limit_names(make_callback("profile:view")) == ["callbacks"]
+
+    def test_dedicated_callback_limits(self):
+        """Confirm buttons also count against their dedicated limit."""
+        assert get_limit_names(make_callback("dm:confirm:5")) == ["callbacks", "direct_messages"]
+        assert get_limit_names(make_callback("chat_request:send:confirm:5")) == ["callbacks", "chat_requests"]
+
+
+@pytest.mark.parametrize("mode", MODES)
+class TestRateLimitMiddleware:
+    """Test the middleware on callbacks."""
+
+    async def test_blocks_callbacks_over_dedicated_limit(self, redis_client, clock, mode, monkeypatch):
+        """A callback over its dedicated limit is answered and not handled."""
+        answer = AsyncMock()
+        monkeypatch.setattr(CallbackQuery, "answer", answer)
+        limiter = MessageRateLimiter(redis_client, mode)
+        limiter.rules["direct_messages"] = RateLimitRule("direct_messages", 1)
+        middleware = RateLimitMiddleware(limiter)
+        handler = AsyncMock(return_value="handled")
+
+        first = await middleware(handler, make_callback("dm:confirm:5"), {})
+        second = await middleware(handler, make_callback("dm:confirm:5"), {})
+        # Other callbacks only count against the general callback limit
+        third = await middleware(handler, make_callback("profile:view"), {})
+
+        assert (first, second, third) == ("handled", None, "handled")
+        assert handler.await_count == 2
+        answer.assert_awaited_once()
+
+        clock.advance(61)
+        assert await middleware(handler, make_callback("dm:confirm:5"), {}) == "handled"
@@ -5,14 +5,87 @@ Handles broadcast message queue and processing
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
-from sqlalchemy import select
+from sqlalchemy import select, update, func
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
+import redis.asyncio as redis
 from db.models import User, BroadcastMessage
 
 logger = logging.getLogger(__name__)
 
+# Broadcast statuses
+BROADCAST_PENDING = "pending"
+BROADCAST_RUNNING = "running"
+BROADCAST_PAUSED = "paused"
+BROADCAST_COMPLETED = "completed"
+BROADCAST_CANCELLED = "cancelled"
+# Statuses picked up by the processor (running = interrupted by a restart)
+BROADCAST_ACTIVE_STATUSES = (BROADCAST_PENDING, BROADCAST_RUNNING)
+
+
+class BroadcastCounters:
+    """
+    Live progress counters of broadcasts in a Redis hash per broadcast.
+
+    Senders increment them (HINCRBY) as they go; the counts in
+    broadcast_messages are only written at checkpoints.
+    """
+
+    def __init__(self, redis_client: redis.Redis, ttl: int = 7 * 86400):
+        """
+        Initialize broadcast counters.
+
+        Args:
+            redis_client: Redis async client instance
+            ttl: Seconds the counters are kept after the last update
+        """
+        self.redis = redis_client
+        self.ttl = ttl
+        self.key_prefix = "broadcast:stats"
+
+    def _get_key(self, broadcast_id: int) -> str:
+        """Get Redis key for the counters of a broadcast."""
+        return f"{self.key_prefix}:{broadcast_id}"
+
+    async def reset(self, broadcast_id: int, sent: int = 0, failed: int = 0) -> None:
+        """Start the counters from the stored counts (when a broadcast starts or resumes)."""
+        key = self._get_key(broadcast_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, mapping={'sent': sent, 'failed': failed})
+        pipe.expire(key, self.ttl)
+        await pipe.execute()
+
+    async def increment(self, broadcast_id: int, field: str, amount: int = 1) -> None:
+        """Increment one counter (sent, failed or opened)."""
+        await self.redis.hincrby(self._get_key(broadcast_id), field, amount)
+
+    async def get(self, broadcast_id: int) -> Optional[Dict[str, int]]:
+        """Get the counters of a broadcast, or None if there are none."""
+        values = await self.redis.hgetall(self._get_key(broadcast_id))
+        if not values:
+            return None
+        return {
+            (k.decode() if isinstance(k, bytes) else k): int(v)
+            for k, v in values.items()
+        }
+
+
+# Global instance (set in main.py)
+_broadcast_counters: Optional[BroadcastCounters] = None
+
+
+def set_broadcast_counters(counters: BroadcastCounters):
+    """Set broadcast counters instance."""
+    global _broadcast_counters
+    _broadcast_counters = counters
+
+
+def get_broadcast_counters() -> Optional[BroadcastCounters]:
+    """Get broadcast counters instance (None if Redis is not configured)."""
+    return _broadcast_counters
+
 
 class BroadcastService:
     """سرویس مدیریت پیام همگانی"""
@@ -55,12 +128,11 @@ class BroadcastService:
             raise
 
     async def get_pending_broadcasts(self, session: AsyncSession) -> List[BroadcastMessage]:
-        """دریافت پیام‌های همگانی در انتظار (sent_count = 0 و failed_count کم)"""
+        """دریافت پیام‌های همگانی در انتظار یا نیمه‌کاره (برای ادامه پس از ری‌استارت)"""
         try:
             result = await session.execute(
                 select(BroadcastMessage)
-                .where(BroadcastMessage.sent_count == 0)
-                .where(BroadcastMessage.failed_count < 100)  # Skip if too many failures
+                .where(BroadcastMessage.status.in_(BROADCAST_ACTIVE_STATUSES))
                 .order_by(BroadcastMessage.created_at)
             )
             broadcasts = result.scalars().all()
@@ -69,21 +141,89 @@ class BroadcastService:
             logger.error(f"Error getting pending broadcasts: {e}")
             return []
 
-    async def get_active_users(self, session: AsyncSession) -> List[User]:
-        """دریافت لیست کاربران فعال (غیر بن شده)"""
+    def _active_users_query(self, query):
+        """فیلتر کاربران فعال (غیر بن شده و بدون مسدود کردن ربات)"""
+        return (
+            query
+            .where(User.is_banned == False)
+            .where(User.is_active == True)
+            .where(User.is_bot_blocked == False)
+            .where(User.telegram_id.isnot(None))
+        )
+
+    async def count_active_users(self, session: AsyncSession, after_user_id: int = 0) -> int:
+        """تعداد کاربران فعال (بعد از after_user_id)"""
+        result = await session.execute(
+            self._active_users_query(select(func.count(User.id)))
+            .where(User.id > after_user_id)
+        )
+        return result.scalar() or 0
+
+    async def get_active_user_batch(
+        self,
+        session: AsyncSession,
+        after_user_id: int,
+        limit: int = 1000
+    ) -> List[Row]:
+        """
+        دریافت دسته بعدی کاربران فعال (keyset pagination)
+
+        Only id and telegram_id are selected; pass the last id of a batch as
+        after_user_id to get the next one.
+
+        Args:
+            session: Database session
+            after_user_id: Return users with a greater id
+            limit: Batch size
+
+        Returns:
+            Rows with id and telegram_id, ordered by id (empty when done)
+        """
+        result = await session.execute(
+            self._active_users_query(select(User.id, User.telegram_id))
+            .where(User.id > after_user_id)
+            .order_by(User.id)
+            .limit(limit)
+        )
+        return list(result.all())
+
+    async def get_broadcast_status(self, session: AsyncSession, broadcast_id: int) -> Optional[str]:
+        """دریافت وضعیت پیام همگانی"""
+        result = await session.execute(
+            select(BroadcastMessage.status).where(BroadcastMessage.id == broadcast_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def set_broadcast_status(
+        self,
+        session: AsyncSession,
+        broadcast_id: int,
+        status: str,
+        from_statuses: Optional[Tuple[str, ...]] = None,
+    ) -> bool:
+        """
+        تغییر وضعیت پیام همگانی
+
+        Args:
+            session: Database session
+            broadcast_id: Broadcast ID
+            status: New status
+            from_statuses: Only change it from one of these statuses
+
+        Returns:
+            True if the status was changed
+        """
         try:
-            result = await session.execute(
-                select(User)
-                .where(User.is_banned == False)
-                .where(User.is_active == True)
-                .where(User.telegram_id.isnot(None))
-            )
-            users = result.scalars().all()
-            logger.info(f"Found {len(list(users))} active users for broadcast")
-            return list(users)
+            stmt = update(BroadcastMessage).where(BroadcastMessage.id == broadcast_id)
+            if from_statuses:
+                stmt = stmt.where(BroadcastMessage.status.in_(from_statuses))
+            result = await session.execute(stmt.values(status=status))
+            await session.commit()
+            return result.rowcount > 0
         except Exception as e:
-            logger.error(f"Error getting active users: {e}")
-            return []
+            await session.rollback()
+            logger.error(f"Error setting broadcast {broadcast_id} status: {e}")
+            return False
 
     async def update_broadcast_progress(
         self,
@@ -91,22 +231,20 @@ class BroadcastService:
         broadcast_id: int,
         sent_count: int,
         failed_count: int,
+        last_user_id: Optional[int] = None,
     ) -> bool:
-        """به‌روزرسانی پیشرفت ارسال پیام همگانی"""
+        """به‌روزرسانی پیشرفت ارسال پیام همگانی (و مکان cursor)"""
         try:
+            values = {'sent_count': sent_count, 'failed_count': failed_count}
+            if last_user_id is not None:
+                values['last_user_id'] = last_user_id
             result = await session.execute(
-                select(BroadcastMessage).where(BroadcastMessage.id == broadcast_id)
+                update(BroadcastMessage)
+                .where(BroadcastMessage.id == broadcast_id)
+                .values(**values)
             )
-            broadcast = result.scalar_one_or_none()
-
-            if not broadcast:
-                return False
-
-            broadcast.sent_count = sent_count
-            broadcast.failed_count = failed_count
-
             await session.commit()
-            return True
+            return result.rowcount > 0
         except Exception as e:
             await session.rollback()
             logger.error(f"Error updating broadcast progress: {e}")
@@ -122,17 +260,13 @@ class BroadcastService:
         """علامت‌گذاری پیام همگانی به عنوان تکمیل شده"""
         try:
             result = await session.execute(
-                select(BroadcastMessage).where(BroadcastMessage.id == broadcast_id)
+                update(BroadcastMessage)
+                .where(BroadcastMessage.id == broadcast_id)
+                .values(sent_count=sent_count, failed_count=failed_count, status=BROADCAST_COMPLETED)
             )
-            broadcast = result.scalar_one_or_none()
-
-            if not broadcast:
-                return False
-
-            broadcast.sent_count = sent_count
-            broadcast.failed_count = failed_count
-
             await session.commit()
+            if not result.rowcount:
+                return False
             logger.info(f"Broadcast {broadcast_id} marked as completed: {sent_count} sent, {failed_count} failed")
             return True
         except Exception as e:
@@ -148,9 +282,9 @@ class BroadcastService:
             all_broadcasts = result.scalars().all()
             
             total = len(all_broadcasts)
-            pending = sum(1 for b in all_broadcasts if b.sent_count == 0 and b.failed_count < 100)
-            processing = sum(1 for b in all_broadcasts if b.sent_count > 0 and b.sent_count < 1000)  # Arbitrary threshold
-            completed = sum(1 for b in all_broadcasts if b.sent_count >= 1000 or b.failed_count >= 100)
+            pending = sum(1 for b in all_broadcasts if b.status == BROADCAST_PENDING)
+            processing = sum(1 for b in all_broadcasts if b.status in (BROADCAST_RUNNING, BROADCAST_PAUSED))
+            completed = sum(1 for b in all_broadcasts if b.status in (BROADCAST_COMPLETED, BROADCAST_CANCELLED))
 
             return {
                 'total': total,
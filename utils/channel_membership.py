@@ -0,0 +1,162 @@
+"""
+Cached mandatory-channel membership checks.
+Keeps the mandatory channel list in-process and membership results in Redis,
+so users aren't checked with getChatMember on every message.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+import redis.asyncio as redis
+from aiogram import Bot
+
+from config.settings import settings
+from db.database import get_db
+from db.crud import get_active_mandatory_channels
+
+logger = logging.getLogger(__name__)
+
+# Chat member statuses that count as joined
+MEMBER_STATUSES = ("member", "administrator", "creator")
+
+# In-process cache of the active mandatory channels
+_mandatory_channels: Optional[list] = None
+_mandatory_channels_loaded_at: float = 0.0
+
+
+def invalidate_mandatory_channels():
+    """Drop the cached mandatory channel list (call after admin changes)."""
+    global _mandatory_channels
+    _mandatory_channels = None
+
+
+async def get_mandatory_channels() -> list:
+    """
+    Get active mandatory channels, cached in-process.
+
+    Other bot replicas pick up admin changes after
+    MANDATORY_CHANNELS_CACHE_TTL_SECONDS.
+
+    Returns:
+        List of channels (with channel_id, channel_name and channel_link)
+    """
+    global _mandatory_channels, _mandatory_channels_loaded_at
+
+    if (
+        _mandatory_channels is not None
+        and time.monotonic() - _mandatory_channels_loaded_at < settings.MANDATORY_CHANNELS_CACHE_TTL_SECONDS
+    ):
+        return _mandatory_channels
+
+    # Get active mandatory channels from database
+    async for db_session in get_db():
+        mandatory_channels = await get_active_mandatory_channels(db_session)
+        break
+    else:
+        # Fallback to old MANDATORY_CHANNEL_ID if no channels in database
+        if settings.MANDATORY_CHANNEL_ID:
+            mandatory_channels = [type('obj', (object,), {
+                'channel_id': settings.MANDATORY_CHANNEL_ID,
+                'channel_link': f"https://t.me/{settings.MANDATORY_CHANNEL_ID.lstrip('@')}",
+                'channel_name': None
+            })()]
+        else:
+            mandatory_channels = []
+
+    _mandatory_channels = mandatory_channels
+    _mandatory_channels_loaded_at = time.monotonic()
+    return mandatory_channels
+
+
+class ChannelMembershipChecker:
+    """Checks mandatory channel membership with results cached in Redis."""
+
+    def __init__(self, redis_client: Optional[redis.Redis]):
+        """
+        Initialize membership checker.
+
+        Args:
+            redis_client: Redis async client instance (None disables the cache)
+        """
+        self.redis = redis_client
+        self.membership_prefix = "channel:member"
+
+    def _get_membership_key(self, channel_id: str, user_id: int) -> str:
+        """Get Redis key for a user's cached membership in a channel."""
+        return f"{self.membership_prefix}:{channel_id}:{user_id}"
+
+    async def _check_member(self, bot: Bot, channel, user_id: int) -> Optional[bool]:
+        """
+        Ask Telegram whether a user is a member of a channel.
+
+        Returns:
+            True/False, or None if the channel can't be checked (skipped)
+        """
+        try:
+            member = await bot.get_chat_member(channel.channel_id, user_id)
+            return member.status in MEMBER_STATUSES
+        except Exception:
+            # Channel doesn't exist or bot can't access it, skip it
+            return None
+
+    async def get_missing_channels(
+        self,
+        bot: Bot,
+        user_id: int,
+        force_refresh: bool = False
+    ) -> list:
+        """
+        Get the mandatory channels a user hasn't joined.
+
+        Cached results are used unless force_refresh is set (the
+        "check membership" button); the rest are checked concurrently.
+
+        Args:
+            bot: Bot instance
+            user_id: Telegram user ID
+            force_refresh: Ignore cached results
+
+        Returns:
+            List of channels the user hasn't joined (in display order)
+        """
+        channels = await get_mandatory_channels()
+        if not channels:
+            return []
+
+        keys = [self._get_membership_key(channel.channel_id, user_id) for channel in channels]
+        cached = [None] * len(channels)
+        if self.redis and not force_refresh:
+            try:
+                cached = await self.redis.mget(keys)
+            except Exception as e:
+                logger.warning(f"Error reading channel membership cache for {user_id}: {e}")
+
+        to_check = [i for i, value in enumerate(cached) if value is None]
+        results = await asyncio.gather(
+            *(self._check_member(bot, channels[i], user_id) for i in to_check)
+        )
+
+        is_member = {i: value in (b"1", "1") for i, value in enumerate(cached) if value is not None}
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=False)
+        for i, result in zip(to_check, results):
+            if result is None:
+                # Unknown (channel not accessible) - treated as joined, not cached
+                is_member[i] = True
+                continue
+            is_member[i] = result
+            if self.redis:
+                ttl = (
+                    settings.CHANNEL_MEMBERSHIP_CACHE_TTL_SECONDS
+                    if result
+                    else settings.CHANNEL_NON_MEMBERSHIP_CACHE_TTL_SECONDS
+                )
+                pipe.setex(keys[i], ttl, "1" if result else "0")
+
+        if self.redis and to_check:
+            try:
+                await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Error writing channel membership cache for {user_id}: {e}")
+
+        return [channel for i, channel in enumerate(channels) if not is_member[i]]
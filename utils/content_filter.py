@@ -6,7 +6,8 @@ import re
 import json
 import os
 import logging
-from typing import Tuple, List
+from collections import deque
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -107,6 +108,10 @@ CHAR_REPLACEMENTS = {
 }
 
 
+_SPECIAL_CHARS_RE = re.compile(r'[^\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFFa-z0-9\s]')
+_SPACES_RE = re.compile(r'\s+')
+
+
 def normalize_text(text: str) -> str:
     """
     Normalize text by removing special characters and converting to standard form.
@@ -124,10 +129,10 @@ def normalize_text(text: str) -> str:
     text = text.lower()
     
     # Remove common special characters used to bypass filters
-    text = re.sub(r'[^\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFFa-z0-9\s]', '', text)
+    text = _SPECIAL_CHARS_RE.sub('', text)
     
     # Remove multiple spaces
-    text = re.sub(r'\s+', ' ', text)
+    text = _SPACES_RE.sub(' ', text)
     
     # Remove leading/trailing spaces
     text = text.strip()
@@ -159,6 +164,92 @@ def generate_variations(word: str) -> List[str]:
     return variations
 
 
+class ProfanityMatcher:
+    """
+    Aho–Corasick automaton over the normalized profanity words and their variations.
+
+    Built once, then finds every word occurring in a text in a single pass
+    over it, however many words and variations there are.
+    """
+
+    def __init__(self, words: List[str]):
+        """
+        Build the automaton.
+
+        Args:
+            words: Profanity words (normalized here, with generate_variations)
+        """
+        self.words = words
+        # Node i: outgoing edges, failure link and the (rank, word) tuples ending here
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[Tuple[int, int], str]]] = [[]]
+
+        # Rank reproduces the old check order: direct matches of any word
+        # first, then variations, each in list order
+        for index, word in enumerate(words):
+            normalized_word = normalize_text(word)
+            if not normalized_word:
+                continue
+            self._add(normalized_word, (0, index), word)
+            for variation in generate_variations(normalized_word)[1:]:
+                self._add(variation, (1, index), word)
+
+        self._build_failure_links()
+
+    def _add(self, pattern: str, rank: Tuple[int, int], word: str) -> None:
+        """Add a pattern to the trie."""
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((rank, word))
+
+    def _build_failure_links(self) -> None:
+        """Set failure links breadth-first and merge the outputs along them."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self._goto[node].items():
+                queue.append(next_node)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_node] = self._goto[fail].get(char, 0)
+                self._output[next_node] = self._output[next_node] + self._output[self._fail[next_node]]
+
+    def find(self, normalized: str) -> Optional[str]:
+        """
+        Find the profanity word that occurs in a normalized text.
+
+        Args:
+            normalized: Text normalized with normalize_text
+
+        Returns:
+            The matched word (as listed) or None
+        """
+        best = None
+        node = 0
+        for char in normalized:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for match in self._output[node]:
+                if best is None or match[0] < best[0]:
+                    best = match
+        return best[1] if best else None
+
+
+# Compiled once at import (PROFANITY_WORDS is loaded once as well)
+PROFANITY_MATCHER = ProfanityMatcher(PROFANITY_WORDS)
+
+
 def check_profanity(text: str) -> Tuple[bool, str]:
     """
     Check if text contains profanity words.
@@ -169,26 +260,76 @@ def check_profanity(text: str) -> Tuple[bool, str]:
     Returns:
         Tuple of (contains_profanity, matched_word)
     """
-    normalized = normalize_text(text)
-    
-    # Check against direct profanity words
-    for word in PROFANITY_WORDS:
-        normalized_word = normalize_text(word)
-        if normalized_word in normalized:
-            return True, word
-    
-    # Check against variations
-    for word in PROFANITY_WORDS:
-        normalized_word = normalize_text(word)
-        variations = generate_variations(normalized_word)
-        
-        for variation in variations:
-            if variation in normalized:
-                return True, word
-    
+    matched_word = PROFANITY_MATCHER.find(normalize_text(text))
+    if matched_word is not None:
+        return True, matched_word
     return False, ""
 
 
+# Common inappropriate patterns
+INAPPROPRIATE_PATTERNS = [
+    r'کس\s*میخوام',
+    r'کص\s*میخوام',
+    r'کوس\s*میخوام',
+    r'کث\s*میخوام',
+    r'کیر\s*میخوام',
+    r'کصم',
+    r'کس\s*میخوای',
+    r'کص\s*میخوای',
+    r'کوس\s*میخوای',
+    r'کث\s*میخوای',
+    r'کیر\s*میخوای',
+    r'کس\s*بخواه',
+    r'کص\s*بخواه',
+    r'کوس\s*بخواه',
+    r'کث\s*بخواه',
+    r'کیر\s*بخواه',
+    r'کس\s*بخوای',
+    r'کص\s*بخوای',
+    r'کوس\s*بخوای',
+    r'کث\s*بخوای',
+    r'کیر\s*بخوای',
+    r'کس\s*بخو',
+    r'کص\s*بخو',
+    r'کوس\s*بخو',
+    r'کث\s*بخو',
+    r'کیر\s*بخو',
+    r'کس\s*بخ',
+    r'کص\s*بخ',
+    r'کوس\s*بخ',
+    r'کث\s*بخ',
+    r'کیر\s*بخ',
+    r'کس\s*می',
+    r'کص\s*می',
+    r'کوس\s*می',
+    r'کث\s*می',
+    r'کیر\s*می',
+    r'کس\s*م',
+    r'کص\s*م',
+    r'کوس\s*م',
+    r'کث\s*م',
+    r'کیر\s*م',
+    r'کس\s*ک',
+    r'کص\s*ک',
+    r'کوس\s*ک',
+    r'کث\s*ک',
+    r'کیر\s*ک',
+    r'کس\s*کش',
+    r'کص\s*کش',
+    r'کوس\s*کش',
+    r'کث\s*کش',
+    r'کیر\s*کش',
+    r'کس\s*کش',
+    r'کص\s*کش',
+    r'کوس\s*کش',
+    r'کث\s*کش',
+    r'کیر\s*کش',
+]
+# All patterns in one regex, so texts without any of them take a single search
+INAPPROPRIATE_PATTERNS_RE = re.compile('|'.join(INAPPROPRIATE_PATTERNS), re.IGNORECASE)
+INAPPROPRIATE_PATTERN_RES = [re.compile(pattern, re.IGNORECASE) for pattern in INAPPROPRIATE_PATTERNS]
+
+
 def detect_pattern(text: str) -> Tuple[bool, str]:
     """
     Detect inappropriate patterns in text (e.g., "کس میخوام", "کصم").
@@ -201,69 +342,12 @@ def detect_pattern(text: str) -> Tuple[bool, str]:
     """
     normalized = normalize_text(text)
     
-    # Common inappropriate patterns
-    patterns = [
-        r'کس\s*میخوام',
-        r'کص\s*میخوام',
-        r'کوس\s*میخوام',
-        r'کث\s*میخوام',
-        r'کیر\s*میخوام',
-        r'کصم',
-        r'کس\s*میخوای',
-        r'کص\s*میخوای',
-        r'کوس\s*میخوای',
-        r'کث\s*میخوای',
-        r'کیر\s*میخوای',
-        r'کس\s*بخواه',
-        r'کص\s*بخواه',
-        r'کوس\s*بخواه',
-        r'کث\s*بخواه',
-        r'کیر\s*بخواه',
-        r'کس\s*بخوای',
-        r'کص\s*بخوای',
-        r'کوس\s*بخوای',
-        r'کث\s*بخوای',
-        r'کیر\s*بخوای',
-        r'کس\s*بخو',
-        r'کص\s*بخو',
-        r'کوس\s*بخو',
-        r'کث\s*بخو',
-        r'کیر\s*بخو',
-        r'کس\s*بخ',
-        r'کص\s*بخ',
-        r'کوس\s*بخ',
-        r'کث\s*بخ',
-        r'کیر\s*بخ',
-        r'کس\s*می',
-        r'کص\s*می',
-        r'کوس\s*می',
-        r'کث\s*می',
-        r'کیر\s*می',
-        r'کس\s*م',
-        r'کص\s*م',
-        r'کوس\s*م',
-        r'کث\s*م',
-        r'کیر\s*م',
-        r'کس\s*ک',
-        r'کص\s*ک',
-        r'کوس\s*ک',
-        r'کث\s*ک',
-        r'کیر\s*ک',
-        r'کس\s*کش',
-        r'کص\s*کش',
-        r'کوس\s*کش',
-        r'کث\s*کش',
-        r'کیر\s*کش',
-        r'کس\s*کش',
-        r'کص\s*کش',
-        r'کوس\s*کش',
-        r'کث\s*کش',
-        r'کیر\s*کش',
-    ]
-    
-    for pattern in patterns:
-        if re.search(pattern, normalized, re.IGNORECASE):
-            return True, pattern
+    if INAPPROPRIATE_PATTERNS_RE.search(normalized):
+        # The combined regex finds the leftmost match; report the first
+        # listed pattern instead
+        for pattern, pattern_re in zip(INAPPROPRIATE_PATTERNS, INAPPROPRIATE_PATTERN_RES):
+            if pattern_re.search(normalized):
+                return True, pattern
     
     return False, ""
 
@@ -0,0 +1,449 @@
+"""
+Redis-backed leaderboards.
+Scores are kept in sorted sets, updated as points, referrals and likes are
+recorded and rebuilt from the database by a periodic reconciliation, so
+leaderboard pages and ranks don't run aggregate queries.
+
+Each metric has an all-time sorted set and one per UTC day; week/month
+rankings are materialized lazily from the day sets and cached briefly.
+"""
+import logging
+from datetime import datetime, date, time, timedelta
+from typing import Dict, List, Optional, Tuple
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from db.crud import (
+    get_leaderboard_totals,
+    get_leaderboard_daily_totals,
+    get_leaderboard_users,
+    get_top_users_by_points,
+    get_top_users_by_referrals,
+    get_top_users_by_likes,
+    get_user_rank_by_points,
+    get_user_rank_by_referrals,
+    get_user_rank_by_likes,
+)
+
+logger = logging.getLogger(__name__)
+
+METRIC_POINTS = "points"  # Current points balance
+METRIC_REFERRALS = "referrals"  # Users referred
+METRIC_LIKES = "likes"  # Likes received
+METRICS = (METRIC_POINTS, METRIC_REFERRALS, METRIC_LIKES)
+
+# Rolling periods, in days (including today)
+PERIOD_DAYS = {"week": 7, "month": 30}
+# Day sets outlive the longest period by a day
+DAY_KEY_TTL = (max(PERIOD_DAYS.values()) + 1) * 86400
+
+# Extra entries read per page, so users banned since the last
+# reconciliation can be skipped without leaving the page short
+OVERFETCH = 10
+# Members per ZADD when rebuilding a sorted set
+REBUILD_CHUNK_SIZE = 1000
+
+# SQL fallback used until the first reconciliation has filled Redis
+_SQL_TOP_USERS = {
+    METRIC_POINTS: get_top_users_by_points,
+    METRIC_REFERRALS: get_top_users_by_referrals,
+    METRIC_LIKES: get_top_users_by_likes,
+}
+_SQL_USER_RANK = {
+    METRIC_POINTS: get_user_rank_by_points,
+    METRIC_REFERRALS: get_user_rank_by_referrals,
+    METRIC_LIKES: get_user_rank_by_likes,
+}
+
+# Global leaderboard instance (set in main.py)
+_leaderboard: Optional["Leaderboard"] = None
+
+
+def set_leaderboard(leaderboard: Optional["Leaderboard"]):
+    """Set the global leaderboard instance."""
+    global _leaderboard
+    _leaderboard = leaderboard
+
+
+def get_leaderboard() -> Optional["Leaderboard"]:
+    """Get the global leaderboard instance (None if Redis isn't set up)."""
+    return _leaderboard
+
+
+def _utc_today() -> date:
+    return datetime.utcnow().date()
+
+
+class Leaderboard:
+    """Leaderboard sorted sets per metric (all-time and per day) in Redis."""
+
+    def __init__(self, redis_client: redis.Redis, cache_ttl: Optional[int] = None):
+        """
+        Initialize leaderboard.
+
+        Args:
+            redis_client: Redis async client instance
+            cache_ttl: Seconds a materialized week/month ranking is reused
+                (defaults to LEADERBOARD_CACHE_TTL_SECONDS)
+        """
+        self.redis = redis_client
+        self.cache_ttl = cache_ttl if cache_ttl is not None else settings.LEADERBOARD_CACHE_TTL_SECONDS
+        self.key_prefix = "leaderboard"
+        self._ready = False
+
+    def _get_key(self, metric: str) -> str:
+        """Get Redis key of the all-time ranking of a metric."""
+        return f"{self.key_prefix}:{metric}"
+
+    def _get_day_key(self, metric: str, day: date) -> str:
+        """Get Redis key of the per-day counts of a metric."""
+        return f"{self.key_prefix}:{metric}:day:{day.isoformat()}"
+
+    def _get_period_key(self, metric: str, period: str) -> str:
+        """Get Redis key of the materialized week/month ranking of a metric."""
+        return f"{self.key_prefix}:{metric}:{period}"
+
+    def _get_ready_key(self) -> str:
+        """Get Redis key marking that the sorted sets have been built."""
+        return f"{self.key_prefix}:ready"
+
+    def _get_reconcile_lock_key(self) -> str:
+        """Get Redis key held by the replica running a reconciliation."""
+        return f"{self.key_prefix}:reconcile_lock"
+
+    # ============= Incremental updates =============
+
+    async def _record(
+        self,
+        metric: str,
+        user_id: int,
+        amount: int,
+        created_at: Optional[datetime] = None,
+        balance: Optional[int] = None
+    ) -> None:
+        """
+        Update the all-time and day sets of a metric for one user.
+
+        Args:
+            metric: Metric name
+            user_id: User ID (database id)
+            amount: Change of the user's count (all-time and that day)
+            created_at: When the counted row was created (defaults to now)
+            balance: New absolute all-time score (instead of adding amount)
+        """
+        day = (created_at or datetime.utcnow()).date()
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            if balance is not None:
+                pipe.zadd(self._get_key(metric), {str(user_id): balance})
+            else:
+                pipe.zincrby(self._get_key(metric), amount, str(user_id))
+            # Rows older than the longest period only count all-time
+            if (_utc_today() - day).days < max(PERIOD_DAYS.values()):
+                day_key = self._get_day_key(metric, day)
+                pipe.zincrby(day_key, amount, str(user_id))
+                pipe.expire(day_key, DAY_KEY_TTL)
+            await pipe.execute()
+        except Exception as e:
+            # The next reconciliation corrects the sets
+            logger.warning(f"Error updating {metric} leaderboard for user {user_id}: {e}")
+
+    async def record_points(self, user_id: int, balance: int) -> None:
+        """
+        Record a points transaction.
+
+        Args:
+            user_id: User ID
+            balance: Points balance after the transaction
+        """
+        await self._record(METRIC_POINTS, user_id, 1, balance=balance)
+
+    async def record_referral(self, referrer_id: int, created_at: Optional[datetime] = None) -> None:
+        """
+        Record a new referral.
+
+        Args:
+            referrer_id: Referrer user ID
+            created_at: When the referral was created (defaults to now)
+        """
+        await self._record(METRIC_REFERRALS, referrer_id, 1, created_at)
+
+    async def record_like(
+        self,
+        liked_user_id: int,
+        created_at: Optional[datetime] = None,
+        removed: bool = False
+    ) -> None:
+        """
+        Record a like (or its removal).
+
+        Args:
+            liked_user_id: User ID of the liked user
+            created_at: When the like was created (defaults to now)
+            removed: The like was removed (unlike)
+        """
+        await self._record(METRIC_LIKES, liked_user_id, -1 if removed else 1, created_at)
+
+    # ============= Reads =============
+
+    async def is_ready(self) -> bool:
+        """Check whether the sorted sets have been built by a reconciliation."""
+        if not self._ready:
+            self._ready = bool(await self.redis.exists(self._get_ready_key()))
+        return self._ready
+
+    async def _get_ranking_key(self, metric: str, period: Optional[str]) -> str:
+        """
+        Get the key of a ranking, materializing a week/month ranking first
+        if it isn't cached.
+
+        Args:
+            metric: Metric name
+            period: 'week', 'month' or None for all-time
+
+        Returns:
+            Redis key of the sorted set
+        """
+        if not period:
+            return self._get_key(metric)
+
+        key = self._get_period_key(metric, period)
+        if await self.redis.exists(key):
+            return key
+
+        today = _utc_today()
+        day_keys = [
+            self._get_day_key(metric, today - timedelta(days=offset))
+            for offset in range(PERIOD_DAYS[period])
+        ]
+        pipe = self.redis.pipeline(transaction=True)
+        if metric == METRIC_POINTS:
+            # Current balance of the users with transactions in the period
+            active_key = f"{key}:active"
+            pipe.zunionstore(active_key, day_keys)
+            pipe.zinterstore(key, {self._get_key(metric): 1, active_key: 0})
+            pipe.delete(active_key)
+        else:
+            pipe.zunionstore(key, day_keys)
+        pipe.expire(key, self.cache_ttl)
+        await pipe.execute()
+        return key
+
+    async def get_top(
+        self,
+        metric: str,
+        limit: int = 10,
+        skip: int = 0,
+        period: Optional[str] = None
+    ) -> List[Tuple[int, int]]:
+        """
+        Get a page of a ranking.
+
+        Args:
+            metric: Metric name
+            limit: Number of entries
+            skip: Entries to skip
+            period: 'week', 'month' or None for all-time
+
+        Returns:
+            List of (user_id, score) tuples, highest score first
+        """
+        key = await self._get_ranking_key(metric, period)
+        # Points rankings list every balance; counts only users with at least one
+        min_score = "-inf" if metric == METRIC_POINTS else "(0"
+        entries = await self.redis.zrevrangebyscore(
+            key, "+inf", min_score, start=skip, num=limit, withscores=True
+        )
+        return [(int(member), int(score)) for member, score in entries]
+
+    async def get_score(self, metric: str, user_id: int, period: Optional[str] = None) -> int:
+        """
+        Get a user's score (points rankings always score the current balance).
+
+        Args:
+            metric: Metric name
+            user_id: User ID
+            period: 'week', 'month' or None for all-time
+
+        Returns:
+            Score (0 if the user isn't ranked)
+        """
+        if metric == METRIC_POINTS:
+            period = None
+        key = await self._get_ranking_key(metric, period)
+        score = await self.redis.zscore(key, str(user_id))
+        return int(score) if score is not None else 0
+
+    async def get_rank(self, metric: str, user_id: int, period: Optional[str] = None) -> int:
+        """
+        Get a user's rank: 1 + number of users with a higher score.
+
+        Args:
+            metric: Metric name
+            user_id: User ID
+            period: 'week', 'month' or None for all-time
+
+        Returns:
+            Rank (users with equal scores share it)
+        """
+        score = await self.get_score(metric, user_id, period)
+        key = await self._get_ranking_key(metric, period)
+        return await self.redis.zcount(key, f"({score}", "+inf") + 1
+
+    async def get_top_users(
+        self,
+        session: AsyncSession,
+        metric: str,
+        limit: int = 10,
+        skip: int = 0,
+        period: Optional[str] = None
+    ) -> List[tuple]:
+        """
+        Get a page of a ranking with user details, as crud.get_top_users_by_*.
+
+        Returns:
+            List of (user_id, score, rank, display_name, profile_id, gender) tuples
+        """
+        entries = await self.get_top(metric, limit + OVERFETCH, skip, period)
+        users = await get_leaderboard_users(session, [user_id for user_id, _ in entries])
+
+        leaderboard = []
+        for user_id, score in entries:
+            if user_id not in users:
+                # Banned or deactivated since the last reconciliation
+                continue
+            display_name, profile_id, gender = users[user_id]
+            leaderboard.append((user_id, score, len(leaderboard) + 1, display_name, profile_id, gender))
+            if len(leaderboard) == limit:
+                break
+        return leaderboard
+
+    # ============= Reconciliation =============
+
+    async def _replace_sorted_set(self, pipe, key: str, scores: Dict[str, int], ttl: Optional[int] = None) -> None:
+        """Write scores to a staging key and queue replacing key with it on pipe."""
+        staging_key = f"{key}:rebuild"
+        await self.redis.delete(staging_key)
+        items = list(scores.items())
+        for i in range(0, len(items), REBUILD_CHUNK_SIZE):
+            await self.redis.zadd(staging_key, dict(items[i:i + REBUILD_CHUNK_SIZE]))
+
+        if items:
+            pipe.rename(staging_key, key)
+            if ttl:
+                pipe.expire(key, ttl)
+        else:
+            pipe.delete(key)
+
+    async def reconcile(self, session: AsyncSession, lock_seconds: Optional[int] = None) -> bool:
+        """
+        Rebuild every sorted set from the database.
+
+        Corrects drift from failed incremental updates, expired rows and
+        banned users. Updates made while it runs may be overwritten until
+        the next reconciliation.
+
+        Args:
+            session: Database session
+            lock_seconds: Skip if another replica reconciled within this many
+                seconds (defaults to half of LEADERBOARD_RECONCILE_INTERVAL_SECONDS)
+
+        Returns:
+            True if the sets were rebuilt, False if skipped
+        """
+        if lock_seconds is None:
+            lock_seconds = max(settings.LEADERBOARD_RECONCILE_INTERVAL_SECONDS // 2, 1)
+        if not await self.redis.set(self._get_reconcile_lock_key(), "1", nx=True, ex=lock_seconds):
+            return False
+
+        today = _utc_today()
+        days = [today - timedelta(days=offset) for offset in range(max(PERIOD_DAYS.values()))]
+        since = datetime.combine(days[-1], time.min)
+
+        for metric in METRICS:
+            totals = await get_leaderboard_totals(session, metric)
+            daily = await get_leaderboard_daily_totals(session, metric, since)
+
+            by_day: Dict[str, Dict[str, int]] = {day.isoformat(): {} for day in days}
+            for user_id, day, count in daily:
+                # func.date() is a date on MySQL and a string on SQLite
+                day = day.isoformat() if isinstance(day, date) else str(day)
+                if day in by_day:
+                    by_day[day][str(user_id)] = count
+
+            pipe = self.redis.pipeline(transaction=True)
+            await self._replace_sorted_set(
+                pipe, self._get_key(metric), {str(user_id): score for user_id, score in totals}
+            )
+            for day in days:
+                await self._replace_sorted_set(
+                    pipe, self._get_day_key(metric, day), by_day[day.isoformat()], DAY_KEY_TTL
+                )
+            for period in PERIOD_DAYS:
+                pipe.delete(self._get_period_key(metric, period))
+            await pipe.execute()
+
+        await self.redis.set(self._get_ready_key(), "1")
+        self._ready = True
+        return True
+
+
+# ============= Leaderboard queries (Redis, or SQL until it's ready) =============
+
+async def get_top_users(
+    session: AsyncSession,
+    metric: str,
+    limit: int = 10,
+    skip: int = 0,
+    period: Optional[str] = None
+) -> List[tuple]:
+    """
+    Get a page of a leaderboard.
+
+    Args:
+        session: Database session
+        metric: METRIC_POINTS, METRIC_REFERRALS or METRIC_LIKES
+        limit: Number of users
+        skip: Users to skip
+        period: 'week', 'month' or None for all-time
+
+    Returns:
+        List of (user_id, score, rank, display_name, profile_id, gender) tuples
+    """
+    leaderboard = get_leaderboard()
+    if leaderboard:
+        try:
+            if await leaderboard.is_ready():
+                return await leaderboard.get_top_users(session, metric, limit, skip, period)
+        except Exception as e:
+            logger.warning(f"Error reading {metric} leaderboard from Redis: {e}")
+    return await _SQL_TOP_USERS[metric](session, limit=limit, skip=skip, period=period)
+
+
+async def get_user_rank(
+    session: AsyncSession,
+    metric: str,
+    user_id: int,
+    period: Optional[str] = None
+) -> Optional[int]:
+    """
+    Get a user's leaderboard rank.
+
+    Args:
+        session: Database session
+        metric: METRIC_POINTS, METRIC_REFERRALS or METRIC_LIKES
+        user_id: User ID
+        period: 'week', 'month' or None for all-time
+
+    Returns:
+        Rank (1 + number of users with a higher score)
+    """
+    leaderboard = get_leaderboard()
+    if leaderboard:
+        try:
+            if await leaderboard.is_ready():
+                return await leaderboard.get_rank(metric, user_id, period)
+        except Exception as e:
+            logger.warning(f"Error reading {metric} rank from Redis: {e}")
+    return await _SQL_USER_RANK[metric](session, user_id, period=period)
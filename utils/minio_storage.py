@@ -1,23 +1,46 @@
 """
 MinIO storage utility for uploading and managing profile images.
+
+The MinIO SDK is synchronous, so its calls run in worker threads and never
+block the event loop. Telegram photos are streamed into MinIO as they are
+downloaded instead of being buffered whole.
 """
+import asyncio
 import logging
 import io
-from typing import Optional
+import threading
+from functools import lru_cache
+from typing import AsyncIterator, Optional
 from minio import Minio
 from minio.error import S3Error
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
-# Global MinIO client instance
+# Global MinIO client instance (thread-safe, shared by the worker threads)
 _minio_client: Optional[Minio] = None
+_minio_client_lock = threading.Lock()
+
+# Multipart upload part size for streams of unknown length (MinIO minimum is 5 MiB)
+STREAM_PART_SIZE = 5 * 1024 * 1024
+# Chunk size of Telegram file downloads
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
 
 def get_minio_client() -> Minio:
-    """Get or create MinIO client instance."""
+    """
+    Get or create MinIO client instance.
+    
+    Blocking (creates the bucket on first use); call it from a worker thread.
+    """
     global _minio_client
-    if _minio_client is None:
+    if _minio_client is not None:
+        return _minio_client
+    
+    with _minio_client_lock:
+        if _minio_client is not None:
+            return _minio_client
+        
         endpoint = settings.MINIO_ENDPOINT
         # Remove http:// or https:// if present
         if endpoint.startswith('http://'):
@@ -25,7 +48,7 @@ def get_minio_client() -> Minio:
         elif endpoint.startswith('https://'):
             endpoint = endpoint[8:]
         
-        _minio_client = Minio(
+        client = Minio(
             endpoint,
             access_key=settings.MINIO_ACCESS_KEY,
             secret_key=settings.MINIO_SECRET_KEY,
@@ -34,8 +57,8 @@ def get_minio_client() -> Minio:
         
         # Ensure bucket exists and is public
         try:
-            if not _minio_client.bucket_exists(settings.MINIO_BUCKET_NAME):
-                _minio_client.make_bucket(settings.MINIO_BUCKET_NAME)
+            if not client.bucket_exists(settings.MINIO_BUCKET_NAME):
+                client.make_bucket(settings.MINIO_BUCKET_NAME)
                 logger.info(f"Created MinIO bucket: {settings.MINIO_BUCKET_NAME}")
             
             # Set bucket policy to allow public read access
@@ -52,7 +75,7 @@ def get_minio_client() -> Minio:
                         }
                     ]
                 }
-                _minio_client.set_bucket_policy(
+                client.set_bucket_policy(
                     settings.MINIO_BUCKET_NAME,
                     json.dumps(policy)
                 )
@@ -62,10 +85,73 @@ def get_minio_client() -> Minio:
         except S3Error as e:
             logger.error(f"Error checking/creating MinIO bucket: {e}")
             raise
+        
+        _minio_client = client
     
     return _minio_client
 
 
+def _get_public_url(filename: str) -> str:
+    """Get the public URL of an object (MINIO_PUBLIC_URL, without trailing slash)."""
+    public_base_url = settings.MINIO_PUBLIC_URL.rstrip('/')
+    return f"{public_base_url}/{settings.MINIO_BUCKET_NAME}/{filename}"
+
+
+def _put_object(stream, filename: str, length: int, content_type: str) -> None:
+    """Upload a stream to MinIO (blocking; runs in a worker thread)."""
+    client = get_minio_client()
+    client.put_object(
+        settings.MINIO_BUCKET_NAME,
+        filename,
+        stream,
+        length=length,
+        content_type=content_type,
+        # Unknown length: multipart upload, one part buffered at a time
+        part_size=STREAM_PART_SIZE if length < 0 else 0
+    )
+
+
+def _remove_object(filename: str) -> None:
+    """Delete an object from MinIO (blocking; runs in a worker thread)."""
+    client = get_minio_client()
+    client.remove_object(settings.MINIO_BUCKET_NAME, filename)
+
+
+class _AsyncStreamReader:
+    """
+    Blocking file-like reader over an async chunk stream.
+    
+    Lets the MinIO SDK (in a worker thread) read a download while it is
+    still running on the event loop.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._stream = stream
+        self._loop = loop
+        self._buffer = bytearray()
+        self._finished = False
+
+    async def _next_chunk(self) -> Optional[bytes]:
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._finished and (size < 0 or len(self._buffer) < size):
+            chunk = asyncio.run_coroutine_threadsafe(self._next_chunk(), self._loop).result()
+            if chunk is None:
+                self._finished = True
+            else:
+                self._buffer.extend(chunk)
+        
+        if size < 0 or size > len(self._buffer):
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
 async def upload_image_to_minio(
     image_data: bytes,
     filename: str,
@@ -83,23 +169,11 @@ async def upload_image_to_minio(
         Public URL of the uploaded image, or None if upload failed
     """
     try:
-        client = get_minio_client()
-        
-        # Upload image
-        image_stream = io.BytesIO(image_data)
-        client.put_object(
-            settings.MINIO_BUCKET_NAME,
-            filename,
-            image_stream,
-            length=len(image_data),
-            content_type=content_type
+        await asyncio.to_thread(
+            _put_object, io.BytesIO(image_data), filename, len(image_data), content_type
         )
         
-        # Generate public URL using MINIO_PUBLIC_URL
-        # Remove trailing slash if present
-        public_base_url = settings.MINIO_PUBLIC_URL.rstrip('/')
-        public_url = f"{public_base_url}/{settings.MINIO_BUCKET_NAME}/{filename}"
-        
+        public_url = _get_public_url(filename)
         logger.info(f"Successfully uploaded image to MinIO: {filename}, public URL: {public_url}")
         return public_url
         
@@ -111,6 +185,44 @@ async def upload_image_to_minio(
         return None
 
 
+async def upload_stream_to_minio(
+    stream: AsyncIterator[bytes],
+    filename: str,
+    length: int = -1,
+    content_type: str = "image/jpeg"
+) -> Optional[str]:
+    """
+    Upload an async chunk stream to MinIO as it arrives and return public URL.
+    
+    Args:
+        stream: Async iterator of data chunks (e.g. a Telegram download)
+        filename: Filename for the object (will be stored as this)
+        length: Total size in bytes, or -1 if unknown (multipart upload)
+        content_type: MIME type of the data
+        
+    Returns:
+        Public URL of the uploaded object, or None if upload failed
+    """
+    try:
+        reader = _AsyncStreamReader(stream, asyncio.get_running_loop())
+        await asyncio.to_thread(_put_object, reader, filename, length, content_type)
+        
+        public_url = _get_public_url(filename)
+        logger.info(f"Successfully uploaded stream to MinIO: {filename}, public URL: {public_url}")
+        return public_url
+        
+    except S3Error as e:
+        logger.error(f"Error uploading stream to MinIO: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error uploading stream to MinIO: {e}", exc_info=True)
+        return None
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose:
+            await aclose()
+
+
 async def download_telegram_file(bot, file_id: str) -> Optional[bytes]:
     """
     Download file from Telegram by file_id.
@@ -137,7 +249,7 @@ async def upload_telegram_photo_to_minio(
     user_id: int
 ) -> Optional[str]:
     """
-    Download photo from Telegram and upload to MinIO.
+    Stream photo from Telegram into MinIO.
     
     Args:
         bot: Bot instance
@@ -148,11 +260,7 @@ async def upload_telegram_photo_to_minio(
         Public URL of the uploaded image, or None if upload failed
     """
     try:
-        # Download file from Telegram
-        file_data = await download_telegram_file(bot, file_id)
-        if not file_data:
-            logger.error(f"Failed to download file {file_id} from Telegram")
-            return None
+        file = await bot.get_file(file_id)
         
         # Generate unique filename
         import hashlib
@@ -161,16 +269,33 @@ async def upload_telegram_photo_to_minio(
         file_hash = hashlib.md5(f"{user_id}_{timestamp}_{file_id}".encode()).hexdigest()[:12]
         filename = f"profile_{user_id}_{file_hash}.jpg"
         
-        # Upload to MinIO
-        url = await upload_image_to_minio(file_data, filename, "image/jpeg")
-        return url
+        if bot.session.api.is_local:
+            # Local Bot API server: files are on disk, no stream to forward
+            file_data = await download_telegram_file(bot, file_id)
+            if not file_data:
+                logger.error(f"Failed to download file {file_id} from Telegram")
+                return None
+            return await upload_image_to_minio(file_data, filename, "image/jpeg")
+        
+        # Upload to MinIO while downloading from Telegram
+        stream = bot.session.stream_content(
+            url=bot.session.api.file_url(bot.token, file.file_path),
+            chunk_size=DOWNLOAD_CHUNK_SIZE,
+            raise_for_status=True
+        )
+        return await upload_stream_to_minio(
+            stream,
+            filename,
+            length=file.file_size or -1,
+            content_type="image/jpeg"
+        )
         
     except Exception as e:
         logger.error(f"Error uploading Telegram photo to MinIO: {e}", exc_info=True)
         return None
 
 
-def delete_image_from_minio(filename: str) -> bool:
+async def delete_image_from_minio(filename: str) -> bool:
     """
     Delete image from MinIO.
     
@@ -181,8 +306,7 @@ def delete_image_from_minio(filename: str) -> bool:
         True if deletion was successful, False otherwise
     """
     try:
-        client = get_minio_client()
-        client.remove_object(settings.MINIO_BUCKET_NAME, filename)
+        await asyncio.to_thread(_remove_object, filename)
         logger.info(f"Successfully deleted image from MinIO: {filename}")
         return True
     except S3Error as e:
@@ -193,10 +317,14 @@ def delete_image_from_minio(filename: str) -> bool:
         return False
 
 
+@lru_cache(maxsize=4096)
 def is_url_accessible_from_internet(url: str) -> bool:
     """
     Check if URL is accessible from internet (not localhost).
     
+    Results are cached in-process (the same profile URLs are checked on
+    every profile view).
+    
     Args:
         url: URL to check
         
@@ -0,0 +1,246 @@
+"""
+Persistent cache of image moderation verdicts.
+Verdicts are keyed by Telegram file_unique_id (NSFW ones also by a perceptual
+hash), kept in Redis with MySQL as the fallback, so known images (and copies
+or near-duplicates of rejected ones) get a verdict without a download or
+inference.
+"""
+import io
+import logging
+from typing import Optional, Tuple
+import redis.asyncio as redis
+from PIL import Image
+
+from config.settings import settings
+from db.database import get_db
+from db.crud import get_image_verdict, find_nsfw_verdict_by_phash, save_image_verdict
+
+logger = logging.getLogger(__name__)
+
+# The 64-bit hash is split into 8-bit bands: two hashes within 7 differing
+# bits share at least one band, so near-duplicate candidates are found by
+# looking up each band of the hash
+PHASH_BANDS = 8
+PHASH_BAND_BITS = 64 // PHASH_BANDS
+
+
+def compute_image_hash(image_data: bytes) -> Optional[int]:
+    """
+    Compute the 64-bit difference hash (dHash) of an image.
+
+    Robust to re-encoding, resizing and small edits. CPU-bound; run it in
+    the NSFW inference pool.
+
+    Args:
+        image_data: Image binary data
+
+    Returns:
+        Unsigned 64-bit hash, or None if the image can't be decoded
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        # JPEGs are decoded at a reduced scale directly
+        image.draft('L', (64, 64))
+        pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    except Exception as e:
+        logger.debug(f"Error computing image hash: {e}")
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hash_distance(hash1: int, hash2: int) -> int:
+    """Number of differing bits of two hashes."""
+    return bin(hash1 ^ hash2).count('1')
+
+
+def _to_signed(value: int) -> int:
+    """Unsigned 64-bit hash -> signed value for a BIGINT column."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value: int) -> int:
+    """Signed BIGINT value -> unsigned 64-bit hash."""
+    return value + (1 << 64) if value < 0 else value
+
+
+class ModerationCache:
+    """
+    Two-level (Redis, then MySQL) cache of image moderation verdicts.
+
+    Any verdict is reused for the same file_unique_id. By perceptual hash
+    (exact or within max_distance bits) only NSFW verdicts are reused: an
+    edited copy of a rejected picture is rejected, while a copy of an
+    accepted one is still checked, since a small explicit overlay often
+    leaves the coarse hash unchanged.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis],
+        ttl: Optional[int] = None,
+        max_distance: Optional[int] = None
+    ):
+        """
+        Initialize moderation cache.
+
+        Args:
+            redis_client: Redis async client instance (None uses MySQL only)
+            ttl: Redis TTL in seconds (defaults to NSFW_VERDICT_TTL_DAYS)
+            max_distance: Near-duplicate hash distance (defaults to NSFW_PHASH_MAX_DISTANCE)
+        """
+        self.redis = redis_client
+        self.ttl = ttl if ttl is not None else settings.NSFW_VERDICT_TTL_DAYS * 86400
+        max_distance = max_distance if max_distance is not None else settings.NSFW_PHASH_MAX_DISTANCE
+        # Bands only guarantee candidates up to PHASH_BANDS - 1 differing bits
+        self.max_distance = min(max_distance, PHASH_BANDS - 1)
+        self.key_prefix = "moderation"
+
+    def _get_file_key(self, file_unique_id: str) -> str:
+        """Get Redis key for the verdict of a file."""
+        return f"{self.key_prefix}:file:{file_unique_id}"
+
+    def _get_hash_key(self, phash: int) -> str:
+        """Get Redis key for the verdict of an exact hash."""
+        return f"{self.key_prefix}:hash:{phash:016x}"
+
+    def _get_band_key(self, band: int, phash: int) -> str:
+        """Get Redis key for the NSFW hashes sharing a band value."""
+        value = (phash >> (band * PHASH_BAND_BITS)) & ((1 << PHASH_BAND_BITS) - 1)
+        return f"{self.key_prefix}:band:{band}:{value:02x}"
+
+    @staticmethod
+    def _encode(verdict: Tuple[bool, float]) -> str:
+        is_nsfw, confidence = verdict
+        return f"{1 if is_nsfw else 0}:{confidence}"
+
+    @staticmethod
+    def _decode(value) -> Tuple[bool, float]:
+        if isinstance(value, bytes):
+            value = value.decode()
+        is_nsfw, confidence = value.split(":", 1)
+        return is_nsfw == "1", float(confidence)
+
+    async def get_by_file_unique_id(self, file_unique_id: str) -> Optional[Tuple[bool, float]]:
+        """
+        Get the verdict of a file.
+
+        Args:
+            file_unique_id: Telegram file_unique_id
+
+        Returns:
+            Tuple of (is_nsfw, confidence) or None if unknown
+        """
+        if self.redis:
+            try:
+                value = await self.redis.get(self._get_file_key(file_unique_id))
+                if value:
+                    return self._decode(value)
+            except Exception as e:
+                logger.warning(f"Error reading moderation cache for {file_unique_id}: {e}")
+
+        async for db_session in get_db():
+            stored = await get_image_verdict(db_session, file_unique_id)
+            break
+        if not stored:
+            return None
+
+        verdict = (stored.is_nsfw, stored.confidence)
+        phash = _to_unsigned(stored.phash) if stored.phash is not None else None
+        await self._store_in_redis(file_unique_id, phash, verdict)
+        return verdict
+
+    async def get_by_hash(self, phash: int) -> Optional[Tuple[bool, float]]:
+        """
+        Get the NSFW verdict of an identical or near-duplicate image.
+
+        MySQL (a full scan of the hashes) is only searched when Redis is
+        not configured or failed; a Redis miss is final.
+
+        Args:
+            phash: Perceptual hash (compute_image_hash)
+
+        Returns:
+            NSFW tuple of (is_nsfw, confidence) or None if unknown
+        """
+        if self.redis:
+            try:
+                value = await self.redis.get(self._get_hash_key(phash))
+                # Hash keys written before they were NSFW-only may hold safe verdicts
+                if value and self._decode(value)[0]:
+                    return self._decode(value)
+
+                if self.max_distance > 0:
+                    pipe = self.redis.pipeline(transaction=False)
+                    for band in range(PHASH_BANDS):
+                        pipe.smembers(self._get_band_key(band, phash))
+                    candidates = set()
+                    for members in await pipe.execute():
+                        candidates.update(int(member) for member in members)
+
+                    matches = sorted(
+                        (hash_distance(phash, candidate), candidate)
+                        for candidate in candidates
+                        if hash_distance(phash, candidate) <= self.max_distance
+                    )
+                    for _, candidate in matches:
+                        value = await self.redis.get(self._get_hash_key(candidate))
+                        if value and self._decode(value)[0]:
+                            return self._decode(value)
+                return None
+            except Exception as e:
+                logger.warning(f"Error reading moderation cache for hash {phash:016x}: {e}")
+
+        async for db_session in get_db():
+            stored = await find_nsfw_verdict_by_phash(db_session, _to_signed(phash), self.max_distance)
+            break
+        if not stored:
+            return None
+        return stored.is_nsfw, stored.confidence
+
+    async def store(self, file_unique_id: str, phash: Optional[int], verdict: Tuple[bool, float]) -> None:
+        """
+        Store the verdict of an image in Redis and MySQL.
+
+        Args:
+            file_unique_id: Telegram file_unique_id
+            phash: Perceptual hash, or None if it couldn't be computed
+            verdict: Tuple of (is_nsfw, confidence)
+        """
+        await self._store_in_redis(file_unique_id, phash, verdict)
+        try:
+            async for db_session in get_db():
+                await save_image_verdict(
+                    db_session,
+                    file_unique_id,
+                    _to_signed(phash) if phash is not None else None,
+                    verdict[0],
+                    verdict[1]
+                )
+                break
+        except Exception as e:
+            logger.warning(f"Error saving moderation verdict for {file_unique_id}: {e}")
+
+    async def _store_in_redis(self, file_unique_id: str, phash: Optional[int], verdict: Tuple[bool, float]) -> None:
+        """Store the verdict in Redis (by file; NSFW ones also by hash and in the bands)."""
+        if not self.redis:
+            return
+        try:
+            value = self._encode(verdict)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.setex(self._get_file_key(file_unique_id), self.ttl, value)
+            if phash is not None and verdict[0]:
+                pipe.setex(self._get_hash_key(phash), self.ttl, value)
+                for band in range(PHASH_BANDS):
+                    band_key = self._get_band_key(band, phash)
+                    pipe.sadd(band_key, str(phash))
+                    pipe.expire(band_key, self.ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error writing moderation cache for {file_unique_id}: {e}")
@@ -2,11 +2,18 @@
 NSFW content detection utilities for images.
 Uses NudeNet library for detecting inappropriate content in profile images.
 """
+import asyncio
 import logging
 import io
-from typing import Optional, Tuple
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
 from PIL import Image
 
+from config.settings import settings
+
 logger = logging.getLogger(__name__)
 
 # Try to import NudeNet, fallback to basic detection if not available
@@ -19,10 +26,10 @@ except ImportError:
 
 
 # Global detector instance (lazy loading)
-_detector: Optional[NudeDetector] = None
+_detector: Optional["NudeDetector"] = None
 
 
-def get_detector() -> Optional[NudeDetector]:
+def get_detector() -> Optional["NudeDetector"]:
     """
     Get or create NudeNet detector instance (lazy loading).
     
@@ -62,9 +69,25 @@ def check_image_nsfw(image_data: bytes) -> Tuple[bool, float]:
         - is_nsfw: True if image is likely NSFW
         - confidence_score: Confidence score (0.0 to 1.0)
     """
+    is_nsfw, confidence, _ = check_image_nsfw_detailed(image_data)
+    return is_nsfw, confidence
+
+
+def check_image_nsfw_detailed(image_data: bytes) -> Tuple[bool, float, bool]:
+    """
+    Check if image contains NSFW content, telling if NudeNet gave the verdict.
+    
+    Args:
+        image_data: Image binary data
+        
+    Returns:
+        Tuple of (is_nsfw, confidence_score, from_detector)
+        - from_detector: False for fallback verdicts (unreadable image,
+          NudeNet unavailable or failing), which must not be stored
+    """
     if not image_data:
         logger.warning("Empty image data provided")
-        return True, 1.0  # Reject empty images
+        return True, 1.0, False  # Reject empty images
     
     try:
         # Try to load image
@@ -74,7 +97,7 @@ def check_image_nsfw(image_data: bytes) -> Tuple[bool, float]:
         width, height = image.size
         if width < 10 or height < 10:
             logger.warning(f"Image too small: {width}x{height}")
-            return True, 1.0  # Reject very small images
+            return True, 1.0, False  # Reject very small images
         
         # Use NudeNet to check for NSFW content
         detector = get_detector()
@@ -191,7 +214,7 @@ def check_image_nsfw(image_data: bytes) -> Tuple[bool, float]:
                     
                     if is_nsfw:
                         logger.warning(f"NSFW content detected with confidence: {max_confidence:.2f}")
-                        return is_nsfw, max_confidence
+                        return is_nsfw, max_confidence, True
                     
                     # NudeNet didn't detect NSFW, continue to pixelation check
                     logger.debug(f"NudeNet passed (confidence: {max_confidence:.2f}), checking pixelation")
@@ -205,18 +228,18 @@ def check_image_nsfw(image_data: bytes) -> Tuple[bool, float]:
             except Exception as e:
                 logger.error(f"Error in NudeNet detection: {e}", exc_info=True)
                 # Fallback to basic heuristics
-                return basic_nsfw_check(image)
+                return (*basic_nsfw_check(image), False)
         else:
             # NudeNet not available, fallback to basic heuristics
-            return basic_nsfw_check(image)
+            return (*basic_nsfw_check(image), False)
         
         # Image passed all checks
-        return False, 0.0
+        return False, 0.0, True
             
     except Exception as e:
         logger.error(f"Error processing image: {e}", exc_info=True)
         # If we can't process the image, reject it (conservative approach)
-        return True, 1.0
+        return True, 1.0, False
 
 
 def basic_nsfw_check(image: Image.Image) -> Tuple[bool, float]:
@@ -258,13 +281,185 @@ def basic_nsfw_check(image: Image.Image) -> Tuple[bool, float]:
         return True, 1.0  # Reject on error
 
 
-async def download_and_check_photo(bot, file_id: str) -> Tuple[bool, Optional[str]]:
+# ============= Off-loop inference =============
+# Inference runs in a process pool (model loaded once per worker), so it
+# never blocks the bot's event loop. Checks of the same file_unique_id
+# share one inference and their verdicts are cached, in-process and in the
+# persistent moderation cache (Redis + MySQL).
+
+_executor: Optional[ProcessPoolExecutor] = None
+# Bounds checks waiting for or running in the pool (backpressure)
+_pending_checks: Optional[asyncio.Semaphore] = None
+# file_unique_id -> future of the running check
+_inflight_checks: Dict[str, asyncio.Future] = {}
+# file_unique_id -> (is_nsfw, confidence), least recently used first
+_verdict_cache: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+# Persistent verdict cache shared by all replicas (set in main.py)
+_moderation_cache = None
+
+
+def set_moderation_cache(cache):
+    """Set the persistent moderation cache (utils.moderation_cache.ModerationCache)."""
+    global _moderation_cache
+    _moderation_cache = cache
+
+
+def _init_worker():
+    """Load the detector once when a pool worker starts."""
+    get_detector()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Get or create the NSFW inference process pool (lazy loading).
+    
+    Returns:
+        ProcessPoolExecutor instance
+    """
+    global _executor
+    if _executor is None:
+        # forkserver: the bot process runs threads by now, and forking it
+        # could deadlock a worker on a lock held by another thread. Workers
+        # fork from a single-threaded server that preloads this module, so
+        # PIL/NudeNet are imported once. Each worker still re-imports the
+        # entry script (main.py) as __mp_main__, like spawned processes do;
+        # its startup code is under the __main__ guard, so this only loads
+        # modules.
+        mp_context = multiprocessing.get_context("forkserver")
+        mp_context.set_forkserver_preload([__name__])
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.NSFW_WORKER_PROCESSES,
+            mp_context=mp_context,
+            initializer=_init_worker
+        )
+        logger.info(f"NSFW inference pool started with {settings.NSFW_WORKER_PROCESSES} workers")
+    return _executor
+
+
+def shutdown_executor():
+    """Shut down the NSFW inference process pool."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _get_cached_verdict(file_unique_id: str) -> Optional[Tuple[bool, float]]:
+    """Get a cached verdict and mark it as recently used."""
+    verdict = _verdict_cache.get(file_unique_id)
+    if verdict is not None:
+        _verdict_cache.move_to_end(file_unique_id)
+    return verdict
+
+
+def _cache_verdict(file_unique_id: str, verdict: Tuple[bool, float]):
+    """Cache a verdict, evicting the least recently used ones."""
+    _verdict_cache[file_unique_id] = verdict
+    _verdict_cache.move_to_end(file_unique_id)
+    while len(_verdict_cache) > settings.NSFW_VERDICT_CACHE_SIZE:
+        _verdict_cache.popitem(last=False)
+
+
+async def _run_in_pool(func, image_data: bytes):
+    """Run func(image_data) in the process pool, waiting for a free slot first."""
+    global _pending_checks
+    if _pending_checks is None:
+        _pending_checks = asyncio.Semaphore(settings.NSFW_MAX_PENDING_CHECKS)
+
+    async with _pending_checks:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(get_executor(), func, image_data)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool on the next check
+            shutdown_executor()
+            raise
+
+
+async def _run_check(image_data: bytes, file_unique_id: Optional[str] = None) -> Tuple[Tuple[bool, float], bool]:
+    """
+    Get the verdict of an image: an identical or near-duplicate image
+    rejected before (by perceptual hash) reuses its NSFW verdict, otherwise
+    check_image_nsfw runs and the verdict is stored if NudeNet gave it.
+
+    Returns:
+        Tuple of (verdict, cacheable); fallback verdicts are not cacheable
+    """
+    if _moderation_cache is None or not file_unique_id:
+        is_nsfw, confidence, from_detector = await _run_in_pool(check_image_nsfw_detailed, image_data)
+        return (is_nsfw, confidence), from_detector
+
+    from utils.moderation_cache import compute_image_hash
+
+    phash = await _run_in_pool(compute_image_hash, image_data)
+    verdict = None
+    if phash is not None:
+        try:
+            verdict = await _moderation_cache.get_by_hash(phash)
+        except Exception as e:
+            logger.warning(f"Error looking up moderation verdict by hash: {e}")
+    if verdict is not None:
+        logger.info(f"Reusing moderation verdict of a matching image for {file_unique_id}")
+        await _moderation_cache.store(file_unique_id, phash, verdict)
+        return verdict, True
+
+    is_nsfw, confidence, from_detector = await _run_in_pool(check_image_nsfw_detailed, image_data)
+    verdict = (is_nsfw, confidence)
+    if from_detector:
+        await _moderation_cache.store(file_unique_id, phash, verdict)
+    return verdict, from_detector
+
+
+async def check_image_nsfw_async(
+    image_data: bytes,
+    file_unique_id: Optional[str] = None
+) -> Tuple[bool, float]:
+    """
+    Check if image contains NSFW content, off the event loop.
+    
+    Args:
+        image_data: Image binary data
+        file_unique_id: Telegram file_unique_id (enables sharing and caching the verdict)
+        
+    Returns:
+        Tuple of (is_nsfw, confidence_score), as check_image_nsfw
+    
+    Raises:
+        asyncio.TimeoutError: If the pool is too busy (NSFW_CHECK_TIMEOUT_SECONDS)
+    """
+    if not file_unique_id:
+        verdict, _ = await asyncio.wait_for(_run_check(image_data), settings.NSFW_CHECK_TIMEOUT_SECONDS)
+        return verdict
+
+    verdict = _get_cached_verdict(file_unique_id)
+    if verdict is not None:
+        return verdict
+
+    future = _inflight_checks.get(file_unique_id)
+    if future is None:
+        future = asyncio.ensure_future(_run_check(image_data, file_unique_id))
+        _inflight_checks[file_unique_id] = future
+        future.add_done_callback(lambda _: _inflight_checks.pop(file_unique_id, None))
+
+    # shield: a caller timing out doesn't cancel the check for the others
+    verdict, cacheable = await asyncio.wait_for(asyncio.shield(future), settings.NSFW_CHECK_TIMEOUT_SECONDS)
+    if cacheable:
+        _cache_verdict(file_unique_id, verdict)
+    return verdict
+
+
+async def download_and_check_photo(
+    bot,
+    file_id: str,
+    file_unique_id: Optional[str] = None
+) -> Tuple[bool, Optional[str]]:
     """
     Download photo from Telegram and check for NSFW content.
     
     Args:
         bot: Telegram bot instance
         file_id: Telegram file_id of the photo
+        file_unique_id: Telegram file_unique_id of the photo (known photos skip the download)
         
     Returns:
         Tuple of (is_safe, error_message)
@@ -274,15 +469,25 @@ async def download_and_check_photo(bot, file_id: str) -> Tuple[bool, Optional[st
     try:
         from utils.minio_storage import download_telegram_file
         
-        # Download image from Telegram
-        image_data = await download_telegram_file(bot, file_id)
-        
-        if not image_data:
-            logger.error(f"Failed to download image with file_id: {file_id}")
-            return False, "❌ متأسفانه در دانلود تصویر مشکلی پیش آمد.\n\nلطفاً دوباره تلاش کنید:"
-        
-        # Check for NSFW content
-        is_nsfw, confidence = check_image_nsfw(image_data)
+        verdict = _get_cached_verdict(file_unique_id) if file_unique_id else None
+        if verdict is None and file_unique_id and _moderation_cache is not None:
+            try:
+                verdict = await _moderation_cache.get_by_file_unique_id(file_unique_id)
+            except Exception as e:
+                logger.warning(f"Error looking up moderation verdict for {file_unique_id}: {e}")
+            if verdict is not None:
+                _cache_verdict(file_unique_id, verdict)
+        if verdict is None:
+            # Download image from Telegram
+            image_data = await download_telegram_file(bot, file_id)
+            
+            if not image_data:
+                logger.error(f"Failed to download image with file_id: {file_id}")
+                return False, "❌ متأسفانه در دانلود تصویر مشکلی پیش آمد.\n\nلطفاً دوباره تلاش کنید:"
+            
+            # Check for NSFW content
+            verdict = await check_image_nsfw_async(image_data, file_unique_id)
+        is_nsfw, confidence = verdict
         
         if is_nsfw:
             logger.warning(f"NSFW/image quality issue detected (confidence: {confidence:.2f})")
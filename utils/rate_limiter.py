@@ -1,26 +1,157 @@
 """
 Redis-based rate limiting utility.
 Prevents abuse by limiting the number of actions per user per time window.
+
+Limits are checked and counted by a Lua script, so any number of named
+limits costs a single Redis round-trip and concurrent requests can't slip
+past a limit between the check and the increment.
 """
 import time
-from typing import Optional
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
 import redis.asyncio as redis
 
 from config.settings import settings
 
+# Rate limiting algorithms
+MODE_SLIDING_WINDOW = "sliding"  # Exact log of request timestamps (sorted set)
+MODE_GCRA = "gcra"  # Generic cell rate algorithm (token bucket, one value per key)
+
+
+# Checks every limit first and only counts the request if all of them allow
+# it. Returns {allowed, remaining_1, retry_after_ms_1, remaining_2, ...}.
+#
+# KEYS[i] = key of limit i
+# ARGV[1] = now (ms), ARGV[2] = unique request id (sliding window member),
+# then ARGV[3 + 3*(i-1) ..] = mode, limit, window (ms) of limit i
+RATE_LIMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local request_id = ARGV[2]
+local allowed = 1
+local results = {}
+local new_tats = {}
+
+for i = 1, #KEYS do
+    local base = 3 + (i - 1) * 3
+    local mode = ARGV[base]
+    local limit = tonumber(ARGV[base + 1])
+    local window = tonumber(ARGV[base + 2])
+    local remaining = 0
+    local retry_after = 0
+
+    if mode == 'gcra' then
+        -- Whole milliseconds, so stored values stay exact integers
+        local interval = math.max(math.floor(window / limit), 1)
+        local tat = tonumber(redis.call('GET', KEYS[i])) or now
+        if tat < now then
+            tat = now
+        end
+        local new_tat = tat + interval
+        local allow_at = new_tat - window
+        if now < allow_at then
+            allowed = 0
+            retry_after = allow_at - now
+        else
+            remaining = math.floor((window - (new_tat - now)) / interval)
+        end
+        new_tats[i] = new_tat
+    else
+        redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - window)
+        local count = redis.call('ZCARD', KEYS[i])
+        if count >= limit then
+            allowed = 0
+            local oldest = redis.call('ZRANGE', KEYS[i], 0, 0, 'WITHSCORES')
+            retry_after = tonumber(oldest[2]) + window - now
+        else
+            remaining = limit - count - 1
+        end
+    end
+
+    results[#results + 1] = remaining
+    results[#results + 1] = retry_after
+end
+
+if allowed == 1 then
+    for i = 1, #KEYS do
+        local base = 3 + (i - 1) * 3
+        local window = tonumber(ARGV[base + 2])
+        if ARGV[base] == 'gcra' then
+            redis.call('SET', KEYS[i], new_tats[i], 'PX', math.ceil(new_tats[i] - now))
+        else
+            redis.call('ZADD', KEYS[i], now, request_id)
+            redis.call('PEXPIRE', KEYS[i], window)
+        end
+    end
+else
+    for i = 1, #KEYS do
+        results[(i - 1) * 2 + 1] = 0
+    end
+end
+
+table.insert(results, 1, allowed)
+return results
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """A named limit: at most `limit` actions per `window_seconds`."""
+    name: str
+    limit: int
+    window_seconds: int = 60
+
+
+def get_default_rules() -> Dict[str, RateLimitRule]:
+    """Get the per-user limits configured in settings, by name."""
+    return {
+        "messages": RateLimitRule("messages", settings.RATE_LIMIT_MESSAGES_PER_MINUTE),
+        "callbacks": RateLimitRule("callbacks", settings.RATE_LIMIT_CALLBACKS_PER_MINUTE),
+        "direct_messages": RateLimitRule("direct_messages", settings.RATE_LIMIT_DIRECT_MESSAGES_PER_MINUTE),
+        "chat_requests": RateLimitRule("chat_requests", settings.RATE_LIMIT_CHAT_REQUESTS_PER_MINUTE),
+    }
+
 
 class RateLimiter:
     """Redis-based rate limiter for limiting user actions."""
-    
-    def __init__(self, redis_client: redis.Redis):
+
+    def __init__(self, redis_client: redis.Redis, mode: Optional[str] = None):
         """
         Initialize rate limiter with Redis client.
-        
+
         Args:
             redis_client: Redis async client instance
+            mode: MODE_SLIDING_WINDOW or MODE_GCRA (defaults to RATE_LIMIT_MODE)
         """
         self.redis = redis_client
-    
+        self.mode = mode or settings.RATE_LIMIT_MODE
+        self._rate_limit_script = self.redis.register_script(RATE_LIMIT_SCRIPT)
+
+    async def _check(self, limits: Iterable[tuple[str, int, int]]) -> tuple[bool, list]:
+        """
+        Check and count a request against several limits in one EVALSHA.
+
+        Args:
+            limits: (key, limit, window_seconds) tuples
+
+        Returns:
+            Tuple of (is_allowed, [(remaining, retry_after_seconds), ...])
+        """
+        keys = []
+        now_ms = int(time.time() * 1000)
+        # Unique per request, so equal timestamps don't collapse in the log
+        args = [now_ms, uuid.uuid4().hex]
+        for key, limit, window_seconds in limits:
+            keys.append(key)
+            args.extend([self.mode, limit, window_seconds * 1000])
+
+        result = await self._rate_limit_script(keys=keys, args=args)
+        per_limit = [
+            (int(result[i]), int(result[i + 1]) / 1000)
+            for i in range(1, len(result), 2)
+        ]
+        return bool(int(result[0])), per_limit
+
     async def check_rate_limit(
         self,
         key: str,
@@ -29,62 +160,91 @@ class RateLimiter:
     ) -> tuple[bool, int]:
         """
         Check if an action is allowed based on rate limit.
-        
+
         Args:
             key: Unique identifier for rate limiting (e.g., f"rate_limit:{user_id}")
             limit: Maximum number of actions allowed
             window_seconds: Time window in seconds
-            
+
         Returns:
             Tuple of (is_allowed, remaining_requests)
         """
-        current_time = int(time.time())
-        window_key = f"{key}:{current_time // window_seconds}"
-        
-        # Get current count
-        count = await self.redis.get(window_key)
-        current_count = int(count) if count else 0
-        
-        if current_count >= limit:
-            return False, 0
-        
-        # Increment counter
-        pipe = self.redis.pipeline()
-        pipe.incr(window_key)
-        pipe.expire(window_key, window_seconds + 1)  # Add 1 second buffer
-        await pipe.execute()
-        
-        return True, limit - current_count - 1
-    
+        is_allowed, per_limit = await self._check([(key, limit, window_seconds)])
+        return is_allowed, per_limit[0][0]
+
     async def reset_rate_limit(self, key: str) -> None:
         """
         Reset rate limit for a key.
-        
+
         Args:
             key: Key to reset
         """
-        pattern = f"{key}:*"
-        async for key_name in self.redis.scan_iter(match=pattern):
-            await self.redis.delete(key_name)
+        await self.redis.delete(key)
 
 
 class MessageRateLimiter(RateLimiter):
-    """Rate limiter specifically for message sending."""
-    
+    """Rate limiter for per-user actions (messages, callbacks, DMs, chat requests)."""
+
+    def __init__(self, redis_client: redis.Redis, mode: Optional[str] = None):
+        """
+        Initialize message rate limiter.
+
+        Args:
+            redis_client: Redis async client instance
+            mode: MODE_SLIDING_WINDOW or MODE_GCRA (defaults to RATE_LIMIT_MODE)
+        """
+        super().__init__(redis_client, mode)
+        self.rules = get_default_rules()
+
+    def _get_user_key(self, name: str, user_id: int) -> str:
+        """Get Redis key for a named limit of a user."""
+        return f"rate_limit:{name}:{user_id}"
+
+    async def check_user_limits(
+        self,
+        user_id: int,
+        names: Iterable[str]
+    ) -> tuple[bool, Dict[str, int]]:
+        """
+        Check several named limits of a user in one Redis call.
+
+        The action is counted against all of them only if all allow it.
+
+        Args:
+            user_id: Telegram user ID
+            names: Limit names (keys of get_default_rules)
+
+        Returns:
+            Tuple of (is_allowed, remaining actions by limit name)
+        """
+        rules = [self.rules[name] for name in names]
+        is_allowed, per_limit = await self._check(
+            (self._get_user_key(rule.name, user_id), rule.limit, rule.window_seconds)
+            for rule in rules
+        )
+        return is_allowed, {
+            rule.name: remaining
+            for rule, (remaining, _) in zip(rules, per_limit)
+        }
+
     async def check_message_limit(self, user_id: int) -> tuple[bool, int]:
         """
         Check if user can send a message based on rate limit.
-        
+
         Args:
             user_id: Telegram user ID
-            
+
         Returns:
             Tuple of (is_allowed, remaining_messages)
         """
-        key = f"msg_rate_limit:{user_id}"
-        return await self.check_rate_limit(
-            key,
-            settings.RATE_LIMIT_MESSAGES_PER_MINUTE,
-            window_seconds=60
-        )
+        is_allowed, remaining = await self.check_user_limits(user_id, ["messages"])
+        return is_allowed, remaining["messages"]
+
+    async def reset_user_limits(self, user_id: int) -> None:
+        """
+        Reset all named limits of a user.
 
+        Args:
+            user_id: Telegram user ID
+        """
+        await self.redis.delete(*(self._get_user_key(name, user_id) for name in self.rules))
@@ -0,0 +1,65 @@
+"""
+In-process token bucket for pacing outgoing Telegram API calls.
+Shared by concurrent senders so their combined rate stays under a limit.
+"""
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Token bucket shared by concurrent tasks, with a pause for FloodWait."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initialize token bucket.
+
+        Args:
+            rate: Tokens added per second (sustained calls per second)
+            capacity: Maximum burst size (defaults to 1, i.e. evenly spaced calls)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else 1.0
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens earned since the last refill."""
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available (and any pause is over) and take it."""
+        # Waiters queue on the lock, so tokens are handed out in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop handing out tokens for a while (e.g. after a FloodWait).
+
+        The bucket restarts empty, so sending resumes at the steady rate
+        instead of with a burst.
+
+        Args:
+            seconds: Pause duration in seconds
+        """
+        paused_until = time.monotonic() + seconds
+        if paused_until > self._paused_until:
+            self._paused_until = paused_until
+            self._tokens = 0.0
+            self._updated_at = paused_until
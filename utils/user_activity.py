@@ -1,23 +1,37 @@
 """
 User activity tracking utilities.
 Tracks user online/offline status using Redis.
+
+Presence is one Redis sorted set (telegram_id -> last activity timestamp):
+online checks are ZSCORE, online counts ZCOUNT and "who went offline" a
+single ZRANGEBYSCORE. last_seen is written to MySQL in batches from it.
 """
-from datetime import datetime, timedelta
-from typing import Optional
+import time
+from datetime import datetime
+from typing import Optional, List
 import redis.asyncio as redis
 
+# Activity timestamps older than this are dropped from the sorted set
+# (they were written to the database long before)
+LAST_SEEN_RETENTION_SECONDS = 86400
+# Each flush re-reads this many seconds before the previous one, so updates
+# that raced with it (or come from a replica with a slightly late clock) are
+# not skipped
+LAST_SEEN_FLUSH_OVERLAP_SECONDS = 5
+
 
 class UserActivityTracker:
     """Tracks user activity to determine online/offline status."""
     
     def __init__(self, redis_client: redis.Redis):
         self.redis = redis_client
-        self.activity_prefix = "user:activity"
         self.online_timeout_seconds = 300  # 5 minutes considered online
-    
-    def _get_activity_key(self, telegram_id: int) -> str:
-        """Get Redis key for user activity."""
-        return f"{self.activity_prefix}:{telegram_id}"
+        # Presence sorted set: telegram_id -> last activity timestamp
+        self.last_seen_key = "user:last_seen"
+        # Timestamp up to which last_seen was flushed to the database
+        self.last_seen_flushed_key = "user:last_seen:flushed_until"
+        # Timestamp up to which offline transitions were written to the database
+        self.offline_checked_key = "user:last_seen:offline_until"
     
     async def update_activity(self, telegram_id: int, db_session=None):
         """
@@ -27,20 +41,20 @@ class UserActivityTracker:
             telegram_id: User's Telegram ID
             db_session: Optional database session to update last_seen in database
         """
-        key = self._get_activity_key(telegram_id)
-        now = datetime.utcnow()
-        timestamp = now.timestamp()
-        # Store as string since Redis decode_responses=False
+        timestamp = time.time()
+        now = datetime.utcfromtimestamp(timestamp)
         try:
-            await self.redis.setex(key, self.online_timeout_seconds, str(timestamp))
+            await self.redis.zadd(self.last_seen_key, {str(telegram_id): timestamp})
             
             # Update last_seen in database if session provided
+            # (write-through; otherwise flush_last_seen writes it later)
             if db_session:
                 try:
                     from db.crud import get_user_by_telegram_id
                     user = await get_user_by_telegram_id(db_session, telegram_id)
                     if user:
                         user.last_seen = now
+                        user.is_bot_blocked = False
                         await db_session.commit()
                 except Exception as db_error:
                     import logging
@@ -50,29 +64,105 @@ class UserActivityTracker:
             logging.getLogger(__name__).error(f"Error updating activity in Redis for user {telegram_id}: {e}")
             raise
     
+    async def _write_last_seen_range(self, db_session, since: float, until: float) -> int:
+        """
+        Write last_seen of users whose last activity is in (since, until] to the database.
+        
+        Returns:
+            Number of users updated
+        """
+        from db.crud import bulk_update_last_seen
+        
+        entries = await self.redis.zrangebyscore(
+            self.last_seen_key, f"({since}", until, withscores=True
+        )
+        if entries:
+            await bulk_update_last_seen(db_session, {
+                int(member): datetime.utcfromtimestamp(score)
+                for member, score in entries
+            })
+        return len(entries)
+    
+    async def _advance_cursor(self, cursor_key: str, now: float) -> None:
+        """Store a flush cursor and drop presence entries past retention."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(cursor_key, str(now))
+        pipe.zremrangebyscore(self.last_seen_key, "-inf", now - LAST_SEEN_RETENTION_SECONDS)
+        await pipe.execute()
+    
+    async def flush_last_seen(self, db_session) -> int:
+        """
+        Write last_seen of users active since the previous flush to the database.
+        
+        Args:
+            db_session: Database session
+            
+        Returns:
+            Number of users updated
+        """
+        now = time.time()
+        flushed_until = await self.redis.get(self.last_seen_flushed_key)
+        if flushed_until:
+            since = float(flushed_until) - LAST_SEEN_FLUSH_OVERLAP_SECONDS
+        else:
+            since = now - LAST_SEEN_RETENTION_SECONDS
+        
+        flushed = await self._write_last_seen_range(db_session, since, now)
+        await self._advance_cursor(self.last_seen_flushed_key, now)
+        return flushed
+    
+    async def flush_offline_users(self, db_session) -> int:
+        """
+        Write last_seen of users who went offline since the previous call.
+        
+        Users go offline online_timeout_seconds after their last activity,
+        so this is one range query over the presence set.
+        
+        Args:
+            db_session: Database session
+            
+        Returns:
+            Number of users updated
+        """
+        now = time.time()
+        offline_until = await self.redis.get(self.offline_checked_key)
+        if offline_until:
+            since = float(offline_until) - LAST_SEEN_FLUSH_OVERLAP_SECONDS
+        else:
+            since = now - LAST_SEEN_RETENTION_SECONDS
+        
+        flushed = await self._write_last_seen_range(
+            db_session,
+            since - self.online_timeout_seconds,
+            now - self.online_timeout_seconds
+        )
+        await self._advance_cursor(self.offline_checked_key, now)
+        return flushed
+    
     async def is_online(self, telegram_id: int) -> bool:
         """Check if user is currently online."""
-        key = self._get_activity_key(telegram_id)
-        exists = await self.redis.exists(key)
-        return bool(exists)
+        last_activity = await self.redis.zscore(self.last_seen_key, str(telegram_id))
+        return last_activity is not None and last_activity > time.time() - self.online_timeout_seconds
     
     async def get_last_activity(self, telegram_id: int) -> Optional[datetime]:
         """Get user's last activity timestamp."""
-        key = self._get_activity_key(telegram_id)
-        timestamp_str = await self.redis.get(key)
-        
-        if timestamp_str:
-            try:
-                # Handle both bytes and string
-                if isinstance(timestamp_str, bytes):
-                    timestamp_str = timestamp_str.decode('utf-8')
-                timestamp = float(timestamp_str)
-                return datetime.utcfromtimestamp(timestamp)
-            except (ValueError, TypeError) as e:
-                print(f"Error parsing timestamp: {e}, value: {timestamp_str}")
-                return None
-        
-        return None
+        last_activity = await self.redis.zscore(self.last_seen_key, str(telegram_id))
+        if last_activity is None:
+            return None
+        return datetime.utcfromtimestamp(last_activity)
+    
+    async def get_online_user_ids(self) -> List[int]:
+        """Get Telegram IDs of all online users."""
+        members = await self.redis.zrangebyscore(
+            self.last_seen_key, f"({time.time() - self.online_timeout_seconds}", "+inf"
+        )
+        return [int(member) for member in members]
+    
+    async def count_online(self) -> int:
+        """Get the number of online users."""
+        return await self.redis.zcount(
+            self.last_seen_key, f"({time.time() - self.online_timeout_seconds}", "+inf"
+        )
 
 
 async def get_user_status(telegram_id: int, activity_tracker: Optional[UserActivityTracker] = None, db_session=None) -> tuple[bool, Optional[datetime]]:
@@ -89,9 +179,8 @@ async def get_user_status(telegram_id: int, activity_tracker: Optional[UserActiv
     """
     # First check Redis for real-time status
     if activity_tracker:
-        is_online = await activity_tracker.is_online(telegram_id)
-        if is_online:
-            last_activity = await activity_tracker.get_last_activity(telegram_id)
+        last_activity = await activity_tracker.get_last_activity(telegram_id)
+        if last_activity and (datetime.utcnow() - last_activity).total_seconds() < activity_tracker.online_timeout_seconds:
             return True, last_activity
     
     # If not online in Redis, check database